@@ -0,0 +1,294 @@
+"""
+后端热点路径的微基准：定时时间生成、标题/话题读取、/getFiles、/getAccounts、SSE 推送、/uploadSave、cookie 文件解析。
+数据库和视频目录都建在临时目录里，不会动到 db/database.db 和 videoFile。
+
+    python -m benchmarks.bench_hot_paths                   # 只跑不比较
+    python -m benchmarks.bench_hot_paths --save-baseline   # 结果写入 benchmarks/baseline.json
+    python -m benchmarks.bench_hot_paths --compare         # 和基线比较，中位数变慢超过 --threshold 倍时退出码为 1
+
+基线和机器相关，换机器或换 python 版本后先重新 --save-baseline。
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import runpy
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from pathlib import Path
+from queue import Queue
+
+from conf import BASE_DIR
+
+BASELINE_PATH = Path(__file__).parent / "baseline.json"
+# 中位数比基线慢多少倍算回退
+DEFAULT_THRESHOLD = 1.25
+# 数据库行数档位
+ROW_COUNTS = (10_000, 100_000)
+TITLE_FOLDER_SIZE = 5_000
+SSE_CLIENTS = 50
+SSE_MESSAGES = 10
+UPLOAD_SAVE_SIZE = 5 * 1024 * 1024
+COOKIE_COUNT = 60
+# 冷启动导入耗时：每次新开解释器导入，包含解释器本身的启动时间
+IMPORT_MODULES = ("sau_backend", "cli_main")
+
+
+class BenchCase(object):
+    """setup 只执行一次，run 重复 repeat 次计时"""
+
+    def __init__(self, name, run, repeat=5, setup=None):
+        self.name = name
+        self.run = run
+        self.repeat = repeat
+        self.setup = setup
+
+
+def measure(case):
+    if case.setup:
+        case.setup()
+    # 预热一次，排除首次导入、缓存建立的影响
+    case.run()
+    samples = []
+    for _ in range(case.repeat):
+        start = time.perf_counter()
+        case.run()
+        samples.append(time.perf_counter() - start)
+    return {"median": statistics.median(samples), "min": min(samples), "repeat": case.repeat}
+
+
+def create_database(base_dir: Path):
+    """用 db/createTable.py 建表，表结构以它为准"""
+    db_dir = base_dir / "db"
+    db_dir.mkdir(parents=True, exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(db_dir)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            runpy.run_path(str(Path(BASE_DIR) / "db" / "createTable.py"))
+    finally:
+        os.chdir(cwd)
+    return db_dir / "database.db"
+
+
+def fill_rows(db_path, rows):
+    """file_records 和 user_info 各填 rows 行，行数已经一致时跳过"""
+    with sqlite3.connect(db_path) as conn:
+        if conn.execute("SELECT COUNT(*) FROM file_records").fetchone()[0] == rows and \
+                conn.execute("SELECT COUNT(*) FROM user_info").fetchone()[0] == rows:
+            return
+        conn.execute("DELETE FROM file_records")
+        conn.execute("DELETE FROM user_info")
+        conn.executemany(
+            "INSERT INTO file_records (filename, filesize, file_path) VALUES (?, ?, ?)",
+            ((f"video_{i}.mp4", 12.5, f"{uuid.uuid1()}_video_{i}.mp4") for i in range(rows)))
+        conn.executemany(
+            "INSERT INTO user_info (type, filePath, userName, status) VALUES (?, ?, ?, ?)",
+            ((i % 5 + 1, f"{uuid.uuid1()}.json", f"account_{i}", i % 2) for i in range(rows)))
+        conn.commit()
+
+
+def schedule_cases():
+    from utils.files_times import generate_schedule_time_next_day
+    return [
+        BenchCase("schedule_1k", lambda: generate_schedule_time_next_day(1000, 5), repeat=20),
+        BenchCase("schedule_1k_timestamps",
+                  lambda: generate_schedule_time_next_day(1000, 5, timestamps=True), repeat=20),
+    ]
+
+
+def title_cases(work_dir: Path):
+    from utils.files_times import get_title_and_hashtags
+    folder = work_dir / "videos"
+
+    def setup():
+        folder.mkdir(exist_ok=True)
+        for i in range(TITLE_FOLDER_SIZE):
+            (folder / f"video_{i}.mp4").touch()
+            (folder / f"video_{i}.txt").write_text(f"标题 {i}\n#话题一 #话题二 #话题三\n", encoding="utf-8")
+
+    def run():
+        # 与 examples/upload_video_to_*.py 的用法一致：遍历目录里的 mp4，逐个读取同名 txt
+        for file in folder.glob("*.mp4"):
+            get_title_and_hashtags(str(file))
+
+    return [BenchCase(f"title_hashtags_{TITLE_FOLDER_SIZE}", run, repeat=3, setup=setup)]
+
+
+def backend_cases(work_dir: Path):
+    import sau_backend
+    # 后端所有路径都基于 BASE_DIR 拼接，指到临时目录
+    sau_backend.BASE_DIR = work_dir
+    (work_dir / "videoFile").mkdir(exist_ok=True)
+    db_path = create_database(work_dir)
+    client = sau_backend.app.test_client()
+
+    def get(url):
+        def run():
+            # /getAccounts 会逐行 print，输出本身也是耗时的一部分，丢到 devnull 而不是省掉
+            with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+                response = client.get(url)
+            assert response.status_code == 200, response.data[:200]
+        return run
+
+    cases = []
+    for rows in ROW_COUNTS:
+        label = f"{rows // 1000}k"
+        repeat = 5 if rows <= 10_000 else 3
+        setup = lambda rows=rows: fill_rows(db_path, rows)
+        cases.append(BenchCase(f"get_files_{label}", get("/getFiles"), repeat=repeat, setup=setup))
+        cases.append(BenchCase(f"get_accounts_{label}", get("/getAccounts"), repeat=repeat, setup=setup))
+
+    payload = os.urandom(UPLOAD_SAVE_SIZE)
+
+    def upload_save():
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = client.post("/uploadSave", data={"file": (io.BytesIO(payload), "bench.mp4")},
+                                   content_type="multipart/form-data")
+        assert response.status_code == 200, response.data[:200]
+
+    cases.append(BenchCase("upload_save_5mb", upload_save, repeat=10))
+    cases.append(BenchCase(f"sse_fanout_{SSE_CLIENTS}x{SSE_MESSAGES}",
+                           lambda: sse_fanout(sau_backend.sse_stream), repeat=3))
+    return cases
+
+
+def sse_fanout(sse_stream):
+    """SSE_CLIENTS 个连接各自一个队列，逐条推送消息，直到所有连接都收到 SSE_MESSAGES 条"""
+    queues = [Queue() for _ in range(SSE_CLIENTS)]
+    done = threading.Barrier(SSE_CLIENTS + 1)
+
+    def consume(queue):
+        received = 0
+        for _ in sse_stream(queue):
+            received += 1
+            if received == SSE_MESSAGES:
+                break
+        done.wait()
+
+    threads = [threading.Thread(target=consume, args=(queue,), daemon=True) for queue in queues]
+    for thread in threads:
+        thread.start()
+    for i in range(SSE_MESSAGES):
+        for queue in queues:
+            queue.put(f"message {i}")
+    done.wait()
+
+
+def cookie_cases(work_dir: Path):
+    from uploader.bilibili_uploader.main import extract_keys_from_json, load_cookie_data, read_cookie_json_file
+    from uploader.xhs_uploader.api import storage_state_to_cookie_str
+    cookie_file = work_dir / "account.json"
+    names = ["SESSDATA", "bili_jct", "DedeUserID__ckMd5", "DedeUserID"]
+    cookies = [{"name": names[i] if i < len(names) else f"cookie_{i}", "value": uuid.uuid4().hex * 4,
+                "domain": ".xiaohongshu.com" if i % 2 else ".bilibili.com", "path": "/",
+                "expires": 1900000000, "httpOnly": False, "secure": True, "sameSite": "Lax"}
+               for i in range(COOKIE_COUNT)]
+    origins = [{"origin": "https://creator.xiaohongshu.com",
+                "localStorage": [{"name": f"key_{i}", "value": "x" * 512} for i in range(50)]}]
+    cookie_file.write_text(json.dumps({"cookies": cookies, "origins": origins}), encoding="utf-8")
+
+    def run_many(func):
+        def run():
+            for _ in range(100):
+                func()
+        return run
+
+    return [
+        BenchCase("cookie_parse_x100", run_many(lambda: extract_keys_from_json(read_cookie_json_file(cookie_file)))),
+        BenchCase("cookie_parse_cached_x100", run_many(lambda: load_cookie_data(cookie_file))),
+        BenchCase("cookie_str_xhs_x100", run_many(lambda: storage_state_to_cookie_str(cookie_file))),
+    ]
+
+
+def import_cases():
+    def cold_import(module):
+        def run():
+            subprocess.run([sys.executable, "-c", f"import {module}"], cwd=BASE_DIR, check=True,
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return run
+
+    return [BenchCase(f"import_{module}", cold_import(module), repeat=5) for module in IMPORT_MODULES]
+
+
+def collect_cases(work_dir: Path):
+    return schedule_cases() + title_cases(work_dir) + backend_cases(work_dir) + cookie_cases(work_dir) + \
+        import_cases()
+
+
+def compare(results, baseline, threshold):
+    """返回回退的用例名列表，同时打印对比表"""
+    regressions = []
+    print(f"{'case':<28}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            print(f"{name:<28}{'-':>12}{format_seconds(result['median']):>12}{'new':>8}")
+            continue
+        ratio = result["median"] / base["median"] if base["median"] else 1.0
+        flag = ""
+        if ratio > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<28}{format_seconds(base['median']):>12}{format_seconds(result['median']):>12}"
+              f"{ratio:>8.2f}{flag}")
+    return regressions
+
+
+def format_seconds(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.1f}us"
+    if seconds < 1:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds:.3f}s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="micro benchmarks for backend hot paths")
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this string")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write results to {BASELINE_PATH.name}")
+    parser.add_argument("--compare", action="store_true", help="compare with the saved baseline")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH))
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="fail when current median > baseline median * threshold")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="sau_bench_") as tmp:
+        for case in collect_cases(Path(tmp)):
+            if args.filter and args.filter not in case.name:
+                continue
+            results[case.name] = measure(case)
+            if not args.compare:
+                print(f"{case.name:<28}median {format_seconds(results[case.name]['median']):>10}  "
+                      f"min {format_seconds(results[case.name]['min']):>10}")
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r", encoding="utf-8") as f:
+                baseline = json.load(f)
+        # --filter 只跑了部分用例时保留其他用例的旧基线
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"baseline saved: {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"regressions (> {args.threshold}x): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,210 @@
+"""
+上传器端到端压测：启动本地桩服务，用真实的上传器类并发跑 N 个任务，
+输出 jobs/min、各阶段 p50/p95 以及峰值内存（本进程 + 浏览器子进程 RSS 之和）。
+
+    python -m benchmarks.run_uploader_bench --platform douyin --jobs 20 --concurrency 4 --file-size 20 --upload-speed 10
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import psutil
+from playwright.async_api import async_playwright
+
+from benchmarks.stub_server import DEFAULT_PORT, StubConfig, start_stub_server
+from utils import base_social_media
+from utils.base_social_media import SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_KUAISHOU, SOCIAL_MEDIA_TENCENT, \
+    SOCIAL_MEDIA_TIKTOK, SOCIAL_MEDIA_XIAOHONGSHU
+
+# 桩页面实现了定时发布控件的平台
+SCHEDULE_PLATFORMS = [SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_KUAISHOU, SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_XIAOHONGSHU]
+# 采样 RSS 的间隔，秒
+RSS_SAMPLE_INTERVAL = 0.5
+BENCH_TAGS = ["压测", "stub"]
+
+
+def build_uploader(platform, index, file_path, account_file, publish_date):
+    title = f"bench {index}"
+    if platform == SOCIAL_MEDIA_DOUYIN:
+        from uploader.douyin_uploader.main import DouYinVideo
+        return DouYinVideo(title, file_path, BENCH_TAGS, publish_date, account_file)
+    if platform == SOCIAL_MEDIA_KUAISHOU:
+        from uploader.ks_uploader.main import KSVideo
+        return KSVideo(title, file_path, BENCH_TAGS, publish_date, account_file)
+    if platform == SOCIAL_MEDIA_TENCENT:
+        from uploader.tencent_uploader.main import TencentVideo
+        return TencentVideo(title, file_path, BENCH_TAGS, publish_date, account_file)
+    if platform == SOCIAL_MEDIA_XIAOHONGSHU:
+        from uploader.xiaohongshu_uploader.main import XiaoHongShuVideo
+        return XiaoHongShuVideo(title, file_path, BENCH_TAGS, publish_date, account_file)
+    if platform == SOCIAL_MEDIA_TIKTOK:
+        from uploader.tk_uploader.main_chrome import TiktokVideo
+        return TiktokVideo(title, file_path, BENCH_TAGS, publish_date, account_file)
+    raise ValueError(f"unsupported platform: {platform}")
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    # nearest-rank
+    index = max(0, math.ceil(pct / 100 * len(values)) - 1)
+    return values[index]
+
+
+def process_tree_rss(process):
+    rss = 0
+    for proc in [process] + process.children(recursive=True):
+        try:
+            rss += proc.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return rss
+
+
+async def sample_peak_rss(stop_event, result):
+    process = psutil.Process(os.getpid())
+    while not stop_event.is_set():
+        result["peak_rss"] = max(result["peak_rss"], process_tree_rss(process))
+        try:
+            await asyncio.wait_for(stop_event.wait(), RSS_SAMPLE_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_job(playwright, semaphore, platform, index, work_dir, file_path, publish_date, results):
+    async with semaphore:
+        # 每个任务一个 cookie 文件，上传结束时会写回 storage_state，避免互相覆盖
+        account_file = work_dir / f"account_{index}.json"
+        account_file.write_text(json.dumps({"cookies": [], "origins": []}))
+        app = build_uploader(platform, index, file_path, str(account_file), publish_date)
+        app.headless = True
+        start = time.perf_counter()
+        outcome = "success"
+        try:
+            result = await app.upload(playwright)
+            if result is False:
+                outcome = "failure"
+        except Exception as e:
+            outcome = "error"
+            print(f"job {index} failed: {e!r}")
+        job_metrics = getattr(app, "job_metrics", None)
+        results.append({
+            "outcome": outcome,
+            "seconds": time.perf_counter() - start,
+            "phases": list(job_metrics.phase_durations) if job_metrics else [],
+            "fixed_sleep_seconds": job_metrics.fixed_sleep_seconds if job_metrics else 0.0,
+        })
+
+
+def summarize(results, wall_seconds, peak_rss, stub_stats):
+    ok = [r for r in results if r["outcome"] == "success"]
+    phase_values = {}
+    for r in ok:
+        # 同一阶段在一个任务里出现多次时合并计算
+        per_job = {}
+        for phase, seconds in r["phases"]:
+            per_job[phase] = per_job.get(phase, 0.0) + seconds
+        for phase, seconds in per_job.items():
+            phase_values.setdefault(phase, []).append(seconds)
+    job_seconds = [r["seconds"] for r in ok]
+    return {
+        "jobs": len(results),
+        "success": len(ok),
+        "failed": len(results) - len(ok),
+        "wall_seconds": round(wall_seconds, 3),
+        "jobs_per_minute": round(len(ok) / wall_seconds * 60, 2) if wall_seconds else 0.0,
+        "job_p50": round(percentile(job_seconds, 50), 3),
+        "job_p95": round(percentile(job_seconds, 95), 3),
+        "phases": {phase: {"p50": round(percentile(values, 50), 3), "p95": round(percentile(values, 95), 3)}
+                   for phase, values in phase_values.items()},
+        "fixed_sleep_p50": round(percentile([r["fixed_sleep_seconds"] for r in ok], 50), 3),
+        "peak_rss_mb": round(peak_rss / 1024 / 1024, 1),
+        "stub": stub_stats,
+    }
+
+
+def print_summary(platform, summary):
+    print(f"platform: {platform}")
+    print(f"jobs: {summary['jobs']}  success: {summary['success']}  failed: {summary['failed']}")
+    print(f"wall: {summary['wall_seconds']}s  throughput: {summary['jobs_per_minute']} jobs/min")
+    print(f"job p50/p95: {summary['job_p50']}s / {summary['job_p95']}s  "
+          f"fixed sleep p50: {summary['fixed_sleep_p50']}s")
+    print(f"peak rss: {summary['peak_rss_mb']} MB")
+    print(f"{'phase':<16}{'p50':>10}{'p95':>10}")
+    for phase, values in summary["phases"].items():
+        print(f"{phase:<16}{values['p50']:>10}{values['p95']:>10}")
+    print(f"stub: {summary['stub']}")
+
+
+async def run_bench(args):
+    config = StubConfig(upload_speed=args.upload_speed * 1024 * 1024, upload_fail_rate=args.upload_fail_rate,
+                        publish_fail_rate=args.publish_fail_rate, processing_delay=args.processing_delay,
+                        seed=args.seed)
+    runner, stub_app = await start_stub_server(config, port=args.port)
+    base_social_media.STUB_SERVER = f"http://127.0.0.1:{args.port}"
+
+    publish_date = 0
+    if args.schedule:
+        publish_date = (datetime.now() + timedelta(days=1)).replace(hour=10, minute=0, second=0, microsecond=0)
+
+    rss = {"peak_rss": 0}
+    stop_event = asyncio.Event()
+    sampler = asyncio.create_task(sample_peak_rss(stop_event, rss))
+    results = []
+    try:
+        with tempfile.TemporaryDirectory(prefix="sau_bench_") as tmp:
+            work_dir = Path(tmp)
+            file_path = work_dir / "bench.mp4"
+            with open(file_path, "wb") as f:
+                f.write(os.urandom(int(args.file_size * 1024 * 1024)))
+
+            semaphore = asyncio.Semaphore(args.concurrency)
+            start = time.perf_counter()
+            async with async_playwright() as playwright:
+                await asyncio.gather(*[
+                    run_job(playwright, semaphore, args.platform, i, work_dir, str(file_path), publish_date, results)
+                    for i in range(args.jobs)
+                ])
+            wall_seconds = time.perf_counter() - start
+    finally:
+        stop_event.set()
+        await sampler
+        await runner.cleanup()
+    return summarize(results, wall_seconds, rss["peak_rss"], stub_app["stats"].to_dict())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="end-to-end uploader benchmark against the local stub server")
+    parser.add_argument("--platform", required=True,
+                        choices=SCHEDULE_PLATFORMS + [SOCIAL_MEDIA_TIKTOK])
+    parser.add_argument("--jobs", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--file-size", type=float, default=10, help="video size in MB")
+    parser.add_argument("--upload-speed", type=float, default=0, help="stub upload speed in MB/s, 0 = unlimited")
+    parser.add_argument("--upload-fail-rate", type=float, default=0.0)
+    parser.add_argument("--publish-fail-rate", type=float, default=0.0)
+    parser.add_argument("--processing-delay", type=float, default=0.0, help="seconds")
+    parser.add_argument("--schedule", action="store_true", help="publish with a schedule time (tomorrow 10:00)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--json", action="store_true", help="print the summary as json")
+    args = parser.parse_args()
+    if args.schedule and args.platform not in SCHEDULE_PLATFORMS:
+        parser.error(f"--schedule is not stubbed for {args.platform}")
+
+    summary = asyncio.run(run_bench(args))
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print_summary(args.platform, summary)
+
+
+if __name__ == '__main__':
+    main()
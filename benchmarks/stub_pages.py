@@ -0,0 +1,359 @@
+"""
+桩服务的页面模板，按 (域名, 路径) 索引。
+页面只保留上传器用到的元素和交互（选择器与 uploader/*/main.py 保持一致），
+上传、发布分别请求 /__stub/upload、/__stub/publish，由 stub_server 控制速度和失败注入。
+"""
+
+PAGE_HEAD = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>%(title)s</title>
+<style>
+  .hidden { display: none; }
+  [contenteditable] { min-height: 40px; border: 1px solid #ccc; }
+</style>
+<script>
+const STUB = {
+  upload: async function (file) {
+    try {
+      const resp = await fetch('/__stub/upload', {method: 'POST', body: file});
+      return resp.ok;
+    } catch (e) {
+      return false;
+    }
+  },
+  // 没有重试入口的平台（快手、小红书）失败后页面自己重新上传
+  uploadUntilOk: async function (file) {
+    while (!(await STUB.upload(file))) {}
+    return true;
+  },
+  publish: async function () {
+    try {
+      const resp = await fetch('/__stub/publish', {method: 'POST'});
+      return resp.ok;
+    } catch (e) {
+      return false;
+    }
+  },
+  $: function (id) { return document.getElementById(id); },
+  show: function (id) { STUB.$(id).classList.remove('hidden'); },
+  hide: function (id) { STUB.$(id).classList.add('hidden'); },
+  // 输入 # 时弹出话题联想，空格/回车确认后收起
+  bindTopicSuggest: function (editor, popupClass) {
+    const popup = document.createElement('div');
+    popup.className = popupClass + ' hidden';
+    popup.textContent = '#话题';
+    document.body.appendChild(popup);
+    editor.addEventListener('keydown', function (e) {
+      if (e.key === '#') {
+        setTimeout(function () { popup.classList.remove('hidden'); }, 50);
+      } else if (e.key === ' ' || e.key === 'Enter') {
+        popup.classList.add('hidden');
+      }
+    });
+  },
+};
+</script>
+</head>
+<body>
+"""
+
+PAGE_TAIL = """
+</body>
+</html>
+"""
+
+DOUYIN_UPLOAD = """
+<div class="container-upload" id="upload-page">
+  <input type="file" id="video-input" accept="video/*">
+</div>
+<div id="publish-page" class="hidden">
+  <div class="title-row">
+    <div class="title-label"><span>作品标题</span></div>
+    <div class="title-field"><input type="text" id="title-input" maxlength="30"></div>
+  </div>
+  <div class="zone-container editor-kit-container" contenteditable="true"></div>
+  <div class="progress-div">
+    <div id="upload-status">上传中</div>
+    <input type="file" class="upload-btn-input" id="retry-input">
+  </div>
+  <div id="upload-result"></div>
+  <div class="timing">
+    <label class="radio-now"><input type="radio" name="timing" checked>立即发布</label>
+    <label class="radio-schedule" id="schedule-radio"><input type="radio" name="timing">定时发布</label>
+    <input class="semi-input hidden" placeholder="日期和时间" id="schedule-input">
+  </div>
+  <button id="publish-btn">发布</button>
+</div>
+<script>
+async function startUpload(file) {
+  STUB.$('upload-status').textContent = '上传中';
+  STUB.$('upload-result').innerHTML = '';
+  if (await STUB.upload(file)) {
+    STUB.$('upload-status').textContent = '上传完成';
+    STUB.$('upload-result').innerHTML = '<div class="long-card-done"><div>重新上传</div></div>';
+  } else {
+    STUB.$('upload-status').textContent = '上传失败';
+  }
+}
+STUB.$('video-input').addEventListener('change', function () {
+  history.pushState({}, '', '/creator-micro/content/post/video?enter_from=publish_page');
+  STUB.hide('upload-page');
+  STUB.show('publish-page');
+  startUpload(this.files[0]);
+});
+STUB.$('retry-input').addEventListener('change', function () { startUpload(this.files[0]); });
+STUB.$('schedule-radio').addEventListener('click', function () { STUB.show('schedule-input'); });
+STUB.$('publish-btn').addEventListener('click', async function () {
+  if (await STUB.publish()) {
+    location.href = '/creator-micro/content/manage?enter_from=publish';
+  }
+});
+</script>
+"""
+
+KUAISHOU_UPLOAD = """
+<div id="upload-page">
+  <button type="button" class="_upload-btn_stub">上传视频</button>
+  <input type="file" id="video-input" class="hidden" accept="video/*">
+</div>
+<div id="publish-page" class="hidden">
+  <div class="desc-row"><span class="desc-label">描述</span><div class="desc-editor" contenteditable="true"></div></div>
+  <div id="upload-status"><span>上传中</span></div>
+  <div class="publish-time">
+    <label>发布时间</label>
+    <div class="radios">
+      <label><input type="radio" class="ant-radio-input" name="timing" checked>立即发布</label>
+      <label><input type="radio" class="ant-radio-input" name="timing" id="schedule-radio">定时发布</label>
+    </div>
+  </div>
+  <div class="ant-picker hidden" id="picker">
+    <div class="ant-picker-input"><input placeholder="选择日期时间" id="schedule-input"></div>
+  </div>
+  <div class="ant-picker-dropdown hidden" id="picker-dropdown">日期面板</div>
+  <div class="publish-btn" id="publish-btn">发布</div>
+</div>
+<script>
+STUB.bindTopicSuggest(document.querySelector('.desc-editor'), 'topic-list');
+document.querySelector('._upload-btn_stub').addEventListener('click', function () { STUB.$('video-input').click(); });
+STUB.$('video-input').addEventListener('change', async function () {
+  STUB.hide('upload-page');
+  STUB.show('publish-page');
+  await STUB.uploadUntilOk(this.files[0]);
+  STUB.$('upload-status').innerHTML = '<span>上传成功</span>';
+});
+STUB.$('schedule-radio').addEventListener('click', function () { STUB.show('picker'); });
+STUB.$('schedule-input').addEventListener('focus', function () { STUB.show('picker-dropdown'); });
+STUB.$('schedule-input').addEventListener('keydown', function (e) {
+  if (e.key === 'Enter') { STUB.hide('picker-dropdown'); }
+});
+STUB.$('publish-btn').addEventListener('click', async function () {
+  if (await STUB.publish()) {
+    location.href = '/article/manage/video?status=2&from=publish';
+  }
+});
+</script>
+"""
+
+TENCENT_CREATE = """
+<div class="upload"><input type="file" id="video-input" accept="video/*"></div>
+<div class="input-editor" contenteditable="true"></div>
+<div class="media-status-content">
+  <div class="status-msg" id="upload-status">等待上传</div>
+  <div class="tag-inner hidden" id="delete-btn">删除</div>
+</div>
+<div class="delete-dialog hidden" id="delete-dialog"><button id="delete-confirm">删除</button></div>
+<div class="post-time">
+  <label><input type="radio" name="timing" checked>不定时</label>
+  <label id="schedule-radio"><input type="radio" name="timing">定时</label>
+</div>
+<div id="picker-wrap" class="hidden">
+  <input placeholder="请选择发表时间" id="date-input" readonly>
+  <div class="weui-desktop-picker__panel hidden" id="date-panel">
+    <span class="weui-desktop-picker__panel__label" id="year-label"></span>
+    <span class="weui-desktop-picker__panel__label" id="month-label"></span>
+    <button class="weui-desktop-btn__icon__right" id="next-month">&gt;</button>
+    <table class="weui-desktop-picker__table"><tbody id="days"></tbody></table>
+  </div>
+  <input placeholder="请选择时间" id="time-input">
+</div>
+<div class="short-title">
+  <div class="label"><span>短标题</span></div>
+  <div class="field"><span><input type="text" id="short-title"></span></div>
+</div>
+<div class="form-btns">
+  <button class="weui-desktop-btn weui-desktop-btn_primary weui-desktop-btn_disabled" id="publish-btn">发表</button>
+  <button class="weui-desktop-btn" id="draft-btn">保存草稿</button>
+</div>
+<script>
+async function startUpload(file) {
+  STUB.$('upload-status').className = 'status-msg';
+  STUB.$('upload-status').textContent = '上传中';
+  if (await STUB.upload(file)) {
+    STUB.$('upload-status').textContent = '上传完成';
+    STUB.$('publish-btn').classList.remove('weui-desktop-btn_disabled');
+  } else {
+    STUB.$('upload-status').className = 'status-msg error';
+    STUB.$('upload-status').textContent = '上传失败';
+    STUB.show('delete-btn');
+  }
+}
+STUB.$('video-input').addEventListener('change', function () { startUpload(this.files[0]); });
+STUB.$('delete-btn').addEventListener('click', function () { STUB.show('delete-dialog'); });
+STUB.$('delete-confirm').addEventListener('click', function () {
+  STUB.hide('delete-dialog');
+  STUB.hide('delete-btn');
+  STUB.$('video-input').value = '';
+});
+
+// 日期面板：月份显示为两位数字（"03月"），早于今天的日期带 disabled 样式
+const today = new Date();
+let panelDate = new Date(today.getFullYear(), today.getMonth(), 1);
+function renderPanel() {
+  STUB.$('year-label').textContent = panelDate.getFullYear() + '年';
+  STUB.$('month-label').textContent = String(panelDate.getMonth() + 1).padStart(2, '0') + '月';
+  const days = new Date(panelDate.getFullYear(), panelDate.getMonth() + 1, 0).getDate();
+  let html = '<tr>';
+  for (let day = 1; day <= days; day++) {
+    const date = new Date(panelDate.getFullYear(), panelDate.getMonth(), day);
+    const disabled = date < new Date(today.getFullYear(), today.getMonth(), today.getDate());
+    html += '<td><a class="' + (disabled ? 'weui-desktop-picker__disabled' : '') + '" data-day="' + day + '">' + day + '</a></td>';
+  }
+  STUB.$('days').innerHTML = html + '</tr>';
+}
+STUB.$('schedule-radio').addEventListener('click', function () { STUB.show('picker-wrap'); });
+STUB.$('date-input').addEventListener('click', function () { renderPanel(); STUB.show('date-panel'); });
+STUB.$('next-month').addEventListener('click', function () {
+  panelDate = new Date(panelDate.getFullYear(), panelDate.getMonth() + 1, 1);
+  renderPanel();
+});
+STUB.$('days').addEventListener('click', function (e) {
+  if (e.target.dataset.day) {
+    STUB.$('date-input').value = panelDate.getFullYear() + '-' + (panelDate.getMonth() + 1) + '-' + e.target.dataset.day;
+    STUB.hide('date-panel');
+  }
+});
+STUB.$('publish-btn').addEventListener('click', async function () {
+  if (this.classList.contains('weui-desktop-btn_disabled')) { return; }
+  if (await STUB.publish()) {
+    location.href = '/platform/post/list';
+  }
+});
+STUB.$('draft-btn').addEventListener('click', async function () {
+  if (await STUB.publish()) {
+    location.href = '/platform/post/list?tab=draft';
+  }
+});
+</script>
+"""
+
+XIAOHONGSHU_PUBLISH = """
+<div class="upload-content">
+  <input class="upload-input" type="file" id="video-input" accept="video/*">
+  <div class="preview-new"><div class="stage" id="upload-stage">等待上传</div></div>
+</div>
+<div class="plugin title-container"><input class="d-text" type="text" id="title-input"></div>
+<div class="ql-editor" contenteditable="true"></div>
+<div class="timing">
+  <label id="schedule-radio"><input type="radio" name="timing">定时发布</label>
+  <input class="el-input__inner hidden" placeholder="选择日期和时间" id="schedule-input">
+</div>
+<button id="publish-btn">发布</button>
+<script>
+STUB.$('video-input').addEventListener('change', async function () {
+  STUB.$('upload-stage').textContent = '上传中';
+  await STUB.uploadUntilOk(this.files[0]);
+  STUB.$('upload-stage').textContent = '上传成功';
+});
+STUB.$('schedule-radio').addEventListener('click', function () {
+  STUB.show('schedule-input');
+  STUB.$('publish-btn').textContent = '定时发布';
+});
+STUB.$('publish-btn').addEventListener('click', async function () {
+  if (await STUB.publish()) {
+    location.href = '/publish/success?source=stub';
+  }
+});
+</script>
+"""
+
+TIKTOK_HOME = """
+<div data-e2e="nav-more-menu">More</div>
+"""
+
+TIKTOK_UPLOAD = """
+<div class="upload-container">
+  <div id="select-area"><button id="select-btn">Select video</button></div>
+  <input type="file" id="video-input" class="hidden" accept="video/*">
+  <div id="form" class="hidden">
+    <h1>Upload video</h1>
+    <div class="DraftEditor-root"><div class="public-DraftEditor-content" contenteditable="true"></div></div>
+    <div id="error-area" class="hidden"><button aria-label="Select file" id="reselect-btn">Select file</button></div>
+    <div class="button-group"><button id="post-btn" disabled>Post</button><button id="discard-btn">Discard</button></div>
+  </div>
+</div>
+<script>
+STUB.bindTopicSuggest(document.querySelector('.public-DraftEditor-content'), 'mentionSuggestions');
+async function startUpload(file) {
+  STUB.hide('error-area');
+  STUB.$('post-btn').disabled = true;
+  if (await STUB.upload(file)) {
+    STUB.$('post-btn').disabled = false;
+  } else {
+    STUB.show('error-area');
+  }
+}
+STUB.$('select-btn').addEventListener('click', function () { STUB.$('video-input').click(); });
+STUB.$('reselect-btn').addEventListener('click', function () { STUB.$('video-input').click(); });
+STUB.$('video-input').addEventListener('change', function () {
+  STUB.hide('select-area');
+  STUB.show('form');
+  startUpload(this.files[0]);
+});
+STUB.$('post-btn').addEventListener('click', async function () {
+  if (await STUB.publish()) {
+    location.href = '/tiktokstudio/content';
+  }
+});
+</script>
+"""
+
+TIKTOK_CONTENT = """
+<div data-tt="components_PostTable_Container">
+  <div data-tt="components_PostInfoCell_Container"><a href="https://www.tiktok.com/@stub/video/7400000000000000001">stub video</a></div>
+</div>
+"""
+
+DONE = """
+<div class="stub-done">ok</div>
+"""
+
+# (域名, 路径) -> (标题, 页面内容)
+PAGES = {
+    ("creator.douyin.com", "/creator-micro/content/upload"): ("抖音创作者中心", DOUYIN_UPLOAD),
+    ("creator.douyin.com", "/creator-micro/content/manage"): ("作品管理", DONE),
+    ("cp.kuaishou.com", "/article/publish/video"): ("快手创作者服务平台", KUAISHOU_UPLOAD),
+    ("cp.kuaishou.com", "/article/manage/video"): ("作品管理", DONE),
+    ("channels.weixin.qq.com", "/platform/post/create"): ("视频号助手", TENCENT_CREATE),
+    ("channels.weixin.qq.com", "/platform/post/list"): ("内容管理", DONE),
+    ("creator.xiaohongshu.com", "/publish/publish"): ("小红书创作服务平台", XIAOHONGSHU_PUBLISH),
+    ("creator.xiaohongshu.com", "/publish/success"): ("发布成功", DONE),
+    ("www.tiktok.com", "/"): ("TikTok", TIKTOK_HOME),
+    # creator-center/upload 在真实站点会跳转到 tiktokstudio/upload
+    ("www.tiktok.com", "/tiktokstudio/upload"): ("TikTok Studio", TIKTOK_UPLOAD),
+    ("www.tiktok.com", "/tiktokstudio/content"): ("TikTok Studio", TIKTOK_CONTENT),
+}
+
+# 需要 302 跳转的路径
+REDIRECTS = {
+    ("www.tiktok.com", "/creator-center/upload"): "/tiktokstudio/upload",
+}
+
+
+def render_page(host, path):
+    page = PAGES.get((host, path))
+    if page is None:
+        return None
+    title, body = page
+    return PAGE_HEAD % {"title": title} + body + PAGE_TAIL
@@ -0,0 +1,136 @@
+"""
+离线创作者中心桩服务，配合 SAU_STUB_SERVER 使用，不需要真实账号和外网即可跑通各平台上传器。
+
+    python -m benchmarks.stub_server --port 8765 --upload-speed 5 --upload-fail-rate 0.1
+    SAU_STUB_SERVER=http://127.0.0.1:8765 python cli_main.py douyin <account> upload <video>
+
+页面路径为 /<原域名>/<原路径>，由 utils.base_social_media.set_stub_route 转发过来。
+"""
+import argparse
+import asyncio
+import random
+
+from aiohttp import web
+
+from benchmarks.stub_pages import REDIRECTS, render_page
+
+DEFAULT_PORT = 8765
+# 每次读取请求体的块大小，限速按块 sleep
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+
+class StubConfig(object):
+    def __init__(self, upload_speed=0, upload_fail_rate=0.0, publish_fail_rate=0.0, processing_delay=0.0, seed=None):
+        # 上传限速，字节/秒，0 表示不限速
+        self.upload_speed = upload_speed
+        # 上传完成后按概率返回 500，模拟平台转码/上传失败
+        self.upload_fail_rate = upload_fail_rate
+        self.publish_fail_rate = publish_fail_rate
+        # 上传完成到"处理完成"之间的额外等待，秒
+        self.processing_delay = processing_delay
+        self.random = random.Random(seed)
+
+
+class StubStats(object):
+    def __init__(self):
+        self.pages = 0
+        self.uploads = 0
+        self.upload_failures = 0
+        self.upload_bytes = 0
+        self.publishes = 0
+        self.publish_failures = 0
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+async def handle_page(request):
+    host = request.match_info["host"]
+    path = "/" + request.match_info["path"]
+    redirect = REDIRECTS.get((host, path))
+    if redirect:
+        raise web.HTTPFound(redirect)
+    html = render_page(host, path)
+    if html is None:
+        # 页面里顺带请求的接口、静态资源等，统一回空
+        return web.Response(status=204)
+    request.app["stats"].pages += 1
+    return web.Response(text=html, content_type="text/html")
+
+
+async def handle_upload(request):
+    config = request.app["config"]
+    stats = request.app["stats"]
+    stats.uploads += 1
+    size = 0
+    started = asyncio.get_running_loop().time()
+    async for chunk in request.content.iter_chunked(UPLOAD_CHUNK_SIZE):
+        size += len(chunk)
+        if config.upload_speed:
+            # 按累计字节数计算应到达的时间，比每块固定 sleep 更接近真实带宽
+            lag = size / config.upload_speed - (asyncio.get_running_loop().time() - started)
+            if lag > 0:
+                await asyncio.sleep(lag)
+    stats.upload_bytes += size
+    if config.random.random() < config.upload_fail_rate:
+        stats.upload_failures += 1
+        return web.json_response({"ok": False, "size": size}, status=500)
+    if config.processing_delay:
+        await asyncio.sleep(config.processing_delay)
+    return web.json_response({"ok": True, "size": size})
+
+
+async def handle_publish(request):
+    config = request.app["config"]
+    stats = request.app["stats"]
+    stats.publishes += 1
+    if config.random.random() < config.publish_fail_rate:
+        stats.publish_failures += 1
+        return web.json_response({"ok": False}, status=500)
+    return web.json_response({"ok": True})
+
+
+async def handle_stats(request):
+    return web.json_response(request.app["stats"].to_dict())
+
+
+def create_app(config=None):
+    app = web.Application(client_max_size=0)
+    app["config"] = config or StubConfig()
+    app["stats"] = StubStats()
+    app.router.add_get("/__stub/stats", handle_stats)
+    app.router.add_post("/{host}/__stub/upload", handle_upload)
+    app.router.add_post("/{host}/__stub/publish", handle_publish)
+    app.router.add_route("*", "/{host}/{path:.*}", handle_page)
+    return app
+
+
+async def start_stub_server(config=None, host="127.0.0.1", port=DEFAULT_PORT):
+    """在当前事件循环里启动桩服务，返回 (runner, app)，用完调用 runner.cleanup()"""
+    app = create_app(config)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    return runner, app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="creator center stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--upload-speed", type=float, default=0, help="upload speed in MB/s, 0 = unlimited")
+    parser.add_argument("--upload-fail-rate", type=float, default=0.0)
+    parser.add_argument("--publish-fail-rate", type=float, default=0.0)
+    parser.add_argument("--processing-delay", type=float, default=0.0, help="seconds")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = StubConfig(upload_speed=args.upload_speed * 1024 * 1024, upload_fail_rate=args.upload_fail_rate,
+                        publish_fail_rate=args.publish_fail_rate, processing_delay=args.processing_delay,
+                        seed=args.seed)
+    web.run_app(create_app(config), host=args.host, port=args.port, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,15 @@
 import argparse
 import asyncio
+import sys
 from datetime import datetime
 from os.path import exists
 from pathlib import Path
 
 from conf import BASE_DIR
-from uploader.douyin_uploader.main import douyin_setup, DouYinVideo
-from uploader.ks_uploader.main import ks_setup, KSVideo
-from uploader.tencent_uploader.main import weixin_setup, TencentVideo
-from uploader.tk_uploader.main_chrome import tiktok_setup, TiktokVideo
-from utils.base_social_media import get_supported_social_media, get_cli_action, SOCIAL_MEDIA_DOUYIN, \
-    SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_TIKTOK, SOCIAL_MEDIA_KUAISHOU
-from utils.constant import TencentZoneTypes
+from utils.base_social_media import get_supported_social_media, get_cli_action, SOCIAL_MEDIA_DOUYIN
 from utils.files_times import get_title_and_hashtags
+# 只导入本次命令用到的平台上传器
+from utils.plugins import create_video, load_platform
 
 
 def parse_schedule(schedule_raw):
@@ -24,11 +21,17 @@ def parse_schedule(schedule_raw):
 
 
 async def main():
+    # batch 不针对单个平台和账号，单独解析
+    if sys.argv[1:2] == ["batch"]:
+        return await batch(sys.argv[2:])
+
     # 主解析器
     parser = argparse.ArgumentParser(description="Upload video to multiple social-media.")
     parser.add_argument("platform", metavar='platform', choices=get_supported_social_media(), help="Choose social-media platform: douyin tencent tiktok kuaishou")
 
     parser.add_argument("account_name", type=str, help="Account name for the platform: xiaoA")
+    parser.add_argument("--daemon", action="store_true",
+                        help="Submit the upload to the running daemon (python -m utils.daemon start)")
     subparsers = parser.add_subparsers(dest="action", metavar='action', help="Choose action", required=True)
 
     actions = get_cli_action()
@@ -51,6 +54,8 @@ async def main():
             raise FileNotFoundError(f'Could not find the video file at {args["video_file"]}')
         if args.publish_type == 1 and not args.schedule:
             parser.error("The schedule must must be specified for scheduled publishing.")
+    if args.daemon and args.action != 'upload':
+        parser.error("Only upload can be submitted to the daemon, login needs an interactive browser.")
 
     account_file = Path(BASE_DIR / "cookies" / f"{args.platform}_{args.account_name}.json")
     account_file.parent.mkdir(exist_ok=True)
@@ -58,14 +63,7 @@ async def main():
     # 根据 action 处理不同的逻辑
     if args.action == 'login':
         print(f"Logging in with account {args.account_name} on platform {args.platform}")
-        if args.platform == SOCIAL_MEDIA_DOUYIN:
-            await douyin_setup(str(account_file), handle=True)
-        elif args.platform == SOCIAL_MEDIA_TIKTOK:
-            await tiktok_setup(str(account_file), handle=True)
-        elif args.platform == SOCIAL_MEDIA_TENCENT:
-            await weixin_setup(str(account_file), handle=True)
-        elif args.platform == SOCIAL_MEDIA_KUAISHOU:
-            await ks_setup(str(account_file), handle=True)
+        await load_platform(args.platform, "setup")(str(account_file), handle=True)
     elif args.action == 'upload':
         title, tags = get_title_and_hashtags(args.video_file)
         video_file = args.video_file
@@ -77,25 +75,112 @@ async def main():
             print("Scheduling videos...")
             publish_date = parse_schedule(args.schedule)
 
-        if args.platform == SOCIAL_MEDIA_DOUYIN:
-            await douyin_setup(account_file, handle=False)
-            app = DouYinVideo(title, video_file, tags, publish_date, account_file)
-        elif args.platform == SOCIAL_MEDIA_TIKTOK:
-            await tiktok_setup(account_file, handle=True)
-            app = TiktokVideo(title, video_file, tags, publish_date, account_file)
-        elif args.platform == SOCIAL_MEDIA_TENCENT:
-            await weixin_setup(account_file, handle=True)
-            category = TencentZoneTypes.LIFESTYLE.value  # 标记原创需要否则不需要传
-            app = TencentVideo(title, video_file, tags, publish_date, account_file, category)
-        elif args.platform == SOCIAL_MEDIA_KUAISHOU:
-            await ks_setup(account_file, handle=True)
-            app = KSVideo(title, video_file, tags, publish_date, account_file)
-        else:
+        if args.daemon:
+            return submit_to_daemon(args, account_file, title, tags)
+
+        setup = load_platform(args.platform, "setup")
+        if setup is None:
             print("Wrong platform, please check your input")
             exit()
+        # 抖音上传时 cookie 失效不自动打开浏览器登录
+        await setup(account_file, handle=args.platform != SOCIAL_MEDIA_DOUYIN)
+        app = create_video(args.platform, title, video_file, tags, publish_date, account_file)
 
         await app.main()
 
 
+def parse_platform_concurrency(values):
+    # douyin=3 kuaishou=1
+    concurrency = {}
+    for value in values:
+        platform, sep, limit = value.partition("=")
+        if not sep or not limit.isdigit():
+            raise argparse.ArgumentTypeError(f"expected platform=N, got {value}")
+        concurrency[platform] = int(limit)
+    return concurrency
+
+
+async def batch(argv):
+    from utils.engine import DEFAULT_MAX_WORKERS, JOB_SKIPPED, format_job_result, run_jobs
+    from utils.manifest import load_manifest, plan_jobs, summarize_jobs, write_report
+    from utils.sharding import run_jobs_sharded
+
+    parser = argparse.ArgumentParser(prog="cli_main.py batch",
+                                     description="Upload every file x platform x account listed in a manifest.")
+    parser.add_argument("manifest", help="Manifest file (.csv/.json/.yaml), see utils/manifest.py for the fields")
+    parser.add_argument("-o", "--report", help="Result report path (.json or .csv), default batch_report_<time>.json")
+    parser.add_argument("-w", "--workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help="Max uploads running at the same time across all platforms (per process)")
+    parser.add_argument("-c", "--platform-concurrency", nargs="*", default=[], metavar="PLATFORM=N",
+                        help="Max uploads running at the same time per platform (per process), e.g. douyin=3 tiktok=1")
+    parser.add_argument("-p", "--processes", type=int, default=1,
+                        help="Shard accounts across N processes, each with its own browsers (e.g. CPU cores)")
+    parser.add_argument("--dry-run", action="store_true", help="Only validate the manifest and write the plan")
+    args = parser.parse_args(argv)
+    try:
+        platform_concurrency = parse_platform_concurrency(args.platform_concurrency)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+
+    started_at = datetime.now()
+    report_path = args.report or f"batch_report_{started_at.strftime('%Y%m%d_%H%M%S')}.json"
+    jobs = plan_jobs(load_manifest(args.manifest), Path(args.manifest).resolve().parent)
+    runnable = sum(1 for job in jobs if job.status != JOB_SKIPPED)
+    print(f"Planned {len(jobs)} jobs, {runnable} to run, {len(jobs) - runnable} skipped")
+    for job in jobs:
+        if job.status == JOB_SKIPPED:
+            print(f"  skip #{job.index} {job.platform}/{job.account}: {job.error}")
+
+    run = runnable and not args.dry_run
+    try:
+        if run and args.processes > 1:
+            # 每个进程一个 playwright 和浏览器池，账号按一致性哈希固定在某个进程
+            print(f"Sharding accounts across {args.processes} processes")
+            await asyncio.to_thread(run_jobs_sharded, jobs, args.processes, args.workers, platform_concurrency)
+        elif run:
+            finished = 0
+
+            def print_progress(job):
+                nonlocal finished
+                finished += 1
+                print(f"[{finished}/{runnable}] {format_job_result(job)}")
+
+            await run_jobs(jobs, args.workers, platform_concurrency, on_job_done=print_progress)
+    finally:
+        # 中途 Ctrl+C 也把已完成的结果写进报告
+        write_report(report_path, jobs, args.manifest, started_at)
+    print(f"Summary: {summarize_jobs(jobs)}")
+    print(f"Report written to {report_path}")
+
+
+def submit_to_daemon(args, account_file, title, tags):
+    # 客户端只发任务、打印守护进程回传的日志，不导入 playwright 和上传器
+    from utils.daemon import daemon_running, submit_job
+
+    if not daemon_running():
+        print("Upload daemon is not running, start it with: python -m utils.daemon start")
+        exit(1)
+
+    def print_event(event):
+        if event["event"] == "log":
+            print(f"{event['level']}: {event['message']}")
+        elif event["event"] == "session":
+            print("Session: cached" if event["cached"] else "Session: checking cookie...")
+
+    result = submit_job({
+        "action": "upload",
+        "platform": args.platform,
+        "account_file": str(account_file),
+        "video_file": str(Path(args.video_file).resolve()),
+        "title": title,
+        "tags": tags,
+        "publish_date": args.schedule if args.publish_type == 1 else 0,
+    }, on_event=print_event)
+    if not result.get("ok"):
+        print(f"Upload failed: {result.get('error', 'uploader returned False')}")
+        exit(1)
+    print(f"Upload finished in {result.get('seconds')}s")
+
+
 if __name__ == "__main__":
     asyncio.run(main())
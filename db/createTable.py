@@ -1,6 +1,11 @@
 import sqlite3
 import json
 import os
+import sys
+
+# 在 db 目录下直接运行、或被其他脚本 runpy 执行时都能导入同目录的 schema.py
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from schema import BILIBILI_UPLOAD_CHUNKS_TABLE, BILIBILI_UPLOAD_SESSIONS_TABLE, XHS_TOPIC_CACHE_TABLE
 
 # 数据库文件路径（如果不存在会自动创建）
 db_file = './database.db'
@@ -34,6 +39,9 @@ cursor.execute('''CREATE TABLE IF NOT EXISTS file_records (
 )
 ''')
 
+# b 站分块上传（断点续传）、小红书话题缓存表，表结构与程序运行时建表共用 db/schema.py
+for ddl in (BILIBILI_UPLOAD_SESSIONS_TABLE, BILIBILI_UPLOAD_CHUNKS_TABLE, XHS_TOPIC_CACHE_TABLE):
+    cursor.execute(ddl)
 
 # 提交更改
 conn.commit()
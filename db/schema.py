@@ -0,0 +1,41 @@
+"""
+程序运行时按需建的表，db/createTable.py 初始化数据库时也执行这里的语句，表结构只在这里定义一份。
+只放字符串常量，不导入项目里的其他模块：createTable.py 在 db 目录下直接运行时也能导入。
+"""
+
+# b 站分块上传会话表（断点续传），uploader/bilibili_uploader/resumable.py
+BILIBILI_UPLOAD_SESSIONS_TABLE = '''CREATE TABLE IF NOT EXISTS bilibili_upload_sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    account_id TEXT NOT NULL,             -- DedeUserID
+    file_key TEXT NOT NULL,               -- 文件路径+大小+修改时间的摘要
+    file_path TEXT NOT NULL,
+    file_size INTEGER NOT NULL,
+    chunk_size INTEGER NOT NULL,
+    chunks INTEGER NOT NULL,
+    upload_id TEXT NOT NULL,
+    upload_url TEXT NOT NULL,
+    upos_uri TEXT NOT NULL,
+    auth TEXT NOT NULL,
+    biz_id INTEGER,
+    status TEXT DEFAULT 'uploading',      -- uploading / completed / expired
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+'''
+
+# b 站已上传分块表
+BILIBILI_UPLOAD_CHUNKS_TABLE = '''CREATE TABLE IF NOT EXISTS bilibili_upload_chunks (
+    session_id INTEGER NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    PRIMARY KEY (session_id, chunk_index)
+)
+'''
+
+# 小红书话题缓存表（tag -> 官方话题），uploader/xhs_uploader/topic_cache.py
+XHS_TOPIC_CACHE_TABLE = '''CREATE TABLE IF NOT EXISTS xhs_topic_cache (
+    tag TEXT PRIMARY KEY,
+    topic TEXT,                           -- 话题 JSON，NULL 表示该 tag 没有官方话题
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL               -- 最近使用时间，用于 LRU 淘汰
+)
+'''
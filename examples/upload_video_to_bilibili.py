@@ -1,7 +1,6 @@
-import time
 from pathlib import Path
 
-from uploader.bilibili_uploader.main import read_cookie_json_file, extract_keys_from_json, random_emoji, BilibiliUploader
+from uploader.bilibili_uploader.main import load_cookie_data, random_emoji, BilibiliBatchUploader
 from conf import BASE_DIR
 from utils.constant import VideoZoneTypes
 from utils.files_times import generate_schedule_time_next_day, get_title_and_hashtags
@@ -13,8 +12,7 @@ if __name__ == '__main__':
     if not account_file.exists():
         print(f"{account_file.name} 配置文件不存在")
         exit()
-    cookie_data = read_cookie_json_file(account_file)
-    cookie_data = extract_keys_from_json(cookie_data)
+    cookie_data = load_cookie_data(account_file)
 
     tid = VideoZoneTypes.SPORTS_FOOTBALL.value  # 设置分区id
     # 获取视频目录
@@ -24,19 +22,19 @@ if __name__ == '__main__':
     file_num = len(files)
     timestamps = generate_schedule_time_next_day(file_num, 1, daily_times=[16], timestamps=True)
 
+    videos = []
     for index, file in enumerate(files):
         title, tags = get_title_and_hashtags(str(file))
         # just avoid error, bilibili don't allow same title of video.
         title += random_emoji()
-        tags_str = ','.join([tag for tag in tags])
         # 打印视频文件名、标题和 hashtag
         print(f"视频文件名：{file}")
         print(f"标题：{title}")
         print(f"Hashtag：{tags}")
         # I set desc same as title, do what u like.
         desc = title
-        bili_uploader = BilibiliUploader(cookie_data, file, title, desc, tid, tags, timestamps[index])
-        bili_uploader.upload()
+        videos.append((file, title, desc, tags, timestamps[index]))
 
-        # life is beautiful don't so rush. be kind be patience
-        time.sleep(30)
+    # 上一个视频提交的同时上传下一个视频；两次提交之间至少间隔 SUBMIT_MIN_INTERVAL（30 秒），避免触发投稿频率限制
+    bili_uploader = BilibiliBatchUploader(cookie_data, tid)
+    bili_uploader.upload(videos)
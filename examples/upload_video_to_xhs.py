@@ -6,7 +6,8 @@ from xhs import XhsClient
 
 from conf import BASE_DIR
 from utils.files_times import generate_schedule_time_next_day, get_title_and_hashtags
-from uploader.xhs_uploader.main import sign_local, beauty_print
+from uploader.xhs_uploader.main import sign_shared, beauty_print
+from uploader.xhs_uploader.topic_cache import get_topic_cache
 
 config = configparser.RawConfigParser()
 config.read(Path(BASE_DIR / "uploader" / "xhs_uploader" / "accounts.ini"))
@@ -21,7 +22,7 @@ if __name__ == '__main__':
     file_num = len(files)
 
     cookies = config['account1']['cookies']
-    xhs_client = XhsClient(cookies, sign=sign_local, timeout=60)
+    xhs_client = XhsClient(cookies, sign=sign_shared, timeout=60)
     # auth cookie
     # 注意：该校验cookie方式可能并没那么准确
     try:
@@ -31,29 +32,21 @@ if __name__ == '__main__':
         exit()
 
     publish_datetimes = generate_schedule_time_next_day(file_num, 1, daily_times=[16])
+    topic_cache = get_topic_cache()
 
     for index, file in enumerate(files):
         title, tags = get_title_and_hashtags(str(file))
         # 加入到标题 补充标题（xhs 可以填1000字不写白不写）
         tags_str = ' '.join(['#' + tag for tag in tags])
-        hash_tags_str = ''
-        hash_tags = []
 
         # 打印视频文件名、标题和 hashtag
         print(f"视频文件名：{file}")
         print(f"标题：{title}")
         print(f"Hashtag：{tags}")
 
-        topics = []
-        # 获取hashtag
-        for i in tags[:3]:
-            topic_official = xhs_client.get_suggest_topic(i)
-            if topic_official:
-                topic_official[0]['type'] = 'topic'
-                topic_one = topic_official[0]
-                hash_tag_name = topic_one['name']
-                hash_tags.append(hash_tag_name)
-                topics.append(topic_one)
+        # 获取hashtag，重复的 tag 直接从本地缓存取，不再请求
+        topics = topic_cache.resolve_many(xhs_client, tags[:3])
+        hash_tags = [topic['name'] for topic in topics]
 
         hash_tags_str = ' ' + ' '.join(['#' + tag + '[话题]#' for tag in hash_tags])
 
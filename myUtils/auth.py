@@ -1,21 +1,24 @@
 import asyncio
-import configparser
-import os
+
+import requests
 
 from playwright.async_api import async_playwright
-from xhs import XhsClient
 
 from conf import BASE_DIR
-from utils.base_social_media import set_init_script
-from utils.log import tencent_logger, kuaishou_logger, douyin_logger
+from utils.base_social_media import set_init_script, set_route_filter, SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_KUAISHOU, SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_XIAOHONGSHU, SOCIAL_MEDIA_BILIBILI
+from utils.log import tencent_logger, kuaishou_logger, douyin_logger, bilibili_logger
+from utils.metrics import track_cookie_check
+from utils.session_store import SESSIONS
+from utils.plugins import load_platform
 from pathlib import Path
-from uploader.xhs_uploader.main import sign_local
 
+@track_cookie_check(SOCIAL_MEDIA_DOUYIN)
 async def cookie_auth_douyin(account_file):
     async with async_playwright() as playwright:
         browser = await playwright.chromium.launch(headless=True)
-        context = await browser.new_context(storage_state=account_file)
+        context = await browser.new_context(storage_state=SESSIONS.get(account_file))
         context = await set_init_script(context)
+        context = await set_route_filter(context, SOCIAL_MEDIA_DOUYIN, block_resources=True)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -38,11 +41,13 @@ async def cookie_auth_douyin(account_file):
             await browser.close()
             return False
 
+@track_cookie_check(SOCIAL_MEDIA_TENCENT)
 async def cookie_auth_tencent(account_file):
     async with async_playwright() as playwright:
         browser = await playwright.chromium.launch(headless=True)
-        context = await browser.new_context(storage_state=account_file)
+        context = await browser.new_context(storage_state=SESSIONS.get(account_file))
         context = await set_init_script(context)
+        context = await set_route_filter(context, SOCIAL_MEDIA_TENCENT, block_resources=True)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -55,11 +60,13 @@ async def cookie_auth_tencent(account_file):
             tencent_logger.success("[+] cookie 有效")
             return True
 
+@track_cookie_check(SOCIAL_MEDIA_KUAISHOU)
 async def cookie_auth_ks(account_file):
     async with async_playwright() as playwright:
         browser = await playwright.chromium.launch(headless=True)
-        context = await browser.new_context(storage_state=account_file)
+        context = await browser.new_context(storage_state=SESSIONS.get(account_file))
         context = await set_init_script(context)
+        context = await set_route_filter(context, SOCIAL_MEDIA_KUAISHOU, block_resources=True)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -74,11 +81,13 @@ async def cookie_auth_ks(account_file):
             return True
 
 
+@track_cookie_check(SOCIAL_MEDIA_XIAOHONGSHU)
 async def cookie_auth_xhs(account_file):
     async with async_playwright() as playwright:
         browser = await playwright.chromium.launch(headless=True)
-        context = await browser.new_context(storage_state=account_file)
+        context = await browser.new_context(storage_state=SESSIONS.get(account_file))
         context = await set_init_script(context)
+        context = await set_route_filter(context, SOCIAL_MEDIA_XIAOHONGSHU, block_resources=True)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -99,22 +108,37 @@ async def cookie_auth_xhs(account_file):
             return True
 
 
+def _bilibili_nav(account_file):
+    # b 站上传器依赖 biliup，导入很慢，用到时再导入
+    from uploader.bilibili_uploader.main import load_cookie_data
+    cookie_data = load_cookie_data(account_file)
+    resp = requests.get("https://api.bilibili.com/x/web-interface/nav", cookies=cookie_data, timeout=5,
+                        headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                                               "(KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36"})
+    return resp.json()
+
+
+@track_cookie_check(SOCIAL_MEDIA_BILIBILI)
+async def cookie_auth_bilibili(account_file):
+    # b 站不需要浏览器，直接请求 nav 接口
+    try:
+        data = await asyncio.to_thread(_bilibili_nav, account_file)
+    except Exception as e:
+        bilibili_logger.error(f"[+] cookie 校验出错: {e}")
+        return False
+    if data.get("code") == 0 and data.get("data", {}).get("isLogin"):
+        bilibili_logger.success("[+] cookie 有效")
+        return True
+    bilibili_logger.error("[+] cookie 失效")
+    return False
+
+
 async def check_cookie(type,file_path):
-    match type:
-        # 小红书
-        case 1:
-            return await cookie_auth_xhs(Path(BASE_DIR / "cookiesFile" / file_path))
-        # 视频号
-        case 2:
-            return await cookie_auth_tencent(Path(BASE_DIR / "cookiesFile" / file_path))
-        # 抖音
-        case 3:
-            return await cookie_auth_douyin(Path(BASE_DIR / "cookiesFile" / file_path))
-        # 快手
-        case 4:
-            return await cookie_auth_ks(Path(BASE_DIR / "cookiesFile" / file_path))
-        case _:
-            return False
+    # type 为平台标识：1 小红书 2 视频号 3 抖音 4 快手 5 b站，对应的校验函数见 utils/plugins.py
+    cookie_auth = load_platform(type, "cookie_check")
+    if cookie_auth is None:
+        return False
+    return await cookie_auth(Path(BASE_DIR / "cookiesFile" / file_path))
 
 # a = asyncio.run(check_cookie(1,"3a6cfdc0-3d51-11f0-8507-44e51723d63c.json"))
 # print(a)
@@ -0,0 +1,358 @@
+"""
+账号登录态保活：后台按平台的间隔逐个打开账号的创作者中心页面（需要登录的轻量页面，图片/媒体请求已拦截），
+- 页面正常打开：服务端下发的新 cookie 合并进 utils/session_store.py 的缓存并写回 cookie 文件，会话被续期
+- 跳到登录页：user_info.status 置 0，日志和 /metrics（sau_accounts_need_login）提示重新扫码登录
+worker 模式下有排队任务的账号在任务的发布时间前 KEEPALIVE_LEAD_SECONDS 内一定会检查一次，失效的账号在发布之前就能发现。
+
+    python -m myUtils.keepalive                  # 常驻，检查数据库里的所有账号
+    python -m myUtils.keepalive --once           # 检查一轮后退出
+    python -m myUtils.keepalive --account douyin:cookies/douyin_uploader/account.json   # 命令行上传用的账号
+    SAU_KEEPALIVE=1 python sau_backend.py        # 后端进程里跑，结果见 /sessionHealth
+
+b 站走 nav 接口，只检查不写回（cookie 文件是 biliup 的格式）。
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from loguru import logger
+
+from conf import BASE_DIR
+from myUtils.postVideo import schedule_publish_dates
+from utils.base_social_media import SOCIAL_MEDIA_BILIBILI, SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_KUAISHOU, \
+    SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_XIAOHONGSHU, set_init_script, set_route_filter, wait_for_any
+from utils.metrics import ACCOUNTS_NEED_LOGIN, SESSION_KEEPALIVES
+from utils.plugins import get_platform, load_platform
+from utils.session_store import SESSIONS, save_context_state
+from utils.task_queue import TASK_QUEUED, TASK_STORE_URL, open_task_store
+
+DB_PATH = Path(BASE_DIR / "db" / "database.db")
+
+# 各平台的保活间隔，秒；视频号的登录态最短。环境变量 SAU_KEEPALIVE_INTERVALS="tencent=1800,douyin=7200" 覆盖
+KEEPALIVE_INTERVALS = {
+    SOCIAL_MEDIA_XIAOHONGSHU: 6 * 3600,
+    SOCIAL_MEDIA_TENCENT: 2 * 3600,
+    SOCIAL_MEDIA_DOUYIN: 6 * 3600,
+    SOCIAL_MEDIA_KUAISHOU: 6 * 3600,
+    SOCIAL_MEDIA_BILIBILI: 12 * 3600,
+}
+for _item in filter(None, os.environ.get("SAU_KEEPALIVE_INTERVALS", "").split(",")):
+    _name, _, _seconds = _item.partition("=")
+    KEEPALIVE_INTERVALS[_name.strip()] = int(_seconds)
+# 有排队任务的账号，在任务的发布时间前这段时间内至少检查一次，秒
+KEEPALIVE_LEAD_SECONDS = 2 * 3600
+# 检查出错（网络等）后多久重试，秒
+KEEPALIVE_ERROR_RETRY = 600
+# 多久看一次有没有到期的账号，秒
+KEEPALIVE_POLL_INTERVAL = 60
+# 同时检查的账号数（同一个浏览器的不同上下文）
+KEEPALIVE_CONCURRENCY = 2
+# 等登录页标志出现的时间，毫秒；超时没出现视为登录有效
+KEEPALIVE_PAGE_TIMEOUT = 8000
+
+# 平台 -> (访问的页面, 出现任意一个即说明需要登录的条件（wait_for_any 写法）, 页面必须停留在这个前缀下)
+KEEPALIVE_PAGES = {
+    SOCIAL_MEDIA_DOUYIN: ("https://creator.douyin.com/creator-micro/content/upload",
+                          {"qrcode": "text=扫码登录", "phone": "text=手机号登录"}, "https://creator.douyin.com/creator-micro"),
+    SOCIAL_MEDIA_TENCENT: ("https://channels.weixin.qq.com/platform/post/create",
+                           {"login": 'div.title-name:has-text("微信小店")'}, "https://channels.weixin.qq.com/platform"),
+    SOCIAL_MEDIA_KUAISHOU: ("https://cp.kuaishou.com/article/publish/video",
+                            {"login": "div.names div.container div.name:text('机构服务')"}, "https://cp.kuaishou.com/article"),
+    SOCIAL_MEDIA_XIAOHONGSHU: ("https://creator.xiaohongshu.com/creator-micro/content/upload",
+                               {"qrcode": "text=扫码登录", "phone": "text=手机号登录"},
+                               "https://creator.xiaohongshu.com/creator-micro"),
+}
+
+SESSION_ALIVE = "alive"
+SESSION_EXPIRED = "expired"
+SESSION_ERROR = "error"
+
+
+async def refresh_browser_session(browser, platform, account_file, timeout=KEEPALIVE_PAGE_TIMEOUT):
+    """打开账号的页面，登录有效时保存刷新后的 cookie 并返回 True，跳到登录页返回 False"""
+    # playwright 在用到时才导入，后端不开保活时不加载
+    from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+    url, login_markers, stay_prefix = KEEPALIVE_PAGES[platform]
+    context = await browser.new_context(storage_state=SESSIONS.get(account_file))
+    try:
+        context = await set_init_script(context)
+        context = await set_route_filter(context, platform, block_resources=True)
+        page = await context.new_page()
+        await page.goto(url)
+        try:
+            await wait_for_any(page, login_markers, timeout=timeout)
+            return False
+        except PlaywrightTimeoutError:
+            pass
+        if stay_prefix and not page.url.startswith(stay_prefix):
+            return False
+        # 页面请求带回的 Set-Cookie 已经在上下文里
+        await save_context_state(context, account_file)
+        return True
+    finally:
+        await context.close()
+
+
+def task_publish_at(task):
+    """
+    排队任务里最早的发布时间（time.time()）：定时发布取 publishDates（入队时算好），
+    旧任务没有 publishDates 时按请求里的定时参数现算（与 generate_schedule_time_next_day 一致）；
+    立即发布的文件取任务可以被领取的时间
+    """
+    payload = task["payload"]
+    dates = payload.get("publishDates")
+    if dates is None:
+        try:
+            dates = schedule_publish_dates(len(payload.get("fileList", [])), payload.get("enableTimer"),
+                                           payload.get("videosPerDay"), payload.get("dailyTimes"),
+                                           payload.get("startDays"), timestamps=True)
+        except Exception:
+            # 定时参数不合法，worker 领取后会失败，按立即发布算
+            dates = []
+    return min([ts or task["available_at"] for ts in dates] or [task["available_at"]])
+
+
+class AccountSession(object):
+    def __init__(self, platform, account_file, name="", account_id=None):
+        self.platform = platform
+        self.account_file = account_file
+        self.name = name or Path(account_file).stem
+        # user_info.id，命令行传入的账号为 None
+        self.account_id = account_id
+        self.state = None
+        self.checked_at = None
+        self.error = None
+        # 最早一个排队任务的发布时间（time.time()，见 task_publish_at），没有为 None
+        self.next_task_at = None
+        # 上次检查时 cookie 文件的修改时间，重新登录、上传 cookie 后立即重新检查
+        self.checked_mtime = None
+
+    def cookie_mtime(self):
+        try:
+            return os.stat(self.account_file).st_mtime_ns
+        except OSError:
+            return None
+
+    @property
+    def needs_login(self):
+        return self.state == SESSION_EXPIRED
+
+    def is_due(self, now, interval, lead_seconds):
+        if self.checked_at is None:
+            return True
+        if self.state != SESSION_ALIVE and self.cookie_mtime() != self.checked_mtime:
+            return True
+        if now - self.checked_at >= (KEEPALIVE_ERROR_RETRY if self.state == SESSION_ERROR else interval):
+            return True
+        # 任务快开始了，距上次检查超过提前量的一半就再查一次
+        return self.next_task_at is not None and self.next_task_at - now <= lead_seconds \
+            and now - self.checked_at >= lead_seconds / 2
+
+    def to_dict(self):
+        return {
+            "platform": self.platform,
+            "name": self.name,
+            "accountFile": str(self.account_file),
+            "state": self.state,
+            "needsLogin": self.needs_login,
+            "checkedAt": self.checked_at,
+            "nextTaskAt": self.next_task_at,
+            "error": self.error,
+        }
+
+
+class SessionKeepAlive(object):
+    """
+    keepalive = SessionKeepAlive()
+    keepalive.start_thread()     # 后端：后台线程里跑自己的事件循环
+    await keepalive.run_once()   # 检查一轮到期的账号
+    """
+
+    def __init__(self, db_path=DB_PATH, extra_accounts=(), intervals=None, lead_seconds=KEEPALIVE_LEAD_SECONDS,
+                 concurrency=KEEPALIVE_CONCURRENCY, poll_interval=KEEPALIVE_POLL_INTERVAL, use_task_store=True):
+        self.db_path = db_path
+        self.intervals = dict(KEEPALIVE_INTERVALS, **(intervals or {}))
+        self.lead_seconds = lead_seconds
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.use_task_store = use_task_store and bool(TASK_STORE_URL)
+        # account_file（str）-> AccountSession
+        self.sessions = {}
+        for platform, account_file in extra_accounts:
+            self.sessions[str(account_file)] = AccountSession(platform, account_file)
+        self._lock = threading.Lock()
+
+    def _load_accounts(self):
+        """user_info 里的账号，新登录的加入，删除的移除（命令行传入的保留）"""
+        if not self.db_path or not Path(self.db_path).exists():
+            return
+        with sqlite3.connect(self.db_path) as conn:
+            rows = conn.execute("SELECT id, type, filePath, userName FROM user_info").fetchall()
+        seen = set()
+        with self._lock:
+            for account_id, type_id, file_path, user_name in rows:
+                plugin = get_platform(type_id)
+                if plugin is None or plugin.name not in self.intervals:
+                    continue
+                account_file = str(Path(BASE_DIR / "cookiesFile" / file_path))
+                seen.add(account_file)
+                session = self.sessions.get(account_file)
+                if session is None:
+                    self.sessions[account_file] = AccountSession(plugin.name, account_file, user_name, account_id)
+            for account_file in [key for key, session in self.sessions.items()
+                                 if session.account_id is not None and key not in seen]:
+                del self.sessions[account_file]
+
+    def _load_next_tasks(self):
+        if not self.use_task_store:
+            return
+        next_tasks = {}
+        for task in open_task_store().list_tasks(TASK_QUEUED, limit=1000):
+            task_at = task_publish_at(task)
+            for file_path in task["payload"].get("accountList", []):
+                account_file = str(Path(BASE_DIR / "cookiesFile" / file_path))
+                next_tasks[account_file] = min(next_tasks.get(account_file, task_at), task_at)
+        with self._lock:
+            for account_file, session in self.sessions.items():
+                session.next_task_at = next_tasks.get(account_file)
+
+    def due_sessions(self, now=None):
+        """到期的账号，有排队任务的按任务的发布时间排在前面"""
+        now = time.time() if now is None else now
+        with self._lock:
+            due = [session for session in self.sessions.values()
+                   if session.is_due(now, self.intervals[session.platform], self.lead_seconds)]
+        return sorted(due, key=lambda s: (s.next_task_at or float("inf"), s.checked_at or 0))
+
+    async def check(self, session, browser_factory):
+        mtime = session.cookie_mtime()
+        try:
+            if session.platform == SOCIAL_MEDIA_BILIBILI:
+                alive = await load_platform(SOCIAL_MEDIA_BILIBILI, "cookie_check")(session.account_file)
+            else:
+                alive = await refresh_browser_session(await browser_factory(), session.platform, session.account_file)
+            state, error = (SESSION_ALIVE if alive else SESSION_EXPIRED), None
+        except FileNotFoundError:
+            state, error = SESSION_EXPIRED, "cookie file missing"
+        except Exception as e:
+            # 网络问题等，判断不了登录态，不改账号状态
+            state, error = SESSION_ERROR, repr(e)
+        session.state, session.error, session.checked_at = state, error, time.time()
+        # 刷新成功会写回 cookie 文件，记录检查前的修改时间即可
+        session.checked_mtime = mtime
+        SESSION_KEEPALIVES.inc(platform=session.platform, outcome=state)
+        if state == SESSION_EXPIRED:
+            next_task = time.strftime("%Y-%m-%d %H:%M", time.localtime(session.next_task_at)) \
+                if session.next_task_at else "none"
+            logger.error(f"[keepalive] {session.platform} {session.name}: login expired, "
+                         f"scan the QR code again (next queued task: {next_task})")
+        elif state == SESSION_ERROR:
+            logger.warning(f"[keepalive] {session.platform} {session.name}: check failed: {error}")
+        else:
+            logger.info(f"[keepalive] {session.platform} {session.name}: session refreshed")
+        if state != SESSION_ERROR and session.account_id is not None:
+            self._update_status(session.account_id, 1 if state == SESSION_ALIVE else 0)
+
+    def _update_status(self, account_id, status):
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE user_info SET status = ? WHERE id = ?", (status, account_id))
+
+    def _update_gauge(self):
+        counts = {}
+        with self._lock:
+            for session in self.sessions.values():
+                counts[(session.platform,)] = counts.get((session.platform,), 0) + int(session.needs_login)
+        ACCOUNTS_NEED_LOGIN.replace(counts)
+
+    async def run_once(self):
+        self._load_accounts()
+        try:
+            self._load_next_tasks()
+        except Exception as e:
+            logger.warning(f"[keepalive] failed to read the task queue: {e!r}")
+        due = self.due_sessions()
+        if due:
+            playwright_manager, browser = None, None
+            browser_lock = asyncio.Lock()
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def browser_factory():
+                # 这一轮全是 b 站账号时不启动浏览器
+                nonlocal playwright_manager, browser
+                async with browser_lock:
+                    if browser is None:
+                        from playwright.async_api import async_playwright
+                        playwright_manager = async_playwright()
+                        playwright = await playwright_manager.__aenter__()
+                        browser = await playwright.chromium.launch(headless=True)
+                return browser
+
+            async def check(session):
+                async with semaphore:
+                    await self.check(session, browser_factory)
+
+            try:
+                await asyncio.gather(*[check(session) for session in due])
+            finally:
+                # 两轮之间间隔很长，不常驻浏览器
+                if browser is not None:
+                    await browser.close()
+                if playwright_manager is not None:
+                    await playwright_manager.__aexit__(None, None, None)
+        self._update_gauge()
+        return due
+
+    async def run(self, stop=None):
+        while stop is None or not stop.is_set():
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.warning(f"[keepalive] round failed: {e!r}")
+            await asyncio.sleep(self.poll_interval)
+
+    def start_thread(self):
+        stop = threading.Event()
+        threading.Thread(target=lambda: asyncio.run(self.run(stop)), name="session-keepalive", daemon=True).start()
+        return stop
+
+    def status(self):
+        with self._lock:
+            return [session.to_dict() for session in self.sessions.values()]
+
+
+def _parse_account(value):
+    platform, sep, account_file = value.partition(":")
+    if not sep or platform not in KEEPALIVE_INTERVALS:
+        raise argparse.ArgumentTypeError(f"expected PLATFORM:COOKIE_FILE, platform one of "
+                                         f"{', '.join(KEEPALIVE_INTERVALS)}")
+    return platform, account_file
+
+
+def main():
+    parser = argparse.ArgumentParser(description="keep account sessions alive and flag accounts that need login")
+    parser.add_argument("--account", type=_parse_account, action="append", default=[],
+                        help="extra account as PLATFORM:COOKIE_FILE (can repeat)")
+    parser.add_argument("--no-db", action="store_true", help="do not load accounts from db/database.db")
+    parser.add_argument("--once", action="store_true", help="check every account once and exit")
+    args = parser.parse_args()
+
+    keepalive = SessionKeepAlive(None if args.no_db else DB_PATH, args.account)
+    if args.once:
+        # --once：不管间隔，所有账号都查一遍
+        keepalive.intervals = {platform: 0 for platform in keepalive.intervals}
+        asyncio.run(keepalive.run_once())
+        for session in keepalive.status():
+            print(f"{session['platform']:12} {session['name']:24} {session['state']}"
+                  + (f"  {session['error']}" if session["error"] else ""))
+        SESSIONS.flush()
+        return
+    asyncio.run(keepalive.run())
+
+
+if __name__ == '__main__':
+    main()
@@ -1,305 +1,160 @@
 import asyncio
 import sqlite3
+import time
+from contextlib import AsyncExitStack
 
 from playwright.async_api import async_playwright
 
 from myUtils.auth import check_cookie
-from utils.base_social_media import set_init_script
+from utils.base_social_media import set_init_script, SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_KUAISHOU, \
+    SOCIAL_MEDIA_XIAOHONGSHU
+from utils.metrics import track_login
 import uuid
 from pathlib import Path
 from conf import BASE_DIR, LOCAL_CHROME_HEADLESS
 
-# 抖音登录
-async def douyin_cookie_gen(id,status_queue):
-    url_changed_event = asyncio.Event()
-    async def on_url_change():
-        # 检查是否是主框架的变化
-        if page.url != original_url:
-            url_changed_event.set()
-    async with async_playwright() as playwright:
-        options = {
-            'headless': LOCAL_CHROME_HEADLESS
-        }
-        # Make sure to run headed.
-        browser = await playwright.chromium.launch(**options)
-        # Setup context however you like.
-        context = await browser.new_context()  # Pass any options
-        context = await set_init_script(context)
-        # Pause the page, and start recording manually.
-        page = await context.new_page()
-        await page.goto("https://creator.douyin.com/")
-        original_url = page.url
-        img_locator = page.get_by_role("img", name="二维码")
-        # 获取 src 属性值
-        src = await img_locator.get_attribute("src")
-        print("✅ 图片地址:", src)
-        status_queue.put(src)
-        # 监听页面的 'framenavigated' 事件，只关注主框架的变化
-        page.on('framenavigated',
-                lambda frame: asyncio.create_task(on_url_change()) if frame == page.main_frame else None)
-        try:
-            # 等待 URL 变化或超时
-            await asyncio.wait_for(url_changed_event.wait(), timeout=200)  # 最多等待 200 秒
-            print("监听页面跳转成功")
-        except asyncio.TimeoutError:
-            print("监听页面跳转超时")
-            await page.close()
-            await context.close()
-            await browser.close()
-            status_queue.put("500")
-            return None
-        uuid_v1 = uuid.uuid1()
-        print(f"UUID v1: {uuid_v1}")
-        # 确保cookiesFile目录存在
-        cookies_dir = Path(BASE_DIR / "cookiesFile")
-        cookies_dir.mkdir(exist_ok=True)
-        await context.storage_state(path=cookies_dir / f"{uuid_v1}.json")
-        result = await check_cookie(3, f"{uuid_v1}.json")
-        if not result:
-            status_queue.put("500")
-            await page.close()
-            await context.close()
-            await browser.close()
-            return None
-        await page.close()
-        await context.close()
-        await browser.close()
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                                INSERT INTO user_info (type, filePath, userName, status)
-                                VALUES (?, ?, ?, ?)
-                                ''', (3, f"{uuid_v1}.json", id, 1))
-            conn.commit()
-            print("✅ 用户状态已记录")
-        status_queue.put("200")
+# 扫码后等待页面跳转的最长时间，秒
+LOGIN_TIMEOUT = 200
 
 
-# 视频号登录
-async def get_tencent_cookie(id,status_queue):
-    url_changed_event = asyncio.Event()
-    async def on_url_change():
-        # 检查是否是主框架的变化
-        if page.url != original_url:
-            url_changed_event.set()
+class LoginPage(object):
+    """打开到二维码的登录页：src 为二维码图片地址，original_url 为扫码前的地址（跳转即登录成功）"""
 
-    async with async_playwright() as playwright:
-        options = {
-            'args': [
-                '--lang en-GB'
-            ],
-            'headless': LOCAL_CHROME_HEADLESS,  # Set headless option here
-        }
-        # Make sure to run headed.
-        browser = await playwright.chromium.launch(**options)
-        # Setup context however you like.
-        context = await browser.new_context()  # Pass any options
-        # Pause the page, and start recording manually.
-        context = await set_init_script(context)
-        page = await context.new_page()
-        await page.goto("https://channels.weixin.qq.com")
-        original_url = page.url
+    def __init__(self, type_id, context, page, src):
+        self.type_id = type_id
+        self.context = context
+        self.page = page
+        self.src = src
+        self.original_url = page.url
+        self.created_at = time.monotonic()
 
-        # 监听页面的 'framenavigated' 事件，只关注主框架的变化
-        page.on('framenavigated',
-                lambda frame: asyncio.create_task(on_url_change()) if frame == page.main_frame else None)
 
-        # 等待 iframe 出现（最多等 60 秒）
-        iframe_locator = page.frame_locator("iframe").first
+async def _douyin_qrcode(page):
+    await page.goto("https://creator.douyin.com/")
+    return await page.get_by_role("img", name="二维码").get_attribute("src")
 
-        # 获取 iframe 中的第一个 img 元素
-        img_locator = iframe_locator.get_by_role("img").first
 
-        # 获取 src 属性值
-        src = await img_locator.get_attribute("src")
-        print("✅ 图片地址:", src)
-        status_queue.put(src)
+async def _tencent_qrcode(page):
+    await page.goto("https://channels.weixin.qq.com")
+    # 二维码在 iframe 里
+    return await page.frame_locator("iframe").first.get_by_role("img").first.get_attribute("src")
 
-        try:
-            # 等待 URL 变化或超时
-            await asyncio.wait_for(url_changed_event.wait(), timeout=200)  # 最多等待 200 秒
-            print("监听页面跳转成功")
-        except asyncio.TimeoutError:
-            status_queue.put("500")
-            print("监听页面跳转超时")
-            await page.close()
-            await context.close()
-            await browser.close()
-            return None
-        uuid_v1 = uuid.uuid1()
-        print(f"UUID v1: {uuid_v1}")
-        # 确保cookiesFile目录存在
-        cookies_dir = Path(BASE_DIR / "cookiesFile")
-        cookies_dir.mkdir(exist_ok=True)
-        await context.storage_state(path=cookies_dir / f"{uuid_v1}.json")
-        result = await check_cookie(2,f"{uuid_v1}.json")
-        if not result:
-            status_queue.put("500")
-            await page.close()
-            await context.close()
-            await browser.close()
-            return None
-        await page.close()
-        await context.close()
-        await browser.close()
 
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                                INSERT INTO user_info (type, filePath, userName, status)
-                                VALUES (?, ?, ?, ?)
-                                ''', (2, f"{uuid_v1}.json", id, 1))
-            conn.commit()
-            print("✅ 用户状态已记录")
-        status_queue.put("200")
+async def _ks_qrcode(page):
+    await page.goto("https://cp.kuaishou.com")
+    # 定位并点击“立即登录”按钮（类型为 link）
+    await page.get_by_role("link", name="立即登录").click()
+    await page.get_by_text("扫码登录").click()
+    return await page.get_by_role("img", name="qrcode").get_attribute("src")
 
-# 快手登录
-async def get_ks_cookie(id,status_queue):
-    url_changed_event = asyncio.Event()
-    async def on_url_change():
-        # 检查是否是主框架的变化
-        if page.url != original_url:
-            url_changed_event.set()
-    async with async_playwright() as playwright:
-        options = {
-            'args': [
-                '--lang en-GB'
-            ],
-            'headless': LOCAL_CHROME_HEADLESS,  # Set headless option here
-        }
-        # Make sure to run headed.
-        browser = await playwright.chromium.launch(**options)
-        # Setup context however you like.
-        context = await browser.new_context()  # Pass any options
+
+async def _xhs_qrcode(page):
+    await page.goto("https://creator.xiaohongshu.com/")
+    await page.locator('img.css-wemwzq').click()
+    return await page.get_by_role("img").nth(2).get_attribute("src")
+
+
+# type -> (打开到二维码并返回图片地址的函数, 浏览器启动参数)，type 与 utils/plugins.py 一致
+QR_LOGIN_PAGES = {
+    1: (_xhs_qrcode, ('--lang en-GB',)),
+    2: (_tencent_qrcode, ('--lang en-GB',)),
+    3: (_douyin_qrcode, ()),
+    4: (_ks_qrcode, ('--lang en-GB',)),
+}
+
+
+async def open_login_page(browser, type_id) -> LoginPage:
+    """在 browser 里新建上下文，打开 type 平台的登录页到二维码出现"""
+    open_qrcode, _ = QR_LOGIN_PAGES[type_id]
+    context = await browser.new_context()
+    try:
         context = await set_init_script(context)
-        # Pause the page, and start recording manually.
         page = await context.new_page()
-        await page.goto("https://cp.kuaishou.com")
-
-        # 定位并点击“立即登录”按钮（类型为 link）
-        await page.get_by_role("link", name="立即登录").click()
-        await page.get_by_text("扫码登录").click()
-        img_locator = page.get_by_role("img", name="qrcode")
-        # 获取 src 属性值
-        src = await img_locator.get_attribute("src")
-        original_url = page.url
-        print("✅ 图片地址:", src)
-        status_queue.put(src)
+        src = await open_qrcode(page)
+    except BaseException:
+        await context.close()
+        raise
+    return LoginPage(type_id, context, page, src)
+
+
+async def qr_login(type_id, id, status_queue):
+    """
+    扫码登录：二维码地址放进 status_queue，等待页面跳转后保存 cookie、校验并写入 user_info。
+    后端开启预热登录页时（myUtils/login_pool.py）直接取一个已经打开到二维码的页面，没有时现开浏览器。
+    """
+    from myUtils.login_pool import LOGIN_POOL
+
+    async with AsyncExitStack() as stack:
+        login_page = await LOGIN_POOL.take(type_id) if LOGIN_POOL.owns_current_loop() else None
+        if login_page is None:
+            playwright = await stack.enter_async_context(async_playwright())
+            browser = await playwright.chromium.launch(headless=LOCAL_CHROME_HEADLESS,
+                                                       args=list(QR_LOGIN_PAGES[type_id][1]))
+            stack.push_async_callback(browser.close)
+            login_page = await open_login_page(browser, type_id)
+        stack.push_async_callback(login_page.context.close)
+        page = login_page.page
+        print("✅ 图片地址:", login_page.src)
+        status_queue.put(login_page.src)
+
+        url_changed_event = asyncio.Event()
         # 监听页面的 'framenavigated' 事件，只关注主框架的变化
         page.on('framenavigated',
-                lambda frame: asyncio.create_task(on_url_change()) if frame == page.main_frame else None)
-
+                lambda frame: url_changed_event.set()
+                if frame == page.main_frame and page.url != login_page.original_url else None)
         try:
             # 等待 URL 变化或超时
-            await asyncio.wait_for(url_changed_event.wait(), timeout=200)  # 最多等待 200 秒
+            await asyncio.wait_for(url_changed_event.wait(), timeout=LOGIN_TIMEOUT)
             print("监听页面跳转成功")
         except asyncio.TimeoutError:
-            status_queue.put("500")
             print("监听页面跳转超时")
-            await page.close()
-            await context.close()
-            await browser.close()
+            status_queue.put("500")
             return None
         uuid_v1 = uuid.uuid1()
         print(f"UUID v1: {uuid_v1}")
         # 确保cookiesFile目录存在
         cookies_dir = Path(BASE_DIR / "cookiesFile")
         cookies_dir.mkdir(exist_ok=True)
-        await context.storage_state(path=cookies_dir / f"{uuid_v1}.json")
-        result = await check_cookie(4, f"{uuid_v1}.json")
-        if not result:
-            status_queue.put("500")
-            await page.close()
-            await context.close()
-            await browser.close()
-            return None
-        await page.close()
-        await context.close()
-        await browser.close()
+        await login_page.context.storage_state(path=cookies_dir / f"{uuid_v1}.json")
+    # 校验会另开浏览器，先关掉登录用的页面
+    result = await check_cookie(type_id, f"{uuid_v1}.json")
+    if not result:
+        status_queue.put("500")
+        return None
+    with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+                       INSERT INTO user_info (type, filePath, userName, status)
+                       VALUES (?, ?, ?, ?)
+                       ''', (type_id, f"{uuid_v1}.json", id, 1))
+        conn.commit()
+        print("✅ 用户状态已记录")
+    status_queue.put("200")
+    return True
 
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                                        INSERT INTO user_info (type, filePath, userName, status)
-                                        VALUES (?, ?, ?, ?)
-                                        ''', (4, f"{uuid_v1}.json", id, 1))
-            conn.commit()
-            print("✅ 用户状态已记录")
-        status_queue.put("200")
 
-# 小红书登录
-async def xiaohongshu_cookie_gen(id,status_queue):
-    url_changed_event = asyncio.Event()
+# 抖音登录
+@track_login(SOCIAL_MEDIA_DOUYIN)
+async def douyin_cookie_gen(id,status_queue):
+    return await qr_login(3, id, status_queue)
 
-    async def on_url_change():
-        # 检查是否是主框架的变化
-        if page.url != original_url:
-            url_changed_event.set()
 
-    async with async_playwright() as playwright:
-        options = {
-            'args': [
-                '--lang en-GB'
-            ],
-            'headless': LOCAL_CHROME_HEADLESS,  # Set headless option here
-        }
-        # Make sure to run headed.
-        browser = await playwright.chromium.launch(**options)
-        # Setup context however you like.
-        context = await browser.new_context()  # Pass any options
-        context = await set_init_script(context)
-        # Pause the page, and start recording manually.
-        page = await context.new_page()
-        await page.goto("https://creator.xiaohongshu.com/")
-        await page.locator('img.css-wemwzq').click()
+# 视频号登录
+@track_login(SOCIAL_MEDIA_TENCENT)
+async def get_tencent_cookie(id,status_queue):
+    return await qr_login(2, id, status_queue)
 
-        img_locator = page.get_by_role("img").nth(2)
-        # 获取 src 属性值
-        src = await img_locator.get_attribute("src")
-        original_url = page.url
-        print("✅ 图片地址:", src)
-        status_queue.put(src)
-        # 监听页面的 'framenavigated' 事件，只关注主框架的变化
-        page.on('framenavigated',
-                lambda frame: asyncio.create_task(on_url_change()) if frame == page.main_frame else None)
 
-        try:
-            # 等待 URL 变化或超时
-            await asyncio.wait_for(url_changed_event.wait(), timeout=200)  # 最多等待 200 秒
-            print("监听页面跳转成功")
-        except asyncio.TimeoutError:
-            status_queue.put("500")
-            print("监听页面跳转超时")
-            await page.close()
-            await context.close()
-            await browser.close()
-            return None
-        uuid_v1 = uuid.uuid1()
-        print(f"UUID v1: {uuid_v1}")
-        # 确保cookiesFile目录存在
-        cookies_dir = Path(BASE_DIR / "cookiesFile")
-        cookies_dir.mkdir(exist_ok=True)
-        await context.storage_state(path=cookies_dir / f"{uuid_v1}.json")
-        result = await check_cookie(1, f"{uuid_v1}.json")
-        if not result:
-            status_queue.put("500")
-            await page.close()
-            await context.close()
-            await browser.close()
-            return None
-        await page.close()
-        await context.close()
-        await browser.close()
+# 快手登录
+@track_login(SOCIAL_MEDIA_KUAISHOU)
+async def get_ks_cookie(id,status_queue):
+    return await qr_login(4, id, status_queue)
+
 
-        with sqlite3.connect(Path(BASE_DIR / "db" / "database.db")) as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                           INSERT INTO user_info (type, filePath, userName, status)
-                           VALUES (?, ?, ?, ?)
-                           ''', (1, f"{uuid_v1}.json", id, 1))
-            conn.commit()
-            print("✅ 用户状态已记录")
-        status_queue.put("200")
+# 小红书登录
+@track_login(SOCIAL_MEDIA_XIAOHONGSHU)
+async def xiaohongshu_cookie_gen(id,status_queue):
+    return await qr_login(1, id, status_queue)
 
 # a = asyncio.run(xiaohongshu_cookie_gen(4,None))
 # print(a)
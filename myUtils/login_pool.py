@@ -0,0 +1,212 @@
+"""
+预热的扫码登录页（默认关闭，SAU_LOGIN_POOL_SIZE 设为正数开启）：后端启动后在一个常驻线程（自己的事件循环、
+playwright 和浏览器）里，给每个平台提前打开 LOGIN_POOL_SIZE 个已经点到二维码的登录页。
+/login 直接取一个，二维码地址立即推给前端，后台再补一个新的。
+二维码会过期，页面打开超过 LOGIN_QR_TTL 的 80% 就换新的，超过 LOGIN_QR_TTL 的不再发出。
+预热要常开浏览器、不停刷新页面，超过 LOGIN_POOL_IDLE 秒没有 /login 就关掉页面和浏览器，下一次 /login 后再预热，
+连续给多个账号扫码时后面的账号能用上。
+
+扫码登录的整个流程（myUtils/login.py 的 qr_login）要在池的事件循环里执行，playwright 对象不能跨事件循环使用：
+    LOGIN_POOL.start()
+    LOGIN_POOL.submit(douyin_cookie_gen(id, status_queue)).result()
+没有启动时 submit 直接在当前线程新建事件循环执行，qr_login 自己开浏览器（原来的方式）。
+"""
+import asyncio
+import os
+import threading
+import time
+
+from loguru import logger
+
+from conf import LOCAL_CHROME_HEADLESS
+from utils.metrics import LOGIN_POOL_PAGES, LOGIN_POOL_TAKES
+from utils.plugins import get_platform
+
+# 每个平台预热的登录页数，0 表示不预热（默认）
+LOGIN_POOL_SIZE = int(os.environ.get("SAU_LOGIN_POOL_SIZE", 0))
+# 二维码有效期，秒；各平台的二维码几分钟就会过期，取偏保守的值
+LOGIN_QR_TTL = int(os.environ.get("SAU_LOGIN_QR_TTL", 90))
+# 页面打开超过有效期的这个比例就提前换新
+LOGIN_REFRESH_RATIO = 0.8
+# 多久没有 /login 就停止预热、关闭浏览器，秒；0 表示一直预热
+LOGIN_POOL_IDLE = int(os.environ.get("SAU_LOGIN_POOL_IDLE", 600))
+# 检查过期、补充页面的间隔，秒
+LOGIN_POOL_CHECK_INTERVAL = 5
+# 打开登录页失败（网络、页面改版）后的等待时间，秒，连续失败翻倍
+LOGIN_POOL_RETRY_DELAY = 10
+LOGIN_POOL_MAX_RETRY_DELAY = 300
+
+
+class LoginPagePool(object):
+    def __init__(self, type_ids=None, size=LOGIN_POOL_SIZE, ttl=LOGIN_QR_TTL, idle=LOGIN_POOL_IDLE):
+        # 默认预热 myUtils/login.py 支持的所有平台
+        from myUtils.login import QR_LOGIN_PAGES
+
+        self.type_ids = list(type_ids or QR_LOGIN_PAGES)
+        self.size = size
+        self.ttl = ttl
+        self.idle = idle
+        self.loop = None
+        # type -> [LoginPage]，新的在后面
+        self._pages = {type_id: [] for type_id in self.type_ids}
+        # 启动参数 -> 浏览器
+        self._browsers = {}
+        self._playwright_manager = None
+        self._playwright = None
+        self._wakeup = None
+        # type -> (连续失败次数, 下次重试时间)
+        self._failures = {}
+        # 最近一次 /login 取页面的时间，启动时算一次
+        self._last_take = time.monotonic()
+
+    @property
+    def running(self):
+        return self.loop is not None
+
+    def owns_current_loop(self):
+        try:
+            return self.loop is not None and asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def start(self):
+        """启动常驻线程，之后在后台打开并维护登录页"""
+        if self.running or self.size <= 0:
+            return
+        ready = threading.Event()
+
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            self._wakeup = asyncio.Event()
+            self.loop.create_task(self._maintain())
+            ready.set()
+            self.loop.run_forever()
+
+        threading.Thread(target=run, name="login-pool", daemon=True).start()
+        ready.wait()
+
+    def submit(self, coro):
+        """在池的事件循环里执行 coro，返回 concurrent.futures.Future；没有启动时在当前线程执行"""
+        if not self.running:
+            from concurrent.futures import Future
+            future = Future()
+            try:
+                future.set_result(asyncio.run(coro))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def _is_fresh(self, login_page, limit):
+        return time.monotonic() - login_page.created_at < limit and not login_page.page.is_closed() \
+            and login_page.page.url == login_page.original_url
+
+    async def take(self, type_id):
+        """取一个可用的登录页（最新的优先），没有时返回 None；取走后后台补充"""
+        pages = self._pages.get(type_id)
+        login_page = None
+        while pages:
+            candidate = pages.pop()
+            if self._is_fresh(candidate, self.ttl):
+                login_page = candidate
+                break
+            await self._close(candidate)
+        self._last_take = time.monotonic()
+        platform = get_platform(type_id).name
+        LOGIN_POOL_TAKES.inc(platform=platform, outcome="hit" if login_page else "miss")
+        self._update_gauge()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return login_page
+
+    async def _browser(self, args):
+        if self._playwright is None:
+            # playwright 在用到时才导入
+            from playwright.async_api import async_playwright
+            self._playwright_manager = async_playwright()
+            self._playwright = await self._playwright_manager.__aenter__()
+        browser = self._browsers.get(args)
+        if browser is None or not browser.is_connected():
+            browser = await self._playwright.chromium.launch(headless=LOCAL_CHROME_HEADLESS, args=list(args))
+            self._browsers[args] = browser
+        return browser
+
+    @staticmethod
+    async def _close(login_page):
+        try:
+            await login_page.context.close()
+        except Exception:
+            pass
+
+    async def _fill(self, type_id):
+        from myUtils.login import QR_LOGIN_PAGES, open_login_page
+
+        pages = self._pages[type_id]
+        # 快过期的先补上新的再关闭，保证随时有页面可取
+        expiring = [page for page in pages if not self._is_fresh(page, self.ttl * LOGIN_REFRESH_RATIO)]
+        failures, retry_at = self._failures.get(type_id, (0, 0))
+        while len(pages) - len(expiring) < self.size and time.monotonic() >= retry_at:
+            try:
+                browser = await self._browser(QR_LOGIN_PAGES[type_id][1])
+                pages.append(await open_login_page(browser, type_id))
+                self._failures.pop(type_id, None)
+            except Exception as e:
+                failures += 1
+                delay = min(LOGIN_POOL_RETRY_DELAY * 2 ** (failures - 1), LOGIN_POOL_MAX_RETRY_DELAY)
+                retry_at = time.monotonic() + delay
+                self._failures[type_id] = (failures, retry_at)
+                logger.warning(f"[login pool] failed to open {get_platform(type_id).name} login page: {e!r}, "
+                               f"retry in {delay}s")
+        for page in expiring:
+            if page in pages:
+                pages.remove(page)
+                await self._close(page)
+
+    def _is_idle(self):
+        return self.idle > 0 and time.monotonic() - self._last_take > self.idle
+
+    async def _close_all(self):
+        for pages in self._pages.values():
+            while pages:
+                await self._close(pages.pop())
+        for browser in self._browsers.values():
+            try:
+                await browser.close()
+            except Exception:
+                pass
+        self._browsers = {}
+        if self._playwright_manager is not None:
+            try:
+                await self._playwright_manager.__aexit__(None, None, None)
+            except Exception:
+                pass
+            self._playwright_manager = self._playwright = None
+
+    def _update_gauge(self):
+        LOGIN_POOL_PAGES.replace({(get_platform(type_id).name,): len(pages) for type_id, pages in self._pages.items()})
+
+    async def _maintain(self):
+        while True:
+            self._wakeup.clear()
+            if self._is_idle():
+                if self._browsers:
+                    logger.info(f"[login pool] no /login for {self.idle}s, closing login pages until the next one")
+                    await self._close_all()
+                    self._update_gauge()
+                # take() 唤醒
+                await self._wakeup.wait()
+                continue
+            for type_id in self.type_ids:
+                try:
+                    await self._fill(type_id)
+                except Exception as e:
+                    logger.warning(f"[login pool] {e!r}")
+            self._update_gauge()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), LOGIN_POOL_CHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+
+LOGIN_POOL = LoginPagePool()
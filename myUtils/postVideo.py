@@ -1,91 +1,281 @@
 import asyncio
+from datetime import datetime
 from pathlib import Path
 
+from loguru import logger
+
 from conf import BASE_DIR
-from uploader.douyin_uploader.main import DouYinVideo
-from uploader.ks_uploader.main import KSVideo
-from uploader.tencent_uploader.main import TencentVideo
-from uploader.xiaohongshu_uploader.main import XiaoHongShuVideo
-from utils.constant import TencentZoneTypes
+from utils.constant import TencentZoneTypes, VideoZoneTypes
+from utils.blocking_executor import BlockingExecutor
 from utils.files_times import generate_schedule_time_next_day
+from utils.log import xhs_logger
 
+# b 站上传器是同步的（内部自己开线程上传分块），放到独立的有界线程池里执行，不阻塞事件循环
+BILIBILI_MAX_WORKERS = 2
+bilibili_executor = BlockingExecutor("bilibili", max_workers=BILIBILI_MAX_WORKERS)
 
-def post_video_tencent(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0, is_draft=False):
-    # 生成文件的完整路径
-    account_file = [Path(BASE_DIR / "cookiesFile" / file) for file in account_file]
-    files = [Path(BASE_DIR / "videoFile" / file) for file in files]
-    if enableTimer:
-        publish_datetimes = generate_schedule_time_next_day(len(files), videos_per_day, daily_times,start_days)
-    else:
-        publish_datetimes = [0 for i in range(len(files))]
+# 小红书发布方式：browser 创作者中心页面自动化；api 先走 HTTP 接口，失败回退到 browser
+XHS_MODE_BROWSER = "browser"
+XHS_MODE_API = "api"
+
+# 各平台上传器在发布函数内部导入，导入本模块时不会加载 playwright / xhs / biliup，
+# 平台按 type 标识的注册见 utils/plugins.py
+
+
+def publish_outcome(file, account, success, error=None):
+    """
+    一个 (文件, 账号) 的发布结果，post_video_* 都返回这样的列表。
+    file、account 是请求里 fileList、accountList 的原值，worker 重试时按它跳过已经发布的组合。
+    """
+    return {"file": file, "account": account, "success": bool(success), "error": error}
+
+
+def failed_outcomes(outcomes):
+    return [outcome for outcome in outcomes or [] if not outcome["success"]]
+
+
+def _publish_one(file, account, publish):
+    """执行一次发布：publish() 返回 False 或抛出异常都算失败，异常不再中断后面的文件和账号"""
+    try:
+        return publish_outcome(file, account, publish() is not False)
+    except Exception as e:
+        logger.exception(f"[-] {account} 发布 {file} 失败: {e!r}")
+        return publish_outcome(file, account, False, repr(e))
+
+
+def schedule_publish_dates(file_num, enableTimer, videos_per_day=1, daily_times=None, start_days=0,
+                           publish_dates=None, timestamps=False):
+    """
+    每个文件的定时发布时间，0 表示立即发布。
+    publish_dates（秒级时间戳，split_post_video_request 入队时算好）优先，否则按定时参数从现在开始算；
+    timestamps 为 False 时返回 datetime。
+    """
+    if publish_dates is not None:
+        if timestamps:
+            return list(publish_dates)
+        return [datetime.fromtimestamp(ts) if ts else 0 for ts in publish_dates]
+    if not enableTimer:
+        return [0 for i in range(file_num)]
+    return generate_schedule_time_next_day(file_num, videos_per_day, daily_times, timestamps=timestamps,
+                                           start_days=start_days or 0)
+
+
+def post_video_tencent(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0, is_draft=False,
+                       publish_dates=None):
+    from uploader.tencent_uploader.main import TencentVideo
+    publish_datetimes = schedule_publish_dates(len(files), enableTimer, videos_per_day, daily_times, start_days,
+                                               publish_dates)
+    outcomes = []
     for index, file in enumerate(files):
-        for cookie in account_file:
-            print(f"文件路径{str(file)}")
+        for account in account_file:
+            # 生成文件的完整路径
+            file_path = Path(BASE_DIR / "videoFile" / file)
+            cookie = Path(BASE_DIR / "cookiesFile" / account)
+            print(f"文件路径{str(file_path)}")
             # 打印视频文件名、标题和 hashtag
-            print(f"视频文件名：{file}")
+            print(f"视频文件名：{file_path}")
             print(f"标题：{title}")
             print(f"Hashtag：{tags}")
-            app = TencentVideo(title, str(file), tags, publish_datetimes[index], cookie, category, is_draft)
-            asyncio.run(app.main(), debug=False)
+            app = TencentVideo(title, str(file_path), tags, publish_datetimes[index], cookie, category, is_draft)
+            outcomes.append(_publish_one(file, account, lambda: asyncio.run(app.main(), debug=False)))
+    return outcomes
 
 
 def post_video_DouYin(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0,
                       thumbnail_path = '',
-                      productLink = '', productTitle = ''):
-    # 生成文件的完整路径
-    account_file = [Path(BASE_DIR / "cookiesFile" / file) for file in account_file]
-    files = [Path(BASE_DIR / "videoFile" / file) for file in files]
-    if enableTimer:
-        publish_datetimes = generate_schedule_time_next_day(len(files), videos_per_day, daily_times,start_days)
-    else:
-        publish_datetimes = [0 for i in range(len(files))]
+                      productLink = '', productTitle = '', publish_dates=None):
+    from uploader.douyin_uploader.main import DouYinVideo
+    publish_datetimes = schedule_publish_dates(len(files), enableTimer, videos_per_day, daily_times, start_days,
+                                               publish_dates)
+    outcomes = []
     for index, file in enumerate(files):
-        for cookie in account_file:
-            print(f"文件路径{str(file)}")
+        for account in account_file:
+            # 生成文件的完整路径
+            file_path = Path(BASE_DIR / "videoFile" / file)
+            cookie = Path(BASE_DIR / "cookiesFile" / account)
+            print(f"文件路径{str(file_path)}")
             # 打印视频文件名、标题和 hashtag
-            print(f"视频文件名：{file}")
+            print(f"视频文件名：{file_path}")
             print(f"标题：{title}")
             print(f"Hashtag：{tags}")
-            app = DouYinVideo(title, str(file), tags, publish_datetimes[index], cookie, thumbnail_path, productLink, productTitle)
-            asyncio.run(app.main(), debug=False)
+            app = DouYinVideo(title, str(file_path), tags, publish_datetimes[index], cookie, thumbnail_path, productLink, productTitle)
+            outcomes.append(_publish_one(file, account, lambda: asyncio.run(app.main(), debug=False)))
+    return outcomes
 
 
-def post_video_ks(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0):
-    # 生成文件的完整路径
-    account_file = [Path(BASE_DIR / "cookiesFile" / file) for file in account_file]
-    files = [Path(BASE_DIR / "videoFile" / file) for file in files]
-    if enableTimer:
-        publish_datetimes = generate_schedule_time_next_day(len(files), videos_per_day, daily_times,start_days)
-    else:
-        publish_datetimes = [0 for i in range(len(files))]
+def post_video_ks(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0,
+                  publish_dates=None):
+    from uploader.ks_uploader.main import KSVideo
+    publish_datetimes = schedule_publish_dates(len(files), enableTimer, videos_per_day, daily_times, start_days,
+                                               publish_dates)
+    outcomes = []
     for index, file in enumerate(files):
-        for cookie in account_file:
-            print(f"文件路径{str(file)}")
+        for account in account_file:
+            # 生成文件的完整路径
+            file_path = Path(BASE_DIR / "videoFile" / file)
+            cookie = Path(BASE_DIR / "cookiesFile" / account)
+            print(f"文件路径{str(file_path)}")
             # 打印视频文件名、标题和 hashtag
-            print(f"视频文件名：{file}")
+            print(f"视频文件名：{file_path}")
             print(f"标题：{title}")
             print(f"Hashtag：{tags}")
-            app = KSVideo(title, str(file), tags, publish_datetimes[index], cookie)
-            asyncio.run(app.main(), debug=False)
+            app = KSVideo(title, str(file_path), tags, publish_datetimes[index], cookie)
+            outcomes.append(_publish_one(file, account, lambda: asyncio.run(app.main(), debug=False)))
+    return outcomes
 
-def post_video_xhs(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0):
-    # 生成文件的完整路径
-    account_file = [Path(BASE_DIR / "cookiesFile" / file) for file in account_file]
-    files = [Path(BASE_DIR / "videoFile" / file) for file in files]
-    file_num = len(files)
-    if enableTimer:
-        publish_datetimes = generate_schedule_time_next_day(file_num, videos_per_day, daily_times,start_days)
-    else:
-        publish_datetimes = 0
+def post_video_xhs(title,files,tags,account_file,category=TencentZoneTypes.LIFESTYLE.value,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0,
+                   mode=XHS_MODE_BROWSER, publish_dates=None):
+    """mode 为 api 时先走 HTTP 接口发布，失败再回退到浏览器流程"""
+    from uploader.xiaohongshu_uploader.main import XiaoHongShuVideo
+    from uploader.xhs_uploader.api import XhsApiNotPublished, XhsApiVideo, api_can_upload
+    publish_datetimes = schedule_publish_dates(len(files), enableTimer, videos_per_day, daily_times, start_days,
+                                               publish_dates)
+
+    def publish(file_path, cookie, publish_date):
+        if mode == XHS_MODE_API and not api_can_upload(file_path):
+            # 大文件分片上传后不确定能拿到 video_id（见 uploader/xhs_uploader/api.py），不占用上传凭证和带宽，直接用浏览器发布
+            xhs_logger.info(f"[-] {file_path.name} 超过接口单次上传上限，使用浏览器发布")
+        elif mode == XHS_MODE_API:
+            try:
+                return XhsApiVideo(title, file_path, tags, publish_date, cookie).upload()
+            except XhsApiNotPublished as e:
+                # 只在发布请求之前失败时回退，create_note 的失败直接抛出，避免重复发布
+                xhs_logger.warning(f"[-] 接口发布失败，改用浏览器发布: {e}")
+        app = XiaoHongShuVideo(title, file_path, tags, publish_date, cookie)
+        return asyncio.run(app.main(), debug=False)
+
+    outcomes = []
     for index, file in enumerate(files):
-        for cookie in account_file:
+        for account in account_file:
+            # 生成文件的完整路径
+            file_path = Path(BASE_DIR / "videoFile" / file)
+            cookie = Path(BASE_DIR / "cookiesFile" / account)
             # 打印视频文件名、标题和 hashtag
-            print(f"视频文件名：{file}")
+            print(f"视频文件名：{file_path}")
             print(f"标题：{title}")
             print(f"Hashtag：{tags}")
-            app = XiaoHongShuVideo(title, file, tags, publish_datetimes, cookie)
-            asyncio.run(app.main(), debug=False)
+            outcomes.append(_publish_one(file, account, lambda: publish(file_path, cookie, publish_datetimes[index])))
+    return outcomes
+
+
+def _upload_bilibili_account(cookie, videos, tid, progress_callback=None, cancel_event=None):
+    from uploader.bilibili_uploader.main import BilibiliBatchUploader, load_cookie_data
+    cookie_data = load_cookie_data(cookie)
+    return BilibiliBatchUploader(cookie_data, tid).upload(videos, progress_callback, cancel_event)
+
+
+def _bilibili_jobs(title, files, tags, account_file, category, enableTimer, videos_per_day, daily_times, start_days,
+                   publish_dates=None):
+    """每个账号一个任务：[(任务名, cookie 文件, videos, tid)]"""
+    # 生成文件的完整路径
+    account_file = [Path(BASE_DIR / "cookiesFile" / file) for file in account_file]
+    files = [Path(BASE_DIR / "videoFile" / file) for file in files]
+    tid = category or VideoZoneTypes.LIFE.value
+    publish_datetimes = schedule_publish_dates(len(files), enableTimer, videos_per_day, daily_times, start_days,
+                                               publish_dates, timestamps=True)
+    videos = [(file, title, title, tags, publish_datetimes[index]) for index, file in enumerate(files)]
+    return [(f"{cookie.name}: {len(videos)} videos", cookie, videos, tid) for cookie in account_file]
+
+
+async def post_video_bilibili_async(title,files,tags,account_file,category=None,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0,
+                                    publish_dates=None):
+    # 每个账号一个任务，账号之间并发，同时运行的任务数由 bilibili_executor 限制
+    jobs = [bilibili_executor.run(name, _upload_bilibili_account, cookie, videos, tid)
+            for name, cookie, videos, tid in _bilibili_jobs(title, files, tags, account_file, category, enableTimer,
+                                                             videos_per_day, daily_times, start_days, publish_dates)]
+    return await asyncio.gather(*jobs, return_exceptions=True)
+
+
+def post_video_bilibili(title,files,tags,account_file,category=None,enableTimer=False,videos_per_day = 1, daily_times=None,start_days = 0,
+                        publish_dates=None):
+    """阻塞到所有账号上传结束（worker、命令行用）；后端接口用 submit_post_video_bilibili，不等待"""
+    print(f"视频文件名：{files}")
+    print(f"标题：{title}")
+    print(f"Hashtag：{tags}")
+    results = asyncio.run(post_video_bilibili_async(title, files, tags, account_file, category, enableTimer,
+                                                    videos_per_day, daily_times, start_days, publish_dates),
+                          debug=False)
+    # 每个账号的结果是与 files 对应的列表，账号整体失败时是异常
+    outcomes = []
+    for index, file in enumerate(files):
+        for account, result in zip(account_file, results):
+            if isinstance(result, BaseException):
+                outcomes.append(publish_outcome(file, account, False, repr(result)))
+            else:
+                outcomes.append(publish_outcome(file, account, result[index]))
+    return outcomes
+
+
+def submit_post_video_bilibili(data):
+    """
+    按 /postVideo 的请求体把 b 站上传提交到 bilibili_executor 后立即返回任务 id，不阻塞后端的请求线程；
+    进度和结果（任一视频失败即为 failed）见 /uploadJobs。队列已满时抛出 ExecutorFullError。
+    """
+    category = data.get('category') or None
+    jobs = _bilibili_jobs(data.get('title'), data.get('fileList', []), data.get('tags'), data.get('accountList', []),
+                          category, data.get('enableTimer'), data.get('videosPerDay'), data.get('dailyTimes'),
+                          data.get('startDays'))
+    return [bilibili_executor.submit(name, _upload_bilibili_account, cookie, videos, tid).id
+            for name, cookie, videos, tid in jobs]
+
+
+def post_video_request(data):
+    """
+    按 /postVideo 的请求体调用对应平台的发布函数，阻塞到发布结束，返回每个 (文件, 账号) 的 publish_outcome。
+    后端直接发布和 worker 从队列领取任务后都走这里（见 myUtils/worker.py）。
+    """
+    from utils.plugins import load_platform
+
+    file_list = data.get('fileList', [])
+    account_list = data.get('accountList', [])
+    type = data.get('type')
+    title = data.get('title')
+    tags = data.get('tags')
+    category = data.get('category')
+    enableTimer = data.get('enableTimer')
+    if category == 0:
+        category = None
+    productLink = data.get('productLink', '')
+    productTitle = data.get('productTitle', '')
+    thumbnail_path = data.get('thumbnail', '')
+    is_draft = data.get('isDraft', False)  # 新增参数：是否保存为草稿
+    xhs_mode = data.get('xhsMode', XHS_MODE_BROWSER)  # 小红书发布方式：browser / api
+
+    videos_per_day = data.get('videosPerDay')
+    daily_times = data.get('dailyTimes')
+    start_days = data.get('startDays')
+    # 入队时已经算好的定时时间，见 split_post_video_request
+    publish_dates = data.get('publishDates')
+    post_video = load_platform(type, "post_video")
+    match type:
+        case 1:
+            return post_video(title, file_list, tags, account_list, category, enableTimer, videos_per_day,
+                              daily_times, start_days, xhs_mode, publish_dates=publish_dates)
+        case 2:
+            return post_video(title, file_list, tags, account_list, category, enableTimer, videos_per_day,
+                              daily_times, start_days, is_draft, publish_dates=publish_dates)
+        case 3:
+            return post_video(title, file_list, tags, account_list, category, enableTimer, videos_per_day,
+                              daily_times, start_days, thumbnail_path, productLink, productTitle,
+                              publish_dates=publish_dates)
+        case 4 | 5:
+            return post_video(title, file_list, tags, account_list, category, enableTimer, videos_per_day,
+                              daily_times, start_days, publish_dates=publish_dates)
+
 
+def split_post_video_request(data):
+    """
+    按 (文件, 账号) 拆成多个请求，每个组合一个任务：不同 worker 可以同时发布，失败重试时不会重发已经成功的组合。
+    定时时间按整个请求的文件顺序在这里算好，写进 publishDates（秒级时间戳，0 为立即发布），
+    拆分后每个文件的定时时间与不拆分时一致，也不会因为任务排队、重试而往后推。
+    """
+    files = data.get('fileList', [])
+    publish_dates = data.get('publishDates')
+    if publish_dates is None:
+        publish_dates = schedule_publish_dates(len(files), data.get('enableTimer'), data.get('videosPerDay'),
+                                               data.get('dailyTimes'), data.get('startDays'), timestamps=True)
+    return [dict(data, fileList=[file], accountList=[account], publishDates=[publish_dates[index]])
+            for index, file in enumerate(files) for account in data.get('accountList', [])]
 
 
 # post_video("333",["demo.mp4"],"d","d")
@@ -0,0 +1,171 @@
+"""
+发布 worker：从共享任务队列（utils/task_queue.py）按租约领取 /postVideo 任务并执行，可以在多台机器上各跑一个或多个。
+后端需要以同样的 SAU_TASK_STORE 启动，/postVideo 才会入队而不是在后端进程里直接发布。
+
+    SAU_TASK_STORE=sqlite:///db/task_queue.db python -m myUtils.worker --concurrency 2
+    python -m myUtils.worker --store sqlite:////data/sau/task_queue.db --types 3 4   # 只领取抖音、快手任务
+
+worker 所在机器需要能访问到任务里的视频（videoFile）和 cookie（cookiesFile），即与后端共用这两个目录。
+"""
+import argparse
+import signal
+import socket
+import os
+import threading
+import time
+import traceback
+
+from loguru import logger
+
+from myUtils.postVideo import failed_outcomes, post_video_request, publish_outcome, split_post_video_request
+from utils.task_queue import DEFAULT_LEASE_SECONDS, TASK_STORE_URL, open_task_store
+from utils.watchdog import MemoryWatchdog
+
+# 队列为空时的轮询间隔，秒
+POLL_INTERVAL = 2
+
+
+class PublishWorker(object):
+    """
+    concurrency 个线程各自 领取 -> 执行 -> 提交结果，一个心跳线程给所有执行中的任务续约。
+    stop() 后不再领取新任务，等执行中的任务结束再退出；进程被强杀时租约到期，任务由其他 worker 重新领取。
+    handler(request) 发布一个 (文件, 账号)，返回 publish_outcome 列表，任一结果失败时任务按失败处理（可重试）。
+    """
+
+    def __init__(self, store, concurrency=1, platform_types=None, lease_seconds=DEFAULT_LEASE_SECONDS,
+                 poll_interval=POLL_INTERVAL, handler=post_video_request):
+        self.store = store
+        self.concurrency = concurrency
+        self.platform_types = platform_types
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.handler = handler
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._stop = threading.Event()
+        # task_id -> 领取该任务的线程的 worker_id
+        self._running = {}
+        self._running_lock = threading.Lock()
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self):
+        threads = [threading.Thread(target=self._work_loop, args=(f"{self.worker_id}:{i}",), daemon=True)
+                   for i in range(self.concurrency)]
+        heartbeat = threading.Thread(target=self._heartbeat_loop, daemon=True)
+        for thread in threads + [heartbeat]:
+            thread.start()
+        logger.info(f"worker {self.worker_id} started, concurrency {self.concurrency}, "
+                    f"types {self.platform_types or 'all'}")
+        for thread in threads:
+            # join 带超时，主线程才能及时响应信号
+            while thread.is_alive():
+                thread.join(1)
+        heartbeat.join(self.lease_seconds / 3)
+        logger.info(f"worker {self.worker_id} stopped")
+
+    def _work_loop(self, worker_id):
+        while not self._stop.is_set():
+            try:
+                task = self.store.claim(worker_id, self.lease_seconds, self.platform_types)
+            except Exception as e:
+                logger.warning(f"claim failed: {e!r}")
+                task = None
+            if task is None:
+                self._stop.wait(self.poll_interval)
+                continue
+            self.run_task(task, worker_id)
+
+    def run_task(self, task, worker_id):
+        task_id = task["id"]
+        if self._stop.is_set():
+            self.store.release(task_id, worker_id)
+            return
+        with self._running_lock:
+            self._running[task_id] = worker_id
+        logger.info(f"task {task_id} claimed by {worker_id}, attempt {task['attempts']}/{task['max_attempts']}")
+        start = time.perf_counter()
+        try:
+            outcomes = self._publish(task_id, task)
+            failed = failed_outcomes(outcomes)
+            seconds = round(time.perf_counter() - start, 3)
+            if failed:
+                # 已经成功的组合记在 result 里，重试时跳过
+                error = f"{len(failed)}/{len(outcomes)} failed: " + \
+                        "; ".join(f"{o['file']} @ {o['account']}: {o['error'] or 'failed'}" for o in failed)
+                logger.error(f"task {task_id} {error}")
+                if not self.store.fail(task_id, worker_id, error, result={"seconds": seconds, "outcomes": outcomes}):
+                    logger.warning(f"task {task_id}: lease lost before reporting failure")
+            elif self.store.complete(task_id, worker_id, {"seconds": seconds, "outcomes": outcomes}):
+                logger.info(f"task {task_id} done in {seconds}s")
+            else:
+                # 租约已经过期并被其他 worker 领取，结果以那边为准
+                logger.warning(f"task {task_id}: lease lost before completion, result discarded")
+        except Exception as e:
+            logger.error(f"task {task_id} failed: {e!r}\n{traceback.format_exc()}")
+            if not self.store.fail(task_id, worker_id, repr(e)):
+                logger.warning(f"task {task_id}: lease lost before reporting failure")
+        finally:
+            with self._running_lock:
+                self._running.pop(task_id, None)
+
+    def _publish(self, task_id, task):
+        """
+        按 (文件, 账号) 逐个发布，返回所有组合的 publish_outcome。
+        上一次尝试已经成功的组合（fail 时记在 result 里）直接沿用结果，不再发布；
+        后端按组合入队的任务只有一个组合，这里也兼容一个任务里有多个文件、账号的请求。
+        """
+        previous = (task.get("result") or {}).get("outcomes", [])
+        published = {(o["file"], o["account"]): o for o in previous if o["success"]}
+        outcomes = []
+        for request in split_post_video_request(task["payload"]):
+            key = (request["fileList"][0], request["accountList"][0])
+            if key in published:
+                logger.info(f"task {task_id}: {key[0]} @ {key[1]} already published, skipped")
+                outcomes.append(published[key])
+                continue
+            try:
+                outcomes.extend(self.handler(request) or [])
+            except Exception as e:
+                logger.error(f"task {task_id}: {key[0]} @ {key[1]} failed: {e!r}\n{traceback.format_exc()}")
+                outcomes.append(publish_outcome(*key, False, repr(e)))
+        return outcomes
+
+    def _heartbeat_loop(self):
+        while not self._stop.is_set() or self._running:
+            with self._running_lock:
+                running = list(self._running.items())
+            for task_id, worker_id in running:
+                try:
+                    if not self.store.heartbeat(task_id, worker_id, self.lease_seconds):
+                        logger.warning(f"task {task_id}: lease lost, another worker may run it again")
+                except Exception as e:
+                    logger.warning(f"task {task_id}: heartbeat failed: {e!r}")
+            time.sleep(self.lease_seconds / 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="claim publish tasks from the shared task queue and run them")
+    parser.add_argument("--store", default=TASK_STORE_URL, help="task store url, default $SAU_TASK_STORE")
+    parser.add_argument("--concurrency", type=int, default=1, help="tasks running at the same time")
+    parser.add_argument("--types", type=int, nargs="*", help="only claim these platform types (1-5)")
+    parser.add_argument("--lease", type=int, default=DEFAULT_LEASE_SECONDS, help="lease seconds")
+    args = parser.parse_args()
+    if not args.store:
+        parser.error("--store or SAU_TASK_STORE is required")
+
+    worker = PublishWorker(open_task_store(args.store), args.concurrency, args.types, args.lease)
+
+    def handle_signal(signum, frame):
+        logger.info("stopping, waiting for running tasks to finish")
+        worker.stop()
+
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+    # 采样浏览器内存、清理崩溃任务遗留的浏览器进程
+    MemoryWatchdog().start_thread()
+    worker.run()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,4 +1,3 @@
-import asyncio
 import os
 import sqlite3
 import threading
@@ -7,13 +6,21 @@ import uuid
 from pathlib import Path
 from queue import Queue
 from flask_cors import CORS
-from myUtils.auth import check_cookie
 from flask import Flask, request, jsonify, Response, render_template, send_from_directory
 from conf import BASE_DIR
-from myUtils.login import get_tencent_cookie, douyin_cookie_gen, get_ks_cookie, xiaohongshu_cookie_gen
-from myUtils.postVideo import post_video_tencent, post_video_DouYin, post_video_ks, post_video_xhs
+from myUtils.postVideo import bilibili_executor, failed_outcomes, post_video_request, split_post_video_request, \
+    submit_post_video_bilibili
+from utils.blocking_executor import ExecutorFullError
+from utils.bandwidth import BANDWIDTH
+from utils.metrics import REGISTRY
+# 各平台的发布、扫码登录、cookie 校验按 type 注册，第一次用到时才导入对应模块
+from utils.plugins import load_platform
+from utils.session_store import SESSIONS
+from utils.task_queue import TASK_STORE_URL, open_task_store
 
 active_queues = {}
+# SAU_KEEPALIVE=1 时后台定时刷新所有账号的登录态（myUtils/keepalive.py），见 /sessionHealth
+session_keepalive = None
 app = Flask(__name__)
 
 #允许所有来源跨域访问
@@ -40,6 +47,11 @@ def favicon(filename):
 def index():  # put application's code here
     return send_from_directory(current_dir, 'index.html')
 
+# Prometheus 指标：上传各阶段耗时、cookie 校验、扫码登录
+@app.route('/metrics')
+def metrics():
+    return Response(REGISTRY.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/upload', methods=['POST'])
 def upload_file():
     if 'file' not in request.files:
@@ -229,7 +241,8 @@ async def getValidAccounts():
         for row in rows:
             print(row)
         for row in rows_list:
-            flag = await check_cookie(row[1],row[2])
+            cookie_auth = load_platform(row[1], "cookie_check")
+            flag = cookie_auth is not None and await cookie_auth(Path(BASE_DIR / "cookiesFile" / row[2]))
             if not flag:
                 row[4] = 0
                 cursor.execute('''
@@ -381,49 +394,75 @@ def postVideo():
     # 获取JSON数据
     data = request.get_json()
 
-    # 从JSON数据中提取fileList和accountList
-    file_list = data.get('fileList', [])
-    account_list = data.get('accountList', [])
-    type = data.get('type')
-    title = data.get('title')
-    tags = data.get('tags')
-    category = data.get('category')
-    enableTimer = data.get('enableTimer')
-    if category == 0:
-        category = None
-    productLink = data.get('productLink', '')
-    productTitle = data.get('productTitle', '')
-    thumbnail_path = data.get('thumbnail', '')
-    is_draft = data.get('isDraft', False)  # 新增参数：是否保存为草稿
-
-    videos_per_day = data.get('videosPerDay')
-    daily_times = data.get('dailyTimes')
-    start_days = data.get('startDays')
     # 打印获取到的数据（仅作为示例）
-    print("File List:", file_list)
-    print("Account List:", account_list)
-    match type:
-        case 1:
-            post_video_xhs(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                               start_days)
-        case 2:
-            post_video_tencent(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                               start_days, is_draft)
-        case 3:
-            post_video_DouYin(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                      start_days, thumbnail_path, productLink, productTitle)
-        case 4:
-            post_video_ks(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                      start_days)
+    print("File List:", data.get('fileList', []))
+    print("Account List:", data.get('accountList', []))
+    if TASK_STORE_URL:
+        # worker 模式：按 (文件, 账号) 拆分入队，由 myUtils/worker.py 领取执行，进度见 /publishTasks
+        return jsonify({"code": 200, "msg": None, "data": {"taskIds": enqueue_post_video(data)}}), 200
+    if data.get('type') == 5:
+        # b 站在后台线程池上传，不占住请求；进度和结果见 /uploadJobs
+        try:
+            job_ids = submit_post_video_bilibili(data)
+        except ExecutorFullError as e:
+            return jsonify({"code": 503, "msg": str(e), "data": None}), 503
+        return jsonify({"code": 200, "msg": None, "data": {"jobIds": job_ids}}), 200
+    outcomes = post_video_request(data)
+    failed = failed_outcomes(outcomes)
+    if failed:
+        # data 里是每个 (文件, 账号) 的结果，前端据此只重发失败的组合
+        return jsonify({"code": 500, "msg": f"{len(failed)}/{len(outcomes)} failed", "data": outcomes}), 500
     # 返回响应给客户端
     return jsonify(
         {
             "code": 200,
             "msg": None,
-            "data": None
+            "data": outcomes
         }), 200
 
 
+def enqueue_post_video(data):
+    store = open_task_store()
+    return [store.enqueue(data.get('type'), task_data) for task_data in split_post_video_request(data)]
+
+
+@app.route('/publishTasks', methods=['GET'])
+def publish_tasks():
+    """worker 模式下的发布任务，status 参数可选 queued / leased / done / failed"""
+    if not TASK_STORE_URL:
+        return jsonify({"code": 400, "msg": "task queue is not enabled (SAU_TASK_STORE)", "data": None}), 400
+    tasks = open_task_store().list_tasks(request.args.get('status'), int(request.args.get('limit', 100)))
+    return jsonify({"code": 200, "msg": None, "data": tasks}), 200
+
+
+@app.route('/uploadJobs', methods=['GET'])
+def upload_jobs():
+    """后台线程池中的上传任务及进度（目前为 b 站）"""
+    return jsonify({"code": 200, "msg": None, "data": bilibili_executor.jobs()}), 200
+
+
+@app.route('/uploadBandwidth', methods=['GET'])
+def upload_bandwidth():
+    """带宽调度：正在上传、排队中的视频及各自吞吐，总吞吐（字节/秒）"""
+    return jsonify({"code": 200, "msg": None, "data": BANDWIDTH.snapshot()}), 200
+
+
+@app.route('/sessionHealth', methods=['GET'])
+def session_health():
+    """账号登录态保活结果：state 为 alive / expired / error，needsLogin 为 True 的账号需要重新扫码登录"""
+    if session_keepalive is None:
+        return jsonify({"code": 400, "msg": "session keep-alive is not enabled (SAU_KEEPALIVE=1)", "data": None}), 400
+    return jsonify({"code": 200, "msg": None, "data": session_keepalive.status()}), 200
+
+
+@app.route('/cancelUploadJob', methods=['POST'])
+def cancel_upload_job():
+    job_id = request.args.get('id') or (request.get_json(silent=True) or {}).get('id')
+    if not job_id or not bilibili_executor.cancel(job_id):
+        return jsonify({"code": 404, "msg": "job not found or already finished", "data": None}), 404
+    return jsonify({"code": 200, "msg": "cancel requested", "data": None}), 200
+
+
 @app.route('/updateUserinfo', methods=['POST'])
 def updateUserinfo():
     # 获取JSON数据
@@ -467,6 +506,11 @@ def postVideoBatch():
 
     if not isinstance(data_list, list):
         return jsonify({"error": "Expected a JSON array"}), 400
+    if TASK_STORE_URL:
+        # 与下面直接发布保持一致：批量接口不发布小红书
+        task_ids = [task_id for data in data_list if data.get('type') != 1 for task_id in enqueue_post_video(data)]
+        return jsonify({"code": 200, "msg": None, "data": {"taskIds": task_ids}}), 200
+    outcomes = []
     for data in data_list:
         # 从JSON数据中提取fileList和accountList
         file_list = data.get('fileList', [])
@@ -487,18 +531,28 @@ def postVideoBatch():
         # 打印获取到的数据（仅作为示例）
         print("File List:", file_list)
         print("Account List:", account_list)
+        post_video = load_platform(type, "post_video")
         match type:
             case 1:
                 return
             case 2:
-                post_video_tencent(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                                   start_days)
+                outcomes += post_video(title, file_list, tags, account_list, category, enableTimer, videos_per_day,
+                                       daily_times, start_days)
             case 3:
-                post_video_DouYin(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                          start_days, productLink, productTitle)
+                outcomes += post_video(title, file_list, tags, account_list, category, enableTimer, videos_per_day,
+                                       daily_times, start_days, productLink, productTitle)
             case 4:
-                post_video_ks(title, file_list, tags, account_list, category, enableTimer, videos_per_day, daily_times,
-                          start_days)
+                outcomes += post_video(title, file_list, tags, account_list, category, enableTimer, videos_per_day,
+                                       daily_times, start_days)
+            case 5:
+                # 与 /postVideo 一致：提交到后台线程池，不等待上传结束，结果见 /uploadJobs
+                try:
+                    submit_post_video_bilibili(data)
+                except ExecutorFullError as e:
+                    return jsonify({"code": 503, "msg": str(e), "data": None}), 503
+    failed = failed_outcomes(outcomes)
+    if failed:
+        return jsonify({"code": 500, "msg": f"{len(failed)}/{len(outcomes)} failed", "data": outcomes}), 500
     # 返回响应给客户端
     return jsonify(
         {
@@ -563,6 +617,8 @@ def upload_cookie():
         cookie_file_path.parent.mkdir(parents=True, exist_ok=True)
 
         file.save(str(cookie_file_path))
+        # 丢弃内存里的旧登录态和还没写盘的更新
+        SESSIONS.invalidate(cookie_file_path)
 
         # 更新数据库中的账号信息（可选，比如更新更新时间）
         # 这里可以根据需要添加额外的处理逻辑
@@ -612,6 +668,9 @@ def download_cookie():
                 "data": None
             }), 404
 
+        # 先写入内存中还没写盘的 cookie 更新
+        SESSIONS.flush(cookie_file_path)
+
         # 返回文件
         return send_from_directory(
             directory=str(cookie_file_path.parent),
@@ -630,27 +689,13 @@ def download_cookie():
 
 # 包装函数：在线程中运行异步函数
 def run_async_function(type,id,status_queue):
-    match type:
-        case '1':
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(xiaohongshu_cookie_gen(id, status_queue))
-            loop.close()
-        case '2':
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(get_tencent_cookie(id,status_queue))
-            loop.close()
-        case '3':
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(douyin_cookie_gen(id,status_queue))
-            loop.close()
-        case '4':
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(get_ks_cookie(id,status_queue))
-            loop.close()
+    # 1 小红书 2 视频号 3 抖音 4 快手，登录流程见 utils/plugins.py
+    login = load_platform(type, "login")
+    if login is None:
+        return
+    # 开启预热登录页时在登录页池的事件循环里执行，否则在当前线程新建事件循环
+    from myUtils.login_pool import LOGIN_POOL
+    LOGIN_POOL.submit(login(id, status_queue)).result()
 
 # SSE 流生成器函数
 def sse_stream(status_queue):
@@ -663,4 +708,14 @@ def sse_stream(status_queue):
             time.sleep(0.1)
 
 if __name__ == '__main__':
+    # 采样各任务浏览器的内存（/metrics 的 sau_browser_*），清理崩溃后遗留的浏览器进程
+    from utils.watchdog import MemoryWatchdog
+    MemoryWatchdog().start_thread()
+    # SAU_LOGIN_POOL_SIZE 大于 0 时每个平台预先打开扫码登录页，/login 立即拿到二维码；默认关闭，不启动线程和浏览器
+    from myUtils.login_pool import LOGIN_POOL
+    LOGIN_POOL.start()
+    if os.environ.get("SAU_KEEPALIVE") == "1":
+        from myUtils.keepalive import SessionKeepAlive
+        session_keepalive = SessionKeepAlive()
+        session_keepalive.start_thread()
     app.run(host='0.0.0.0' ,port=5409)
@@ -0,0 +1,9 @@
+"""
+单元测试不打开浏览器、不访问外网：python -m pytest tests
+和运行后端一样需要根目录的 conf.py（从 conf.example.py 复制）。
+"""
+import sys
+from pathlib import Path
+
+# 项目模块按根目录导入（from utils.xxx import ...），与 python sau_backend.py 的运行方式一致
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,103 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from utils import bandwidth
+from utils.bandwidth import AGING_SECONDS, BandwidthScheduler, RateMeter, URGENT_SECONDS
+
+MB = 1024 * 1024
+
+
+def _scheduler(**kwargs):
+    kwargs.setdefault("ramp_seconds", 0)
+    return BandwidthScheduler(**kwargs)
+
+
+def _cancelled():
+    event = threading.Event()
+    event.set()
+    return event
+
+
+def test_first_upload_is_admitted_immediately():
+    scheduler = _scheduler(uplink_mbps=1, min_rate_kb=10 * 1024)
+    ticket = scheduler.acquire("a.mp4", 100 * MB)
+    assert ticket is not None and scheduler.snapshot()["active"][0]["name"] == "a.mp4"
+
+
+def test_max_active_blocks_until_release():
+    scheduler = _scheduler(max_active=1)
+    first = scheduler.acquire("a.mp4", MB)
+    # 排不上时取消排队，返回 None，也不留在等待队列里
+    assert scheduler.acquire("b.mp4", MB, cancel_event=_cancelled()) is None
+    assert scheduler.snapshot()["waiting"] == []
+    first.release()
+    assert scheduler.acquire("b.mp4", MB) is not None
+
+
+def test_no_headroom_when_uplink_is_saturated():
+    # 上行 8Mbit/s = 1MB/s，已经跑满时不再放行
+    scheduler = _scheduler(uplink_mbps=8, min_rate_kb=512, window=30)
+    first = scheduler.acquire("a.mp4", 100 * MB)
+    first.add_bytes(30 * MB)
+    assert scheduler.acquire("b.mp4", MB, cancel_event=_cancelled()) is None
+    first.release()
+    assert scheduler.acquire("b.mp4", MB) is not None
+
+
+def test_ramp_blocks_next_admission():
+    scheduler = _scheduler(ramp_seconds=60)
+    scheduler.acquire("a.mp4", MB)
+    assert scheduler.acquire("b.mp4", MB, cancel_event=_cancelled()) is None
+
+
+def test_priority_urgent_and_small_first():
+    scheduler = _scheduler(max_active=1)
+    blocker = scheduler.acquire("blocker.mp4", MB)
+    later = datetime.now() + timedelta(seconds=URGENT_SECONDS * 4)
+    soon = datetime.now() + timedelta(seconds=URGENT_SECONDS / 2)
+    for name, size, publish_date in [("later_small.mp4", MB, later), ("now_big.mp4", 500 * MB, 0),
+                                     ("soon_small.mp4", MB, soon), ("now_small.mp4", 2 * MB, 0)]:
+        ticket, admitted = scheduler._enqueue(name, size, publish_date, "douyin")
+        assert not admitted
+    # 立即发布和临近发布的按大小排，远期定时的排最后
+    assert [t["name"] for t in scheduler.snapshot()["waiting"]] == [
+        "soon_small.mp4", "now_small.mp4", "now_big.mp4", "later_small.mp4"]
+    blocker.release()
+    with scheduler._cond:
+        admitted = [t.name for t in list(scheduler._waiting) if scheduler._try_admit(t)]
+    assert admitted == ["soon_small.mp4"]
+
+
+def test_waiting_large_file_ages_ahead():
+    scheduler = _scheduler(max_active=1)
+    scheduler.acquire("blocker.mp4", MB)
+    big = scheduler._enqueue("big.mp4", 64 * MB, 0, "douyin")[0]
+    small = scheduler._enqueue("small.mp4", MB, 0, "douyin")[0]
+    now = time.monotonic()
+    assert small.priority(now) < big.priority(now)
+    # 大文件已经等了 7 个 AGING_SECONDS，排序用的大小降到 1/128，排到刚来的小文件前面
+    big.enqueued_at -= AGING_SECONDS * 7
+    assert big.priority(now) < small.priority(now)
+
+
+def test_bytes_reported_at_completion_are_spread_over_elapsed(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(bandwidth.time, "monotonic", lambda: clock[0])
+    scheduler = _scheduler(window=30)
+    ticket = scheduler.acquire("a.mp4", 120 * MB)
+    clock[0] += 120
+    # 120 秒上传完 120MB，吞吐按 1MB/s 计，不是 120MB 一次落在 30 秒的窗口里（4MB/s）
+    ticket.add_bytes(120 * MB, elapsed=120)
+    snapshot = scheduler.snapshot()
+    assert snapshot["total_bytes"] == 120 * MB
+    assert snapshot["throughput_bytes_per_second"] == MB
+
+
+def test_rate_meter_window():
+    meter = RateMeter(window=10, started_at=0)
+    meter.add(100, now=1)
+    meter.add(100, now=5)
+    assert meter.rate(now=5) == 200 / 5
+    assert meter.rate(now=12) == 100 / 10
+    assert meter.rate(now=100) == 0
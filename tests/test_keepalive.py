@@ -0,0 +1,38 @@
+import time
+
+from myUtils.keepalive import SESSION_ALIVE, AccountSession, SessionKeepAlive, task_publish_at
+
+
+def _task(payload, available_at):
+    return {"payload": payload, "available_at": available_at}
+
+
+def test_task_publish_at_uses_scheduled_time():
+    now = time.time()
+    assert task_publish_at(_task({"fileList": ["a.mp4"], "publishDates": [now + 86400]}, now)) == now + 86400
+    # 有立即发布的文件时取可领取时间
+    assert task_publish_at(_task({"fileList": ["a.mp4", "b.mp4"], "publishDates": [now + 86400, 0]}, now)) == now
+
+
+def test_task_publish_at_computes_schedule_for_old_tasks():
+    now = time.time()
+    payload = {"fileList": ["a.mp4"], "enableTimer": True, "videosPerDay": 1, "dailyTimes": [10], "startDays": 1}
+    # 从后天开始定时，至少在 24 小时以后
+    assert task_publish_at(_task(payload, now)) > now + 24 * 3600
+    assert task_publish_at(_task({"fileList": ["a.mp4"]}, now)) == now
+
+
+def test_due_sessions_lead_window_and_order():
+    now = time.time()
+    keepalive = SessionKeepAlive(db_path=None, use_task_store=False, intervals={"douyin": 6 * 3600},
+                                 lead_seconds=2 * 3600)
+    for name, next_task_at in [("later", now + 86400), ("soon", now + 1800), ("idle", None)]:
+        session = AccountSession("douyin", f"cookies/{name}.json")
+        # 一小时前检查过，还没到保活间隔
+        session.state, session.checked_at = SESSION_ALIVE, now - 3600
+        session.checked_mtime = session.cookie_mtime()
+        session.next_task_at = next_task_at
+        keepalive.sessions[session.account_file] = session
+    # 只有发布时间在提前量以内的账号需要再检查
+    assert [s.name for s in keepalive.due_sessions(now)] == ["soon"]
+    assert [s.name for s in keepalive.due_sessions(now + 6 * 3600)] == ["soon", "later", "idle"]
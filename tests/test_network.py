@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+
+from utils import network
+from utils.network import POLL_RETRY_POLICY, CircuitBreaker, CircuitOpenError, RetryPolicy, async_retry, retry
+
+# 测试里不等待退避
+NO_DELAY = RetryPolicy(base_delay=0, max_delay=0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(network.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    """替换注册表里的 test 平台熔断器：2 次失败熔断，10 秒后半开"""
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=10)
+    monkeypatch.setitem(network._circuit_breakers, "test", breaker)
+    monkeypatch.setitem(network._retry_budgets, "test", network.RetryBudget())
+    return breaker
+
+
+def test_breaker_opens_after_failures_and_half_open_probe_closes_it(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, recovery_timeout=10)
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock[0] += 10
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # 半开时只放行一个探测请求
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_failed_half_open_probe_reopens(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=10)
+    breaker.before_call()
+    breaker.record_failure()
+    clock[0] += 10
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+def test_async_retry_shares_platform_breaker(clock, breaker):
+    calls = []
+
+    @async_retry(timeout=60, platform="test", policy=NO_DELAY)
+    async def flaky(fail):
+        calls.append(fail)
+        if fail:
+            raise ConnectionError("boom")
+        return "ok"
+
+    # 第二次失败触发熔断，不再等待重试，原样抛出
+    with pytest.raises(ConnectionError):
+        asyncio.run(flaky(True))
+    assert len(calls) == 2
+    assert breaker.state == CircuitBreaker.OPEN
+    # 同平台的其他调用直接被拒绝
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(flaky(False))
+    assert len(calls) == 2
+
+    clock[0] += 10
+    assert asyncio.run(flaky(False)) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_non_retryable_error_is_not_counted(breaker):
+    calls = []
+
+    @retry(platform="test", policy=NO_DELAY)
+    def bad_argument():
+        calls.append(1)
+        raise ValueError("bad")
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            bad_argument()
+    assert len(calls) == 3
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_sync_retry_stops_at_max_retries():
+    calls = []
+
+    @retry(max_retries=3, policy=NO_DELAY)
+    def always_fails():
+        calls.append(1)
+        raise ConnectionError("boom")
+
+    with pytest.raises(Exception, match="Failed after 3 retries"):
+        always_fails()
+    assert len(calls) == 3
+
+
+def test_poll_policy_delay_is_short():
+    assert all(POLL_RETRY_POLICY.delay(attempt) <= 2 for attempt in range(1, 20))
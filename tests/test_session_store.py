@@ -0,0 +1,85 @@
+import json
+import os
+import time
+
+from utils.session_store import SessionStore, merge_storage_state
+
+
+def _cookie(name, value, domain=".douyin.com", expires=-1):
+    return {"name": name, "value": value, "domain": domain, "path": "/", "expires": expires}
+
+
+def _write(path, state, mtime_ns=None):
+    path.write_text(json.dumps(state), encoding="utf-8")
+    if mtime_ns is not None:
+        # 文件系统的修改时间精度不一，测试里显式设置
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_merge_new_cookie_overrides_same_key():
+    old = {"cookies": [_cookie("sid", "old"), _cookie("sid", "other", domain=".toutiao.com")]}
+    new = {"cookies": [_cookie("sid", "new"), _cookie("ttwid", "1")]}
+    merged = {(c["name"], c["domain"]): c["value"] for c in merge_storage_state(old, new)["cookies"]}
+    assert merged == {("sid", ".douyin.com"): "new", ("sid", ".toutiao.com"): "other", ("ttwid", ".douyin.com"): "1"}
+
+
+def test_merge_drops_expired_cookies_and_keeps_session_cookies():
+    new = {"cookies": [_cookie("gone", "1", expires=time.time() - 10), _cookie("session", "1", expires=-1),
+                       _cookie("alive", "1", expires=time.time() + 3600)]}
+    assert sorted(c["name"] for c in merge_storage_state(None, new)["cookies"]) == ["alive", "session"]
+
+
+def test_merge_local_storage_by_origin_and_name():
+    old = {"origins": [{"origin": "https://a.com", "localStorage": [{"name": "k1", "value": "1"},
+                                                                      {"name": "k2", "value": "1"}]}]}
+    new = {"origins": [{"origin": "https://a.com", "localStorage": [{"name": "k2", "value": "2"}]},
+                       {"origin": "https://b.com", "localStorage": [{"name": "k", "value": "b"}]}]}
+    origins = {o["origin"]: {i["name"]: i["value"] for i in o["localStorage"]}
+               for o in merge_storage_state(old, new)["origins"]}
+    assert origins == {"https://a.com": {"k1": "1", "k2": "2"}, "https://b.com": {"k": "b"}}
+
+
+def test_get_is_cached_until_file_changes(tmp_path):
+    account_file = tmp_path / "douyin_a.json"
+    _write(account_file, {"cookies": [_cookie("sid", "1")]}, mtime_ns=1_000_000_000)
+    store = SessionStore(flush_delay=0)
+    first = store.get(account_file)
+    assert store.get(account_file) is first and store.reads == 1
+    # 扫码登录等外部写入：修改时间变了，重新读取
+    _write(account_file, {"cookies": [_cookie("sid", "2")]}, mtime_ns=2_000_000_000)
+    assert store.get(account_file)["cookies"][0]["value"] == "2" and store.reads == 2
+
+
+def test_update_merges_and_writes_through(tmp_path):
+    account_file = tmp_path / "douyin_a.json"
+    _write(account_file, {"cookies": [_cookie("sid", "1"), _cookie("ttwid", "1")]}, mtime_ns=1_000_000_000)
+    store = SessionStore(flush_delay=0)
+    store.update(account_file, {"cookies": [_cookie("sid", "2")]})
+    on_disk = {c["name"]: c["value"] for c in json.loads(account_file.read_text(encoding="utf-8"))["cookies"]}
+    assert on_disk == {"sid": "2", "ttwid": "1"} and store.writes == 1
+    # 自己写的文件不触发重新读取
+    store.get(account_file)
+    assert store.reads == 1
+
+
+def test_pending_update_dropped_when_file_changed_on_disk(tmp_path):
+    account_file = tmp_path / "douyin_a.json"
+    _write(account_file, {"cookies": [_cookie("sid", "1")]}, mtime_ns=1_000_000_000)
+    store = SessionStore(flush_delay=60)
+    store.update(account_file, {"cookies": [_cookie("sid", "stale")]})
+    # 延迟写盘之前重新登录写入了新文件，以文件为准
+    _write(account_file, {"cookies": [_cookie("sid", "relogin")]}, mtime_ns=2_000_000_000)
+    store.flush(account_file)
+    assert json.loads(account_file.read_text(encoding="utf-8"))["cookies"][0]["value"] == "relogin"
+    assert store.writes == 0
+    assert store.get(account_file)["cookies"][0]["value"] == "relogin"
+
+
+def test_invalidate_forces_reread(tmp_path):
+    account_file = tmp_path / "douyin_a.json"
+    _write(account_file, {"cookies": []}, mtime_ns=1_000_000_000)
+    store = SessionStore(flush_delay=0)
+    store.get(account_file)
+    store.invalidate(account_file)
+    store.get(account_file)
+    assert store.reads == 2
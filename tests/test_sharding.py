@@ -0,0 +1,64 @@
+import os
+
+from utils import sharding
+from utils.engine import JOB_FAILED, JOB_SKIPPED, JOB_SUCCESS, UploadJob
+from utils.sharding import HashRing, run_jobs_sharded, shard_jobs
+
+
+def _job(index, account):
+    return UploadJob(index, "douyin", account, f"cookies/douyin_{account}.json", f"videos/{index}.mp4")
+
+
+def test_hash_ring_is_sticky():
+    ring = HashRing(range(4))
+    keys = [f"cookies/douyin_{i}.json" for i in range(200)]
+    nodes = [ring.get_node(key) for key in keys]
+    # 同一个 key 每次（包括新建的环）都落在同一个节点
+    assert nodes == [HashRing(range(4)).get_node(key) for key in keys]
+    assert set(nodes) == {0, 1, 2, 3}
+
+
+def test_hash_ring_moves_few_keys_when_adding_node():
+    keys = [f"cookies/douyin_{i}.json" for i in range(1000)]
+    ring = HashRing(range(4))
+    before = {key: ring.get_node(key) for key in keys}
+    ring.add_node(4)
+    moved = [key for key in keys if ring.get_node(key) != before[key]]
+    # 只有新节点接手的 key 换节点，约 1/5
+    assert all(ring.get_node(key) == 4 for key in moved)
+    assert 100 < len(moved) < 300
+    ring.remove_node(4)
+    assert {key: ring.get_node(key) for key in keys} == before
+
+
+def test_shard_jobs_keeps_account_together_and_order():
+    jobs = [_job(i, f"user{i % 5}") for i in range(20)]
+    buckets = shard_jobs(jobs, 3)
+    for bucket in buckets:
+        assert [job.index for job in bucket] == sorted(job.index for job in bucket)
+    shard_of = {}
+    for shard, bucket in enumerate(buckets):
+        for job in bucket:
+            assert shard_of.setdefault(job.account, shard) == shard
+
+
+def _fake_run_shard(shard, jobs, max_workers, platform_concurrency):
+    # 在 spawn 出来的子进程里执行；带 crash 账号的分片模拟进程被杀
+    if any(job.account == "crash" for job in jobs):
+        os._exit(1)
+    for job in jobs:
+        job.status = JOB_SUCCESS
+    return jobs
+
+
+def test_crashed_shard_does_not_abort_others(monkeypatch):
+    monkeypatch.setattr(sharding, "_run_shard", _fake_run_shard)
+    ring = HashRing(range(2))
+    crash_shard = ring.get_node("cookies/douyin_crash.json")
+    other = next(f"user{i}" for i in range(100) if ring.get_node(f"cookies/douyin_user{i}.json") != crash_shard)
+    skipped = _job(2, other)
+    skipped.skip("duplicate")
+    jobs = run_jobs_sharded([_job(0, "crash"), _job(1, other), skipped], processes=2, max_workers=1)
+    assert jobs[0].status == JOB_FAILED and "crashed" in jobs[0].error
+    assert jobs[1].status == JOB_SUCCESS
+    assert jobs[2].status == JOB_SKIPPED
@@ -0,0 +1,119 @@
+import pytest
+
+from myUtils.postVideo import publish_outcome, split_post_video_request
+from myUtils.worker import PublishWorker
+from utils import task_queue
+from utils.task_queue import TASK_DONE, TASK_FAILED, TASK_LEASED, TASK_QUEUED, SQLiteTaskStore, TaskStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    # 失败后立即可以重新领取
+    monkeypatch.setattr(task_queue, "RETRY_DELAY", 0)
+    return SQLiteTaskStore(tmp_path / "task_queue.db")
+
+
+def test_task_store_is_abstract():
+    with pytest.raises(TypeError):
+        TaskStore()
+
+
+def test_claim_in_order_and_only_once(store):
+    first = store.enqueue(3, {"n": 1})
+    second = store.enqueue(4, {"n": 2})
+    task = store.claim("w1")
+    assert task["id"] == first and task["status"] == TASK_LEASED and task["attempts"] == 1
+    assert task["payload"] == {"n": 1}
+    assert store.claim("w2")["id"] == second
+    assert store.claim("w3") is None
+
+
+def test_claim_platform_filter(store):
+    store.enqueue(3, {})
+    kuaishou = store.enqueue(4, {})
+    assert store.claim("w1", platform_types=[4])["id"] == kuaishou
+    assert store.claim("w1", platform_types=[4]) is None
+
+
+def test_expired_lease_is_claimed_by_another_worker(store):
+    task_id = store.enqueue(3, {})
+    store.claim("w1", lease_seconds=-1)
+    task = store.claim("w2")
+    assert task["id"] == task_id and task["lease_owner"] == "w2" and task["attempts"] == 2
+    # 原来的 worker 已经失去租约，结果不再写入
+    assert not store.heartbeat(task_id, "w1")
+    assert not store.complete(task_id, "w1", {"ok": True})
+    assert store.complete(task_id, "w2", {"ok": True})
+    assert store.get(task_id)["status"] == TASK_DONE
+
+
+def test_expired_lease_without_attempts_left_fails(store):
+    task_id = store.enqueue(3, {}, max_attempts=1)
+    store.claim("w1", lease_seconds=-1)
+    assert store.claim("w2") is None
+    task = store.get(task_id)
+    assert task["status"] == TASK_FAILED and task["error"] == "lease expired"
+
+
+def test_fail_retries_until_max_attempts(store):
+    task_id = store.enqueue(3, {}, max_attempts=2)
+    store.claim("w1")
+    assert store.fail(task_id, "w1", "boom", result={"outcomes": [1]})
+    task = store.get(task_id)
+    assert task["status"] == TASK_QUEUED and task["result"] == {"outcomes": [1]}
+    store.claim("w1")
+    # 不传 result 时保留上一次的
+    assert store.fail(task_id, "w1", "boom again")
+    task = store.get(task_id)
+    assert task["status"] == TASK_FAILED and task["error"] == "boom again" and task["result"] == {"outcomes": [1]}
+
+
+def test_release_does_not_count_attempt(store):
+    task_id = store.enqueue(3, {})
+    store.claim("w1")
+    assert store.release(task_id, "w1")
+    assert store.claim("w2")["attempts"] == 1
+
+
+def test_split_by_file_and_account_keeps_schedule():
+    data = {"type": 3, "fileList": ["a.mp4", "b.mp4"], "accountList": ["x.json", "y.json"],
+            "enableTimer": True, "videosPerDay": 1, "dailyTimes": [10], "startDays": 0}
+    requests = split_post_video_request(data)
+    assert [(r["fileList"], r["accountList"]) for r in requests] == [
+        (["a.mp4"], ["x.json"]), (["a.mp4"], ["y.json"]), (["b.mp4"], ["x.json"]), (["b.mp4"], ["y.json"])]
+    # 第二个文件排在后一天，同一个文件的各账号时间相同
+    dates = [r["publishDates"][0] for r in requests]
+    assert dates[0] == dates[1] and dates[2] == dates[3] and dates[2] - dates[0] == 86400
+
+
+def test_worker_retry_skips_published_files(store):
+    calls = []
+
+    def handler(request):
+        file, account = request["fileList"][0], request["accountList"][0]
+        calls.append(file)
+        # b.mp4 第一次失败
+        return [publish_outcome(file, account, file != "b.mp4" or calls.count(file) > 1)]
+
+    task_id = store.enqueue(3, {"type": 3, "fileList": ["a.mp4", "b.mp4"], "accountList": ["x.json"]})
+    worker = PublishWorker(store, handler=handler)
+    worker.run_task(store.claim("w1"), "w1")
+    task = store.get(task_id)
+    assert task["status"] == TASK_QUEUED and "b.mp4 @ x.json" in task["error"]
+
+    worker.run_task(store.claim("w1"), "w1")
+    task = store.get(task_id)
+    assert calls == ["a.mp4", "b.mp4", "b.mp4"]
+    assert task["status"] == TASK_DONE
+    assert [(o["file"], o["success"]) for o in task["result"]["outcomes"]] == [("a.mp4", True), ("b.mp4", True)]
+
+
+def test_worker_fails_on_handler_exception(store):
+    def handler(request):
+        raise RuntimeError("browser crashed")
+
+    task_id = store.enqueue(3, {"type": 3, "fileList": ["a.mp4"], "accountList": ["x.json"]}, max_attempts=1)
+    PublishWorker(store, handler=handler).run_task(store.claim("w1"), "w1")
+    task = store.get(task_id)
+    assert task["status"] == TASK_FAILED and "browser crashed" in task["error"]
+    assert task["result"]["outcomes"][0]["success"] is False
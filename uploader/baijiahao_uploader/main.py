@@ -2,15 +2,18 @@
 import random
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright, Page
+from playwright.async_api import Playwright, async_playwright, Page, TimeoutError as PlaywrightTimeoutError
 import os
 import time
 import asyncio
 
 from conf import LOCAL_CHROME_PATH, LOCAL_CHROME_HEADLESS
-from utils.base_social_media import set_init_script
+from utils.base_social_media import set_init_script, set_route_filter, goto_platform_page, SOCIAL_MEDIA_BAIJIAHAO
+from utils.bandwidth import set_video_files
 from utils.log import baijiahao_logger
-from utils.network import async_retry
+from utils.metrics import fixed_sleep, track_cookie_check, track_upload_job
+from utils.session_store import SESSIONS, save_context_state
+from utils.network import async_retry, POLL_RETRY_POLICY
 
 
 async def baijiahao_cookie_gen(account_file):
@@ -35,11 +38,13 @@ async def baijiahao_cookie_gen(account_file):
         baijiahao_logger.success("cookie saved")
 
 
+@track_cookie_check(SOCIAL_MEDIA_BAIJIAHAO)
 async def cookie_auth(account_file):
     async with async_playwright() as playwright:
         browser = await playwright.chromium.launch(headless=LOCAL_CHROME_HEADLESS)
-        context = await browser.new_context(storage_state=account_file)
+        context = await browser.new_context(storage_state=SESSIONS.get(account_file))
         context = await set_init_script(context)
+        context = await set_route_filter(context, SOCIAL_MEDIA_BAIJIAHAO, block_resources=True)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -90,9 +95,11 @@ class BaiJiaHaoVideo(object):
             except:
                 await page.locator('div.select-wrap').nth(0).click()
         # page.locator(f'div.rc-virtual-list-holder-inner >> text={publish_date_day}').click()
-        await page.wait_for_timeout(2000)
-        await page.locator(f'div.rc-virtual-list  div.cheetah-select-item >> text={publish_date_day}').click()
-        await page.wait_for_timeout(2000)
+        day_option = page.locator(f'div.rc-virtual-list  div.cheetah-select-item >> text={publish_date_day}').first
+        await day_option.wait_for(state="visible")
+        await day_option.click()
+        # 等日期下拉框收起，再打开小时下拉框
+        await self.wait_dropdown_closed(page)
 
         # 改为随机点击一个 hour
         for _ in range(3):
@@ -102,41 +109,49 @@ class BaiJiaHaoVideo(object):
                 break
             except:
                 await page.locator('div.select-wrap').nth(1).click()
-        await page.wait_for_timeout(2000)
-        current_choice_hour = await page.locator('div.rc-virtual-list:visible div.cheetah-select-item-option').count()
-        await page.wait_for_timeout(2000)
-        await page.locator('div.rc-virtual-list:visible div.cheetah-select-item-option').nth(
-            random.randint(1, current_choice_hour-3)).click()
+        # 等小时选项渲染出来再计数
+        hour_options = page.locator('div.rc-virtual-list:visible div.cheetah-select-item-option')
+        await hour_options.first.wait_for(state="visible")
+        current_choice_hour = await hour_options.count()
+        await hour_options.nth(random.randint(1, current_choice_hour-3)).click()
         # 2024.08.05 current_choice_hour的获取可能有问题，页面有7，这里获取了10，暂时硬编码至6
 
-        await page.wait_for_timeout(2000)
+        await self.wait_dropdown_closed(page)
         await page.locator("button >> text=定时发布").click()
 
+    async def wait_dropdown_closed(self, page):
+        try:
+            await page.locator('div.rc-virtual-list:visible').first.wait_for(state="hidden", timeout=5000)
+        except PlaywrightTimeoutError:
+            baijiahao_logger.debug("下拉框未收起，继续")
 
     async def handle_upload_error(self, page):
         # 日后实现，目前没遇到
         return
-        print("视频出错了，重新上传中")
+        baijiahao_logger.error("视频出错了，重新上传中")
 
+    @track_upload_job(SOCIAL_MEDIA_BAIJIAHAO)
     async def upload(self, playwright: Playwright) -> None:
         # 使用 Chromium 浏览器启动一个浏览器实例
         browser = await playwright.chromium.launch(headless=self.headless, executable_path=self.local_executable_path, proxy=self.proxy_setting)
         # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(storage_state=f"{self.account_file}", user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.4324.150 Safari/537.36')
+        context = await browser.new_context(storage_state=SESSIONS.get(self.account_file), user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.4324.150 Safari/537.36')
         # context = await set_init_script(context)
+        context = await set_route_filter(context, SOCIAL_MEDIA_BAIJIAHAO)
         await context.grant_permissions(['geolocation'])
 
         # 创建一个新的页面
         page = await context.new_page()
+        self.job_metrics.phase("navigation")
         # 访问指定的 URL
-        await page.goto("https://baijiahao.baidu.com/builder/rc/edit?type=videoV2", timeout=60000)
+        await goto_platform_page(page, "https://baijiahao.baidu.com/builder/rc/edit?type=videoV2", SOCIAL_MEDIA_BAIJIAHAO, timeout=60000)
         baijiahao_logger.info(f"正在上传-------{self.title}.mp4")
         # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
         baijiahao_logger.info('正在打开主页...')
         await page.wait_for_url("https://baijiahao.baidu.com/builder/rc/edit?type=videoV2", timeout=60000)
 
         # 点击 "上传视频" 按钮
-        await page.locator("div[class^='video-main-container'] input").set_input_files(self.file_path)
+        await set_video_files(page.locator("div[class^='video-main-container'] input"), self.file_path, self.publish_date)
 
         # 等待页面跳转到指定的 URL
         while True:
@@ -150,15 +165,18 @@ class BaiJiaHaoVideo(object):
 
         # 填充标题和话题
         # 这里为了避免页面变化，故使用相对位置定位：作品标题父级右侧第一个元素的input子元素
-        await asyncio.sleep(1)
+        self.job_metrics.phase("metadata")
+        await fixed_sleep(1)
         baijiahao_logger.info("正在填充标题和话题...")
         await self.add_title_tags(page)
 
+        self.job_metrics.phase("file_transfer")
         upload_status = await self.uploading_video(page)
         if not upload_status:
             baijiahao_logger.error(f"发现上传出错了... 文件:{self.file_path}")
             raise
 
+        self.job_metrics.phase("processing")
         # 判断视频封面图是否生成成功
         while True:
             baijiahao_logger.info("正在确认封面完成, 准备去点击定时/发布...")
@@ -169,23 +187,25 @@ class BaiJiaHaoVideo(object):
                 baijiahao_logger.info("等待封面生成...")
                 await asyncio.sleep(3)
 
+        self.job_metrics.phase("publish")
         await self.publish_video(page, self.publish_date)
-        await page.wait_for_timeout(2000)
+        await fixed_sleep(2)
         if await page.locator('div.passMod_dialog-container >> text=百度安全验证:visible').count():
             baijiahao_logger.error("出现验证，退出")
             raise Exception("出现验证，退出")
         await page.wait_for_url("https://baijiahao.baidu.com/builder/rc/clue**", timeout=5000)
         baijiahao_logger.success("视频发布成功")
 
-        await context.storage_state(path=self.account_file)  # 保存cookie
+        self.job_metrics.phase("teardown")
+        await save_context_state(context, self.account_file)  # 保存cookie
         baijiahao_logger.info('cookie更新完毕！')
-        await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
+        await fixed_sleep(2)  # 这里延迟是为了方便眼睛直观的观看
         # 关闭浏览器上下文和浏览器实例
         await context.close()
         await browser.close()
 
 
-    @async_retry(timeout=300)  # 例如，最多重试3次，超时时间为180秒
+    @async_retry(timeout=300, policy=POLL_RETRY_POLICY)  # 页面内的等待：重试间隔不超过 2 秒，总超时 300 秒，不计入平台熔断
     async def uploading_video(self, page):
         while True:
             upload_failed = await page.locator('div .cover-overlay:has-text("上传失败")').count()
@@ -212,7 +232,6 @@ class BaiJiaHaoVideo(object):
             try:
                 await schedule_element.click()
                 await page.wait_for_selector('div.select-wrap:visible', timeout=3000)
-                await page.wait_for_timeout(timeout=2000)
                 baijiahao_logger.info("开始点击发布定时...")
                 await self.set_schedule_time(page, publish_date)
                 break
@@ -220,7 +239,7 @@ class BaiJiaHaoVideo(object):
                 baijiahao_logger.error(f"定时发布失败: {e}")
                 raise  # 重新抛出异常，让重试装饰器捕获
 
-    @async_retry(timeout=300)  # 例如，最多重试3次，超时时间为180秒
+    @async_retry(timeout=300, policy=POLL_RETRY_POLICY)  # 页面内的等待：重试间隔不超过 2 秒，总超时 300 秒，不计入平台熔断
     async def publish_video(self, page: Page, publish_date):
         if publish_date != 0:
             # 定时发布
@@ -257,7 +276,7 @@ class BaiJiaHaoVideo(object):
         # 创建一个浏览器上下文，使用指定的 cookie 文件
         context = await browser.new_context(
             viewport={"width": 1600, "height": 900},
-            storage_state=f"{self.account_file}",
+            storage_state=SESSIONS.get(self.account_file),
             user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.4324.150 Safari/537.36'
         )
         # context = await set_init_script(context)
@@ -318,7 +337,7 @@ class BaiJiaHaoVideo(object):
                 )
 
                 if is_processed:
-                    print(f"[跳过] {title}")
+                    baijiahao_logger.info(f"[跳过] {title}")
                     continue
 
                 # 悬停显示按钮（根据HTML结构，按钮在悬停时显示）
@@ -327,14 +346,14 @@ class BaiJiaHaoVideo(object):
                 # 点击生成文案按钮
                 button = item.locator('button:has-text("生成文案")')
                 await button.click()
-                print(f"[点击] {title}")
+                baijiahao_logger.info(f"[点击] {title}")
 
                 # 等待30秒
                 # await page.wait_for_timeout(30000)
-                print(f"[等待完成] {title}")
+                baijiahao_logger.info(f"[等待完成] {title}")
                 
                 # 监听"一键成片"按钮
-                print(f"[开始监听] 一键成片按钮")
+                baijiahao_logger.info(f"[开始监听] 一键成片按钮")
                 should_exit_while_loop = False  # 添加标志变量
                 while True:
                     # 定位"一键成片"按钮
@@ -347,18 +366,18 @@ class BaiJiaHaoVideo(object):
                         
                         if is_disabled is None:
                             # 按钮不再被禁用，点击它
-                            print(f"[发现可点击按钮] 一键成片")
+                            baijiahao_logger.info(f"[发现可点击按钮] 一键成片")
                             await one_key_button.click()  # 先点击一键成片按钮
                             
                             # 等待可能出现的"温馨提示"窗口
-                            print(f"[检查] 是否出现温馨提示窗口")
+                            baijiahao_logger.info(f"[检查] 是否出现温馨提示窗口")
                             await page.wait_for_timeout(2000)  # 等待2秒，让窗口有时间显示
                             
                             try:
                                 # 检查是否存在"温馨提示"窗口，设置较短的超时时间
                                 tip_window = page.locator("div:has-text('温馨提示') >> visible=true")
                                 if await tip_window.count() > 0:
-                                    print(f"[发现] 温馨提示窗口")
+                                    baijiahao_logger.info(f"[发现] 温馨提示窗口")
                                     
                                     # 定位并点击"知道了"按钮，设置较短的超时时间
                                     know_button = page.locator("button:has-text('知道了')")
@@ -366,19 +385,19 @@ class BaiJiaHaoVideo(object):
                                         try:
                                             # 设置较短的超时时间进行点击
                                             await know_button.click(timeout=5000)
-                                            print(f"[已点击] 知道了按钮")
+                                            baijiahao_logger.info(f"[已点击] 知道了按钮")
                                         except Exception as e:
-                                            print(f"[警告] 点击知道了按钮时出错: {str(e)}")
+                                            baijiahao_logger.warning(f"[警告] 点击知道了按钮时出错: {str(e)}")
                                     else:
-                                        print(f"[警告] 未找到知道了按钮")
+                                        baijiahao_logger.warning(f"[警告] 未找到知道了按钮")
                                 else:
-                                    print(f"[信息] 未出现温馨提示窗口，继续执行")
+                                    baijiahao_logger.info(f"[信息] 未出现温馨提示窗口，继续执行")
                             except Exception as e:
-                                print(f"[警告] 处理温馨提示窗口时出错: {str(e)}")
+                                baijiahao_logger.warning(f"[警告] 处理温馨提示窗口时出错: {str(e)}")
                                 # 继续执行，不要因为这个错误中断流程
                                 
                             # 记录到LocalStorage前打印日志
-                            print(f"[开始记录] 准备将标题 '{title}' 记录到LocalStorage")
+                            baijiahao_logger.info(f"[开始记录] 准备将标题 '{title}' 记录到LocalStorage")
                             
                             # 记录到LocalStorage
                             await page.evaluate(
@@ -403,12 +422,12 @@ class BaiJiaHaoVideo(object):
                             )
                             
                             # 记录完成后打印日志
-                            print(f"[记录完成] 标题 '{title}' 已成功记录到LocalStorage")
+                            baijiahao_logger.info(f"[记录完成] 标题 '{title}' 已成功记录到LocalStorage")
 
-                            print(f"[记录完成] {title}")
+                            baijiahao_logger.info(f"[记录完成] {title}")
                             
                             # 监听新打开的标签页
-                            print(f"[监听] 等待新标签页打开")
+                            baijiahao_logger.info(f"[监听] 等待新标签页打开")
                             # 获取当前所有页面
                             current_pages = context.pages
                             current_page_count = len(current_pages)
@@ -425,7 +444,7 @@ class BaiJiaHaoVideo(object):
                                 if len(pages) > current_page_count:
                                     # 获取最新打开的页面（通常是列表中的最后一个）
                                     new_page = pages[-1]
-                                    print(f"[发现] 新标签页已打开")
+                                    baijiahao_logger.info(f"[发现] 新标签页已打开")
                                     break
                                 # 短暂等待后再次检查
                                 await asyncio.sleep(0.5)
@@ -439,33 +458,33 @@ class BaiJiaHaoVideo(object):
                                     page_title = await new_page.title()
                                     page_url = new_page.url
                                     
-                                    print(f"[获取] 标题: {page_title}")
-                                    print(f"[获取] URL: {page_url}")
+                                    baijiahao_logger.info(f"[获取] 标题: {page_title}")
+                                    baijiahao_logger.info(f"[获取] URL: {page_url}")
                                     
                                     # 将标题和URL保存到url.txt文件
                                     with open("url.txt", "a", encoding="utf-8") as f:
                                         f.write(f"{page_title}\n{page_url}\n\n")
                                     
-                                    print(f"[保存] 标题和URL已保存到url.txt")
+                                    baijiahao_logger.info(f"[保存] 标题和URL已保存到url.txt")
                                     
                                     # 等待5秒后关闭新标签页
-                                    print(f"[等待] 5秒后将关闭新标签页")
+                                    baijiahao_logger.info(f"[等待] 5秒后将关闭新标签页")
                                     await asyncio.sleep(5)
                                     await new_page.close()
-                                    print(f"[关闭] 新标签页已关闭")
+                                    baijiahao_logger.info(f"[关闭] 新标签页已关闭")
                                 except Exception as e:
-                                    print(f"[错误] 处理新标签页时出错: {str(e)}")
+                                    baijiahao_logger.error(f"[错误] 处理新标签页时出错: {str(e)}")
                                     try:
                                         # 尝试关闭页面，即使出错
                                         await new_page.close()
-                                        print(f"[关闭] 新标签页已关闭（出错后）")
+                                        baijiahao_logger.info(f"[关闭] 新标签页已关闭（出错后）")
                                     except:
                                         pass
                             else:
-                                print(f"[警告] 未检测到新标签页打开")
+                                baijiahao_logger.warning(f"[警告] 未检测到新标签页打开")
                             
                             # 跳出整个while循环
-                            print(f"[操作] 跳出所有循环，不再处理其他新闻")
+                            baijiahao_logger.info(f"[操作] 跳出所有循环，不再处理其他新闻")
                             should_exit_while_loop = True  # 设置标志变量
                             break  # 跳出while循环
                     
@@ -478,22 +497,22 @@ class BaiJiaHaoVideo(object):
                 
                 # 检查是否需要跳出for循环
                 if should_exit_while_loop:
-                    print(f"[操作] 跳出for循环，完全结束处理")
+                    baijiahao_logger.info(f"[操作] 跳出for循环，完全结束处理")
                     break  # 跳出for循环
             except Exception as e:
-                print(f"处理新闻时出错: {str(e)}")
+                baijiahao_logger.error(f"处理新闻时出错: {str(e)}")
                 continue
 
 
         # endregion 操作处
 
-        print(f"[循环完成] 准备关闭浏览器")
+        baijiahao_logger.info(f"[循环完成] 准备关闭浏览器")
 
         # 暂停 1000s
         await asyncio.sleep(1000)  # 这里延迟是为了方便眼睛直观的观看
 
         # 退出前保存 storage 信息
-        await context.storage_state(path=self.account_file)  # 保存cookie
+        await save_context_state(context, self.account_file)  # 保存cookie
         baijiahao_logger.info('cookie更新完毕！')
         await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
         # 关闭浏览器上下文和浏览器实例
@@ -0,0 +1,193 @@
+import json
+import math
+import os
+import re
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+
+from conf import BASE_DIR
+from utils.log import bilibili_logger
+
+# biliup upload_file(lines=...) 支持的 upos 线路及其探测地址
+UPLOAD_LINES = {
+    "bda": "//upos-cs-upcdnbda.bilivideo.com/OK",
+    "bda2": "//upos-cs-upcdnbda2.bilivideo.com/OK",
+    "ws": "//upos-cs-upcdnws.bilivideo.com/OK",
+    "qn": "//upos-cs-upcdnqn.bilivideo.com/OK",
+    "bldsa": "//upos-cs-upcdnbldsa.bilivideo.com/OK",
+    "tx": "//upos-cs-upcdntx.bilivideo.com/OK",
+    "txa": "//upos-cs-upcdntxa.bilivideo.com/OK",
+}
+PROBE_LIST_URL = "https://member.bilibili.com/preupload?r=probe"
+# 每条线路的探测包大小，太小时测到的主要是握手延迟
+PROBE_BYTES = 512 * 1024
+PROBE_TIMEOUT = 10
+# 同一网络下线路选择结果的缓存时间（秒）
+LINE_CACHE_TTL = 30 * 60
+LINE_CACHE_FILE = Path(BASE_DIR / "cookies" / "bilibili_uploader" / "line_cache.json")
+
+# b 站 upos 分块大小一般为 10MB，并发数不超过分块数
+UPLOAD_CHUNK_SIZE = 10 * 1024 * 1024
+MIN_UPLOAD_THREADS = 1
+MAX_UPLOAD_THREADS = 16
+# 还没有上传记录时，按文件大小给初始并发数：(文件大小上限, 并发数)
+DEFAULT_THREADS_BY_SIZE = [
+    (50 * 1024 * 1024, 2),
+    (500 * 1024 * 1024, 4),
+    (2 * 1024 * 1024 * 1024, 8),
+]
+DEFAULT_THREADS_LARGE = 12
+
+_cache_lock = threading.Lock()
+
+
+def get_network_id() -> str:
+    """
+    当前网络的标识：出口网卡的本机 IP（UDP connect 不会真的发包）。
+    换网络（家里/公司/热点）后 IP 通常会变化，线路需要重新测速。
+    """
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("223.5.5.5", 53))
+            return s.getsockname()[0]
+    except OSError:
+        return "unknown"
+
+
+def _load_cache() -> dict:
+    try:
+        with open(LINE_CACHE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache: dict):
+    LINE_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = LINE_CACHE_FILE.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_file, LINE_CACHE_FILE)
+
+
+def get_candidate_lines(session: requests.Session) -> dict:
+    """优先使用 b 站下发的线路列表，只保留 biliup 能指定的 upos 线路"""
+    try:
+        ret = session.get(PROBE_LIST_URL, timeout=5).json()
+        lines = {}
+        for line in ret.get("lines", []):
+            matched = re.search(r"upcdn=(\w+)", line.get("query", ""))
+            if line.get("os") == "upos" and matched and matched.group(1) in UPLOAD_LINES:
+                lines[matched.group(1)] = line.get("probe_url") or UPLOAD_LINES[matched.group(1)]
+        if lines:
+            return lines
+    except (requests.RequestException, ValueError) as e:
+        bilibili_logger.warning(f"[-] 获取上传线路列表失败，使用内置线路: {e}")
+    return dict(UPLOAD_LINES)
+
+
+def _probe_line(session, name, probe_url):
+    payload = bytes(PROBE_BYTES)
+    start = time.perf_counter()
+    try:
+        resp = session.post(f"https:{probe_url}", data=payload, timeout=PROBE_TIMEOUT)
+        cost = time.perf_counter() - start
+        if resp.status_code != 200:
+            return name, None
+    except requests.RequestException:
+        return name, None
+    return name, PROBE_BYTES / cost
+
+
+def probe_lines(lines=None) -> dict:
+    """所有候选线路并发测速，返回 {线路: 上行速度(bytes/s)}，失败的线路不在结果中"""
+    with requests.Session() as session:
+        session.headers["User-Agent"] = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 " \
+                                        "(KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36"
+        lines = lines or get_candidate_lines(session)
+        with ThreadPoolExecutor(max_workers=len(lines)) as executor:
+            results = list(executor.map(lambda item: _probe_line(session, *item), lines.items()))
+    speeds = {name: speed for name, speed in results if speed}
+    bilibili_logger.info("[-] 线路测速: " + ", ".join(f"{name} {speed / 1024 / 1024:.2f}MB/s"
+                                                   for name, speed in sorted(speeds.items(), key=lambda x: -x[1])))
+    return speeds
+
+
+def default_upload_threads(file_size) -> int:
+    for size_limit, threads in DEFAULT_THREADS_BY_SIZE:
+        if file_size <= size_limit:
+            return threads
+    return DEFAULT_THREADS_LARGE
+
+
+def clamp_upload_threads(threads, file_size) -> int:
+    chunks = max(1, math.ceil(file_size / UPLOAD_CHUNK_SIZE))
+    return max(MIN_UPLOAD_THREADS, min(threads, MAX_UPLOAD_THREADS, chunks))
+
+
+def select_upload_line(file_size, force_probe=False):
+    """
+    返回 (线路, 并发数)。
+    线路按网络缓存 LINE_CACHE_TTL 秒，过期或 force_probe 时重新测速；全部线路测速失败时返回 'AUTO' 交给 biliup 自己探测。
+    并发数优先使用上次上传后调整的值（见 record_upload_throughput），否则按文件大小估算。
+    """
+    network_id = get_network_id()
+    with _cache_lock:
+        entry = _load_cache().get(network_id)
+    if force_probe or not entry or time.time() - entry.get("probed_at", 0) > LINE_CACHE_TTL:
+        speeds = probe_lines()
+        if not speeds:
+            return "AUTO", clamp_upload_threads(default_upload_threads(file_size), file_size)
+        line = max(speeds, key=speeds.get)
+        with _cache_lock:
+            cache = _load_cache()
+            previous = cache.get(network_id, {})
+            entry = {
+                "line": line,
+                "probe_speed": speeds[line],
+                "probed_at": time.time(),
+            }
+            # 线路没变时保留上次调整过的并发数
+            if previous.get("line") == line and previous.get("threads"):
+                entry["threads"] = previous["threads"]
+            cache[network_id] = entry
+            _save_cache(cache)
+        bilibili_logger.info(f"[-] 选择上传线路 {line}")
+    threads = entry.get("threads") or default_upload_threads(file_size)
+    return entry["line"], clamp_upload_threads(threads, file_size)
+
+
+def record_upload_throughput(line, threads, file_size, seconds):
+    """
+    上传完成后记录实际速度，调整该网络下次使用的并发数：
+    - 每个连接的速度接近单连接测速值，说明上行带宽还没跑满，并发数翻倍
+    - 每个连接的速度不到测速值一半，说明连接之间在抢带宽，并发数降到 3/4
+    分块数少于 4 的小文件不参与调整。
+    """
+    if seconds <= 0 or file_size < 4 * UPLOAD_CHUNK_SIZE:
+        return
+    network_id = get_network_id()
+    throughput = file_size / seconds
+    with _cache_lock:
+        cache = _load_cache()
+        entry = cache.get(network_id)
+        if not entry or entry.get("line") != line:
+            return
+        per_connection = throughput / threads
+        probe_speed = entry.get("probe_speed") or per_connection
+        next_threads = threads
+        if per_connection >= probe_speed * 0.8:
+            next_threads = threads * 2
+        elif per_connection < probe_speed * 0.5:
+            next_threads = int(threads * 0.75)
+        entry["threads"] = max(MIN_UPLOAD_THREADS, min(next_threads, MAX_UPLOAD_THREADS))
+        entry["throughput"] = throughput
+        entry["observed_at"] = time.time()
+        _save_cache(cache)
+    bilibili_logger.info(f"[-] 线路 {line} {threads} 线程上传速度 {throughput / 1024 / 1024:.2f}MB/s，"
+                         f"下次并发数 {entry['threads']}")
@@ -1,9 +1,27 @@
 import json
+import os
 import pathlib
 import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from biliup.plugins.bili_webup import BiliBili, Data
 
+from uploader.bilibili_uploader.line_selector import select_upload_line, record_upload_throughput
+from uploader.bilibili_uploader.resumable import ResumableUposUploader, UploadCancelled, BILIBILI_RETRY_POLICY, \
+    BILIBILI_REQUEST_MAX_ATTEMPTS
+from utils.bandwidth import BANDWIDTH
+from utils.base_social_media import SOCIAL_MEDIA_BILIBILI
 from utils.log import bilibili_logger
+from utils.metrics import UploadJobMetrics, track_upload_job
+from utils.network import retry
+
+# 同一账号两次提交（submit）之间的最小间隔，秒；提交太快会触发 b 站的投稿频率限制
+SUBMIT_MIN_INTERVAL = float(os.environ.get("SAU_BILIBILI_SUBMIT_INTERVAL", 30))
+# 账号 -> 最近一次（或已预约的）提交时间，time.monotonic()
+_last_submit_at = {}
+_submit_interval_lock = threading.Lock()
 
 
 def extract_keys_from_json(data):
@@ -12,12 +30,14 @@ def extract_keys_from_json(data):
     extracted_data = {}
 
     # Extracting cookie data
-    for cookie in data['cookie_info']['cookies']:
+    # biliup 登录生成的格式为 cookie_info.cookies，playwright storage_state 格式为顶层 cookies
+    cookies = data['cookie_info']['cookies'] if 'cookie_info' in data else data.get('cookies', [])
+    for cookie in cookies:
         if cookie['name'] in keys_to_extract:
             extracted_data[cookie['name']] = cookie['value']
 
     # Extracting access_token
-    if "access_token" in data['token_info']:
+    if "access_token" in data.get('token_info', {}):
         extracted_data['access_token'] = data['token_info']['access_token']
 
     return extracted_data
@@ -29,6 +49,66 @@ def read_cookie_json_file(filepath: pathlib.Path):
         return content
 
 
+@lru_cache(maxsize=32)
+def _load_cookie_data(filepath: str, mtime_ns: int):
+    return extract_keys_from_json(read_cookie_json_file(pathlib.Path(filepath)))
+
+
+def load_cookie_data(filepath: pathlib.Path) -> dict:
+    """
+    读取并解析账号 cookie 文件，按 (路径, 修改时间) 缓存，同一进程里重复读取同一账号不再解析 JSON。
+    返回值是缓存对象的副本，调用方可以随意修改。
+    """
+    filepath = pathlib.Path(filepath).resolve()
+    return dict(_load_cookie_data(str(filepath), filepath.stat().st_mtime_ns))
+
+
+def upload_video_file(bili: BiliBili, file, lines=None, threads=None, account_id="", progress_callback=None,
+                      cancel_event=None, dtime=0) -> dict:
+    """
+    上传单个文件的分块，返回 video_part。lines / threads 为 None 时自动选择，并记录实际上传速度。
+    分块进度保存在数据库中，进程中断后重新上传同一文件会续传。
+    开始前向带宽调度排队，dtime（定时发布时间戳）临近的先上传。
+    """
+    file_size = os.path.getsize(file)
+    auto = lines is None
+    if lines is None or threads is None:
+        auto_lines, auto_threads = select_upload_line(file_size)
+        lines = lines or auto_lines
+        threads = threads or auto_threads
+    bilibili_logger.info(f'[-] 上传线路 {lines}，并发数 {threads}')
+    with BANDWIDTH.admit(os.path.basename(str(file)), file_size, dtime, SOCIAL_MEDIA_BILIBILI, cancel_event) as ticket:
+        if ticket is None:
+            raise UploadCancelled(f"{file} 上传已取消")
+        start = time.perf_counter()
+        uploader = ResumableUposUploader(bili, account_id, progress_callback=progress_callback,
+                                         cancel_event=cancel_event, bandwidth_ticket=ticket)
+        video_part = uploader.upload_file(file, lines=lines, tasks=threads)
+    if auto:
+        record_upload_throughput(lines, threads, uploader.transferred_bytes, time.perf_counter() - start)
+    return video_part
+
+
+@retry(max_retries=BILIBILI_REQUEST_MAX_ATTEMPTS, platform=SOCIAL_MEDIA_BILIBILI, policy=BILIBILI_RETRY_POLICY)
+def login_by_cookies(bili: BiliBili, cookie_data):
+    """biliup 的 login_by_cookies（请求 nav 接口），网络错误时退避重试并计入 B 站的熔断器；cookie 失效直接抛出"""
+    bili.login_by_cookies(cookie_data)
+    bili.access_token = cookie_data.get('access_token')
+
+
+def wait_submit_interval(account_id, min_interval=SUBMIT_MIN_INTERVAL):
+    """距同一账号上次提交不足 min_interval 秒时等待；先在锁内预约提交时间，多个线程同时提交时依次排开"""
+    with _submit_interval_lock:
+        now = time.monotonic()
+        last = _last_submit_at.get(account_id)
+        submit_at = now if last is None else max(now, last + min_interval)
+        _last_submit_at[account_id] = submit_at
+    delay = submit_at - now
+    if delay > 0:
+        bilibili_logger.info(f'[-] 距上次提交不足 {min_interval:.0f} 秒，等待 {delay:.1f} 秒')
+        time.sleep(delay)
+
+
 def random_emoji():
     emoji_list = ["🍏", "🍎", "🍊", "🍋", "🍌", "🍉", "🍇", "🍓", "🍈", "🍒", "🍑", "🍍", "🥭", "🥥", "🥝",
                   "🍅", "🍆", "🥑", "🥦", "🥒", "🥬", "🌶", "🌽", "🥕", "🥔", "🍠", "🥐", "🍞", "🥖", "🥨", "🥯", "🧀", "🥚", "🍳", "🥞",
@@ -41,10 +121,12 @@ def random_emoji():
 
 class BilibiliUploader(object):
     def __init__(self, cookie_data, file: pathlib.Path, title, desc, tid, tags, dtime):
-        self.upload_thread_num = 3
+        # None 表示自动：测速选择线路，按文件大小和历史上传速度决定并发数
+        self.upload_thread_num = None
         self.copyright = 1
-        self.lines = 'AUTO'
+        self.lines = None
         self.cookie_data = cookie_data
+        self.account_id = cookie_data.get('DedeUserID', '')
         self.file = file
         self.title = title
         self.desc = desc
@@ -62,14 +144,20 @@ class BilibiliUploader(object):
         self.data.set_tag(self.tags)
         self.data.dtime = self.dtime
 
-    def upload(self):
+    @track_upload_job(SOCIAL_MEDIA_BILIBILI, account_attr="account_id", first_phase="login")
+    def upload(self, progress_callback=None, cancel_event=None):
         with BiliBili(self.data) as bili:
-            bili.login_by_cookies(self.cookie_data)
-            bili.access_token = self.cookie_data.get('access_token')
-            video_part = bili.upload_file(str(self.file), lines=self.lines,
-                                          tasks=self.upload_thread_num)  # 上传视频，默认线路AUTO自动选择，线程数量3。
+            login_by_cookies(bili, self.cookie_data)
+            self.job_metrics.phase("file_transfer")
+            video_part = upload_video_file(bili, self.file, self.lines, self.upload_thread_num, self.account_id,
+                                           progress_callback, cancel_event, self.dtime)
             video_part['title'] = self.title
             self.data.append(video_part)
+            if cancel_event is not None and cancel_event.is_set():
+                bilibili_logger.warning(f'[-] {self.file.name} 已取消，不再提交')
+                return False
+            self.job_metrics.phase("publish")
+            wait_submit_interval(self.account_id)
             ret = bili.submit()  # 提交视频
             if ret.get('code') == 0:
                 bilibili_logger.success(f'[+] {self.file.name}上传 成功')
@@ -77,3 +165,95 @@ class BilibiliUploader(object):
             else:
                 bilibili_logger.error(f'[-] {self.file.name}上传 失败, error messge: {ret.get("message")}')
                 return False
+
+
+class BilibiliBatchUploader(object):
+    """
+    同一账号批量上传：整批只登录一次，分块上传复用同一个 BiliBili 客户端（HTTP 会话、线路选择结果）。
+    上一个视频在后台线程提交（submit）的同时，主线程已经开始上传下一个视频的分块。
+    提交用另一个 BiliBili 客户端：requests.Session 不保证线程安全，主线程上传时也在用自己的会话预上传、合并分片。
+    两次提交之间至少间隔 SUBMIT_MIN_INTERVAL 秒。
+    """
+
+    def __init__(self, cookie_data, tid, copyright=1):
+        self.upload_thread_num = None
+        self.lines = None
+        self.copyright = copyright
+        self.cookie_data = cookie_data
+        self.account_id = cookie_data.get('DedeUserID', '')
+        self.tid = tid
+
+    def _build_data(self, title, desc, tags, dtime):
+        data = Data()
+        data.copyright = self.copyright
+        data.title = title
+        data.desc = desc
+        data.tid = self.tid
+        data.set_tag(tags)
+        data.dtime = dtime
+        return data
+
+    def _login(self, bili):
+        login_by_cookies(bili, self.cookie_data)
+
+    def _submit(self, submit_bili, data, file, job_metrics):
+        """在提交线程里执行，submit_bili 只在这个线程使用"""
+        job_metrics.phase("publish")
+        try:
+            wait_submit_interval(self.account_id)
+            submit_bili.video = data
+            ret = submit_bili.submit()  # 提交视频
+        except Exception as e:
+            bilibili_logger.error(f'[-] {file.name}上传 失败, error messge: {e}')
+            job_metrics.finish("error")
+            return False
+        if ret.get('code') == 0:
+            bilibili_logger.success(f'[+] {file.name}上传 成功')
+            job_metrics.finish("success")
+            return True
+        bilibili_logger.error(f'[-] {file.name}上传 失败, error messge: {ret.get("message")}')
+        job_metrics.finish("failure")
+        return False
+
+    def upload(self, videos, progress_callback=None, cancel_event=None):
+        """
+        :param videos: [(file, title, desc, tags, dtime), ...]
+        :param progress_callback: progress_callback(已上传字节数, 整批总字节数)
+        :param cancel_event: threading.Event，置位后不再开始新文件，正在上传的文件停在当前分块（可续传）
+        :return: 与 videos 顺序对应的上传结果列表
+        """
+        results = [False] * len(videos)
+        total_size = sum(os.path.getsize(video[0]) for video in videos)
+        finished_size = 0
+        with BiliBili(Data()) as bili, BiliBili(Data()) as submit_bili, \
+                ThreadPoolExecutor(max_workers=1) as submitter:
+            self._login(bili)
+            self._login(submit_bili)
+            pending = []
+            for index, (file, title, desc, tags, dtime) in enumerate(videos):
+                if cancel_event is not None and cancel_event.is_set():
+                    bilibili_logger.warning(f'[-] 批量上传已取消，剩余 {len(videos) - index} 个视频未上传')
+                    break
+                file = pathlib.Path(file)
+                file_progress = None
+                if progress_callback:
+                    file_progress = lambda done, total, offset=finished_size: progress_callback(offset + done, total_size)
+                job_metrics = UploadJobMetrics(SOCIAL_MEDIA_BILIBILI, self.account_id, first_phase="file_transfer")
+                bilibili_logger.info(f'[+] ({index + 1}/{len(videos)}) 正在上传 {file.name}')
+                try:
+                    video_part = upload_video_file(bili, file, self.lines, self.upload_thread_num, self.account_id,
+                                                   file_progress, cancel_event, dtime)
+                except Exception as e:
+                    bilibili_logger.error(f'[-] {file.name}上传 失败, error messge: {e}')
+                    job_metrics.finish("error")
+                    continue
+                finally:
+                    finished_size += os.path.getsize(file)
+                video_part['title'] = title
+                data = self._build_data(title, desc, tags, dtime)
+                data.append(video_part)
+                pending.append((index, submitter.submit(self._submit, submit_bili, data, file, job_metrics)))
+            for index, future in pending:
+                results[index] = future.result()
+        bilibili_logger.info(f'[+] 批量上传完成，成功 {sum(results)}/{len(videos)}')
+        return results
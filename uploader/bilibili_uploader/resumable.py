@@ -0,0 +1,293 @@
+import hashlib
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from os.path import basename, splitext
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from conf import BASE_DIR
+from db.schema import BILIBILI_UPLOAD_CHUNKS_TABLE, BILIBILI_UPLOAD_SESSIONS_TABLE
+from uploader.bilibili_uploader.line_selector import UPLOAD_LINES
+from utils.base_social_media import SOCIAL_MEDIA_BILIBILI
+from utils.log import bilibili_logger, log_every
+from utils.network import RetryPolicy, retry
+
+DB_PATH = Path(BASE_DIR / "db" / "database.db")
+# upos 的 upload_id 和 X-Upos-Auth 有有效期，超过这个时间的会话不再续传
+UPLOAD_SESSION_TTL = 12 * 3600
+CHUNK_RETRIES = 10
+COMPLETE_RETRIES = 5
+UPOS_PROBE_VERSION = "20221109"
+# nav、preupload 这类接口请求：只重试网络错误和 5xx（requests 异常），接口返回的业务错误（如 cookie 失效）直接抛出
+BILIBILI_RETRY_POLICY = RetryPolicy(retry_on=(requests.RequestException,))
+BILIBILI_REQUEST_MAX_ATTEMPTS = 3
+
+
+class UploadCancelled(Exception):
+    """上传被取消，已完成的分块保存在数据库里，下次可以续传"""
+
+
+class UploadSessionExpired(Exception):
+    """续传时 upos 拒绝了旧的 upload_id"""
+
+
+def init_upload_tables(db_path=DB_PATH):
+    """建表（表结构见 db/schema.py），并删除超过 UPLOAD_SESSION_TTL、已经不能续传的会话和分块记录"""
+    expired_before = time.time() - UPLOAD_SESSION_TTL
+    with sqlite3.connect(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute(BILIBILI_UPLOAD_SESSIONS_TABLE)
+        cursor.execute(BILIBILI_UPLOAD_CHUNKS_TABLE)
+        cursor.execute('''DELETE FROM bilibili_upload_chunks WHERE session_id IN (
+            SELECT id FROM bilibili_upload_sessions WHERE created_at <= ?)''', (expired_before,))
+        cursor.execute('DELETE FROM bilibili_upload_sessions WHERE created_at <= ?', (expired_before,))
+        conn.commit()
+
+
+def biliup_session(bili) -> requests.Session:
+    """
+    biliup 的 BiliBili 没有公开会话对象，preupload / 合并分片要用带登录 cookie 的会话，只能读取名字改编后的私有属性。
+    requirements.txt 固定了 biliup==0.4.98；升级后属性改名时给出明确的错误，而不是上传到一半报 AttributeError。
+    """
+    try:
+        return bili._BiliBili__session
+    except AttributeError:
+        raise RuntimeError("biliup 的 BiliBili 没有 __session 属性：b 站断点续传依赖 biliup 0.4.x 的内部实现，"
+                           "请安装 requirements.txt 中固定的 biliup 版本") from None
+
+
+def get_file_key(filepath) -> str:
+    """同一路径、大小、修改时间视为同一个文件"""
+    stat = os.stat(filepath)
+    raw = f"{os.path.abspath(filepath)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class ResumableUposUploader(object):
+    """
+    b 站 upos 分块上传，已完成的分块记录到 db/database.db。
+    进程中断后重新上传同一个文件，会复用原来的 upload_id，只上传缺失的分块。
+    """
+
+    def __init__(self, bili, account_id, db_path=DB_PATH, progress_callback=None, cancel_event=None,
+                 bandwidth_ticket=None):
+        self.bili = bili
+        self.session = biliup_session(bili)
+        self.account_id = str(account_id or "")
+        self.db_path = db_path
+        self.progress_callback = progress_callback
+        self.cancel_event = cancel_event
+        # utils.bandwidth 的 UploadTicket，每个分块上传完成后计入吞吐
+        self.bandwidth_ticket = bandwidth_ticket
+        self._db_lock = threading.Lock()
+        self._progress_lock = threading.Lock()
+        self._uploaded_bytes = 0
+        # 本次运行实际发送的字节数（续传时不含之前已完成的分块）
+        self.transferred_bytes = 0
+        init_upload_tables(db_path)
+
+    def _line_query(self, lines):
+        if lines in UPLOAD_LINES:
+            return f"upcdn={lines}&probe_version={UPOS_PROBE_VERSION}"
+        if not self.bili._auto_os:
+            self.bili._auto_os = self.bili.probe()
+        return self.bili._auto_os["query"]
+
+    @retry(max_retries=BILIBILI_REQUEST_MAX_ATTEMPTS, platform=SOCIAL_MEDIA_BILIBILI, policy=BILIBILI_RETRY_POLICY)
+    def _preupload(self, filepath, file_size, lines):
+        query = {
+            'r': 'upos',
+            'profile': 'ugcupos/bup',
+            'ssl': 0,
+            'version': '2.8.12',
+            'build': 2081200,
+            'name': basename(filepath),
+            'size': file_size,
+        }
+        ret = self.session.get(f"https://member.bilibili.com/preupload?{self._line_query(lines)}",
+                               params=query, timeout=5)
+        ret.raise_for_status()
+        ret = ret.json()
+        endpoint = ret['endpoint']
+        # 与 biliup 一致：指定 bda2/qn/ws 时替换分配到的上传节点
+        if lines in ('bda2', 'qn', 'ws') and re.match(r'//upos-(sz|cs)-upcdn(bda2|ws|qn)\.bilivideo\.com', endpoint):
+            ret['endpoint'] = re.sub(r'upcdn(bda2|qn|ws)', f'upcdn{lines}', endpoint)
+        return ret
+
+    def _load_session(self, file_key):
+        with self._db_lock, sqlite3.connect(self.db_path) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute('''
+                SELECT * FROM bilibili_upload_sessions
+                WHERE account_id = ? AND file_key = ? AND status = 'uploading' AND created_at > ?
+                ORDER BY id DESC LIMIT 1''', (self.account_id, file_key, time.time() - UPLOAD_SESSION_TTL)).fetchone()
+            if row is None:
+                return None, set()
+            done = {r[0] for r in conn.execute(
+                'SELECT chunk_index FROM bilibili_upload_chunks WHERE session_id = ?', (row['id'],))}
+            return dict(row), done
+
+    def _create_session(self, filepath, file_key, file_size, lines):
+        ret = self._preupload(filepath, file_size, lines)
+        upload_url = f"https:{ret['endpoint']}/{ret['upos_uri'].replace('upos://', '')}"
+        headers = {"X-Upos-Auth": ret["auth"]}
+        upload_id = self.session.post(f'{upload_url}?uploads&output=json', timeout=15,
+                                      headers=headers).json()["upload_id"]
+        now = time.time()
+        session = {
+            "account_id": self.account_id,
+            "file_key": file_key,
+            "file_path": os.path.abspath(filepath),
+            "file_size": file_size,
+            "chunk_size": ret['chunk_size'],
+            "chunks": math.ceil(file_size / ret['chunk_size']),
+            "upload_id": upload_id,
+            "upload_url": upload_url,
+            "upos_uri": ret['upos_uri'],
+            "auth": ret['auth'],
+            "biz_id": ret['biz_id'],
+            "status": "uploading",
+            "created_at": now,
+            "updated_at": now,
+        }
+        with self._db_lock, sqlite3.connect(self.db_path) as conn:
+            columns = list(session.keys())
+            cursor = conn.execute(
+                f"INSERT INTO bilibili_upload_sessions ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                [session[c] for c in columns])
+            session["id"] = cursor.lastrowid
+            conn.commit()
+        return session
+
+    def _set_status(self, session_id, status):
+        with self._db_lock, sqlite3.connect(self.db_path) as conn:
+            conn.execute('UPDATE bilibili_upload_sessions SET status = ?, updated_at = ? WHERE id = ?',
+                         (status, time.time(), session_id))
+            if status != 'uploading':
+                conn.execute('DELETE FROM bilibili_upload_chunks WHERE session_id = ?', (session_id,))
+            conn.commit()
+
+    def _mark_chunk(self, session_id, chunk_index):
+        with self._db_lock, sqlite3.connect(self.db_path) as conn:
+            conn.execute('INSERT OR IGNORE INTO bilibili_upload_chunks (session_id, chunk_index) VALUES (?, ?)',
+                         (session_id, chunk_index))
+            conn.execute('UPDATE bilibili_upload_sessions SET updated_at = ? WHERE id = ?', (time.time(), session_id))
+            conn.commit()
+
+    def _report_progress(self, size, total):
+        with self._progress_lock:
+            self._uploaded_bytes += size
+            self.transferred_bytes += size
+            uploaded = self._uploaded_bytes
+        if self.bandwidth_ticket is not None:
+            self.bandwidth_ticket.add_bytes(size)
+        if self.progress_callback:
+            self.progress_callback(uploaded, total)
+
+    def _upload_chunk(self, put_session, session, chunk_index, resumed):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            return False
+        chunk_size = session["chunk_size"]
+        start = chunk_index * chunk_size
+        with open(session["file_path"], "rb") as f:
+            f.seek(start)
+            data = f.read(chunk_size)
+        params = {
+            'uploadId': session["upload_id"],
+            'chunks': session["chunks"],
+            'total': session["file_size"],
+            'chunk': chunk_index,
+            'size': len(data),
+            'partNumber': chunk_index + 1,
+            'start': start,
+            'end': start + len(data),
+        }
+        headers = {"X-Upos-Auth": session["auth"]}
+        for attempt in range(1, CHUNK_RETRIES + 1):
+            try:
+                resp = put_session.put(session["upload_url"], params=params, data=data, headers=headers, timeout=60)
+                if resumed and resp.status_code in (400, 403, 404):
+                    raise UploadSessionExpired(f"chunk {chunk_index}: HTTP {resp.status_code}")
+                resp.raise_for_status()
+                break
+            except requests.RequestException as e:
+                bilibili_logger.warning(f"retry chunk{chunk_index} >> {attempt}. {e}")
+                if attempt == CHUNK_RETRIES:
+                    raise
+                time.sleep(min(2 ** attempt, 30))
+        self._mark_chunk(session["id"], chunk_index)
+        self._report_progress(len(data), session["file_size"])
+        log_every(bilibili_logger, f"[-] {basename(session['file_path'])} "
+                                   f"{self._uploaded_bytes / session['file_size']:.1%}", key="chunk_progress")
+        return True
+
+    def _complete(self, session):
+        params = {
+            'name': basename(session["file_path"]),
+            'uploadId': session["upload_id"],
+            'biz_id': session["biz_id"],
+            'output': 'json',
+            'profile': 'ugcupos/bup',
+        }
+        parts = [{"partNumber": index + 1, "eTag": "etag"} for index in range(session["chunks"])]
+        headers = {"X-Upos-Auth": session["auth"]}
+        for attempt in range(1, COMPLETE_RETRIES + 1):
+            try:
+                r = self.session.post(session["upload_url"], params=params, json={"parts": parts}, headers=headers,
+                                      timeout=15).json()
+                if r.get('OK') == 1:
+                    return
+                raise IOError(r)
+            except (IOError, ValueError) as e:
+                bilibili_logger.warning(f"请求合并分片时出现问题，尝试重连，次数：{attempt}. {e}")
+                if attempt == COMPLETE_RETRIES:
+                    raise
+                time.sleep(15)
+
+    def _upload_session(self, session, done, tasks, resumed):
+        missing = [index for index in range(session["chunks"]) if index not in done]
+        self._uploaded_bytes = min(len(done) * session["chunk_size"], session["file_size"])
+        if resumed:
+            bilibili_logger.info(f"[-] 续传 {basename(session['file_path'])}：已完成 {len(done)}/{session['chunks']} 个分块")
+        put_session = requests.Session()
+        put_session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=max(tasks, 1)))
+        try:
+            with ThreadPoolExecutor(max_workers=max(tasks, 1)) as executor:
+                results = list(executor.map(lambda index: self._upload_chunk(put_session, session, index, resumed),
+                                            missing))
+        finally:
+            put_session.close()
+        if not all(results):
+            raise UploadCancelled(f"{session['file_path']} 上传已取消")
+
+    def upload_file(self, filepath, lines='AUTO', tasks=3) -> dict:
+        """与 BiliBili.upload_file 返回值一致：{"title", "filename", "desc"}"""
+        filepath = str(filepath)
+        file_size = os.path.getsize(filepath)
+        file_key = get_file_key(filepath)
+        self.transferred_bytes = 0
+        session, done = self._load_session(file_key)
+        resumed = session is not None
+        if session is None:
+            session = self._create_session(filepath, file_key, file_size, lines)
+        start = time.perf_counter()
+        try:
+            self._upload_session(session, done, tasks, resumed)
+        except UploadSessionExpired as e:
+            bilibili_logger.warning(f"[-] 上传会话已失效，重新上传: {e}")
+            self._set_status(session["id"], "expired")
+            session = self._create_session(filepath, file_key, file_size, lines)
+            self._upload_session(session, set(), tasks, False)
+        self._complete(session)
+        self._set_status(session["id"], "completed")
+        cost = time.perf_counter() - start
+        bilibili_logger.info(f'{basename(filepath)} uploaded >> {file_size / 1000 / 1000 / max(cost, 1e-6):.2f}MB/s')
+        return {"title": splitext(basename(filepath))[0], "filename": splitext(basename(session["upos_uri"]))[0],
+                "desc": ""}
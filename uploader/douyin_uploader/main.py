@@ -1,37 +1,51 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
+import re
 
-from playwright.async_api import Playwright, async_playwright, Page
+from playwright.async_api import Playwright, async_playwright, Page, TimeoutError as PlaywrightTimeoutError, expect
 import os
 import asyncio
 
 from conf import LOCAL_CHROME_PATH, LOCAL_CHROME_HEADLESS
-from utils.base_social_media import set_init_script
-from utils.log import douyin_logger
+from utils.base_social_media import set_init_script, set_route_filter, goto_platform_page, add_topics, replace_editor_text, wait_for_any, \
+    wait_for_input_value, SOCIAL_MEDIA_DOUYIN
+from utils.bandwidth import set_video_files
+from utils.log import douyin_logger, log_every
+from utils.metrics import fixed_sleep, track_cookie_check, track_upload_job
+from utils.session_store import SESSIONS, save_context_state
 
 
+@track_cookie_check(SOCIAL_MEDIA_DOUYIN)
 async def cookie_auth(account_file):
     async with async_playwright() as playwright:
         browser = await playwright.chromium.launch(headless=LOCAL_CHROME_HEADLESS)
-        context = await browser.new_context(storage_state=account_file)
+        context = await browser.new_context(storage_state=SESSIONS.get(account_file))
         context = await set_init_script(context)
+        context = await set_route_filter(context, SOCIAL_MEDIA_DOUYIN, block_resources=True)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
         await page.goto("https://creator.douyin.com/creator-micro/content/upload")
         try:
-            await page.wait_for_url("https://creator.douyin.com/creator-micro/content/upload", timeout=5000)
-        except:
-            print("[+] 等待5秒 cookie 失效")
+            # 跳转到登录页时不必等满 5 秒
+            state = await wait_for_any(page, {
+                "upload": "url:https://creator.douyin.com/creator-micro/content/upload",
+                "login": "text=手机号登录",
+                "qrcode": "text=扫码登录",
+            }, timeout=5000)
+        except PlaywrightTimeoutError:
+            state = None
+        if state != "upload":
+            douyin_logger.info("[+] 等待5秒 cookie 失效")
             await context.close()
             await browser.close()
             return False
         # 2024.06.17 抖音创作者中心改版
         if await page.get_by_text('手机号登录').count() or await page.get_by_text('扫码登录').count():
-            print("[+] 等待5秒 cookie 失效")
+            douyin_logger.info("[+] 等待5秒 cookie 失效")
             return False
         else:
-            print("[+] cookie 有效")
+            douyin_logger.success("[+] cookie 有效")
             return True
 
 
@@ -82,21 +96,24 @@ class DouYinVideo(object):
         label_element = page.locator("[class^='radio']:has-text('定时发布')")
         # 在选中的 label 元素下点击 checkbox
         await label_element.click()
-        await asyncio.sleep(1)
         publish_date_hour = publish_date.strftime("%Y-%m-%d %H:%M")
 
-        await asyncio.sleep(1)
-        await page.locator('.semi-input[placeholder="日期和时间"]').click()
+        # 选中定时发布后才会出现日期输入框
+        date_input = page.locator('.semi-input[placeholder="日期和时间"]')
+        await date_input.wait_for(state="visible")
+        await date_input.click()
         await page.keyboard.press("Control+KeyA")
         await page.keyboard.type(str(publish_date_hour))
         await page.keyboard.press("Enter")
 
-        await asyncio.sleep(1)
+        if not await wait_for_input_value(date_input, publish_date_hour):
+            douyin_logger.warning(f"  [-] 定时发布时间可能未生效: {publish_date_hour}")
 
     async def handle_upload_error(self, page):
         douyin_logger.info('视频出错了，重新上传中')
         await page.locator('div.progress-div [class^="upload-btn-input"]').set_input_files(self.file_path)
 
+    @track_upload_job(SOCIAL_MEDIA_DOUYIN)
     async def upload(self, playwright: Playwright) -> None:
         # 使用 Chromium 浏览器启动一个浏览器实例
         if self.local_executable_path:
@@ -104,61 +121,48 @@ class DouYinVideo(object):
         else:
             browser = await playwright.chromium.launch(headless=self.headless)
         # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(storage_state=f"{self.account_file}")
+        context = await browser.new_context(storage_state=SESSIONS.get(self.account_file))
         context = await set_init_script(context)
+        context = await set_route_filter(context, SOCIAL_MEDIA_DOUYIN)
 
         # 创建一个新的页面
         page = await context.new_page()
+        self.job_metrics.phase("navigation")
         # 访问指定的 URL
-        await page.goto("https://creator.douyin.com/creator-micro/content/upload")
+        await goto_platform_page(page, "https://creator.douyin.com/creator-micro/content/upload", SOCIAL_MEDIA_DOUYIN)
         douyin_logger.info(f'[+]正在上传-------{self.title}.mp4')
         # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
         douyin_logger.info(f'[-] 正在打开主页...')
         await page.wait_for_url("https://creator.douyin.com/creator-micro/content/upload")
         # 点击 "上传视频" 按钮
-        await page.locator("div[class^='container'] input").set_input_files(self.file_path)
+        await set_video_files(page.locator("div[class^='container'] input"), self.file_path, self.publish_date)
 
-        # 等待页面跳转到指定的 URL 2025.01.08修改在原有基础上兼容两种页面
+        # 等待页面跳转到指定的 URL 2025.01.08修改在原有基础上兼容两种页面，两个版本同时等待
         while True:
             try:
-                # 尝试等待第一个 URL
-                await page.wait_for_url(
-                    "https://creator.douyin.com/creator-micro/content/publish?enter_from=publish_page", timeout=3000)
-                douyin_logger.info("[+] 成功进入version_1发布页面!")
+                version = await wait_for_any(page, {
+                    "version_1": "url:https://creator.douyin.com/creator-micro/content/publish?enter_from=publish_page",
+                    "version_2": "url:https://creator.douyin.com/creator-micro/content/post/video?enter_from=publish_page",
+                }, timeout=6000)
+                douyin_logger.info(f"[+] 成功进入{version}发布页面!")
                 break  # 成功进入页面后跳出循环
-            except Exception:
-                try:
-                    # 如果第一个 URL 超时，再尝试等待第二个 URL
-                    await page.wait_for_url(
-                        "https://creator.douyin.com/creator-micro/content/post/video?enter_from=publish_page",
-                        timeout=3000)
-                    douyin_logger.info("[+] 成功进入version_2发布页面!")
-
-                    break  # 成功进入页面后跳出循环
-                except:
-                    print("  [-] 超时未进入视频发布页面，重新尝试...")
-                    await asyncio.sleep(0.5)  # 等待 0.5 秒后重新尝试
+            except PlaywrightTimeoutError:
+                log_every(douyin_logger, "  [-] 超时未进入视频发布页面，重新尝试...")
         # 填充标题和话题
         # 检查是否存在包含输入框的元素
         # 这里为了避免页面变化，故使用相对位置定位：作品标题父级右侧第一个元素的input子元素
-        await asyncio.sleep(1)
+        self.job_metrics.phase("metadata")
+        await fixed_sleep(1)
         douyin_logger.info(f'  [-] 正在填充标题和话题...')
         title_container = page.get_by_text('作品标题').locator("..").locator("xpath=following-sibling::div[1]").locator("input")
         if await title_container.count():
             await title_container.fill(self.title[:30])
         else:
-            titlecontainer = page.locator(".notranslate")
-            await titlecontainer.click()
-            await page.keyboard.press("Backspace")
-            await page.keyboard.press("Control+KeyA")
-            await page.keyboard.press("Delete")
-            await page.keyboard.type(self.title)
+            await replace_editor_text(page, page.locator(".notranslate"), self.title)
             await page.keyboard.press("Enter")
-        css_selector = ".zone-container"
-        for index, tag in enumerate(self.tags, start=1):
-            await page.type(css_selector, "#" + tag)
-            await page.press(css_selector, "Space")
+        await add_topics(page, self.tags, SOCIAL_MEDIA_DOUYIN, editor=".zone-container")
         douyin_logger.info(f'总共添加{len(self.tags)}个话题')
+        self.job_metrics.phase("file_transfer")
         while True:
             # 判断重新上传按钮是否存在，如果不存在，代表视频正在上传，则等待
             try:
@@ -168,16 +172,17 @@ class DouYinVideo(object):
                     douyin_logger.success("  [-]视频上传完毕")
                     break
                 else:
-                    douyin_logger.info("  [-] 正在上传视频中...")
+                    log_every(douyin_logger, "  [-] 正在上传视频中...")
                     await asyncio.sleep(2)
 
                     if await page.locator('div.progress-div > div:has-text("上传失败")').count():
                         douyin_logger.error("  [-] 发现上传出错了... 准备重试")
                         await self.handle_upload_error(page)
             except:
-                douyin_logger.info("  [-] 正在上传视频中...")
+                log_every(douyin_logger, "  [-] 正在上传视频中...")
                 await asyncio.sleep(2)
 
+        self.job_metrics.phase("metadata")
         if self.productLink and self.productTitle:
             douyin_logger.info(f'  [-] 正在设置商品链接...')
             await self.set_product_link(page, self.productLink, self.productTitle)
@@ -199,8 +204,10 @@ class DouYinVideo(object):
                 await page.locator(third_part_element).locator('input.semi-switch-native-control').click()
 
         if self.publish_date != 0:
+            self.job_metrics.phase("schedule")
             await self.set_schedule_time_douyin(page, self.publish_date)
 
+        self.job_metrics.phase("publish")
         # 判断视频是否发布成功
         while True:
             # 判断视频是否发布成功
@@ -213,13 +220,14 @@ class DouYinVideo(object):
                 douyin_logger.success("  [-]视频发布成功")
                 break
             except:
-                douyin_logger.info("  [-] 视频正在发布中...")
+                log_every(douyin_logger, "  [-] 视频正在发布中...")
                 await page.screenshot(full_page=True)
                 await asyncio.sleep(0.5)
 
-        await context.storage_state(path=self.account_file)  # 保存cookie
+        self.job_metrics.phase("teardown")
+        await save_context_state(context, self.account_file)  # 保存cookie
         douyin_logger.success('  [-]cookie更新完毕！')
-        await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
+        await fixed_sleep(2)  # 这里延迟是为了方便眼睛直观的观看
         # 关闭浏览器上下文和浏览器实例
         await context.close()
         await browser.close()
@@ -230,10 +238,9 @@ class DouYinVideo(object):
             await page.click('text="选择封面"')
             await page.wait_for_selector("div.dy-creator-content-modal")
             await page.click('text="设置竖封面"')
-            await page.wait_for_timeout(2000)  # 等待2秒
-            # 定位到上传区域并点击
+            # 定位到上传区域并点击（set_input_files 会等上传控件出现）
             await page.locator("div[class^='semi-upload upload'] >> input.semi-upload-hidden-input").set_input_files(thumbnail_path)
-            await page.wait_for_timeout(2000)  # 等待2秒
+            await fixed_sleep(2)  # 等封面处理
             await page.locator("div#tooltip-container button:visible:has-text('完成')").click()
             # finish_confirm_element = page.locator("div[class^='confirmBtn'] >> div:has-text('完成')")
             # if await finish_confirm_element.count():
@@ -252,7 +259,6 @@ class DouYinVideo(object):
         #     "div.semi-select-single").nth(0).click()
         await page.locator('div.semi-select span:has-text("输入地理位置")').click()
         await page.keyboard.press("Backspace")
-        await page.wait_for_timeout(2000)
         await page.keyboard.type(location)
         await page.wait_for_selector('div[role="listbox"] [role="option"]', timeout=5000)
         await page.locator('div[role="listbox"] [role="option"]').first.click()
@@ -260,7 +266,6 @@ class DouYinVideo(object):
     async def handle_product_dialog(self, page: Page, product_title: str):
         """处理商品编辑弹窗"""
 
-        await page.wait_for_timeout(2000)
         await page.wait_for_selector('input[placeholder="请输入商品短标题"]', timeout=10000)
         short_title_input = page.locator('input[placeholder="请输入商品短标题"]')
         if not await short_title_input.count():
@@ -268,10 +273,13 @@ class DouYinVideo(object):
             return False
         product_title = product_title[:10]
         await short_title_input.fill(product_title)
-        # 等待一下让界面响应
-        await page.wait_for_timeout(1000)
 
         finish_button = page.locator('button:has-text("完成编辑")')
+        # 等按钮根据输入刷新可用状态
+        try:
+            await expect(finish_button).not_to_have_class(re.compile("disabled"), timeout=1000)
+        except AssertionError:
+            pass
         if 'disabled' not in await finish_button.get_attribute('class'):
             await finish_button.click()
             douyin_logger.debug("[+] 成功点击'完成编辑'按钮")
@@ -295,7 +303,6 @@ class DouYinVideo(object):
         
     async def set_product_link(self, page: Page, product_link: str, product_title: str):
         """设置商品链接功能"""
-        await page.wait_for_timeout(2000)  # 等待2秒
         try:
             # 定位"添加标签"文本，然后向上导航到容器，再找到下拉框
             await page.wait_for_selector('text=添加标签', timeout=10000)
@@ -329,7 +336,7 @@ class DouYinVideo(object):
             await add_button.click()
             douyin_logger.debug("[+] 成功点击'添加链接'按钮")
             ## 如果链接不可用
-            await page.wait_for_timeout(2000)
+            await fixed_sleep(2)
             error_modal = page.locator('text=未搜索到对应商品')
             if await error_modal.count():
                 confirm_button = page.locator('button:has-text("确定")')
@@ -351,6 +358,6 @@ class DouYinVideo(object):
 
     async def main(self):
         async with async_playwright() as playwright:
-            await self.upload(playwright)
+            return await self.upload(playwright)
 
 
@@ -1,33 +1,44 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright
+from playwright.async_api import Playwright, async_playwright, TimeoutError as PlaywrightTimeoutError
 import os
 import asyncio
 
 from conf import LOCAL_CHROME_PATH, LOCAL_CHROME_HEADLESS
-from utils.base_social_media import set_init_script
+from utils.base_social_media import set_init_script, set_route_filter, goto_platform_page, add_topics, replace_editor_text, wait_for_any, \
+    wait_for_input_value, SOCIAL_MEDIA_KUAISHOU
+from utils.bandwidth import set_video_files
 from utils.files_times import get_absolute_path
-from utils.log import kuaishou_logger
+from utils.log import kuaishou_logger, log_every
+from utils.metrics import fixed_sleep, track_cookie_check, track_upload_job
+from utils.session_store import SESSIONS, save_context_state
 
 
+@track_cookie_check(SOCIAL_MEDIA_KUAISHOU)
 async def cookie_auth(account_file):
     async with async_playwright() as playwright:
         browser = await playwright.chromium.launch(headless=LOCAL_CHROME_HEADLESS)
-        context = await browser.new_context(storage_state=account_file)
+        context = await browser.new_context(storage_state=SESSIONS.get(account_file))
         context = await set_init_script(context)
+        context = await set_route_filter(context, SOCIAL_MEDIA_KUAISHOU, block_resources=True)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
         await page.goto("https://cp.kuaishou.com/article/publish/video")
         try:
-            await page.wait_for_selector("div.names div.container div.name:text('机构服务')", timeout=5000)  # 等待5秒
-
+            # 出现"机构服务"说明跳到了登录页；上传按钮先出现则不必等满 5 秒
+            state = await wait_for_any(page, {
+                "expired": "div.names div.container div.name:text('机构服务')",
+                "valid": "button[class^='_upload-btn']",
+            }, timeout=5000)
+        except PlaywrightTimeoutError:
+            state = "valid"
+        if state == "expired":
             kuaishou_logger.info("[+] 等待5秒 cookie 失效")
             return False
-        except:
-            kuaishou_logger.success("[+] cookie 有效")
-            return True
+        kuaishou_logger.success("[+] cookie 有效")
+        return True
 
 
 async def ks_setup(account_file, handle=False):
@@ -76,9 +87,10 @@ class KSVideo(object):
         kuaishou_logger.error("视频出错了，重新上传中")
         await page.locator('div.progress-div [class^="upload-btn-input"]').set_input_files(self.file_path)
 
+    @track_upload_job(SOCIAL_MEDIA_KUAISHOU)
     async def upload(self, playwright: Playwright) -> None:
         # 使用 Chromium 浏览器启动一个浏览器实例
-        print(self.local_executable_path)
+        kuaishou_logger.debug(f"local_executable_path: {self.local_executable_path}")
         if self.local_executable_path:
             browser = await playwright.chromium.launch(
                 headless=self.headless,
@@ -88,12 +100,14 @@ class KSVideo(object):
             browser = await playwright.chromium.launch(
                 headless=self.headless
             )  # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(storage_state=f"{self.account_file}")
+        context = await browser.new_context(storage_state=SESSIONS.get(self.account_file))
         context = await set_init_script(context)
+        context = await set_route_filter(context, SOCIAL_MEDIA_KUAISHOU)
         # 创建一个新的页面
         page = await context.new_page()
+        self.job_metrics.phase("navigation")
         # 访问指定的 URL
-        await page.goto("https://cp.kuaishou.com/article/publish/video")
+        await goto_platform_page(page, "https://cp.kuaishou.com/article/publish/video", SOCIAL_MEDIA_KUAISHOU)
         kuaishou_logger.info('正在上传-------{}.mp4'.format(self.title))
         # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
         kuaishou_logger.info('正在打开主页...')
@@ -105,36 +119,29 @@ class KSVideo(object):
         async with page.expect_file_chooser() as fc_info:
             await upload_button.click()
         file_chooser = await fc_info.value
-        await file_chooser.set_files(self.file_path)
-
-        await asyncio.sleep(2)
+        await set_video_files(file_chooser, self.file_path, self.publish_date)
 
         # if not await page.get_by_text("封面编辑").count():
         #     raise Exception("似乎没有跳转到到编辑页面")
 
-        await asyncio.sleep(1)
+        # 等编辑页的描述输入框出现，不再固定等待 3 秒
+        await page.get_by_text("描述").locator("xpath=following-sibling::div").first.wait_for(state="visible")
 
         # 等待按钮可交互
         new_feature_button = page.locator('button[type="button"] span:text("我知道了")')
         if await new_feature_button.count() > 0:
             await new_feature_button.click()
 
+        self.job_metrics.phase("metadata")
         kuaishou_logger.info("正在填充标题和话题...")
-        await page.get_by_text("描述").locator("xpath=following-sibling::div").click()
-        kuaishou_logger.info("clear existing title")
-        await page.keyboard.press("Backspace")
-        await page.keyboard.press("Control+KeyA")
-        await page.keyboard.press("Delete")
-        kuaishou_logger.info("filling new  title")
-        await page.keyboard.type(self.title)
+        await replace_editor_text(page, page.get_by_text("描述").locator("xpath=following-sibling::div"), self.title)
         await page.keyboard.press("Enter")
 
         # 快手只能添加3个话题
-        for index, tag in enumerate(self.tags[:3], start=1):
-            kuaishou_logger.info("正在添加第%s个话题" % index)
-            await page.keyboard.type(f"#{tag} ")
-            await asyncio.sleep(2)
+        await add_topics(page, self.tags[:3], SOCIAL_MEDIA_KUAISHOU)
+        kuaishou_logger.info(f"总共添加{len(self.tags[:3])}个话题")
 
+        self.job_metrics.phase("file_transfer")
         max_retries = 60  # 设置最大重试次数,最大等待时间为 2 分钟
         retry_count = 0
 
@@ -160,8 +167,10 @@ class KSVideo(object):
 
         # 定时任务
         if self.publish_date != 0:
+            self.job_metrics.phase("schedule")
             await self.set_schedule_time(page, self.publish_date)
 
+        self.job_metrics.phase("publish")
         # 判断视频是否发布成功
         while True:
             try:
@@ -169,10 +178,13 @@ class KSVideo(object):
                 if await publish_button.count() > 0:
                     await publish_button.click()
 
-                await asyncio.sleep(1)
+                # 部分账号会弹出二次确认，最多等 1 秒，没有弹出直接等跳转
                 confirm_button = page.get_by_text("确认发布")
-                if await confirm_button.count() > 0:
+                try:
+                    await confirm_button.wait_for(state="visible", timeout=1000)
                     await confirm_button.click()
+                except PlaywrightTimeoutError:
+                    pass
 
                 # 等待页面跳转，确认发布成功
                 await page.wait_for_url(
@@ -182,32 +194,39 @@ class KSVideo(object):
                 kuaishou_logger.success("视频发布成功")
                 break
             except Exception as e:
-                kuaishou_logger.info(f"视频正在发布中... 错误: {e}")
+                log_every(kuaishou_logger, f"视频正在发布中... 错误: {e}", key="publishing")
                 await page.screenshot(full_page=True)
                 await asyncio.sleep(1)
 
-        await context.storage_state(path=self.account_file)  # 保存cookie
+        self.job_metrics.phase("teardown")
+        await save_context_state(context, self.account_file)  # 保存cookie
         kuaishou_logger.info('cookie更新完毕！')
-        await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
+        await fixed_sleep(2)  # 这里延迟是为了方便眼睛直观的观看
         # 关闭浏览器上下文和浏览器实例
         await context.close()
         await browser.close()
 
     async def main(self):
         async with async_playwright() as playwright:
-            await self.upload(playwright)
+            return await self.upload(playwright)
 
     async def set_schedule_time(self, page, publish_date):
         kuaishou_logger.info("click schedule")
         publish_date_hour = publish_date.strftime("%Y-%m-%d %H:%M:%S")
         await page.locator("label:text('发布时间')").locator('xpath=following-sibling::div').locator(
             '.ant-radio-input').nth(1).click()
-        await asyncio.sleep(1)
 
-        await page.locator('div.ant-picker-input input[placeholder="选择日期时间"]').click()
-        await asyncio.sleep(1)
+        # 选中定时发布后才会出现日期输入框，点击后等日期面板弹出再输入
+        date_input = page.locator('div.ant-picker-input input[placeholder="选择日期时间"]')
+        await date_input.wait_for(state="visible")
+        await date_input.click()
+        try:
+            await page.locator("div.ant-picker-dropdown:visible").first.wait_for(state="visible", timeout=3000)
+        except PlaywrightTimeoutError:
+            kuaishou_logger.debug("日期面板未弹出，直接输入")
 
         await page.keyboard.press("Control+KeyA")
         await page.keyboard.type(str(publish_date_hour))
         await page.keyboard.press("Enter")
-        await asyncio.sleep(1)
+        if not await wait_for_input_value(date_input, publish_date_hour):
+            kuaishou_logger.warning(f"定时发布时间可能未生效: {publish_date_hour}")
@@ -1,14 +1,18 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright
+from playwright.async_api import Playwright, async_playwright, TimeoutError as PlaywrightTimeoutError
 import os
 import asyncio
 
 from conf import LOCAL_CHROME_PATH, LOCAL_CHROME_HEADLESS
-from utils.base_social_media import set_init_script
+from utils.base_social_media import set_init_script, set_route_filter, goto_platform_page, add_topics, replace_editor_text, wait_for_any, \
+    SOCIAL_MEDIA_TENCENT
+from utils.bandwidth import set_video_files
 from utils.files_times import get_absolute_path
-from utils.log import tencent_logger
+from utils.log import tencent_logger, log_every
+from utils.metrics import fixed_sleep, track_cookie_check, track_upload_job
+from utils.session_store import SESSIONS, save_context_state
 
 
 def format_str_for_short_title(origin_title: str) -> str:
@@ -31,22 +35,30 @@ def format_str_for_short_title(origin_title: str) -> str:
     return formatted_string
 
 
+@track_cookie_check(SOCIAL_MEDIA_TENCENT)
 async def cookie_auth(account_file):
     async with async_playwright() as playwright:
         browser = await playwright.chromium.launch(headless=LOCAL_CHROME_HEADLESS)
-        context = await browser.new_context(storage_state=account_file)
+        context = await browser.new_context(storage_state=SESSIONS.get(account_file))
         context = await set_init_script(context)
+        context = await set_route_filter(context, SOCIAL_MEDIA_TENCENT, block_resources=True)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
         await page.goto("https://channels.weixin.qq.com/platform/post/create")
         try:
-            await page.wait_for_selector('div.title-name:has-text("微信小店")', timeout=5000)  # 等待5秒
+            # 登录页出现"微信小店"标题说明 cookie 失效；发表页的上传控件先出现则不必等满 5 秒
+            state = await wait_for_any(page, {
+                "expired": 'div.title-name:has-text("微信小店")',
+                "valid": 'input[type="file"]',
+            }, timeout=5000)
+        except PlaywrightTimeoutError:
+            state = "valid"
+        if state == "expired":
             tencent_logger.error("[+] 等待5秒 cookie 失效")
             return False
-        except:
-            tencent_logger.success("[+] cookie 有效")
-            return True
+        tencent_logger.success("[+] cookie 有效")
+        return True
 
 
 async def get_tencent_cookie(account_file):
@@ -135,23 +147,27 @@ class TencentVideo(object):
         file_input = page.locator('input[type="file"]')
         await file_input.set_input_files(self.file_path)
 
+    @track_upload_job(SOCIAL_MEDIA_TENCENT)
     async def upload(self, playwright: Playwright) -> None:
         # 使用 Chromium (这里使用系统内浏览器，用chromium 会造成h264错误
         browser = await playwright.chromium.launch(headless=self.headless, executable_path=self.local_executable_path)
         # 创建一个浏览器上下文，使用指定的 cookie 文件
-        context = await browser.new_context(storage_state=f"{self.account_file}")
+        context = await browser.new_context(storage_state=SESSIONS.get(self.account_file))
         context = await set_init_script(context)
+        context = await set_route_filter(context, SOCIAL_MEDIA_TENCENT)
 
         # 创建一个新的页面
         page = await context.new_page()
+        self.job_metrics.phase("navigation")
         # 访问指定的 URL
-        await page.goto("https://channels.weixin.qq.com/platform/post/create")
+        await goto_platform_page(page, "https://channels.weixin.qq.com/platform/post/create", SOCIAL_MEDIA_TENCENT)
         tencent_logger.info(f'[+]正在上传-------{self.title}.mp4')
         # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
         await page.wait_for_url("https://channels.weixin.qq.com/platform/post/create")
         # await page.wait_for_selector('input[type="file"]', timeout=10000)
         file_input = page.locator('input[type="file"]')
-        await file_input.set_input_files(self.file_path)
+        await set_video_files(file_input, self.file_path, self.publish_date)
+        self.job_metrics.phase("metadata")
         # 填充标题和话题
         await self.add_title_tags(page)
         # 添加商品
@@ -160,18 +176,24 @@ class TencentVideo(object):
         await self.add_collection(page)
         # 原创选择
         await self.add_original(page)
+        self.job_metrics.phase("file_transfer")
         # 检测上传状态
         await self.detect_upload_status(page)
         if self.publish_date != 0:
+            self.job_metrics.phase("schedule")
             await self.set_schedule_time_tencent(page, self.publish_date)
+        self.job_metrics.phase("metadata")
         # 添加短标题
         await self.add_short_title(page)
 
+        self.job_metrics.phase("publish")
         await self.click_publish(page)
 
-        await context.storage_state(path=f"{self.account_file}")  # 保存cookie
+        self.job_metrics.phase("teardown")
+
+        await save_context_state(context, self.account_file)  # 保存cookie
         tencent_logger.success('  [-]cookie更新完毕！')
-        await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
+        await fixed_sleep(2)  # 这里延迟是为了方便眼睛直观的观看
         # 关闭浏览器上下文和浏览器实例
         await context.close()
         await browser.close()
@@ -216,7 +238,7 @@ class TencentVideo(object):
                         tencent_logger.success("  [-]视频发布成功")
                         break
                 tencent_logger.exception(f"  [-] Exception: {e}")
-                tencent_logger.info("  [-] 视频正在发布中...")
+                log_every(tencent_logger, "  [-] 视频正在发布中...")
                 await asyncio.sleep(0.5)
 
     async def detect_upload_status(self, page):
@@ -229,7 +251,7 @@ class TencentVideo(object):
                     tencent_logger.info("  [-]视频上传完毕")
                     break
                 else:
-                    tencent_logger.info("  [-] 正在上传视频中...")
+                    log_every(tencent_logger, "  [-] 正在上传视频中...")
                     await asyncio.sleep(2)
                     # 出错了视频出错
                     if await page.locator('div.status-msg.error').count() and await page.locator(
@@ -237,16 +259,13 @@ class TencentVideo(object):
                         tencent_logger.error("  [-] 发现上传出错了...准备重试")
                         await self.handle_upload_error(page)
             except:
-                tencent_logger.info("  [-] 正在上传视频中...")
+                log_every(tencent_logger, "  [-] 正在上传视频中...")
                 await asyncio.sleep(2)
 
     async def add_title_tags(self, page):
-        await page.locator("div.input-editor").click()
-        await page.keyboard.type(self.title)
+        await replace_editor_text(page, page.locator("div.input-editor"), self.title)
         await page.keyboard.press("Enter")
-        for index, tag in enumerate(self.tags, start=1):
-            await page.keyboard.type("#" + tag)
-            await page.keyboard.press("Space")
+        await add_topics(page, self.tags, SOCIAL_MEDIA_TENCENT)
         tencent_logger.info(f"成功添加hashtag: {len(self.tags)}")
 
     async def add_collection(self, page):
@@ -276,10 +295,15 @@ class TencentVideo(object):
                 await page.locator('div.form-content:visible').click()  # 下拉菜单
                 await page.locator(
                     f'div.form-content:visible ul.weui-desktop-dropdown__list li.weui-desktop-dropdown__list-ele:has-text("{self.category}")').first.click()
-                await page.wait_for_timeout(1000)
+                # 等下拉菜单收起
+                try:
+                    await page.locator('div.form-content:visible ul.weui-desktop-dropdown__list').first.wait_for(
+                        state="hidden", timeout=3000)
+                except PlaywrightTimeoutError:
+                    pass
             if await page.locator('button:has-text("声明原创"):visible').count():
                 await page.locator('button:has-text("声明原创"):visible').click()
 
     async def main(self):
         async with async_playwright() as playwright:
-            await self.upload(playwright)
+            return await self.upload(playwright)
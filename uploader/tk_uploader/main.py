@@ -2,21 +2,27 @@
 import re
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright
+from playwright.async_api import Playwright, async_playwright, TimeoutError as PlaywrightTimeoutError
 import os
 import asyncio
 from uploader.tk_uploader.tk_config import Tk_Locator
-from utils.base_social_media import set_init_script
+from utils.base_social_media import set_init_script, set_route_filter, goto_platform_page, add_topics, replace_editor_text, wait_for_any, \
+    SOCIAL_MEDIA_TIKTOK
+from utils.bandwidth import set_video_files
 from utils.files_times import get_absolute_path
-from utils.log import tiktok_logger
+from utils.log import tiktok_logger, log_every
+from utils.metrics import fixed_sleep, track_cookie_check, track_upload_job
+from utils.session_store import SESSIONS, save_context_state
 from conf import LOCAL_CHROME_HEADLESS
 
 
+@track_cookie_check(SOCIAL_MEDIA_TIKTOK)
 async def cookie_auth(account_file):
     async with async_playwright() as playwright:
         browser = await playwright.firefox.launch(headless=LOCAL_CHROME_HEADLESS)
-        context = await browser.new_context(storage_state=account_file)
+        context = await browser.new_context(storage_state=SESSIONS.get(account_file))
         context = await set_init_script(context)
+        context = await set_route_filter(context, SOCIAL_MEDIA_TIKTOK, block_resources=True)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
@@ -124,8 +130,11 @@ class TiktokVideo(object):
         # pick hour first
         await self.locator_base.locator(hour_selector).click()
         # click time button again
-        # 等待某个特定的元素出现或状态变化，表明UI已更新
-        await page.wait_for_timeout(1000)  # 等待500毫秒
+        # 等小时列表收起（表明选择已生效）后再重新打开时间选择
+        try:
+            await self.locator_base.locator("span.tiktok-timepicker-left").first.wait_for(state="hidden", timeout=2000)
+        except PlaywrightTimeoutError:
+            pass
         await scheduled_picker.locator('div.TUXInputBox').nth(0).click()
         # pick minutes after
         await self.locator_base.locator(minute_selector).click()
@@ -141,23 +150,20 @@ class TiktokVideo(object):
         file_chooser = await fc_info.value
         await file_chooser.set_files(self.file_path)
 
+    @track_upload_job(SOCIAL_MEDIA_TIKTOK)
     async def upload(self, playwright: Playwright) -> None:
         browser = await playwright.firefox.launch(headless=self.headless)
-        context = await browser.new_context(storage_state=f"{self.account_file}")
+        context = await browser.new_context(storage_state=SESSIONS.get(self.account_file))
         context = await set_init_script(context)
+        context = await set_route_filter(context, SOCIAL_MEDIA_TIKTOK)
         page = await context.new_page()
+        self.job_metrics.phase("navigation")
 
-        await page.goto("https://www.tiktok.com/creator-center/upload")
+        await goto_platform_page(page, "https://www.tiktok.com/creator-center/upload", SOCIAL_MEDIA_TIKTOK)
         tiktok_logger.info(f'[+]Uploading-------{self.title}.mp4')
 
         await page.wait_for_url("https://www.tiktok.com/tiktokstudio/upload", timeout=10000)
 
-        try:
-            await page.wait_for_selector('iframe[data-tt="Upload_index_iframe"], div.upload-container', timeout=10000)
-            tiktok_logger.info("Either iframe or div appeared.")
-        except Exception as e:
-            tiktok_logger.error("Neither iframe nor div appeared within the timeout.")
-
         await self.choose_base_locator(page)
 
         upload_button = self.locator_base.locator(
@@ -167,55 +173,36 @@ class TiktokVideo(object):
         async with page.expect_file_chooser() as fc_info:
             await upload_button.click()
         file_chooser = await fc_info.value
-        await file_chooser.set_files(self.file_path)
+        await set_video_files(file_chooser, self.file_path, self.publish_date)
 
+        self.job_metrics.phase("metadata")
         await self.add_title_tags(page)
+        self.job_metrics.phase("file_transfer")
         # detact upload status
         await self.detect_upload_status(page)
         if self.publish_date != 0:
+            self.job_metrics.phase("schedule")
             await self.set_schedule_time(page, self.publish_date)
 
+        self.job_metrics.phase("publish")
         await self.click_publish(page)
 
-        await context.storage_state(path=f"{self.account_file}")  # save cookie
+        self.job_metrics.phase("teardown")
+        await save_context_state(context, self.account_file)  # save cookie
         tiktok_logger.info('  [-] update cookie！')
-        await asyncio.sleep(2)  # close delay for look the video status
+        await fixed_sleep(2)  # close delay for look the video status
         # close all
         await context.close()
         await browser.close()
 
     async def add_title_tags(self, page):
-
         editor_locator = self.locator_base.locator('div.public-DraftEditor-content')
-        await editor_locator.click()
-
-        await page.keyboard.press("End")
-
-        await page.keyboard.press("Control+A")
-
-        await page.keyboard.press("Delete")
-
-        await page.keyboard.press("End")
-
-        await page.wait_for_timeout(1000)  # 等待1秒
-
-        await page.keyboard.insert_text(self.title)
-        await page.wait_for_timeout(1000)  # 等待1秒
-        await page.keyboard.press("End")
-
+        await replace_editor_text(page, editor_locator, self.title)
         await page.keyboard.press("Enter")
 
         # tag part
-        for index, tag in enumerate(self.tags, start=1):
-            tiktok_logger.info("Setting the %s tag" % index)
-            await page.keyboard.press("End")
-            await page.wait_for_timeout(1000)  # 等待1秒
-            await page.keyboard.insert_text("#" + tag + " ")
-            await page.keyboard.press("Space")
-            await page.wait_for_timeout(1000)  # 等待1秒
-
-            await page.keyboard.press("Backspace")
-            await page.keyboard.press("End")
+        await add_topics(page, self.tags, SOCIAL_MEDIA_TIKTOK, root=self.locator_base)
+        tiktok_logger.info(f"Set {len(self.tags)} tags")
 
     async def click_publish(self, page):
         success_flag_div = '#\\:r9\\:'
@@ -234,7 +221,7 @@ class TiktokVideo(object):
                     break
                 else:
                     tiktok_logger.exception(f"  [-] Exception: {e}")
-                    tiktok_logger.info("  [-] video publishing")
+                    log_every(tiktok_logger, "  [-] video publishing")
                     await page.screenshot(full_page=True)
                     await asyncio.sleep(0.5)
 
@@ -245,21 +232,30 @@ class TiktokVideo(object):
                     tiktok_logger.info("  [-]video uploaded.")
                     break
                 else:
-                    tiktok_logger.info("  [-] video uploading...")
+                    log_every(tiktok_logger, "  [-] video uploading...")
                     await asyncio.sleep(2)
                     if await self.locator_base.locator('button[aria-label="Select file"]').count():
                         tiktok_logger.info("  [-] found some error while uploading now retry...")
                         await self.handle_upload_error(page)
             except:
-                tiktok_logger.info("  [-] video uploading...")
+                log_every(tiktok_logger, "  [-] video uploading...")
                 await asyncio.sleep(2)
 
     async def choose_base_locator(self, page):
-        # await page.wait_for_selector('div.upload-container')
-        if await page.locator('iframe[data-tt="Upload_index_iframe"]').count():
-            self.locator_base = self.locator_base
+        # 新旧两版上传页同时等待，哪个先出现用哪个
+        try:
+            variant = await wait_for_any(page, {
+                "iframe": 'iframe[data-tt="Upload_index_iframe"]',
+                "div": "div.upload-container",
+            }, timeout=10000)
+            tiktok_logger.info(f"Upload page variant: {variant}")
+        except PlaywrightTimeoutError:
+            tiktok_logger.error("Neither iframe nor div appeared within the timeout.")
+            variant = "div"
+        if variant == "iframe":
+            self.locator_base = page.frame_locator(Tk_Locator.tk_iframe)
         else:
-            self.locator_base = page.locator(Tk_Locator.default) 
+            self.locator_base = page.locator(Tk_Locator.default)
 
     async def main(self):
         async with async_playwright() as playwright:
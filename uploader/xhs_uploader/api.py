@@ -0,0 +1,160 @@
+import os
+import time
+from datetime import datetime
+
+from requests import RequestException
+from xhs import XhsClient
+from xhs.exception import DataFetchError, NeedVerifyError, SignError
+
+from uploader.xhs_uploader.main import sign_shared
+from uploader.xhs_uploader.topic_cache import get_topic_cache
+from utils.bandwidth import BANDWIDTH
+from utils.base_social_media import SOCIAL_MEDIA_XIAOHONGSHU
+from utils.log import xhs_logger
+from utils.metrics import track_upload_job
+from utils.network import NON_RETRYABLE_EXCEPTIONS, RetryPolicy, retry
+from utils.session_store import SESSIONS
+
+# ros-upload 单次 PUT 的上限，超过后走分片上传
+XHS_SINGLE_UPLOAD_LIMIT = 5 * 1024 * 1024
+# 发布笔记需要 video_id，只在单次 PUT 的响应头（X-Ros-Video-Id）里确认过；分片上传合并（CompleteMultipartUpload）
+# 的响应是否带这个头没有在真实上传中验证，也没找到别的查询接口，所以默认只有不超过 XHS_SINGLE_UPLOAD_LIMIT 的文件走接口，
+# 更大的文件直接用浏览器发布。设置 SAU_XHS_API_MULTIPART=1 可以让大文件也先试接口（拿不到 video_id 时仍会回退）
+XHS_API_MULTIPART = os.environ.get("SAU_XHS_API_MULTIPART", "").lower() in ("1", "true", "yes")
+# 上传完成后轮询视频第一帧（作为封面）的次数和间隔
+FIRST_FRAME_RETRIES = 10
+FIRST_FRAME_INTERVAL = 3
+# 每个视频最多关联的官方话题数
+MAX_TOPICS = 3
+# xhs 库的异常都继承 RequestException：网络错误、IP 限流重试；接口返回的业务错误、签名失败、需要验证码重试也没用
+XHS_RETRY_POLICY = RetryPolicy(retry_on=(RequestException,),
+                               give_up_on=NON_RETRYABLE_EXCEPTIONS + (DataFetchError, SignError, NeedVerifyError))
+XHS_REQUEST_MAX_ATTEMPTS = 3
+
+
+class XhsApiNotPublished(Exception):
+    """
+    接口发布在调用 create_note 之前失败，笔记一定没有发出，调用方可以放心改用浏览器发布。
+    create_note 本身失败时不包装成这个异常：请求可能已经在服务端生效，再用浏览器发一次会重复发布。
+    """
+
+
+def xhs_request(func, max_attempts=XHS_REQUEST_MAX_ATTEMPTS):
+    """包装 XhsClient 的接口方法：按 XHS_RETRY_POLICY 退避重试，失败计入小红书的熔断器和重试预算（utils/network.py）"""
+    return retry(max_retries=max_attempts, platform=SOCIAL_MEDIA_XIAOHONGSHU, policy=XHS_RETRY_POLICY)(func)
+
+
+def storage_state_to_cookie_str(account_file) -> str:
+    """playwright storage_state 文件 -> XhsClient 需要的 cookie 字符串"""
+    state = SESSIONS.get(account_file)
+    cookies = [cookie for cookie in state.get("cookies", []) if cookie.get("domain", "").endswith("xiaohongshu.com")]
+    return "; ".join(f"{cookie['name']}={cookie['value']}" for cookie in cookies)
+
+
+def api_can_upload(video_path) -> bool:
+    """这个文件能否走接口发布，见 XHS_API_MULTIPART"""
+    return XHS_API_MULTIPART or os.path.getsize(video_path) <= XHS_SINGLE_UPLOAD_LIMIT
+
+
+def upload_video(xhs_client: XhsClient, video_path, publish_date=0) -> tuple:
+    """
+    上传视频文件，返回 (file_id, video_id)；大于 5MB 的文件使用分片上传（XhsClient.upload_file 不支持），
+    默认不会走到这里，见 api_can_upload。
+    先向带宽调度排队，放行后再申请上传凭证，排队时间长了凭证可能过期；
+    xhs 库没有进度回调，字节数在上传完成后按用时计入。
+    """
+    file_size = os.path.getsize(video_path)
+    with BANDWIDTH.admit(os.path.basename(str(video_path)), file_size, publish_date, SOCIAL_MEDIA_XIAOHONGSHU) as ticket:
+        file_id, token = xhs_request(xhs_client.get_upload_files_permit)("video")
+        start = time.monotonic()
+        if file_size > XHS_SINGLE_UPLOAD_LIMIT:
+            res = xhs_request(xhs_client.upload_file_with_slice)(file_id, token, str(video_path))
+        else:
+            res = xhs_request(xhs_client.upload_file)(file_id, token, str(video_path), content_type="video/mp4")
+        ticket.add_bytes(file_size, elapsed=time.monotonic() - start)
+    # xhs 库自己的 create_video_note 从单次 PUT 的响应头读取 X-Ros-Video-Id；分片上传只在 SAU_XHS_API_MULTIPART 打开时
+    # 才会走到这里，响应里没有这个头时抛出异常，由调用方在发布之前回退
+    video_id = getattr(res, "headers", {}).get("X-Ros-Video-Id")
+    if not video_id:
+        mode = "分片" if file_size > XHS_SINGLE_UPLOAD_LIMIT else "单次"
+        raise Exception(f"{mode}上传的响应里没有 X-Ros-Video-Id: {file_id}")
+    return file_id, video_id
+
+
+def get_topics(xhs_client: XhsClient, tags):
+    return get_topic_cache().resolve_many(xhs_client, tags[:MAX_TOPICS],
+                                          suggest=xhs_request(xhs_client.get_suggest_topic))
+
+
+class XhsApiVideo(object):
+    """
+    小红书 HTTP 接口发布视频，不打开创作者中心页面；签名使用常驻签名浏览器（sign_shared）。
+    参数与 XiaoHongShuVideo 一致，默认只用于不超过 5MB 的文件（api_can_upload）。
+    create_note 之前的失败抛出 XhsApiNotPublished，可以回退到浏览器流程；
+    create_note 的失败原样抛出，不能回退。
+    """
+
+    def __init__(self, title, file_path, tags, publish_date, account_file, thumbnail_path=None):
+        self.title = title
+        self.file_path = file_path
+        self.tags = tags
+        self.publish_date = publish_date
+        self.account_file = account_file
+        self.thumbnail_path = thumbnail_path
+
+    @track_upload_job(SOCIAL_MEDIA_XIAOHONGSHU, first_phase="login")
+    def upload(self):
+        try:
+            xhs_client, topics, video_info = self._prepare()
+        except Exception as e:
+            raise XhsApiNotPublished(repr(e)) from e
+
+        self.job_metrics.phase("publish")
+        post_time = None
+        if isinstance(self.publish_date, datetime):
+            post_time = self.publish_date.strftime("%Y-%m-%d %H:%M:%S")
+        tags_str = ' '.join(['#' + tag for tag in self.tags])
+        hash_tags_str = ' ' + ' '.join(['#' + topic['name'] + '[话题]#' for topic in topics]) if topics else ''
+        # 只尝试一次：失败计入熔断器，但不重试，请求可能已经在服务端生效，重试会重复发布
+        create_note = xhs_request(xhs_client.create_note, max_attempts=1)
+        note = create_note(self.title[:20], self.title + tags_str + hash_tags_str, "video", topics=topics,
+                           video_info=video_info, post_time=post_time, is_private=False)
+        xhs_logger.success(f"[+] (api) 发布成功: {note}")
+        return note
+
+    def _prepare(self):
+        """发布前的步骤：话题、上传视频、封面，返回 (xhs_client, topics, video_info)"""
+        xhs_client = XhsClient(storage_state_to_cookie_str(self.account_file), sign=sign_shared, timeout=60)
+        xhs_logger.info(f'[+] (api) 正在上传-------{os.path.basename(self.file_path)}')
+
+        self.job_metrics.phase("metadata")
+        topics = get_topics(xhs_client, self.tags)
+
+        self.job_metrics.phase("file_transfer")
+        file_id, video_id = upload_video(xhs_client, self.file_path, self.publish_date)
+
+        self.job_metrics.phase("processing")
+        is_upload = bool(self.thumbnail_path)
+        if is_upload:
+            image_id, token = xhs_request(xhs_client.get_upload_files_permit)("image")
+            xhs_request(xhs_client.upload_file)(image_id, token, str(self.thumbnail_path))
+        else:
+            image_id = None
+            get_first_frame = xhs_request(xhs_client.get_video_first_frame_image_id)
+            for _ in range(FIRST_FRAME_RETRIES):
+                time.sleep(FIRST_FRAME_INTERVAL)
+                image_id = get_first_frame(video_id)
+                if image_id:
+                    break
+            if not image_id:
+                raise Exception(f"视频转码超时，未获取到封面: {video_id}")
+
+        video_info = {
+            "file_id": file_id,
+            "timelines": [],
+            "cover": {"file_id": image_id, "frame": {"ts": 0, "is_user_select": False, "is_upload": is_upload}},
+            "chapters": [],
+            "chapter_sync_text": False,
+            "entrance": "web",
+        }
+        return xhs_client, topics, video_info
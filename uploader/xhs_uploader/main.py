@@ -1,12 +1,17 @@
+import atexit
 import configparser
 import json
 import pathlib
+import queue
+import threading
+from concurrent.futures import Future
 from time import sleep
 
 import requests
 from playwright.sync_api import sync_playwright
 
 from conf import BASE_DIR, XHS_SERVER, LOCAL_CHROME_HEADLESS
+from utils.log import xhs_logger
 
 config = configparser.RawConfigParser()
 config.read('accounts.ini')
@@ -43,6 +48,100 @@ def sign_local(uri, data=None, a1="", web_session=""):
     raise Exception("重试了这么多次还是无法签名成功，寄寄寄")
 
 
+SIGN_RETRIES = 10
+SIGN_TIMEOUT = 120
+
+
+class XhsSigner(object):
+    """
+    常驻的签名浏览器：sign_local 每次签名都要启动一个浏览器，这里只启动一次并复用同一个页面，a1 变化时才重新加载。
+    playwright 同步 API 只能在创建它的线程里使用，所以浏览器放在独立线程中，sign() 可以在任意线程（包括事件循环线程）调用。
+    """
+
+    def __init__(self, headless=LOCAL_CHROME_HEADLESS):
+        self.headless = headless
+        self._requests = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="xhs-signer", daemon=True)
+                self._thread.start()
+
+    def _load_page(self, browser_context, page, a1):
+        if page is not None:
+            page.close()
+        browser_context.clear_cookies()
+        browser_context.add_cookies([{'name': 'a1', 'value': a1, 'domain': ".xiaohongshu.com", 'path': "/"}])
+        page = browser_context.new_page()
+        page.goto("https://www.xiaohongshu.com")
+        # 与 sign_local 相同：设置 cookie 后需要等待页面脚本初始化，否则签名失败
+        sleep(2)
+        return page
+
+    def _run(self):
+        with sync_playwright() as playwright:
+            browser = playwright.chromium.launch(headless=self.headless)
+            browser_context = browser.new_context()
+            browser_context.add_init_script(path=pathlib.Path(BASE_DIR / "utils/stealth.min.js"))
+            page, current_a1 = None, None
+            while True:
+                item = self._requests.get()
+                if item is None:
+                    break
+                uri, data, a1, future = item
+                if future.done():
+                    continue
+                error = None
+                for _ in range(SIGN_RETRIES):
+                    try:
+                        if page is None or a1 != current_a1:
+                            page, current_a1 = self._load_page(browser_context, page, a1), a1
+                        encrypt_params = page.evaluate("([url, data]) => window._webmsxyw(url, data)", [uri, data])
+                        future.set_result({
+                            "x-s": encrypt_params["X-s"],
+                            "x-t": str(encrypt_params["X-t"])
+                        })
+                        break
+                    except Exception as e:
+                        # window._webmsxyw is not a function 等错误，重新加载页面后重试
+                        error = e
+                        if page is not None:
+                            try:
+                                page.close()
+                            except Exception:
+                                pass
+                        page, current_a1 = None, None
+                else:
+                    xhs_logger.error(f"签名失败: {error}")
+                    future.set_exception(Exception("重试了这么多次还是无法签名成功，寄寄寄"))
+            browser.close()
+
+    def sign(self, uri, data=None, a1="", web_session=""):
+        self._ensure_started()
+        future = Future()
+        self._requests.put((uri, data, a1, future))
+        return future.result(timeout=SIGN_TIMEOUT)
+
+    def close(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                self._requests.put(None)
+                self._thread.join(timeout=10)
+            self._thread = None
+
+
+xhs_signer = XhsSigner()
+atexit.register(xhs_signer.close)
+
+
+def sign_shared(uri, data=None, a1="", web_session=""):
+    """与 sign_local 参数一致，使用常驻签名浏览器"""
+    return xhs_signer.sign(uri, data, a1, web_session)
+
+
 def sign(uri, data=None, a1="", web_session=""):
     # 填写自己的 flask 签名服务端口地址
     res = requests.post(f"{XHS_SERVER}/sign",
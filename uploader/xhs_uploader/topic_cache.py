@@ -0,0 +1,97 @@
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from conf import BASE_DIR
+from db.schema import XHS_TOPIC_CACHE_TABLE
+from utils.log import xhs_logger
+
+DB_PATH = Path(BASE_DIR / "db" / "database.db")
+# 官方话题变化很慢，缓存 7 天；搜不到话题的 tag 也缓存（时间短一些），避免每次都去请求
+TOPIC_CACHE_TTL = 7 * 24 * 3600
+TOPIC_CACHE_NEGATIVE_TTL = 24 * 3600
+# 超过这个条数时按最近使用时间淘汰
+TOPIC_CACHE_MAX_ENTRIES = 5000
+
+
+class TopicCache(object):
+    """
+    tag -> 官方话题对象（get_suggest_topic 返回的第一个结果），保存在 db/database.db，多次运行共享。
+    命中缓存时不发请求、不需要签名。
+    """
+
+    def __init__(self, db_path=DB_PATH, ttl=TOPIC_CACHE_TTL, negative_ttl=TOPIC_CACHE_NEGATIVE_TTL,
+                 max_entries=TOPIC_CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute(XHS_TOPIC_CACHE_TABLE)
+            conn.commit()
+
+    def get(self, tag):
+        """返回 (是否命中, 话题对象或 None)"""
+        now = time.time()
+        with self._lock, sqlite3.connect(self.db_path) as conn:
+            row = conn.execute('SELECT topic, created_at FROM xhs_topic_cache WHERE tag = ?', (tag,)).fetchone()
+            if row is None:
+                return False, None
+            topic, created_at = row
+            if now - created_at > (self.ttl if topic is not None else self.negative_ttl):
+                conn.execute('DELETE FROM xhs_topic_cache WHERE tag = ?', (tag,))
+                conn.commit()
+                return False, None
+            conn.execute('UPDATE xhs_topic_cache SET last_used = ? WHERE tag = ?', (now, tag))
+            conn.commit()
+        return True, json.loads(topic) if topic is not None else None
+
+    def set(self, tag, topic):
+        now = time.time()
+        with self._lock, sqlite3.connect(self.db_path) as conn:
+            conn.execute('INSERT OR REPLACE INTO xhs_topic_cache (tag, topic, created_at, last_used) VALUES (?, ?, ?, ?)',
+                         (tag, json.dumps(topic, ensure_ascii=False) if topic is not None else None, now, now))
+            # LRU 淘汰
+            conn.execute('''DELETE FROM xhs_topic_cache WHERE tag IN (
+                SELECT tag FROM xhs_topic_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)''', (self.max_entries,))
+            conn.commit()
+
+    def resolve(self, xhs_client, tag, suggest=None):
+        """
+        先查缓存，未命中再调用 get_suggest_topic 并写入缓存；返回话题对象（已设置 type=topic）或 None。
+        suggest 可以替换 xhs_client.get_suggest_topic（如包上重试）
+        """
+        hit, topic = self.get(tag)
+        if hit:
+            return topic
+        topic_official = (suggest or xhs_client.get_suggest_topic)(tag)
+        topic = None
+        if topic_official:
+            topic = topic_official[0]
+            topic['type'] = 'topic'
+        self.set(tag, topic)
+        xhs_logger.debug(f"话题缓存未命中: {tag} -> {topic['name'] if topic else None}")
+        return topic
+
+    def resolve_many(self, xhs_client, tags, suggest=None):
+        topics = []
+        for tag in tags:
+            topic = self.resolve(xhs_client, tag, suggest)
+            if topic:
+                topics.append(topic)
+        return topics
+
+
+_topic_cache = None
+_topic_cache_lock = threading.Lock()
+
+
+def get_topic_cache() -> TopicCache:
+    global _topic_cache
+    with _topic_cache_lock:
+        if _topic_cache is None:
+            _topic_cache = TopicCache()
+        return _topic_cache
@@ -1,37 +1,50 @@
 # -*- coding: utf-8 -*-
 from datetime import datetime
 
-from playwright.async_api import Playwright, async_playwright, Page
+from playwright.async_api import Playwright, async_playwright, Page, TimeoutError as PlaywrightTimeoutError
 import os
 import asyncio
 
 from conf import LOCAL_CHROME_PATH, LOCAL_CHROME_HEADLESS
-from utils.base_social_media import set_init_script
-from utils.log import xiaohongshu_logger
+from utils.base_social_media import set_init_script, set_route_filter, goto_platform_page, add_topics, replace_editor_text, wait_for_any, \
+    wait_for_input_value, SOCIAL_MEDIA_XIAOHONGSHU
+from utils.bandwidth import set_video_files
+from utils.log import xiaohongshu_logger, log_every
+from utils.metrics import fixed_sleep, track_cookie_check, track_upload_job
+from utils.session_store import SESSIONS, save_context_state
 
 
+@track_cookie_check(SOCIAL_MEDIA_XIAOHONGSHU)
 async def cookie_auth(account_file):
     async with async_playwright() as playwright:
         browser = await playwright.chromium.launch(headless=LOCAL_CHROME_HEADLESS)
-        context = await browser.new_context(storage_state=account_file)
+        context = await browser.new_context(storage_state=SESSIONS.get(account_file))
         context = await set_init_script(context)
+        context = await set_route_filter(context, SOCIAL_MEDIA_XIAOHONGSHU, block_resources=True)
         # 创建一个新的页面
         page = await context.new_page()
         # 访问指定的 URL
         await page.goto("https://creator.xiaohongshu.com/creator-micro/content/upload")
         try:
-            await page.wait_for_url("https://creator.xiaohongshu.com/creator-micro/content/upload", timeout=5000)
-        except:
-            print("[+] 等待5秒 cookie 失效")
+            # 跳转到登录页时不必等满 5 秒
+            state = await wait_for_any(page, {
+                "upload": "url:https://creator.xiaohongshu.com/creator-micro/content/upload",
+                "login": "text=手机号登录",
+                "qrcode": "text=扫码登录",
+            }, timeout=5000)
+        except PlaywrightTimeoutError:
+            state = None
+        if state != "upload":
+            xiaohongshu_logger.info("[+] 等待5秒 cookie 失效")
             await context.close()
             await browser.close()
             return False
         # 2024.06.17 抖音创作者中心改版
         if await page.get_by_text('手机号登录').count() or await page.get_by_text('扫码登录').count():
-            print("[+] 等待5秒 cookie 失效")
+            xiaohongshu_logger.info("[+] 等待5秒 cookie 失效")
             return False
         else:
-            print("[+] cookie 有效")
+            xiaohongshu_logger.success("[+] cookie 有效")
             return True
 
 
@@ -76,8 +89,8 @@ class XiaoHongShuVideo(object):
         self.thumbnail_path = thumbnail_path
 
     async def set_schedule_time_xiaohongshu(self, page, publish_date):
-        print("  [-] 正在设置定时发布时间...")
-        print(f"publish_date: {publish_date}")
+        xiaohongshu_logger.info("  [-] 正在设置定时发布时间...")
+        xiaohongshu_logger.debug(f"publish_date: {publish_date}")
 
         # 使用文本内容定位元素
         # element = await page.wait_for_selector(
@@ -90,22 +103,25 @@ class XiaoHongShuVideo(object):
         label_element = page.locator("label:has-text('定时发布')")
         # # 在选中的 label 元素下点击 checkbox
         await label_element.click()
-        await asyncio.sleep(1)
         publish_date_hour = publish_date.strftime("%Y-%m-%d %H:%M")
-        print(f"publish_date_hour: {publish_date_hour}")
+        xiaohongshu_logger.debug(f"publish_date_hour: {publish_date_hour}")
 
-        await asyncio.sleep(1)
-        await page.locator('.el-input__inner[placeholder="选择日期和时间"]').click()
+        # 选中定时发布后才会出现日期输入框
+        date_input = page.locator('.el-input__inner[placeholder="选择日期和时间"]')
+        await date_input.wait_for(state="visible")
+        await date_input.click()
         await page.keyboard.press("Control+KeyA")
         await page.keyboard.type(str(publish_date_hour))
         await page.keyboard.press("Enter")
 
-        await asyncio.sleep(1)
+        if not await wait_for_input_value(date_input, publish_date_hour):
+            xiaohongshu_logger.warning(f"  [-] 定时发布时间可能未生效: {publish_date_hour}")
 
     async def handle_upload_error(self, page):
         xiaohongshu_logger.info('视频出错了，重新上传中')
         await page.locator('div.progress-div [class^="upload-btn-input"]').set_input_files(self.file_path)
 
+    @track_upload_job(SOCIAL_MEDIA_XIAOHONGSHU)
     async def upload(self, playwright: Playwright) -> None:
         # 使用 Chromium 浏览器启动一个浏览器实例
         if self.local_executable_path:
@@ -115,20 +131,24 @@ class XiaoHongShuVideo(object):
         # 创建一个浏览器上下文，使用指定的 cookie 文件
         context = await browser.new_context(
             viewport={"width": 1600, "height": 900},
-            storage_state=f"{self.account_file}"
+            storage_state=SESSIONS.get(self.account_file)
         )
         context = await set_init_script(context)
+        context = await set_route_filter(context, SOCIAL_MEDIA_XIAOHONGSHU)
 
         # 创建一个新的页面
         page = await context.new_page()
+        self.job_metrics.phase("navigation")
         # 访问指定的 URL
-        await page.goto("https://creator.xiaohongshu.com/publish/publish?from=homepage&target=video")
+        await goto_platform_page(page, "https://creator.xiaohongshu.com/publish/publish?from=homepage&target=video", SOCIAL_MEDIA_XIAOHONGSHU)
         xiaohongshu_logger.info(f'[+]正在上传-------{self.title}.mp4')
         # 等待页面跳转到指定的 URL，没进入，则自动等待到超时
         xiaohongshu_logger.info(f'[-] 正在打开主页...')
         await page.wait_for_url("https://creator.xiaohongshu.com/publish/publish?from=homepage&target=video")
         # 点击 "上传视频" 按钮
-        await page.locator("div[class^='upload-content'] input[class='upload-input']").set_input_files(self.file_path)
+        await set_video_files(page.locator("div[class^='upload-content'] input[class='upload-input']"), self.file_path,
+                              self.publish_date)
+        self.job_metrics.phase("file_transfer")
 
         # 等待页面跳转到指定的 URL 2025.01.08修改在原有基础上兼容两种页面
         while True:
@@ -151,34 +171,28 @@ class XiaoHongShuVideo(object):
                         xiaohongshu_logger.info("[+] 检测到上传成功标识!")
                         break  # 成功检测到上传成功后跳出循环
                     else:
-                        print("  [-] 未找到上传成功标识，继续等待...")
+                        log_every(xiaohongshu_logger, "  [-] 未找到上传成功标识，继续等待...")
                 else:
-                    print("  [-] 未找到预览元素，继续等待...")
+                    log_every(xiaohongshu_logger, "  [-] 未找到预览元素，继续等待...")
                     await asyncio.sleep(1)
             except Exception as e:
-                print(f"  [-] 检测过程出错: {str(e)}，重新尝试...")
+                log_every(xiaohongshu_logger, f"  [-] 检测过程出错: {str(e)}，重新尝试...", key="upload_check_error")
                 await asyncio.sleep(0.5)  # 等待0.5秒后重新尝试
 
         # 填充标题和话题
         # 检查是否存在包含输入框的元素
         # 这里为了避免页面变化，故使用相对位置定位：作品标题父级右侧第一个元素的input子元素
-        await asyncio.sleep(1)
+        self.job_metrics.phase("metadata")
+        await fixed_sleep(1)
         xiaohongshu_logger.info(f'  [-] 正在填充标题和话题...')
         title_container = page.locator('div.plugin.title-container').locator('input.d-text')
         if await title_container.count():
             await title_container.fill(self.title[:30])
         else:
-            titlecontainer = page.locator(".notranslate")
-            await titlecontainer.click()
-            await page.keyboard.press("Backspace")
-            await page.keyboard.press("Control+KeyA")
-            await page.keyboard.press("Delete")
-            await page.keyboard.type(self.title)
+            await replace_editor_text(page, page.locator(".notranslate"), self.title)
             await page.keyboard.press("Enter")
         css_selector = ".ql-editor" # 不能加上 .ql-blank 属性，这样只能获取第一次非空状态
-        for index, tag in enumerate(self.tags, start=1):
-            await page.type(css_selector, "#" + tag)
-            await page.press(css_selector, "Space")
+        await add_topics(page, self.tags, SOCIAL_MEDIA_XIAOHONGSHU, editor=css_selector)
         xiaohongshu_logger.info(f'总共添加{len(self.tags)}个话题')
 
         # while True:
@@ -215,8 +229,10 @@ class XiaoHongShuVideo(object):
         #         await page.locator(third_part_element).locator('input.semi-switch-native-control').click()
 
         if self.publish_date != 0:
+            self.job_metrics.phase("schedule")
             await self.set_schedule_time_xiaohongshu(page, self.publish_date)
 
+        self.job_metrics.phase("publish")
         # 判断视频是否发布成功
         while True:
             try:
@@ -232,13 +248,14 @@ class XiaoHongShuVideo(object):
                 xiaohongshu_logger.success("  [-]视频发布成功")
                 break
             except:
-                xiaohongshu_logger.info("  [-] 视频正在发布中...")
+                log_every(xiaohongshu_logger, "  [-] 视频正在发布中...")
                 await page.screenshot(full_page=True)
                 await asyncio.sleep(0.5)
 
-        await context.storage_state(path=self.account_file)  # 保存cookie
+        self.job_metrics.phase("teardown")
+        await save_context_state(context, self.account_file)  # 保存cookie
         xiaohongshu_logger.success('  [-]cookie更新完毕！')
-        await asyncio.sleep(2)  # 这里延迟是为了方便眼睛直观的观看
+        await fixed_sleep(2)  # 这里延迟是为了方便眼睛直观的观看
         # 关闭浏览器上下文和浏览器实例
         await context.close()
         await browser.close()
@@ -248,10 +265,9 @@ class XiaoHongShuVideo(object):
             await page.click('text="选择封面"')
             await page.wait_for_selector("div.semi-modal-content:visible")
             await page.click('text="设置竖封面"')
-            await page.wait_for_timeout(2000)  # 等待2秒
-            # 定位到上传区域并点击
+            # 定位到上传区域并点击（set_input_files 会等上传控件出现）
             await page.locator("div[class^='semi-upload upload'] >> input.semi-upload-hidden-input").set_input_files(thumbnail_path)
-            await page.wait_for_timeout(2000)  # 等待2秒
+            await fixed_sleep(2)  # 等封面处理
             await page.locator("div[class^='extractFooter'] button:visible:has-text('完成')").click()
             # finish_confirm_element = page.locator("div[class^='confirmBtn'] >> div:has-text('完成')")
             # if await finish_confirm_element.count():
@@ -259,59 +275,52 @@ class XiaoHongShuVideo(object):
             # await page.locator("div[class^='footer'] button:has-text('完成')").click()
 
     async def set_location(self, page: Page, location: str = "青岛市"):
-        print(f"开始设置位置: {location}")
+        xiaohongshu_logger.info(f"开始设置位置: {location}")
         
         # 点击地点输入框
-        print("等待地点输入框加载...")
+        xiaohongshu_logger.debug("等待地点输入框加载...")
         loc_ele = await page.wait_for_selector('div.d-text.d-select-placeholder.d-text-ellipsis.d-text-nowrap')
-        print(f"已定位到地点输入框: {loc_ele}")
+        xiaohongshu_logger.debug(f"已定位到地点输入框: {loc_ele}")
         await loc_ele.click()
-        print("点击地点输入框完成")
+        xiaohongshu_logger.debug("点击地点输入框完成")
         
         # 输入位置名称
-        print(f"等待1秒后输入位置名称: {location}")
-        await page.wait_for_timeout(1000)
+        xiaohongshu_logger.debug(f"输入位置名称: {location}")
         await page.keyboard.type(location)
-        print(f"位置名称输入完成: {location}")
+        xiaohongshu_logger.debug(f"位置名称输入完成: {location}")
         
         # 等待下拉列表加载
-        print("等待下拉列表加载...")
+        xiaohongshu_logger.debug("等待下拉列表加载...")
         dropdown_selector = 'div.d-popover.d-popover-default.d-dropdown.--size-min-width-large'
-        await page.wait_for_timeout(3000)
         try:
-            await page.wait_for_selector(dropdown_selector, timeout=3000)
-            print("下拉列表已加载")
+            await page.wait_for_selector(dropdown_selector, timeout=6000)
+            xiaohongshu_logger.debug("下拉列表已加载")
         except:
-            print("下拉列表未按预期显示，可能结构已变化")
-        
-        # 增加等待时间以确保内容加载完成
-        print("额外等待1秒确保内容渲染完成...")
-        await page.wait_for_timeout(1000)
+            xiaohongshu_logger.debug("下拉列表未按预期显示，可能结构已变化")
         
-        # 尝试更灵活的XPath选择器
-        print("尝试使用更灵活的XPath选择器...")
+        # 尝试更灵活的XPath选择器，搜索结果是异步返回的，直接等目标选项渲染出来
+        xiaohongshu_logger.debug("尝试使用更灵活的XPath选择器...")
         flexible_xpath = (
             f'//div[contains(@class, "d-popover") and contains(@class, "d-dropdown")]'
             f'//div[contains(@class, "d-options-wrapper")]'
             f'//div[contains(@class, "d-grid") and contains(@class, "d-options")]'
             f'//div[contains(@class, "name") and text()="{location}"]'
         )
-        await page.wait_for_timeout(3000)
         
         # 尝试定位元素
-        print(f"尝试定位包含'{location}'的选项...")
+        xiaohongshu_logger.debug(f"尝试定位包含'{location}'的选项...")
         try:
             # 先尝试使用更灵活的选择器
             location_option = await page.wait_for_selector(
                 flexible_xpath,
-                timeout=3000
+                timeout=7000
             )
             
             if location_option:
-                print(f"使用灵活选择器定位成功: {location_option}")
+                xiaohongshu_logger.debug(f"使用灵活选择器定位成功: {location_option}")
             else:
                 # 如果灵活选择器失败，再尝试原选择器
-                print("灵活选择器未找到元素，尝试原始选择器...")
+                xiaohongshu_logger.debug("灵活选择器未找到元素，尝试原始选择器...")
                 location_option = await page.wait_for_selector(
                     f'//div[contains(@class, "d-popover") and contains(@class, "d-dropdown")]'
                     f'//div[contains(@class, "d-options-wrapper")]'
@@ -321,25 +330,25 @@ class XiaoHongShuVideo(object):
                 )
             
             # 滚动到元素并点击
-            print("滚动到目标选项...")
+            xiaohongshu_logger.debug("滚动到目标选项...")
             await location_option.scroll_into_view_if_needed()
-            print("元素已滚动到视图内")
+            xiaohongshu_logger.debug("元素已滚动到视图内")
             
             # 增加元素可见性检查
             is_visible = await location_option.is_visible()
-            print(f"目标选项是否可见: {is_visible}")
+            xiaohongshu_logger.debug(f"目标选项是否可见: {is_visible}")
             
             # 点击元素
-            print("准备点击目标选项...")
+            xiaohongshu_logger.debug("准备点击目标选项...")
             await location_option.click()
-            print(f"成功选择位置: {location}")
+            xiaohongshu_logger.info(f"成功选择位置: {location}")
             return True
             
         except Exception as e:
-            print(f"定位位置失败: {e}")
+            xiaohongshu_logger.warning(f"定位位置失败: {e}")
             
             # 打印更多调试信息
-            print("尝试获取下拉列表中的所有选项...")
+            xiaohongshu_logger.debug("尝试获取下拉列表中的所有选项...")
             try:
                 all_options = await page.query_selector_all(
                     '//div[contains(@class, "d-popover") and contains(@class, "d-dropdown")]'
@@ -347,15 +356,15 @@ class XiaoHongShuVideo(object):
                     '//div[contains(@class, "d-grid") and contains(@class, "d-options")]'
                     '/div'
                 )
-                print(f"找到 {len(all_options)} 个选项")
+                xiaohongshu_logger.debug(f"找到 {len(all_options)} 个选项")
                 
                 # 打印前3个选项的文本内容
                 for i, option in enumerate(all_options[:3]):
                     option_text = await option.inner_text()
-                    print(f"选项 {i+1}: {option_text.strip()[:50]}...")
+                    xiaohongshu_logger.debug(f"选项 {i+1}: {option_text.strip()[:50]}...")
                     
             except Exception as e:
-                print(f"获取选项列表失败: {e}")
+                xiaohongshu_logger.warning(f"获取选项列表失败: {e}")
                 
             # 截图保存（取消注释使用）
             # await page.screenshot(path=f"location_error_{location}.png")
@@ -363,6 +372,6 @@ class XiaoHongShuVideo(object):
 
     async def main(self):
         async with async_playwright() as playwright:
-            await self.upload(playwright)
+            return await self.upload(playwright)
 
 
@@ -0,0 +1,335 @@
+"""
+上行带宽调度：同时上传的视频共用一条上行链路，一起抢带宽时每个都变慢，大文件拖住小文件，平台自己的上传超时开始触发。
+所有上传（浏览器里 set_input_files 交给页面的视频、b 站分块上传）先向 BANDWIDTH 排队，带宽还有余量时才放行：
+- 排队顺序：立即发布和定时发布时间临近（URGENT_SECONDS 内）的优先，其中小文件先传，等得越久越靠前，大文件不会一直排不上；
+  其余按发布时间先后
+- 余量：配置了 SAU_UPLINK_MBPS 时为 上行带宽 - 实测总吞吐；没配置时按实测总吞吐估计，放行后每个上传平均仍能拿到 MIN_UPLOAD_RATE_KB
+- 刚放行的上传还没测出速度，RAMP_SECONDS 内不再放行下一个（第一个上传总是直接放行）
+每个上传的吞吐按最近 THROUGHPUT_WINDOW 秒的字节数计算：浏览器上传统计页面发出的大请求体（分片上传的每个分片），
+b 站统计每个分块；总吞吐导出到 /metrics（sau_upload_throughput_bytes 等），明细见 BANDWIDTH.snapshot()。
+
+调度只在一个进程内生效，多进程（batch -p、守护进程 --processes）时每个进程各自调度，SAU_UPLINK_MBPS 按进程数分摊后再配置。
+
+    ticket = await BANDWIDTH.acquire_async("demo.mp4", size, publish_date, platform="douyin")
+    ticket.add_bytes(n)   # 每发送一段；没有进度回调时结束后 ticket.add_bytes(size, elapsed=用时)
+    ticket.release()
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from loguru import logger
+
+from utils.metrics import UPLOAD_ADMISSION_WAIT_SECONDS, UPLOAD_BYTES, UPLOAD_THROUGHPUT_BYTES, UPLOADS_ACTIVE, \
+    UPLOADS_WAITING, current_job_metrics
+
+# 上行带宽，Mbit/s；0 表示不知道，按实测吞吐自动估计
+UPLINK_MBPS = float(os.environ.get("SAU_UPLINK_MBPS", 0))
+# 每个上传至少要有的速度，KB/s，低于这个速度大文件容易触发平台的上传超时
+MIN_UPLOAD_RATE_KB = int(os.environ.get("SAU_MIN_UPLOAD_RATE_KB", 512))
+# 同时上传数的上限，带宽再富余也不超过
+MAX_ACTIVE_UPLOADS = int(os.environ.get("SAU_MAX_ACTIVE_UPLOADS", 8))
+# 吞吐统计窗口，秒；浏览器上传按分片完成计数，窗口要比上传一个分片的时间长
+THROUGHPUT_WINDOW = 30
+# 刚放行的上传在这段时间内还测不准速度，秒
+RAMP_SECONDS = 5
+# 定时发布时间在这个时间内的任务优先，秒
+URGENT_SECONDS = 30 * 60
+# 排队每等这么久，文件大小在排序时减半，秒
+AGING_SECONDS = 120
+# 异步等待时的轮询间隔，秒
+ADMIT_POLL_INTERVAL = 0.5
+# 浏览器上传：只统计不小于这个大小的请求体，排除页面里普通的接口请求
+MIN_TRACKED_BODY = 64 * 1024
+
+
+def publish_timestamp(publish_date):
+    """publish_date 为 datetime、时间戳，0/None 表示立即发布（返回 None）"""
+    if isinstance(publish_date, datetime):
+        return publish_date.timestamp()
+    if isinstance(publish_date, (int, float)) and publish_date > 0:
+        return float(publish_date)
+    return None
+
+
+class RateMeter(object):
+    """最近 window 秒内的字节数 / 秒，不足一个窗口时按实际经过的时间（至少 1 秒）算"""
+
+    def __init__(self, window=THROUGHPUT_WINDOW, started_at=None):
+        self.window = window
+        self.started_at = time.monotonic() if started_at is None else started_at
+        self._samples = deque()
+        self._bytes = 0
+
+    def add(self, size, now=None):
+        now = time.monotonic() if now is None else now
+        self._samples.append((now, size))
+        self._bytes += size
+        self._trim(now)
+
+    def _trim(self, now):
+        while self._samples and self._samples[0][0] < now - self.window:
+            self._bytes -= self._samples.popleft()[1]
+
+    def rate(self, now=None):
+        now = time.monotonic() if now is None else now
+        self._trim(now)
+        return self._bytes / max(min(self.window, now - self.started_at), 1.0)
+
+
+class UploadTicket(object):
+    def __init__(self, scheduler, name, size, publish_date=0, platform=""):
+        self.scheduler = scheduler
+        self.name = name
+        self.size = size
+        self.platform = platform
+        self.publish_ts = publish_timestamp(publish_date)
+        self.enqueued_at = time.monotonic()
+        self.admitted_at = None
+        self.released = False
+        self.bytes = 0
+        self.meter = None
+        self.seq = 0
+
+    def priority(self, now):
+        """越小越先放行：立即发布和快到发布时间的排前面，其中小文件先传；其余按发布时间"""
+        urgent = self.publish_ts is None or self.publish_ts - time.time() < URGENT_SECONDS
+        aged_size = self.size / 2 ** ((now - self.enqueued_at) / AGING_SECONDS)
+        if urgent:
+            return (0, 0, aged_size, self.seq)
+        return (1, self.publish_ts, aged_size, self.seq)
+
+    def add_bytes(self, size, elapsed=None):
+        """elapsed：没有进度回调、上传结束才一次上报时传上传用时，见 BandwidthScheduler.report"""
+        self.scheduler.report(self, size, elapsed)
+
+    def release(self):
+        self.scheduler.release(self)
+
+    def to_dict(self, now=None):
+        now = time.monotonic() if now is None else now
+        return {
+            "name": self.name,
+            "platform": self.platform,
+            "size": self.size,
+            "bytes": self.bytes,
+            "rate": round(self.meter.rate(now)) if self.meter else 0,
+            "seconds": round(now - (self.admitted_at or self.enqueued_at), 1),
+        }
+
+
+class BandwidthScheduler(object):
+    """线程安全：后端每个发布任务一个线程（各自的事件循环），b 站分块上传在线程池里上报字节"""
+
+    def __init__(self, uplink_mbps=UPLINK_MBPS, min_rate_kb=MIN_UPLOAD_RATE_KB, max_active=MAX_ACTIVE_UPLOADS,
+                 window=THROUGHPUT_WINDOW, ramp_seconds=RAMP_SECONDS):
+        # 字节/秒，None 表示自动估计
+        self.capacity = uplink_mbps * 1000 * 1000 / 8 if uplink_mbps else None
+        self.min_rate = min_rate_kb * 1024
+        self.max_active = max_active
+        self.window = window
+        self.ramp_seconds = ramp_seconds
+        self._active = []
+        self._waiting = []
+        self._seq = 0
+        self._meter = RateMeter(window)
+        self._peak_rate = 0.0
+        self._total_bytes = 0
+        self._cond = threading.Condition()
+
+    def _has_headroom(self, now):
+        if not self._active:
+            return True
+        if len(self._active) >= self.max_active:
+            return False
+        if any(now - ticket.admitted_at < self.ramp_seconds for ticket in self._active):
+            return False
+        rate = self._meter.rate(now)
+        if self.capacity is not None:
+            return self.capacity - rate >= self.min_rate
+        # 正在上传的都还没统计到字节（页面整个文件一个请求上传，结束时才能统计）时没法估计，不限制
+        if not any(ticket.bytes for ticket in self._active):
+            return True
+        return rate / (len(self._active) + 1) >= self.min_rate
+
+    def _try_admit(self, ticket):
+        """在锁内调用：ticket 排在最前面且有余量时放行"""
+        now = time.monotonic()
+        if min(self._waiting, key=lambda t: t.priority(now)) is not ticket or not self._has_headroom(now):
+            return False
+        self._waiting.remove(ticket)
+        ticket.admitted_at = now
+        ticket.meter = RateMeter(self.window, now)
+        self._active.append(ticket)
+        self._update_gauges(now)
+        UPLOAD_ADMISSION_WAIT_SECONDS.observe(now - ticket.enqueued_at, platform=ticket.platform)
+        if now - ticket.enqueued_at >= 1:
+            logger.info(f"upload {ticket.name} admitted after {now - ticket.enqueued_at:.1f}s "
+                        f"({len(self._active)} active, {self._meter.rate(now) / 1024 / 1024:.2f}MB/s)")
+        return True
+
+    def _enqueue(self, name, size, publish_date, platform):
+        ticket = UploadTicket(self, name, size, publish_date, platform)
+        with self._cond:
+            self._seq += 1
+            ticket.seq = self._seq
+            self._waiting.append(ticket)
+            admitted = self._try_admit(ticket)
+            self._update_gauges(time.monotonic())
+        return ticket, admitted
+
+    def _cancel(self, ticket):
+        with self._cond:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                self._update_gauges(time.monotonic())
+            self._cond.notify_all()
+
+    def acquire(self, name, size, publish_date=0, platform="", cancel_event=None):
+        """阻塞到放行，返回 UploadTicket；cancel_event 置位时放弃排队，返回 None"""
+        ticket, admitted = self._enqueue(name, size, publish_date, platform)
+        with self._cond:
+            while not admitted:
+                if cancel_event is not None and cancel_event.is_set():
+                    break
+                # 带余量的判断依赖实测速度，不只在 release 时变化，所以带超时轮询
+                self._cond.wait(ADMIT_POLL_INTERVAL)
+                admitted = self._try_admit(ticket)
+        if not admitted:
+            self._cancel(ticket)
+            return None
+        return ticket
+
+    async def acquire_async(self, name, size, publish_date=0, platform=""):
+        ticket, admitted = self._enqueue(name, size, publish_date, platform)
+        try:
+            while not admitted:
+                await asyncio.sleep(ADMIT_POLL_INTERVAL)
+                with self._cond:
+                    admitted = self._try_admit(ticket)
+        except BaseException:
+            self._cancel(ticket)
+            raise
+        return ticket
+
+    @contextmanager
+    def admit(self, name, size, publish_date=0, platform="", cancel_event=None):
+        """同步上传用：with BANDWIDTH.admit(...) as ticket，取消排队时 ticket 为 None"""
+        ticket = self.acquire(name, size, publish_date, platform, cancel_event)
+        try:
+            yield ticket
+        finally:
+            if ticket is not None:
+                ticket.release()
+
+    def report(self, ticket, size, elapsed=None):
+        """
+        elapsed 不为空时 size 是这段时间里发送的全部字节：吞吐只计入按平均速度落在统计窗口内的部分，
+        一次计入整个文件会让总吞吐出现尖峰，把其他上传的余量判断成不够
+        """
+        now = time.monotonic()
+        metered = size
+        if elapsed and elapsed > self.window:
+            metered = size * self.window / elapsed
+        with self._cond:
+            ticket.bytes += size
+            if ticket.meter is not None:
+                ticket.meter.add(metered, now)
+            self._meter.add(metered, now)
+            self._total_bytes += size
+            rate = self._meter.rate(now)
+            self._peak_rate = max(self._peak_rate, rate)
+            UPLOAD_THROUGHPUT_BYTES.set(rate)
+        UPLOAD_BYTES.inc(size, platform=ticket.platform)
+
+    def release(self, ticket):
+        with self._cond:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket in self._active:
+                self._active.remove(ticket)
+            self._update_gauges(time.monotonic())
+            self._cond.notify_all()
+
+    def _update_gauges(self, now):
+        UPLOADS_ACTIVE.set(len(self._active))
+        UPLOADS_WAITING.set(len(self._waiting))
+        UPLOAD_THROUGHPUT_BYTES.set(self._meter.rate(now))
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self._cond:
+            rate = self._meter.rate(now)
+            UPLOAD_THROUGHPUT_BYTES.set(rate)
+            return {
+                "uplink_bytes_per_second": self.capacity,
+                "throughput_bytes_per_second": round(rate),
+                "peak_bytes_per_second": round(self._peak_rate),
+                "total_bytes": self._total_bytes,
+                "active": [ticket.to_dict(now) for ticket in self._active],
+                "waiting": [ticket.to_dict(now) for ticket in
+                            sorted(self._waiting, key=lambda t: t.priority(now))],
+            }
+
+
+BANDWIDTH = BandwidthScheduler()
+
+
+def _track_page_bytes(page, ticket):
+    """按页面发出的请求体统计上传字节，返回取消监听的函数"""
+
+    async def on_request_finished(request):
+        if request.method not in ("POST", "PUT", "PATCH"):
+            return
+        try:
+            sizes = await request.sizes()
+        except Exception:
+            return
+        if sizes.get("requestBodySize", 0) >= MIN_TRACKED_BODY:
+            # 整个文件一个请求时结束才统计到，按请求用时（毫秒，相对 startTime，拿不到时为 -1）摊开
+            response_end = request.timing.get("responseEnd", -1)
+            ticket.add_bytes(sizes["requestBodySize"], elapsed=response_end / 1000 if response_end > 0 else None)
+
+    page.on("requestfinished", on_request_finished)
+
+    def stop():
+        try:
+            page.remove_listener("requestfinished", on_request_finished)
+        except Exception:
+            pass
+
+    return stop
+
+
+async def set_video_files(target, file_path, publish_date=0):
+    """
+    代替 locator.set_input_files(file_path) / file_chooser.set_files(file_path)：排队到带宽有余量再把视频交给页面，
+    之后统计这个页面的上传字节，当前任务的 file_transfer 阶段结束、任务结束或页面关闭时归还名额。
+    """
+    job_metrics = current_job_metrics()
+    ticket = await BANDWIDTH.acquire_async(os.path.basename(str(file_path)), os.path.getsize(file_path),
+                                           publish_date, job_metrics.platform if job_metrics else "")
+    page = target.page
+    stop_tracking = _track_page_bytes(page, ticket)
+
+    def release(*args):
+        stop_tracking()
+        ticket.release()
+
+    page.once("close", release)
+    if job_metrics is not None:
+        job_metrics.on_phase_end("file_transfer", release)
+    try:
+        if hasattr(target, "set_files"):
+            await target.set_files(file_path)
+        else:
+            await target.set_input_files(file_path)
+    except BaseException:
+        release()
+        raise
+    return ticket
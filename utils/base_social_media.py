@@ -1,13 +1,83 @@
+import asyncio
+import os
+import re
 from pathlib import Path
 from typing import List
+from urllib.parse import urlparse
 
 from conf import BASE_DIR
+from utils.network import async_retry
 
 SOCIAL_MEDIA_DOUYIN = "douyin"
 SOCIAL_MEDIA_TENCENT = "tencent"
 SOCIAL_MEDIA_TIKTOK = "tiktok"
 SOCIAL_MEDIA_BILIBILI = "bilibili"
 SOCIAL_MEDIA_KUAISHOU = "kuaishou"
+SOCIAL_MEDIA_XIAOHONGSHU = "xiaohongshu"
+SOCIAL_MEDIA_BAIJIAHAO = "baijiahao"
+
+# 请求过滤总开关，调试页面元素时可以关掉
+ROUTE_FILTER_ENABLED = True
+
+# 离线压测：设置为本地桩服务地址（如 http://127.0.0.1:8765，见 benchmarks/stub_server.py）后，
+# 各平台创作者中心的请求全部转发到桩服务，其他请求一律拦截，不访问外网
+STUB_SERVER = os.environ.get("SAU_STUB_SERVER", "")
+
+# 桩服务模式下转发的域名
+STUB_HOSTS = {
+    SOCIAL_MEDIA_DOUYIN: ["creator.douyin.com"],
+    SOCIAL_MEDIA_TENCENT: ["channels.weixin.qq.com"],
+    SOCIAL_MEDIA_KUAISHOU: ["cp.kuaishou.com"],
+    SOCIAL_MEDIA_XIAOHONGSHU: ["creator.xiaohongshu.com"],
+    SOCIAL_MEDIA_TIKTOK: ["www.tiktok.com"],
+}
+
+# 只做页面检查（cookie 校验、登录态保活）时用不到的资源类型，直接 abort；
+# 上传页面的封面选择、视频预览要加载图片和视频，上传上下文不拦截这些类型
+BLOCKED_RESOURCE_TYPES = ["image", "media", "font"]
+
+# 所有平台通用的统计/埋点/广告域名，返回空响应（204），避免页面脚本因请求失败反复重试
+COMMON_STUB_DOMAINS = [
+    "hm.baidu.com",
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "cnzz.com",
+    "umeng.com",
+    "growingio.com",
+    "sensorsdata.cn",
+    "hotjar.com",
+]
+
+# 各平台的过滤规则
+# - stub_domains: 该平台自身的埋点、监控、推荐域名，返回空响应
+# - allow_domains: 开启资源类型拦截时仍然放行的域名（上传、签名等）
+ROUTE_FILTER_RULES = {
+    SOCIAL_MEDIA_DOUYIN: {
+        "stub_domains": ["mcs.zijieapi.com", "mon.zijieapi.com", "mcs.snssdk.com", "mon.snssdk.com"],
+        "allow_domains": ["bytedanceapi.com", "snssdk.com"],
+    },
+    SOCIAL_MEDIA_TENCENT: {
+        "stub_domains": ["beacon.qq.com", "aegis.qq.com", "btrace.qq.com", "h.trace.qq.com"],
+        "allow_domains": ["video.qq.com"],
+    },
+    SOCIAL_MEDIA_KUAISHOU: {
+        "stub_domains": ["log-sdk.ksapisrv.com", "wlog.kuaishou.com"],
+        "allow_domains": ["kuaishouzt.com"],
+    },
+    SOCIAL_MEDIA_XIAOHONGSHU: {
+        "stub_domains": ["apm-fe.xiaohongshu.com", "t2.xiaohongshu.com", "lng.xiaohongshu.com"],
+        "allow_domains": ["ros-upload.xiaohongshu.com"],
+    },
+    SOCIAL_MEDIA_TIKTOK: {
+        "stub_domains": ["mon.tiktokv.com", "mcs.tiktokw.us", "analytics.tiktok.com"],
+        "allow_domains": [],
+    },
+    SOCIAL_MEDIA_BAIJIAHAO: {
+        "stub_domains": ["sp1.baidu.com", "miao.baidu.com"],
+        "allow_domains": [],
+    },
+}
 
 
 def get_supported_social_media() -> List[str]:
@@ -22,3 +92,171 @@ async def set_init_script(context):
     stealth_js_path = Path(BASE_DIR / "utils/stealth.min.js")
     await context.add_init_script(path=stealth_js_path)
     return context
+
+
+def _match_domain(host: str, domains: List[str]) -> bool:
+    return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+
+async def set_route_filter(context, platform: str, block_resources: bool = False):
+    """
+    给浏览器上下文挂上请求过滤：埋点/统计域名返回空响应。
+    block_resources=True 时图片、媒体、字体等资源也直接拦截（allow_domains 中的域名除外），
+    只用于不和页面交互的检查（cookie 校验、登录态保活），上传页面的封面、预览需要这些资源。
+    注意：开启 route 后 playwright 会关闭该上下文的 http 缓存，每个上下文只用一次，影响可以忽略。
+    """
+    if STUB_SERVER and platform in STUB_HOSTS:
+        return await set_stub_route(context, platform)
+    rules = ROUTE_FILTER_RULES.get(platform)
+    if not ROUTE_FILTER_ENABLED or rules is None:
+        return context
+    stub_domains = COMMON_STUB_DOMAINS + rules.get("stub_domains", [])
+    allow_domains = rules.get("allow_domains", [])
+    blocked_resource_types = set(rules.get("block_resource_types", BLOCKED_RESOURCE_TYPES)) if block_resources else set()
+
+    async def handle_route(route):
+        request = route.request
+        host = urlparse(request.url).hostname or ""
+        if _match_domain(host, stub_domains):
+            await route.fulfill(status=204, body="")
+        elif request.resource_type in blocked_resource_types and not _match_domain(host, allow_domains):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await context.route("**/*", handle_route)
+    return context
+
+
+async def set_stub_route(context, platform: str):
+    """把该平台的页面和接口请求转发到桩服务：https://<host>/<path> -> STUB_SERVER/<host>/<path>，页面 url 不变"""
+    stub_hosts = STUB_HOSTS[platform]
+    stub_server = STUB_SERVER.rstrip("/")
+
+    async def handle_route(route):
+        parsed = urlparse(route.request.url)
+        if parsed.hostname not in stub_hosts:
+            await route.abort()
+            return
+        stub_url = f"{stub_server}/{parsed.hostname}{parsed.path or '/'}"
+        if parsed.query:
+            stub_url += "?" + parsed.query
+        # 跳转原样交给浏览器处理，页面 url 才会跟真实站点一致
+        response = await route.fetch(url=stub_url, max_redirects=0)
+        await route.fulfill(response=response)
+
+    await context.route("**/*", handle_route)
+    return context
+
+
+# 打开平台页面（上传页）的最多尝试次数和总超时，秒
+GOTO_MAX_ATTEMPTS = 3
+GOTO_TIMEOUT = 120
+
+
+class PageUnavailableError(Exception):
+    """平台页面返回 5xx"""
+
+
+async def goto_platform_page(page, url: str, platform: str, **kwargs):
+    """
+    代替 page.goto(url)：打开失败（超时、断网、5xx）时退避重试，失败计入该平台的熔断器和重试预算（utils/network.py）。
+    平台故障时连续失败的任务会让熔断器打开，之后同平台的任务直接失败，不再一起反复请求。
+    """
+
+    @async_retry(timeout=GOTO_TIMEOUT, max_retries=GOTO_MAX_ATTEMPTS, platform=platform)
+    async def goto():
+        response = await page.goto(url, **kwargs)
+        if response is not None and response.status >= 500:
+            raise PageUnavailableError(f"{url} returned {response.status}")
+        return response
+
+    return await goto()
+
+
+# 话题联想弹窗：输入 "#话题" 后等这个弹窗出现再按确认键，只有确认太快会丢话题的平台才需要配置
+# 没有配置的平台不等待；弹窗超时不出现也直接继续，不影响发布
+TOPIC_SUGGEST_SELECTORS = {
+    SOCIAL_MEDIA_KUAISHOU: "[class*='topic-list'], [class*='topic-popover']",
+    SOCIAL_MEDIA_TIKTOK: ".mentionSuggestions, [class*='hashtag-suggestion']",
+}
+TOPIC_SUGGEST_TIMEOUT = 1500  # 毫秒
+
+
+async def replace_editor_text(page, editor, text: str):
+    """
+    点击编辑器，清空后一次性写入 text。
+    insert_text 只触发一次 input 事件，不逐字模拟按键，长标题也是毫秒级。
+    """
+    await editor.click()
+    await page.keyboard.press("Control+KeyA")
+    await page.keyboard.press("Delete")
+    await page.keyboard.insert_text(text)
+
+
+async def add_topics(page, tags: List[str], platform: str, editor: str = None, root=None, confirm_key: str = "Space"):
+    """
+    在当前光标位置（或先聚焦 editor 选择器）逐个写入话题。
+    "#" 用真实按键输入以触发编辑器的话题模式，话题文字用 insert_text 一次写入；
+    需要时等待该平台的话题联想弹窗（root 为弹窗所在的 page/frame，默认 page），然后按 confirm_key 确认。
+    """
+    if editor:
+        await page.focus(editor)
+    suggest_selector = TOPIC_SUGGEST_SELECTORS.get(platform)
+    for tag in tags:
+        await page.keyboard.press("#")
+        await page.keyboard.insert_text(tag)
+        if suggest_selector:
+            try:
+                await (root or page).locator(suggest_selector).first.wait_for(state="visible",
+                                                                              timeout=TOPIC_SUGGEST_TIMEOUT)
+            except Exception:
+                pass
+        await page.keyboard.press(confirm_key)
+
+
+async def _wait_condition(page, condition, timeout):
+    if callable(condition):
+        return await condition(timeout)
+    if isinstance(condition, re.Pattern):
+        return await page.wait_for_url(condition, timeout=timeout)
+    if condition.startswith("url:"):
+        return await page.wait_for_url(condition[len("url:"):], timeout=timeout)
+    return await page.locator(condition).first.wait_for(state="attached", timeout=timeout)
+
+
+async def wait_for_any(page, conditions: dict, timeout: float = 30000) -> str:
+    """
+    同时等待多个条件，返回最先满足的条件名；全部超时（或失败）时抛出 playwright 的 TimeoutError。
+    条件写法：
+    - "url:<url 或 glob>" / re.compile(...)：页面 url 匹配，与 page.wait_for_url 一致
+    - 其他字符串：选择器对应的元素出现在页面上（包括 iframe 元素本身）
+    - async 函数 f(timeout)：自定义条件，正常返回即视为满足
+    用于页面有多个版本、或需要区分"已登录/跳转登录页"的场景，耗时只取决于页面实际加载的时间。
+    """
+    tasks = {asyncio.ensure_future(_wait_condition(page, condition, timeout)): name
+             for name, condition in conditions.items()}
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return tasks[task]
+        # playwright 在用到时才导入：平台常量被命令行客户端、插件注册表引用，导入本模块要足够轻
+        from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+        raise PlaywrightTimeoutError(f"wait_for_any: none of {list(conditions)} matched within {timeout}ms")
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def wait_for_input_value(locator, value: str, timeout: float = 3000) -> bool:
+    """等待输入框的值变为 value（如日期选择器接受了键盘输入），超时返回 False，不抛异常"""
+    from playwright.async_api import expect
+    try:
+        await expect(locator).to_have_value(value, timeout=timeout)
+        return True
+    except AssertionError:
+        return False
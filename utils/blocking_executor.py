@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from loguru import logger
+
+
+class ExecutorFullError(Exception):
+    """排队任务数达到上限，拒绝新任务"""
+
+
+class JobCancelled(Exception):
+    """任务在开始前被取消"""
+
+
+def failed_results(result):
+    """
+    任务函数的返回值里失败的个数：False 算一个失败；列表（如批量上传每个视频的结果）按元素计，
+    元素为假值或异常都算失败；其他返回值不算失败
+    """
+    if result is False:
+        return 1
+    if isinstance(result, (list, tuple)):
+        return sum(1 for item in result if isinstance(item, BaseException) or not item)
+    return 0
+
+
+class BlockingJob(object):
+    """
+    线程池中的一个阻塞任务。
+    任务函数通过关键字参数拿到 progress_callback(done, total) 和 cancel_event，自行在合适的位置检查取消。
+    返回值为 False，或列表中有失败的元素时任务记为 failed（见 failed_results）。
+    """
+
+    def __init__(self, job_id, name, func, args, kwargs):
+        self.id = job_id
+        self.name = name
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.cancel_event = threading.Event()
+        self.status = "pending"  # pending / running / success / failed / cancelled
+        self.done = 0
+        self.total = 0
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def progress_callback(self, done, total):
+        self.done = done
+        self.total = total
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def run(self):
+        if self.cancel_event.is_set():
+            self.status = "cancelled"
+            self.finished_at = time.time()
+            raise JobCancelled(self.name)
+        self.status = "running"
+        self.started_at = time.time()
+        try:
+            result = self.func(*self.args, progress_callback=self.progress_callback, cancel_event=self.cancel_event,
+                               **self.kwargs)
+        except BaseException as e:
+            self.status = "cancelled" if self.cancel_event.is_set() else "failed"
+            self.error = str(e)
+            raise
+        finally:
+            self.finished_at = time.time()
+        failed = failed_results(result)
+        if failed and isinstance(result, (list, tuple)):
+            self.error = f"{failed}/{len(result)} failed"
+        self.status = "cancelled" if self.cancel_event.is_set() else ("failed" if failed else "success")
+        return result
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "progress": round(self.done / self.total, 4) if self.total else 0,
+            "error": self.error,
+            "createdAt": self.created_at,
+            "startedAt": self.started_at,
+            "finishedAt": self.finished_at,
+        }
+
+
+class BlockingExecutor(object):
+    """
+    给同步上传器（如 b 站）用的有界线程池：
+    - max_workers 限制同时运行的任务数，max_pending 限制排队任务数，超过直接拒绝
+    - run() 是协程，在事件循环里 await 不会阻塞其他浏览器任务；await 被取消时同时通知任务取消
+    - submit() 提交后立即返回 BlockingJob，不等待结束（后端接口用，结果通过 jobs() 查询）
+    - 已结束的任务保留最近 keep_finished 个，供查询进度
+    """
+
+    def __init__(self, name, max_workers=2, max_pending=32, keep_finished=100):
+        self.name = name
+        self.max_workers = max_workers
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def _add_job(self, name, func, args, kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise ExecutorFullError(f"{self.name}: too many pending jobs")
+        job = BlockingJob(uuid.uuid4().hex[:12], name, func, args, kwargs)
+        with self._lock:
+            self._jobs[job.id] = job
+            finished = [j for j in self._jobs.values() if j.finished_at]
+            for old in sorted(finished, key=lambda j: j.finished_at)[:-self.keep_finished or None]:
+                self._jobs.pop(old.id, None)
+        return job
+
+    def _run_job(self, job):
+        try:
+            return job.run()
+        finally:
+            self._slots.release()
+
+    async def run(self, name, func, *args, **kwargs):
+        job = self._add_job(name, func, args, kwargs)
+        logger.info(f"{self.name}: job {job.id} ({name}) queued")
+        future = asyncio.get_running_loop().run_in_executor(self._executor, self._run_job, job)
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            job.cancel()
+            # 线程里的任务会自行结束，这里取走结果，避免 "exception was never retrieved"
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            raise
+
+    def submit(self, name, func, *args, **kwargs) -> BlockingJob:
+        """提交任务后立即返回，队列已满时抛出 ExecutorFullError"""
+        job = self._add_job(name, func, args, kwargs)
+        logger.info(f"{self.name}: job {job.id} ({name}) queued")
+        future = self._executor.submit(self._run_job, job)
+
+        def log_error(f):
+            if not f.cancelled() and f.exception() is not None and job.status == "failed":
+                logger.error(f"{self.name}: job {job.id} ({name}) failed: {f.exception()!r}")
+
+        future.add_done_callback(log_error)
+        return job
+
+    def cancel(self, job_id) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or job.finished_at:
+            return False
+        job.cancel()
+        return True
+
+    def jobs(self):
+        with self._lock:
+            return [job.to_dict() for job in sorted(self._jobs.values(), key=lambda j: j.created_at)]
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            job.cancel()
+        self._executor.shutdown(wait=wait)
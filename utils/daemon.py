@@ -0,0 +1,437 @@
+"""
+本地常驻上传进程：常驻 playwright driver、按启动参数复用浏览器、缓存已校验的账号，
+cli_main.py --daemon 只负责把任务通过 Unix socket 发过来并打印回传的日志。
+
+    python -m utils.daemon start     # 前台运行，Ctrl+C 退出
+    python -m utils.daemon status
+    python -m utils.daemon stop
+    python cli_main.py --daemon douyin xiaoA upload videos/demo.mp4
+
+协议：客户端发送一行 JSON 请求，服务端逐行返回 JSON 事件，最后一条 event 为 done。
+仅支持有 Unix socket 的系统；登录需要人工扫码，不走守护进程。
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from conf import BASE_DIR
+from utils.bandwidth import BANDWIDTH
+from utils.engine import BrowserPool, PooledPlaywright
+from utils.sharding import HashRing
+
+DAEMON_SOCKET = os.environ.get("SAU_DAEMON_SOCKET", str(Path(BASE_DIR / "sau_daemon.sock")))
+# 账号 cookie 校验通过（或刚上传成功）后，这段时间内的任务不再启动浏览器校验，秒
+SESSION_TTL = 30 * 60
+SCHEDULE_FORMAT = '%Y-%m-%d %H:%M'
+# 多进程模式：等待子进程开始监听的超时时间、检查子进程是否退出的间隔，秒
+CHILD_START_TIMEOUT = 30
+CHILD_CHECK_INTERVAL = 1
+
+
+def _check_unix_socket():
+    if not hasattr(socket, "AF_UNIX"):
+        raise RuntimeError("daemon mode needs unix domain sockets, which this platform does not support")
+
+
+class SessionCache(object):
+    """已校验有效的账号 cookie 文件 -> 校验时间（time.monotonic）"""
+
+    def __init__(self, ttl=SESSION_TTL):
+        self.ttl = ttl
+        self._validated = {}
+
+    @staticmethod
+    def _key(account_file):
+        return str(Path(account_file).resolve())
+
+    def is_valid(self, account_file):
+        validated_at = self._validated.get(self._key(account_file))
+        return validated_at is not None and time.monotonic() - validated_at < self.ttl
+
+    def mark_valid(self, account_file):
+        self._validated[self._key(account_file)] = time.monotonic()
+
+    def invalidate(self, account_file):
+        self._validated.pop(self._key(account_file), None)
+
+    def __len__(self):
+        return sum(1 for key in list(self._validated) if self.is_valid(key))
+
+
+class UploadDaemon(object):
+    def __init__(self, socket_path=DAEMON_SOCKET, session_ttl=SESSION_TTL):
+        self.socket_path = socket_path
+        self.sessions = SessionCache(session_ttl)
+        self.started_at = time.time()
+        self.jobs_done = 0
+        self.jobs_running = 0
+        self._playwright_manager = None
+        self._pool = None
+        self._watchdog = None
+        self._watchdog_task = None
+        self._server = None
+        self._stopped = None
+
+    async def start(self):
+        from playwright.async_api import async_playwright
+        from utils.log import setup_base_sinks
+        from utils.watchdog import MemoryWatchdog
+
+        _check_unix_socket()
+        setup_base_sinks()
+        if os.path.exists(self.socket_path):
+            if daemon_running(self.socket_path):
+                raise RuntimeError(f"daemon already running on {self.socket_path}")
+            os.unlink(self.socket_path)
+        self._playwright_manager = async_playwright()
+        self._pool = BrowserPool(await self._playwright_manager.start())
+        self._watchdog = MemoryWatchdog(self._pool)
+        self._watchdog_task = asyncio.create_task(self._watchdog.run())
+        self._stopped = asyncio.Event()
+        self._server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        # 只允许当前用户连接
+        os.chmod(self.socket_path, 0o600)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._stopped.wait()
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self._watchdog_task is not None:
+            self._watchdog_task.cancel()
+            self._watchdog_task = None
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+        if self._playwright_manager is not None:
+            await self._playwright_manager.__aexit__(None, None, None)
+            self._playwright_manager = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def status(self):
+        bandwidth = BANDWIDTH.snapshot()
+        return {
+            "pid": os.getpid(),
+            "uptime": round(time.time() - self.started_at, 1),
+            "browsers": self._pool.size() if self._pool else 0,
+            "browser_launches": self._pool.launches if self._pool else 0,
+            "browser_recycles": self._pool.recycles if self._pool else 0,
+            "browser_rss_mb": round(self._watchdog.total_rss / 1024 / 1024, 1) if self._watchdog else 0,
+            "orphans_reaped": self._watchdog.reaped if self._watchdog else 0,
+            "uploads_active": len(bandwidth["active"]),
+            "uploads_waiting": len(bandwidth["waiting"]),
+            "upload_throughput_mbps": round(bandwidth["throughput_bytes_per_second"] * 8 / 1000 / 1000, 2),
+            "sessions": len(self.sessions),
+            "jobs_running": self.jobs_running,
+            "jobs_done": self.jobs_done,
+        }
+
+    async def _handle_client(self, reader, writer):
+        loop = asyncio.get_running_loop()
+
+        def emit(event):
+            # loguru sink 可能在其他线程里调用
+            data = (json.dumps(event, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+            loop.call_soon_threadsafe(lambda: writer.is_closing() or writer.write(data))
+
+        try:
+            line = await reader.readline()
+            request = json.loads(line or b"{}")
+            action = request.get("action")
+            if action == "status":
+                emit({"event": "done", "ok": True, "status": self.status()})
+            elif action == "stop":
+                emit({"event": "done", "ok": True})
+                self._stopped.set()
+            elif action == "upload":
+                emit({"event": "done", **await self.run_upload(request, emit)})
+            else:
+                emit({"event": "done", "ok": False, "error": f"unknown action: {action}"})
+        except Exception as e:
+            emit({"event": "done", "ok": False, "error": repr(e)})
+        finally:
+            await asyncio.sleep(0)
+            try:
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def run_upload(self, request, emit):
+        from loguru import logger
+        from utils.plugins import create_video, load_platform
+
+        request_id = uuid.uuid4().hex[:12]
+        platform = request["platform"]
+        account_file = request["account_file"]
+        publish_date = request.get("publish_date") or 0
+        if publish_date:
+            publish_date = datetime.strptime(publish_date, SCHEDULE_FORMAT)
+
+        def forward_log(message):
+            record = message.record
+            emit({"event": "log", "level": record["level"].name, "message": record["message"]})
+
+        # 把本任务的日志（loguru 上下文中带 daemon_request）转发给客户端
+        sink_id = logger.add(forward_log, level="INFO", format="{message}",
+                             filter=lambda record: record["extra"].get("daemon_request") == request_id)
+        self.jobs_running += 1
+        start = time.perf_counter()
+        try:
+            with logger.contextualize(daemon_request=request_id):
+                emit({"event": "accepted", "request_id": request_id})
+                setup = load_platform(platform, "setup")
+                if setup is None:
+                    return {"ok": False, "error": f"unsupported platform: {platform}"}
+                if self.sessions.is_valid(account_file):
+                    emit({"event": "session", "cached": True})
+                else:
+                    emit({"event": "session", "cached": False})
+                    if not await setup(account_file, handle=False):
+                        return {"ok": False, "error": "cookie file missing or expired, run login without --daemon"}
+                    self.sessions.mark_valid(account_file)
+                app = create_video(platform, request["title"], request["video_file"], request.get("tags", []),
+                                   publish_date, account_file)
+                try:
+                    result = await app.upload(PooledPlaywright(self._pool))
+                except Exception:
+                    self.sessions.invalidate(account_file)
+                    raise
+                # 上传成功说明 cookie 仍然有效，顺延校验时间
+                self.sessions.mark_valid(account_file)
+                job_metrics = getattr(app, "job_metrics", None)
+                return {"ok": result is not False, "seconds": round(time.perf_counter() - start, 3),
+                        "phases": job_metrics.phase_durations if job_metrics else []}
+        finally:
+            self.jobs_running -= 1
+            self.jobs_done += 1
+            try:
+                logger.remove(sink_id)
+            except ValueError:
+                pass
+
+
+class DaemonSupervisor(object):
+    """
+    多进程模式：对外监听 socket_path，启动 processes 个 UploadDaemon 子进程（各自监听 socket_path.<i>），
+    上传任务按账号一致性哈希转发到固定的子进程，复用该进程里的浏览器和已校验的账号。
+    子进程退出后自动重启，账号仍然落在原来的子进程上。
+    """
+
+    def __init__(self, socket_path=DAEMON_SOCKET, processes=2, session_ttl=SESSION_TTL):
+        self.socket_path = socket_path
+        self.session_ttl = session_ttl
+        self.shard_sockets = [f"{socket_path}.{i}" for i in range(processes)]
+        self.ring = HashRing(range(processes))
+        self.started_at = time.time()
+        self.restarts = 0
+        self._children = {}
+        self._server = None
+        self._stopped = None
+
+    def shard_for(self, account_file):
+        # 与 SessionCache 的 key 一致，同一个 cookie 文件不同写法也落在同一个子进程
+        return self.ring.get_node(str(Path(account_file).resolve()))
+
+    async def _spawn(self, shard):
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "utils.daemon", "start", "--socket", self.shard_sockets[shard],
+            "--session-ttl", str(self.session_ttl), cwd=str(BASE_DIR))
+        self._children[shard] = process
+        deadline = time.monotonic() + CHILD_START_TIMEOUT
+        while not daemon_running(self.shard_sockets[shard]):
+            if process.returncode is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"shard {shard} failed to start")
+            await asyncio.sleep(0.1)
+
+    async def start(self):
+        _check_unix_socket()
+        if os.path.exists(self.socket_path):
+            if daemon_running(self.socket_path):
+                raise RuntimeError(f"daemon already running on {self.socket_path}")
+            os.unlink(self.socket_path)
+        self._stopped = asyncio.Event()
+        await asyncio.gather(*[self._spawn(shard) for shard in range(len(self.shard_sockets))])
+        self._server = await asyncio.start_unix_server(self._handle_client, path=self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+
+    async def serve_forever(self):
+        try:
+            await self.start()
+            while not self._stopped.is_set():
+                await self._restart_exited()
+                try:
+                    await asyncio.wait_for(self._stopped.wait(), CHILD_CHECK_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await self.close()
+
+    async def _restart_exited(self):
+        for shard, process in list(self._children.items()):
+            if process.returncode is None:
+                continue
+            print(f"shard {shard} exited with code {process.returncode}, restarting")
+            self.restarts += 1
+            try:
+                await self._spawn(shard)
+            except RuntimeError as e:
+                print(e)
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await asyncio.gather(*[self._request(shard, {"action": "stop"}) for shard in self._children],
+                             return_exceptions=True)
+        for process in self._children.values():
+            try:
+                await asyncio.wait_for(process.wait(), CHILD_START_TIMEOUT)
+            except asyncio.TimeoutError:
+                process.kill()
+        self._children = {}
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    async def _request(self, shard, request, writer=None):
+        """把请求发给子进程；writer 不为空时把子进程返回的每一行原样转发给客户端。返回 done 事件"""
+        reader, child_writer = await asyncio.open_unix_connection(self.shard_sockets[shard])
+        try:
+            child_writer.write((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+            await child_writer.drain()
+            while line := await reader.readline():
+                if writer is not None:
+                    writer.write(line)
+                    await writer.drain()
+                event = json.loads(line)
+                if event.get("event") == "done":
+                    return event
+            raise ConnectionError(f"shard {shard} closed the connection before the job finished")
+        finally:
+            child_writer.close()
+
+    async def status(self):
+        events = await asyncio.gather(*[self._request(shard, {"action": "status"})
+                                        for shard in range(len(self.shard_sockets))], return_exceptions=True)
+        shards = [event.get("status") if isinstance(event, dict) else {"error": repr(event)} for event in events]
+        totals = {key: sum(shard.get(key, 0) for shard in shards)
+                  for key in ("browsers", "browser_launches", "browser_recycles", "browser_rss_mb", "orphans_reaped",
+                              "uploads_active", "uploads_waiting", "upload_throughput_mbps",
+                              "sessions", "jobs_running", "jobs_done")}
+        return {"pid": os.getpid(), "uptime": round(time.time() - self.started_at, 1),
+                "processes": len(self.shard_sockets), "restarts": self.restarts, **totals, "shards": shards}
+
+    async def _handle_client(self, reader, writer):
+        event = None
+        try:
+            request = json.loads(await reader.readline() or b"{}")
+            action = request.get("action")
+            if action == "upload":
+                # 子进程返回的事件（包括最后的 done）已经逐行转发给客户端
+                await self._request(self.shard_for(request["account_file"]), request, writer)
+            elif action == "status":
+                event = {"event": "done", "ok": True, "status": await self.status()}
+            elif action == "stop":
+                event = {"event": "done", "ok": True}
+                self._stopped.set()
+            else:
+                event = {"event": "done", "ok": False, "error": f"unknown action: {action}"}
+        except Exception as e:
+            event = {"event": "done", "ok": False, "error": repr(e)}
+        finally:
+            # 所有分支（包括转发上传）都在这里关闭连接
+            await self._close_client(writer, event)
+
+    @staticmethod
+    async def _close_client(writer, event=None):
+        try:
+            if event is not None:
+                writer.write((json.dumps(event, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+                await writer.drain()
+        except Exception:
+            # 客户端已经断开
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+
+def daemon_running(socket_path=DAEMON_SOCKET):
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return False
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+        return True
+    except OSError:
+        return False
+
+
+def submit_job(request, on_event=None, socket_path=DAEMON_SOCKET):
+    """
+    发送请求并逐条处理返回的事件（on_event(event)），返回最后的 done 事件。
+    客户端只用标准库，不导入 playwright 和上传器。
+    """
+    _check_unix_socket()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(request, ensure_ascii=False) + "\n").encode("utf-8"))
+        with sock.makefile("r", encoding="utf-8") as stream:
+            for line in stream:
+                event = json.loads(line)
+                if event.get("event") == "done":
+                    return event
+                if on_event:
+                    on_event(event)
+    raise ConnectionError("daemon closed the connection before the job finished")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="local upload daemon")
+    parser.add_argument("command", choices=["start", "stop", "status"])
+    parser.add_argument("--socket", default=DAEMON_SOCKET)
+    parser.add_argument("--session-ttl", type=int, default=SESSION_TTL, help="seconds")
+    parser.add_argument("--processes", type=int, default=1,
+                        help="run N daemon processes and shard accounts across them (e.g. CPU cores)")
+    args = parser.parse_args()
+
+    if args.command == "start":
+        if args.processes > 1:
+            daemon = DaemonSupervisor(args.socket, args.processes, args.session_ttl)
+        else:
+            daemon = UploadDaemon(args.socket, args.session_ttl)
+        print(f"daemon listening on {args.socket}")
+        try:
+            asyncio.run(daemon.serve_forever())
+        except KeyboardInterrupt:
+            pass
+        return
+    if not daemon_running(args.socket):
+        print(f"daemon is not running ({args.socket})")
+        sys.exit(1)
+    event = submit_job({"action": args.command}, socket_path=args.socket)
+    print(json.dumps(event.get("status", event), ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
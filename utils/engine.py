@@ -0,0 +1,300 @@
+"""
+进程内并发上传引擎：一个 playwright、按启动参数复用的浏览器，按平台限制并发，
+同一账号的任务串行（上传结束会写回 cookie 文件），每个账号只校验一次 cookie。
+命令行 batch（cli_main.py batch）和守护进程（utils/daemon.py）共用。
+"""
+import asyncio
+import json
+import time
+from pathlib import Path
+
+from utils.plugins import create_video, load_platform
+
+# 全局同时进行的上传任务数
+DEFAULT_MAX_WORKERS = 4
+# 单个平台同时进行的上传任务数，没有配置的平台用 DEFAULT_PLATFORM_CONCURRENCY
+DEFAULT_PLATFORM_CONCURRENCY = 2
+PLATFORM_CONCURRENCY = {
+    # TikTok 上传页很重，并发高了容易超时
+    "tiktok": 1,
+}
+
+# chromium 启动参数中标记池内浏览器编号的开关，chromium 会忽略不认识的开关
+BROWSER_ID_ARG = "--sau-browser-id"
+
+# 任务状态
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_SUCCESS = "success"
+JOB_FAILED = "failed"
+# 没有执行：清单校验不通过、重复行、账号 cookie 失效
+JOB_SKIPPED = "skipped"
+
+
+class PooledBrowser(object):
+    """
+    池中浏览器的借用句柄。上传器结束时调用 browser.close()，这里只关闭本次任务创建的上下文，浏览器留给下一个任务。
+    其他属性和方法直接转发给真实的 Browser。
+    """
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+        self._browser = entry.browser
+        self._contexts = []
+        self._released = False
+
+    async def new_context(self, **kwargs):
+        context = await self._browser.new_context(**kwargs)
+        self._contexts.append(context)
+        return context
+
+    async def new_page(self, **kwargs):
+        page = await self._browser.new_page(**kwargs)
+        self._contexts.append(page.context)
+        return page
+
+    async def close(self, **kwargs):
+        contexts, self._contexts = self._contexts, []
+        for context in contexts:
+            try:
+                await context.close()
+            except Exception:
+                pass
+        if not self._released:
+            self._released = True
+            await self._pool.release(self._entry)
+
+    def __getattr__(self, item):
+        return getattr(self._browser, item)
+
+
+class PooledBrowserType(object):
+    def __init__(self, pool, name):
+        self._pool = pool
+        self._name = name
+
+    async def launch(self, **kwargs):
+        return await self._pool.launch(self._name, **kwargs)
+
+    def __getattr__(self, item):
+        return getattr(getattr(self._pool.playwright, self._name), item)
+
+
+class PooledPlaywright(object):
+    """替代 async_playwright() 得到的对象传给 uploader.upload(playwright)，chromium/firefox/webkit.launch 走浏览器池"""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self.chromium = PooledBrowserType(pool, "chromium")
+        self.firefox = PooledBrowserType(pool, "firefox")
+        self.webkit = PooledBrowserType(pool, "webkit")
+
+    def __getattr__(self, item):
+        return getattr(self._pool.playwright, item)
+
+
+class PoolEntry(object):
+    def __init__(self, browser_id, browser_type, browser):
+        self.id = browser_id
+        self.browser_type = browser_type
+        self.browser = browser
+        # 正在使用该浏览器的任务数
+        self.in_use = 0
+        # 已经退役（内存超限），不再分配给新任务，最后一个任务结束后关闭
+        self.draining = False
+
+
+class BrowserPool(object):
+    """
+    按 (浏览器类型, 启动参数) 复用已启动的浏览器，多个任务共用一个浏览器、各自独立的上下文；浏览器崩溃后自动重新启动。
+    chromium 启动参数里带上 --sau-browser-id=<id>，内存看门狗（utils/watchdog.py）据此把进程对应到池里的浏览器。
+    """
+
+    def __init__(self, playwright):
+        self.playwright = playwright
+        self._browsers = {}
+        self._locks = {}
+        self._draining = {}
+        self._next_id = 0
+        self.launches = 0
+        self.recycles = 0
+
+    async def launch(self, browser_type, **kwargs):
+        key = (browser_type, json.dumps(kwargs, sort_keys=True, default=str))
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._browsers.get(key)
+            if entry is None or not entry.browser.is_connected():
+                self._next_id += 1
+                launch_kwargs = dict(kwargs)
+                if browser_type == "chromium":
+                    launch_kwargs["args"] = list(kwargs.get("args") or []) + [f"{BROWSER_ID_ARG}={self._next_id}"]
+                browser = await getattr(self.playwright, browser_type).launch(**launch_kwargs)
+                entry = self._browsers[key] = PoolEntry(self._next_id, browser_type, browser)
+                self.launches += 1
+            entry.in_use += 1
+        return PooledBrowser(self, entry)
+
+    async def release(self, entry):
+        entry.in_use -= 1
+        if entry.draining and entry.in_use <= 0:
+            self._draining.pop(entry.id, None)
+            await self._close_browser(entry.browser)
+
+    def entries(self):
+        """所有还没关闭的浏览器（包括正在退役的）"""
+        return list(self._browsers.values()) + list(self._draining.values())
+
+    async def retire(self, browser_id):
+        """
+        退役一个浏览器：之后的任务启动新浏览器，正在使用它的任务跑完后再关闭，不打断上传。
+        返回 False 表示找不到或已经在退役。
+        """
+        for key, entry in list(self._browsers.items()):
+            if entry.id != browser_id:
+                continue
+            del self._browsers[key]
+            entry.draining = True
+            self.recycles += 1
+            if entry.in_use <= 0:
+                await self._close_browser(entry.browser)
+            else:
+                self._draining[entry.id] = entry
+            return True
+        return False
+
+    @staticmethod
+    async def _close_browser(browser):
+        try:
+            await browser.close()
+        except Exception:
+            pass
+
+    def size(self):
+        return sum(1 for entry in self.entries() if entry.browser.is_connected())
+
+    async def close(self):
+        entries, self._browsers, self._draining = self.entries(), {}, {}
+        for entry in entries:
+            await self._close_browser(entry.browser)
+
+
+class UploadJob(object):
+    def __init__(self, index, platform, account, account_file, video_file, title="", tags=None, publish_date=0):
+        self.index = index
+        self.platform = platform
+        self.account = account
+        self.account_file = account_file
+        self.video_file = video_file
+        self.title = title
+        self.tags = tags or []
+        # 0 表示立即发布，否则为 datetime
+        self.publish_date = publish_date
+        self.status = JOB_PENDING
+        self.error = ""
+        self.seconds = 0.0
+        self.phases = []
+
+    def skip(self, error):
+        self.status = JOB_SKIPPED
+        self.error = error
+
+    def to_dict(self):
+        return {
+            "index": self.index,
+            "platform": self.platform,
+            "account": self.account,
+            "video_file": str(self.video_file),
+            "title": self.title,
+            "tags": self.tags,
+            "publish_date": self.publish_date.strftime('%Y-%m-%d %H:%M') if self.publish_date else "",
+            "status": self.status,
+            "error": self.error,
+            "seconds": round(self.seconds, 3),
+            "phases": self.phases,
+        }
+
+
+class UploadEngine(object):
+    """
+    engine = UploadEngine(BrowserPool(playwright), platform_concurrency={"douyin": 3})
+    await engine.run(jobs)   # 已经是 skipped 的任务不执行，其余任务结束后 status 为 success/failed/skipped
+    """
+
+    def __init__(self, pool, max_workers=DEFAULT_MAX_WORKERS, platform_concurrency=None, on_job_done=None):
+        self.pool = pool
+        self.max_workers = max_workers
+        self.platform_concurrency = dict(PLATFORM_CONCURRENCY, **(platform_concurrency or {}))
+        self.on_job_done = on_job_done
+        self._workers = None
+        self._platform_semaphores = {}
+        self._account_locks = {}
+        # 账号 cookie 文件 -> 校验任务，同一账号的多个任务共用一次校验结果
+        self._account_checks = {}
+
+    def _platform_semaphore(self, platform):
+        if platform not in self._platform_semaphores:
+            limit = self.platform_concurrency.get(platform, DEFAULT_PLATFORM_CONCURRENCY)
+            self._platform_semaphores[platform] = asyncio.Semaphore(max(1, limit))
+        return self._platform_semaphores[platform]
+
+    def _check_account(self, job):
+        key = str(Path(job.account_file).resolve())
+        if key not in self._account_checks:
+            setup = load_platform(job.platform, "setup")
+            # handle=False：cookie 失效时直接返回 False，不打开浏览器等待扫码
+            self._account_checks[key] = asyncio.ensure_future(setup(job.account_file, handle=False))
+        return self._account_checks[key]
+
+    async def run(self, jobs):
+        self._workers = asyncio.Semaphore(max(1, self.max_workers))
+        await asyncio.gather(*[self._run_job(job) for job in jobs if job.status != JOB_SKIPPED])
+        return jobs
+
+    async def _run_job(self, job):
+        account_lock = self._account_locks.setdefault(str(Path(job.account_file).resolve()), asyncio.Lock())
+        # 先排账号，再占平台和全局名额，等账号的任务不占用并发名额
+        async with account_lock, self._platform_semaphore(job.platform), self._workers:
+            job.status = JOB_RUNNING
+            start = time.perf_counter()
+            try:
+                if not await self._check_account(job):
+                    job.skip("cookie file missing or expired, run login first")
+                    return
+                app = create_video(job.platform, job.title, str(job.video_file), job.tags, job.publish_date,
+                                   job.account_file)
+                result = await app.upload(PooledPlaywright(self.pool))
+                job.status = JOB_FAILED if result is False else JOB_SUCCESS
+                if result is False:
+                    job.error = "uploader returned False"
+                job_metrics = getattr(app, "job_metrics", None)
+                if job_metrics:
+                    job.phases = list(job_metrics.phase_durations)
+            except Exception as e:
+                job.status = JOB_FAILED
+                job.error = repr(e)
+            finally:
+                job.seconds = time.perf_counter() - start
+                if self.on_job_done:
+                    self.on_job_done(job)
+
+
+def format_job_result(job):
+    detail = f" ({job.error})" if job.error else ""
+    return f"{job.status} #{job.index} {job.platform}/{job.account} {Path(job.video_file).name} {job.seconds:.1f}s{detail}"
+
+
+async def run_jobs(jobs, max_workers=DEFAULT_MAX_WORKERS, platform_concurrency=None, on_job_done=None):
+    """启动一个 playwright，用浏览器池跑完 jobs，结束时关闭所有浏览器"""
+    from playwright.async_api import async_playwright
+    from utils.watchdog import MemoryWatchdog
+
+    async with async_playwright() as playwright:
+        pool = BrowserPool(playwright)
+        watchdog = asyncio.create_task(MemoryWatchdog(pool).run())
+        try:
+            return await UploadEngine(pool, max_workers, platform_concurrency, on_job_done).run(jobs)
+        finally:
+            watchdog.cancel()
+            await pool.close()
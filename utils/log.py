@@ -1,9 +1,25 @@
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
 from pathlib import Path
 from sys import stdout
 from loguru import logger
 
 from conf import BASE_DIR
 
+# 变量值回溯（diagnose）会在每条异常日志里遍历调用栈上的变量，开销很大，默认关闭；
+# 排查问题时设置环境变量 SAU_LOG_DIAGNOSE=1 开启
+LOG_DIAGNOSE = os.environ.get("SAU_LOG_DIAGNOSE", "").lower() in ("1", "true", "yes")
+# 所有业务日志额外写一份 JSON 行格式，便于按 job_id / platform / account 检索
+LOG_JSON_PATH = "logs/sau.jsonl"
+# 轮询类日志（"正在上传视频中..." 等）默认每个任务每 10 秒最多输出一次
+LOG_SAMPLE_INTERVAL = 10
+
+_current_job_id = ContextVar("sau_job_id", default="")
+
 
 def log_formatter(record: dict) -> str:
     """
@@ -23,25 +39,141 @@ def log_formatter(record: dict) -> str:
     return f"<fg #70acde>{{time:YYYY-MM-DD HH:mm:ss}}</fg #70acde> | <fg {color}>{{level}}</fg {color}>: <light-white>{{message}}</light-white>\n"
 
 
+def add_business_sink(log_name: str, file_path: str):
+    def filter_record(record):
+        return record["extra"].get("business_name") == log_name
+
+    Path(BASE_DIR / file_path).parent.mkdir(exist_ok=True)
+    # enqueue=True：写文件放到 loguru 的后台线程，事件循环里打日志不会被磁盘 IO 阻塞
+    logger.add(Path(BASE_DIR / file_path), filter=filter_record, level="INFO", rotation="10 MB", retention="10 days",
+               enqueue=True, backtrace=True, diagnose=LOG_DIAGNOSE)
+
+
+class LazyLogger(object):
+    """
+    业务 logger 的代理：第一次使用（info / error / opt ...）时才创建控制台、JSON 和该业务的文件 sink。
+    每个 enqueue sink 都带一个后台线程和打开的文件，只导入模块、不输出日志的进程（后端冷启动、命令行只用一个平台）不需要它们。
+    """
+
+    def __init__(self, log_name: str, file_path: str):
+        self._log_name = log_name
+        self._file_path = file_path
+        self._logger = None
+
+    def _setup(self):
+        with _sinks_lock:
+            if self._logger is None:
+                setup_base_sinks()
+                add_business_sink(self._log_name, self._file_path)
+                self._logger = logger.bind(business_name=self._log_name)
+        return self._logger
+
+    def __getattr__(self, item):
+        return getattr(self._logger or self._setup(), item)
+
+
 def create_logger(log_name: str, file_path: str):
     """
     Create custom logger for different business modules.
     :param str log_name: name of log
     :param str file_path: Optional path to log file
-    :returns: Configured logger
+    :returns: Configured logger (sinks are added on first use)
     """
-    def filter_record(record):
-        return record["extra"].get("business_name") == log_name
+    return LazyLogger(log_name, file_path)
+
 
+def create_json_sink(file_path: str):
+    """
+    结构化日志：每条记录一行 JSON，extra 中带 business_name，以及 log_context 注入的 platform / account / job_id
+    """
     Path(BASE_DIR / file_path).parent.mkdir(exist_ok=True)
-    logger.add(Path(BASE_DIR / file_path), filter=filter_record, level="INFO", rotation="10 MB", retention="10 days", backtrace=True, diagnose=True)
-    return logger.bind(business_name=log_name)
+    logger.add(Path(BASE_DIR / file_path), filter=lambda record: "business_name" in record["extra"], level="INFO",
+               rotation="50 MB", retention="10 days", serialize=True, enqueue=True, backtrace=False,
+               diagnose=LOG_DIAGNOSE)
+
 
+@contextmanager
+def log_context(platform=None, account=None, job_id=None):
+    """
+    在一次上传/登录任务范围内，给所有日志记录附加 platform、account、job_id。
+    基于 contextvars，asyncio 并发任务之间互不影响。
+    """
+    job_id = job_id or uuid.uuid4().hex[:12]
+    token = _current_job_id.set(job_id)
+    try:
+        with logger.contextualize(platform=platform or "", account=account or "", job_id=job_id):
+            yield job_id
+    finally:
+        _current_job_id.reset(token)
+
+
+class LogSampler(object):
+    """
+    轮询日志采样：同一个 key 在 interval 秒内只放行一次，被丢弃的条数在下一次输出时带上。
+    key 默认附带当前 job_id，不同任务互不影响。
+    """
+
+    def __init__(self, interval=LOG_SAMPLE_INTERVAL):
+        self.interval = interval
+        self._last = {}
+        self._suppressed = {}
+        self._lock = threading.Lock()
+
+    def log(self, bound_logger, key, message, level="INFO", interval=None):
+        interval = self.interval if interval is None else interval
+        now = time.monotonic()
+        with self._lock:
+            last = self._last.get(key)
+            if last is not None and now - last < interval:
+                self._suppressed[key] = self._suppressed.get(key, 0) + 1
+                return False
+            self._last[key] = now
+            suppressed = self._suppressed.pop(key, 0)
+            # 防止长期运行的进程 key 无限增长
+            if len(self._last) > 4096:
+                expired = [k for k, t in self._last.items() if now - t > interval]
+                for k in expired:
+                    self._last.pop(k, None)
+                    self._suppressed.pop(k, None)
+        if suppressed:
+            message = f"{message} (近 {interval} 秒内省略 {suppressed} 条)"
+        bound_logger.opt(depth=2).log(level, message)
+        return True
+
+
+_sampler = LogSampler()
+
+
+def log_every(bound_logger, message, level="INFO", key=None, interval=None):
+    """
+    轮询循环里使用：tencent_logger.info("正在上传视频中...") -> log_every(tencent_logger, "正在上传视频中...")
+    """
+    return _sampler.log(bound_logger, (_current_job_id.get(), key or message), message, level=level, interval=interval)
+
+
+_sinks_lock = threading.RLock()
+_base_sinks_ready = False
+
+
+def setup_base_sinks():
+    """
+    替换 loguru 默认的 stderr 输出为彩色控制台 sink，并添加 JSON 行 sink；只执行一次。
+    业务 logger 第一次输出时自动调用；直接使用 loguru logger 的模块在此之前走 loguru 默认输出。
+    """
+    global _base_sinks_ready
+    with _sinks_lock:
+        if _base_sinks_ready:
+            return
+        # Remove loguru's default stderr handler (id 0); sinks added by others in the meantime are kept
+        try:
+            logger.remove(0)
+        except ValueError:
+            pass
+        # Add a standard console handler
+        logger.add(stdout, colorize=True, format=log_formatter, enqueue=True, backtrace=True, diagnose=LOG_DIAGNOSE)
+        create_json_sink(LOG_JSON_PATH)
+        _base_sinks_ready = True
 
-# Remove all existing handlers
-logger.remove()
-# Add a standard console handler
-logger.add(stdout, colorize=True, format=log_formatter)
 
 douyin_logger = create_logger('douyin', 'logs/douyin.log')
 tencent_logger = create_logger('tencent', 'logs/tencent.log')
@@ -0,0 +1,168 @@
+"""
+批量上传清单：一行（一条）描述 视频文件 × 平台 × 账号 × 定时时间，展开成 UploadJob 列表，并输出结果报告。
+
+支持 .csv / .json / .yaml(.yml)，字段：
+    file       视频文件，相对路径相对清单所在目录
+    platform   平台，多个用 | 分隔或写成列表（字段名也可以写 platforms）
+    account    账号名，多个用 | 分隔或写成列表（字段名也可以写 accounts），cookie 文件为 cookies/<platform>_<account>.json
+    title      可选，不写时读取视频同名 txt（第一行标题，第二行话题）
+    tags       可选，空格或逗号分隔，# 可带可不带
+    schedule   可选，定时发布时间 %Y-%m-%d %H:%M，不写立即发布
+json/yaml 可以是任务列表，也可以是 {"defaults": {...}, "jobs": [...]}，defaults 中的字段作为每一条的默认值。
+"""
+import csv
+import json
+import re
+from datetime import datetime
+from pathlib import Path
+
+from conf import BASE_DIR
+from utils.engine import UploadJob
+from utils.files_times import get_title_and_hashtags
+from utils.plugins import get_platform
+
+SCHEDULE_FORMAT = '%Y-%m-%d %H:%M'
+LIST_SEPARATOR = "|"
+
+
+def load_manifest(path):
+    path = Path(path)
+    suffix = path.suffix.lower()
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if suffix == ".csv":
+            return list(csv.DictReader(f))
+        if suffix in (".yaml", ".yml"):
+            import yaml
+            data = yaml.safe_load(f)
+        elif suffix == ".json":
+            data = json.load(f)
+        else:
+            raise ValueError(f"unsupported manifest format: {path.suffix}, use .csv/.json/.yaml")
+    if isinstance(data, dict):
+        defaults = data.get("defaults") or {}
+        return [dict(defaults, **row) for row in data.get("jobs") or []]
+    return data or []
+
+
+def _as_list(value, separator=LIST_SEPARATOR):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [str(item).strip() for item in value if str(item).strip()]
+    return [item.strip() for item in str(value).split(separator) if item.strip()]
+
+
+def _parse_tags(value):
+    if isinstance(value, (list, tuple)):
+        tags = [str(tag) for tag in value]
+    else:
+        tags = re.split(r"[\s,，]+", str(value or ""))
+    return [tag.strip().lstrip("#") for tag in tags if tag.strip().lstrip("#")]
+
+
+def _row_value(row, *names):
+    for name in names:
+        value = row.get(name)
+        if value not in (None, ""):
+            return value
+    return None
+
+
+def plan_jobs(rows, manifest_dir="."):
+    """
+    展开清单行并校验，返回 UploadJob 列表（按清单顺序）。
+    校验不通过的、与前面重复（同一文件、平台、账号）的任务状态直接设为 skipped，写进报告但不执行。
+    同一个视频的标题只读取一次。
+    """
+    jobs = []
+    seen = set()
+    titles = {}
+    manifest_dir = Path(manifest_dir)
+    for line, row in enumerate(rows, start=1):
+        video_file = _row_value(row, "file", "video_file")
+        platforms = _as_list(_row_value(row, "platforms", "platform"))
+        accounts = _as_list(_row_value(row, "accounts", "account"))
+        if not video_file or not platforms or not accounts:
+            job = UploadJob(len(jobs), ",".join(platforms), ",".join(accounts), "", video_file or "")
+            job.skip(f"row {line}: file, platform and account are required")
+            jobs.append(job)
+            continue
+        video_path = Path(video_file)
+        if not video_path.is_absolute():
+            video_path = (manifest_dir / video_path).resolve()
+
+        row_error = ""
+        publish_date = 0
+        schedule = _row_value(row, "schedule", "publish_date")
+        if schedule:
+            try:
+                publish_date = schedule if isinstance(schedule, datetime) else \
+                    datetime.strptime(str(schedule).strip(), SCHEDULE_FORMAT)
+            except ValueError:
+                row_error = f"row {line}: schedule must be in {SCHEDULE_FORMAT} format"
+        if not row_error and not video_path.is_file():
+            row_error = f"row {line}: video file not found"
+
+        title = _row_value(row, "title")
+        tags = _parse_tags(row.get("tags"))
+        if not row_error and title is None:
+            if video_path not in titles:
+                try:
+                    titles[video_path] = get_title_and_hashtags(str(video_path))
+                except (OSError, IndexError):
+                    titles[video_path] = None
+            if titles[video_path] is None:
+                row_error = f"row {line}: no title given and no readable {video_path.stem}.txt"
+            else:
+                title, txt_tags = titles[video_path]
+                tags = tags or [tag for tag in txt_tags if tag]
+
+        for platform in platforms:
+            for account in accounts:
+                account_file = Path(BASE_DIR / "cookies" / f"{platform}_{account}.json")
+                job = UploadJob(len(jobs), platform, account, str(account_file), video_path, title or "", tags,
+                                publish_date)
+                plugin = get_platform(platform)
+                key = (str(video_path), platform, account)
+                if row_error:
+                    job.skip(row_error)
+                elif plugin is None or not plugin.has("video"):
+                    job.skip(f"row {line}: unsupported platform: {platform}")
+                elif key in seen:
+                    job.skip(f"row {line}: duplicate of an earlier row")
+                seen.add(key)
+                jobs.append(job)
+    return jobs
+
+
+def summarize_jobs(jobs):
+    summary = {"total": len(jobs)}
+    for job in jobs:
+        summary[job.status] = summary.get(job.status, 0) + 1
+    return summary
+
+
+def write_report(path, jobs, manifest="", started_at=None):
+    """.csv 每个任务一行，其他后缀写 json（包含 summary 和 jobs）"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    records = [job.to_dict() for job in jobs]
+    if path.suffix.lower() == ".csv":
+        fields = ["index", "platform", "account", "video_file", "title", "tags", "publish_date", "status", "error",
+                  "seconds"]
+        with open(path, "w", encoding="utf-8-sig", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+            writer.writeheader()
+            for record in records:
+                writer.writerow(dict(record, tags=" ".join(record["tags"])))
+        return path
+    report = {
+        "manifest": str(manifest),
+        "started_at": started_at.isoformat(timespec="seconds") if started_at else "",
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "summary": summarize_jobs(jobs),
+        "jobs": records,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    return path
@@ -0,0 +1,398 @@
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+
+from utils.log import log_context
+
+# 秒，覆盖从页面跳转（亚秒级）到大文件上传（几十分钟）的范围
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+
+def _escape_label_value(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames, labelvalues, extra=None) -> str:
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.extend(f'{name}="{_escape_label_value(value)}"' for name, value in extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter(object):
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labelvalues, value in items:
+            yield f"{self.name}_total{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+
+
+class Gauge(object):
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def replace(self, values):
+        """整体替换所有标签组合的值，values: {(labelvalue, ...): value}，用于每次采样后标签集合会变化的指标"""
+        with self._lock:
+            self._values = {tuple(str(v) for v in key): value for key, value in values.items()}
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labelvalues, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}"
+
+
+class Histogram(object):
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, upper in enumerate(self.buckets):
+                if value <= upper:
+                    state["buckets"][index] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, {"buckets": list(state["buckets"]), "sum": state["sum"], "count": state["count"]})
+                     for key, state in self._values.items()]
+        for labelvalues, state in items:
+            cumulative = 0
+            for upper, count in zip(self.buckets, state["buckets"]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, labelvalues, [("le", _format_value(upper))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield f"{self.name}_sum{labels} {_format_value(state['sum'])}"
+            yield f"{self.name}_count{labels} {state['count']}"
+
+
+class MetricsRegistry(object):
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def expose(self) -> str:
+        """Prometheus 文本格式（version 0.0.4）"""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+UPLOAD_JOBS = REGISTRY.counter(
+    "sau_upload_jobs", "Finished uploader jobs.", ("platform", "account", "outcome"))
+UPLOAD_JOB_SECONDS = REGISTRY.histogram(
+    "sau_upload_job_seconds", "Wall time of a whole uploader job.", ("platform", "account", "outcome"))
+UPLOAD_PHASE_SECONDS = REGISTRY.histogram(
+    "sau_upload_phase_seconds",
+    "Wall time of each uploader phase (browser_launch, login, navigation, metadata, file_transfer, processing, schedule, publish, teardown).",
+    ("platform", "account", "phase", "outcome"))
+COOKIE_CHECKS = REGISTRY.counter(
+    "sau_cookie_checks", "Cookie validity checks.", ("platform", "account", "outcome"))
+COOKIE_CHECK_SECONDS = REGISTRY.histogram(
+    "sau_cookie_check_seconds", "Wall time of a cookie validity check.", ("platform", "outcome"))
+LOGINS = REGISTRY.counter(
+    "sau_logins", "QR code login flows.", ("platform", "outcome"))
+LOGIN_SECONDS = REGISTRY.histogram(
+    "sau_login_seconds", "Wall time of a QR code login flow.", ("platform", "outcome"))
+RETRY_ATTEMPTS = REGISTRY.counter(
+    "sau_retry_attempts", "async_retry decisions (retry, fatal, exhausted, budget_exhausted, circuit_open).", ("platform", "outcome"))
+CIRCUIT_TRANSITIONS = REGISTRY.counter(
+    "sau_circuit_transitions", "Circuit breaker state transitions.", ("platform", "state"))
+FIXED_SLEEP_SECONDS = REGISTRY.counter(
+    "sau_fixed_sleep_seconds", "Seconds spent in unconditional sleeps (fixed_sleep) inside uploader jobs.", ("platform", "phase"))
+JOB_FIXED_SLEEP_SECONDS = REGISTRY.histogram(
+    "sau_job_fixed_sleep_seconds", "Total fixed-sleep time of a whole uploader job.", ("platform",),
+    buckets=(0, 1, 2, 5, 10, 20, 30, 60, 120, 300))
+BROWSER_RSS_BYTES = REGISTRY.gauge(
+    "sau_browser_rss_bytes", "RSS of each browser (main process plus renderers/GPU/utility children), sampled by the watchdog.",
+    ("browser",))
+BROWSER_TOTAL_RSS_BYTES = REGISTRY.gauge(
+    "sau_browser_total_rss_bytes", "RSS of all browser processes owned by this process.")
+BROWSER_PROCESSES = REGISTRY.gauge(
+    "sau_browser_processes", "Browser processes (including children) owned by this process.")
+BROWSER_RECYCLES = REGISTRY.counter(
+    "sau_browser_recycles", "Pooled browsers retired by the memory watchdog.", ("reason",))
+ORPHAN_PROCESSES_REAPED = REGISTRY.counter(
+    "sau_orphan_browser_processes_reaped", "Orphaned playwright browser processes killed by the watchdog.")
+LOGIN_POOL_PAGES = REGISTRY.gauge(
+    "sau_login_pool_pages", "Pre-warmed QR login pages ready to hand out.", ("platform",))
+LOGIN_POOL_TAKES = REGISTRY.counter(
+    "sau_login_pool_takes", "QR logins served from the pre-warmed pool (hit) or opened on demand (miss).",
+    ("platform", "outcome"))
+SESSION_KEEPALIVES = REGISTRY.counter(
+    "sau_session_keepalives", "Background session refreshes (alive, expired, error).", ("platform", "outcome"))
+ACCOUNTS_NEED_LOGIN = REGISTRY.gauge(
+    "sau_accounts_need_login", "Accounts whose session expired at the last keep-alive check.", ("platform",))
+UPLOAD_THROUGHPUT_BYTES = REGISTRY.gauge(
+    "sau_upload_throughput_bytes", "Aggregate upload throughput over the last 30 seconds, bytes per second.")
+UPLOAD_BYTES = REGISTRY.counter(
+    "sau_upload_bytes", "Video bytes sent by uploads admitted by the bandwidth scheduler.", ("platform",))
+UPLOADS_ACTIVE = REGISTRY.gauge(
+    "sau_uploads_active", "Uploads admitted by the bandwidth scheduler and still transferring.")
+UPLOADS_WAITING = REGISTRY.gauge(
+    "sau_uploads_waiting", "Uploads waiting for bandwidth headroom.")
+UPLOAD_ADMISSION_WAIT_SECONDS = REGISTRY.histogram(
+    "sau_upload_admission_wait_seconds", "Time an upload waited for bandwidth headroom.", ("platform",),
+    buckets=(0, 1, 5, 10, 30, 60, 120, 300, 600, 1800))
+
+# 当前协程/线程正在执行的上传任务，fixed_sleep 用它把等待时间记到对应任务上
+_current_job_metrics = ContextVar("sau_current_job_metrics", default=None)
+
+
+def account_label(account_file) -> str:
+    if not account_file:
+        return ""
+    return Path(str(account_file)).stem
+
+
+class UploadJobMetrics(object):
+    """
+    记录一次上传任务的各个阶段耗时。
+    phase(name) 结束上一个阶段并开始下一个阶段，阶段按顺序串行，不需要改动原有代码的缩进。
+    """
+
+    def __init__(self, platform, account_file=None, first_phase="browser_launch"):
+        self.platform = platform
+        self.account = account_label(account_file)
+        self.started_at = time.perf_counter()
+        self.current_phase = first_phase
+        self.phase_started_at = self.started_at
+        self.fixed_sleep_seconds = 0.0
+        # [(phase, 秒)]，按发生顺序，同一阶段可能出现多次；压测脚本用它统计分位数
+        self.phase_durations = []
+        # [(phase, callback)]，见 on_phase_end
+        self._phase_end_callbacks = []
+
+    def on_phase_end(self, phase, callback):
+        """phase 阶段下一次结束（切换到其他阶段）或任务结束时调用一次 callback()"""
+        self._phase_end_callbacks.append((phase, callback))
+
+    def _run_phase_end_callbacks(self, phase=None):
+        remaining = []
+        for name, callback in self._phase_end_callbacks:
+            if phase is not None and name != phase:
+                remaining.append((name, callback))
+                continue
+            try:
+                callback()
+            except Exception:
+                pass
+        self._phase_end_callbacks = remaining
+
+    def _observe_phase(self, outcome):
+        if self.current_phase is None:
+            return
+        if self._phase_end_callbacks:
+            self._run_phase_end_callbacks(self.current_phase)
+        elapsed = time.perf_counter() - self.phase_started_at
+        self.phase_durations.append((self.current_phase, elapsed))
+        UPLOAD_PHASE_SECONDS.observe(elapsed, platform=self.platform,
+                                     account=self.account, phase=self.current_phase, outcome=outcome)
+
+    def phase(self, name):
+        self._observe_phase("success")
+        self.current_phase = name
+        self.phase_started_at = time.perf_counter()
+
+    def record_fixed_sleep(self, seconds):
+        self.fixed_sleep_seconds += seconds
+        FIXED_SLEEP_SECONDS.inc(seconds, platform=self.platform, phase=self.current_phase or "")
+
+    def finish(self, outcome="success"):
+        self._observe_phase(outcome)
+        self._run_phase_end_callbacks()
+        self.current_phase = None
+        elapsed = time.perf_counter() - self.started_at
+        UPLOAD_JOBS.inc(platform=self.platform, account=self.account, outcome=outcome)
+        UPLOAD_JOB_SECONDS.observe(elapsed, platform=self.platform, account=self.account, outcome=outcome)
+        JOB_FIXED_SLEEP_SECONDS.observe(self.fixed_sleep_seconds, platform=self.platform)
+
+
+async def fixed_sleep(seconds):
+    """
+    无条件等待 seconds 秒，并计入当前上传任务的 fixed-sleep 统计（sau_fixed_sleep_seconds）。
+    能等具体条件（元素状态、选项渲染、url 变化）时不要用它；上传任务里的无条件等待都走这里，方便发现回退。
+    统计范围：只含无条件等待。轮询循环（等上传完成、等发布跳转）里两次检查之间的 asyncio.sleep 不计入，
+    它们等多久取决于条件何时满足，时间体现在对应阶段的耗时（sau_upload_phase_seconds）里。
+    """
+    job_metrics = current_job_metrics()
+    if job_metrics is not None:
+        job_metrics.record_fixed_sleep(seconds)
+    await asyncio.sleep(seconds)
+
+
+def current_job_metrics():
+    """当前协程/线程正在执行的上传任务的 UploadJobMetrics，不在上传任务里时为 None"""
+    return _current_job_metrics.get()
+
+
+def track_upload_job(platform, account_attr="account_file", first_phase="browser_launch"):
+    """
+    上传方法装饰器，同步/异步方法都支持。
+    被装饰方法里通过 self.job_metrics.phase("xxx") 标记阶段切换，账号标签取自 self.<account_attr>。
+    方法执行期间的日志都带上 platform / account / job_id。
+    """
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(self, *args, **kwargs):
+                self.job_metrics = UploadJobMetrics(platform, getattr(self, account_attr, None), first_phase)
+                token = _current_job_metrics.set(self.job_metrics)
+                with log_context(platform, self.job_metrics.account):
+                    try:
+                        result = await func(self, *args, **kwargs)
+                    except BaseException:
+                        self.job_metrics.finish("error")
+                        raise
+                    finally:
+                        _current_job_metrics.reset(token)
+                self.job_metrics.finish("success" if result is not False else "failure")
+                return result
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            self.job_metrics = UploadJobMetrics(platform, getattr(self, account_attr, None), first_phase)
+            token = _current_job_metrics.set(self.job_metrics)
+            with log_context(platform, self.job_metrics.account):
+                try:
+                    result = func(self, *args, **kwargs)
+                except BaseException:
+                    self.job_metrics.finish("error")
+                    raise
+                finally:
+                    _current_job_metrics.reset(token)
+            self.job_metrics.finish("success" if result is not False else "failure")
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def track_cookie_check(platform):
+    """cookie 校验函数装饰器，函数第一个参数为 cookie 文件，返回 True/False"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(account_file, *args, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = await func(account_file, *args, **kwargs)
+                outcome = "valid" if result else "invalid"
+                return result
+            finally:
+                COOKIE_CHECKS.inc(platform=platform, account=account_label(account_file), outcome=outcome)
+                COOKIE_CHECK_SECONDS.observe(time.perf_counter() - start, platform=platform, outcome=outcome)
+
+        return wrapper
+
+    return decorator
+
+
+def track_login(platform):
+    """扫码登录流程装饰器，流程成功时返回真值"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                with log_context(platform):
+                    result = await func(*args, **kwargs)
+                outcome = "success" if result else "failure"
+                return result
+            finally:
+                LOGINS.inc(platform=platform, outcome=outcome)
+                LOGIN_SECONDS.observe(time.perf_counter() - start, platform=platform, outcome=outcome)
+
+        return wrapper
+
+    return decorator
@@ -1,28 +1,304 @@
 import asyncio
+import random
+import threading
 import time
+from collections import deque
 from functools import wraps
 
+from loguru import logger
+
+from utils.metrics import CIRCUIT_TRANSITIONS, RETRY_ATTEMPTS
+
+# 退避参数：第 n 次重试前等待 random(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * RETRY_MULTIPLIER ** (n-1))) 秒
+RETRY_BASE_DELAY = 1
+RETRY_MAX_DELAY = 30
+RETRY_MULTIPLIER = 2
+
+# 这些异常是代码/参数问题，重试也不会成功，直接抛出
+NON_RETRYABLE_EXCEPTIONS = (ValueError, TypeError, KeyError, AttributeError, NotImplementedError)
+
+# 重试预算：每个平台在 RETRY_BUDGET_WINDOW 秒内的重试次数不超过调用次数的 RETRY_BUDGET_RATIO，
+# 但至少允许 RETRY_BUDGET_MIN_RETRIES 次，避免平台故障时所有任务一起放大请求量
+RETRY_BUDGET_WINDOW = 60
+RETRY_BUDGET_RATIO = 0.5
+RETRY_BUDGET_MIN_RETRIES = 10
+
+# 熔断：连续失败 CIRCUIT_FAILURE_THRESHOLD 次后熔断，CIRCUIT_RECOVERY_TIMEOUT 秒后放行少量探测请求
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RECOVERY_TIMEOUT = 30
+CIRCUIT_HALF_OPEN_MAX_CALLS = 1
+
+
+class CircuitOpenError(Exception):
+    """平台熔断中，请求被直接拒绝"""
+
+    def __init__(self, name, retry_after):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"circuit '{name}' is open, retry after {retry_after:.1f}s")
+
+
+class RetryPolicy(object):
+    """
+    重试策略：指数退避 + full jitter，按异常类型区分可重试/不可重试。
+    """
+
+    def __init__(self, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY, multiplier=RETRY_MULTIPLIER,
+                 jitter=True, retry_on=(Exception,), give_up_on=NON_RETRYABLE_EXCEPTIONS):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.retry_on = tuple(retry_on)
+        self.give_up_on = tuple(give_up_on) + (CircuitOpenError,)
+
+    def is_retryable(self, exc) -> bool:
+        if isinstance(exc, self.give_up_on):
+            return False
+        return isinstance(exc, self.retry_on)
+
+    def delay(self, attempt) -> float:
+        """attempt 从 1 开始"""
+        ceiling = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        if self.jitter:
+            return random.uniform(0, ceiling)
+        return ceiling
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+# 页面内轮询（等元素出现、等上传完成）：重试间隔不超过 2 秒，不做长时间退避，任务后段偶尔失败一次不会白等几十秒
+POLL_RETRY_POLICY = RetryPolicy(base_delay=1, max_delay=2)
+
+
+class RetryBudget(object):
+    """滑动窗口内的重试预算，线程安全，多个事件循环线程可以共享"""
+
+    def __init__(self, window=RETRY_BUDGET_WINDOW, ratio=RETRY_BUDGET_RATIO, min_retries=RETRY_BUDGET_MIN_RETRIES):
+        self.window = window
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self._calls = deque()
+        self._retries = deque()
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        for events in (self._calls, self._retries):
+            while events and now - events[0] > self.window:
+                events.popleft()
+
+    def record_call(self):
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            self._calls.append(now)
+
+    def try_acquire(self) -> bool:
+        """预算内则记录一次重试并返回 True"""
+        now = time.monotonic()
+        with self._lock:
+            self._trim(now)
+            allowed = max(self.min_retries, int(len(self._calls) * self.ratio))
+            if len(self._retries) >= allowed:
+                return False
+            self._retries.append(now)
+            return True
+
+
+class CircuitBreaker(object):
+    """
+    closed: 正常放行，连续失败达到阈值后 -> open
+    open: 直接抛出 CircuitOpenError，recovery_timeout 后 -> half_open
+    half_open: 只放行 half_open_max_calls 个探测请求，成功 -> closed，失败 -> open
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, recovery_timeout=CIRCUIT_RECOVERY_TIMEOUT,
+                 half_open_max_calls=CIRCUIT_HALF_OPEN_MAX_CALLS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.half_open_calls = 0
+        self._lock = threading.Lock()
+
+    def _transition(self, state):
+        if state == self.state:
+            return
+        logger.warning(f"circuit '{self.name}': {self.state} -> {state}")
+        CIRCUIT_TRANSITIONS.inc(platform=self.name, state=state)
+        self.state = state
+        if state == self.OPEN:
+            self.opened_at = time.monotonic()
+        if state == self.HALF_OPEN:
+            self.half_open_calls = 0
+        if state == self.CLOSED:
+            self.failures = 0
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                elapsed = time.monotonic() - self.opened_at
+                if elapsed < self.recovery_timeout:
+                    raise CircuitOpenError(self.name, self.recovery_timeout - elapsed)
+                self._transition(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN:
+                if self.half_open_calls >= self.half_open_max_calls:
+                    raise CircuitOpenError(self.name, self.recovery_timeout)
+                self.half_open_calls += 1
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._transition(self.CLOSED)
+
+    def record_ignored(self):
+        """调用以不计入熔断的异常结束（如参数错误），归还 half_open 的探测名额"""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self.half_open_calls > 0:
+                self.half_open_calls -= 1
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self._transition(self.OPEN)
+
+
+_circuit_breakers = {}
+_retry_budgets = {}
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breaker(name) -> CircuitBreaker:
+    with _registry_lock:
+        if name not in _circuit_breakers:
+            _circuit_breakers[name] = CircuitBreaker(name)
+        return _circuit_breakers[name]
+
+
+def get_retry_budget(name) -> RetryBudget:
+    with _registry_lock:
+        if name not in _retry_budgets:
+            _retry_budgets[name] = RetryBudget()
+        return _retry_budgets[name]
+
+
+class _RetryCall(object):
+    """一次带重试的调用：async_retry 和 retry 共用的熔断、重试预算、退避判断"""
+
+    def __init__(self, func, timeout, max_retries, platform, policy):
+        self.name = func.__qualname__
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.platform = platform
+        self.policy = policy
+        self.breaker = get_circuit_breaker(platform) if platform else None
+        self.budget = get_retry_budget(platform) if platform else None
+        self.label = platform or ""
+        self.start_time = time.time()
+        self.attempts = 0
+
+    def before_call(self):
+        if self.breaker:
+            self.breaker.before_call()
+        if self.budget:
+            self.budget.record_call()
+
+    def succeeded(self):
+        if self.breaker:
+            self.breaker.record_success()
+
+    def failed(self, e):
+        """返回重试前的等待秒数；返回 None 时调用方原样抛出 e，超时、次数用完时这里抛出新的异常"""
+        self.attempts += 1
+        if not self.policy.is_retryable(e):
+            if self.breaker:
+                self.breaker.record_ignored()
+            RETRY_ATTEMPTS.inc(platform=self.label, outcome="fatal")
+            return None
+        if self.breaker:
+            self.breaker.record_failure()
+            if self.breaker.state == CircuitBreaker.OPEN:
+                # 本次失败触发了熔断，不再等待重试
+                RETRY_ATTEMPTS.inc(platform=self.label, outcome="circuit_open")
+                return None
+        if self.max_retries is not None and self.attempts >= self.max_retries:
+            logger.error(f"{self.name}: reached maximum retries of {self.max_retries}.")
+            RETRY_ATTEMPTS.inc(platform=self.label, outcome="exhausted")
+            raise Exception(f"Failed after {self.max_retries} retries.") from e
+        elapsed = time.time() - self.start_time
+        if elapsed > self.timeout:
+            logger.error(f"{self.name}: timeout after {self.timeout} seconds.")
+            RETRY_ATTEMPTS.inc(platform=self.label, outcome="exhausted")
+            raise TimeoutError(f"Function execution exceeded {self.timeout} seconds timeout.") from e
+        if self.budget and not self.budget.try_acquire():
+            logger.error(f"{self.name}: retry budget of '{self.platform}' exhausted.")
+            RETRY_ATTEMPTS.inc(platform=self.label, outcome="budget_exhausted")
+            return None
+        delay = min(self.policy.delay(self.attempts), max(self.timeout - elapsed, 0))
+        logger.warning(f"{self.name}: attempt {self.attempts} failed: {e}. Retrying in {delay:.1f}s...")
+        RETRY_ATTEMPTS.inc(platform=self.label, outcome="retry")
+        return delay
+
+
+def async_retry(timeout=60, max_retries=None, platform=None, policy=None):
+    """
+    :param timeout: 从第一次调用开始计算的总超时（秒）
+    :param max_retries: 最大尝试次数，None 表示只受 timeout 限制
+    :param platform: 平台名，指定后同一平台共享熔断器和重试预算。只用于请求平台接口、页面跳转这类失败代表平台故障的步骤；
+                     页面内轮询 DOM 的等待失败只和当前任务有关，不要指定，否则一个任务的失败会熔断同平台的所有任务
+    :param policy: RetryPolicy，默认指数退避 + jitter；页面内轮询用 POLL_RETRY_POLICY
+    """
+    policy = policy or DEFAULT_RETRY_POLICY
 
-def async_retry(timeout=60, max_retries=None):
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            start_time = time.time()
-            attempts = 0
+            call = _RetryCall(func, timeout, max_retries, platform, policy)
+            while True:
+                call.before_call()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    delay = call.failed(e)
+                    if delay is None:
+                        raise
+                    await asyncio.sleep(delay)
+                    continue
+                call.succeeded()
+                return result
+
+        return wrapper
+
+    return decorator
+
+
+def retry(timeout=60, max_retries=None, platform=None, policy=None):
+    """同步版本的 async_retry，给 xhs、biliup 这类同步 HTTP 客户端的调用用，参数相同"""
+    policy = policy or DEFAULT_RETRY_POLICY
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            call = _RetryCall(func, timeout, max_retries, platform, policy)
             while True:
+                call.before_call()
                 try:
-                    return await func(*args, **kwargs)
+                    result = func(*args, **kwargs)
                 except Exception as e:
-                    attempts += 1
-                    if max_retries is not None and attempts >= max_retries:
-                        print(f"Reached maximum retries of {max_retries}.")
-                        raise Exception(f"Failed after {max_retries} retries.") from e
-                    if time.time() - start_time > timeout:
-                        print(f"Function timeout after {timeout} seconds.")
-                        raise TimeoutError(f"Function execution exceeded {timeout} seconds timeout.") from e
-                    print(f"Attempt {attempts} failed: {e}. Retrying...")
-                    await asyncio.sleep(1)  # Sleep to avoid tight loop or provide backoff logic here
+                    delay = call.failed(e)
+                    if delay is None:
+                        raise
+                    time.sleep(delay)
+                    continue
+                call.succeeded()
+                return result
 
         return wrapper
 
-    return decorator
\ No newline at end of file
+    return decorator
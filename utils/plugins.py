@@ -0,0 +1,125 @@
+import importlib
+import threading
+
+from utils.base_social_media import SOCIAL_MEDIA_BILIBILI, SOCIAL_MEDIA_DOUYIN, SOCIAL_MEDIA_KUAISHOU, \
+    SOCIAL_MEDIA_TENCENT, SOCIAL_MEDIA_TIKTOK, SOCIAL_MEDIA_XIAOHONGSHU
+from utils.constant import TencentZoneTypes
+
+# 插件入口类型
+# post_video    后端发布函数（myUtils/postVideo.py），返回每个 (文件, 账号) 的 publish_outcome 列表
+# login         后端扫码登录流程 (id, status_queue)
+# cookie_check  cookie 校验 (account_file) -> bool
+# setup         命令行 cookie 准备 (account_file, handle)
+# video         命令行上传器类
+PLUGIN_KINDS = ("post_video", "login", "cookie_check", "setup", "video")
+
+
+class PlatformPlugin(object):
+    """
+    一个平台的入口集合。入口写成 "模块:属性" 字符串，第一次 load 时才 import 对应模块，
+    这样后端和命令行启动时不会把所有上传器、playwright、xhs、biliup 都加载进来。
+    """
+
+    def __init__(self, type_id, name, **entries):
+        unknown = set(entries) - set(PLUGIN_KINDS)
+        if unknown:
+            raise ValueError(f"unknown plugin kind: {', '.join(sorted(unknown))}")
+        self.type_id = type_id
+        self.name = name
+        self.entries = {kind: target for kind, target in entries.items() if target}
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def has(self, kind):
+        return kind in self.entries
+
+    def load(self, kind):
+        if kind in self._loaded:
+            return self._loaded[kind]
+        target = self.entries.get(kind)
+        if target is None:
+            return None
+        with self._lock:
+            if kind not in self._loaded:
+                module_name, _, attr = target.partition(":")
+                self._loaded[kind] = getattr(importlib.import_module(module_name), attr)
+        return self._loaded[kind]
+
+
+_plugins_by_type = {}
+_plugins_by_name = {}
+
+
+def register_platform(type_id, name, **entries) -> PlatformPlugin:
+    """
+    注册平台插件，type_id 为后端/前端使用的平台标识（1 小红书 2 视频号 3 抖音 4 快手 5 b站），
+    只在命令行使用的平台 type_id 传 None。重复注册同一个平台会覆盖之前的入口。
+    """
+    plugin = PlatformPlugin(type_id, name, **entries)
+    if type_id is not None:
+        _plugins_by_type[type_id] = plugin
+    _plugins_by_name[name] = plugin
+    return plugin
+
+
+def get_platform(key):
+    """按 type_id（int 或数字字符串，如 sse 登录接口的 '1'）或平台名查找插件，找不到返回 None"""
+    if isinstance(key, str) and key.isdigit():
+        key = int(key)
+    if isinstance(key, int):
+        return _plugins_by_type.get(key)
+    return _plugins_by_name.get(key)
+
+
+def load_platform(key, kind):
+    """加载平台的某个入口，平台不存在或没有该入口时返回 None"""
+    plugin = get_platform(key)
+    if plugin is None:
+        return None
+    return plugin.load(kind)
+
+
+def get_platform_types():
+    return sorted(_plugins_by_type)
+
+
+def create_video(key, title, file_path, tags, publish_date, account_file):
+    """命令行和守护进程共用：按平台创建上传器实例，平台没有上传器时返回 None"""
+    video_class = load_platform(key, "video")
+    if video_class is None:
+        return None
+    if get_platform(key).name == SOCIAL_MEDIA_TENCENT:
+        category = TencentZoneTypes.LIFESTYLE.value  # 标记原创需要否则不需要传
+        return video_class(title, file_path, tags, publish_date, account_file, category)
+    return video_class(title, file_path, tags, publish_date, account_file)
+
+
+register_platform(1, SOCIAL_MEDIA_XIAOHONGSHU,
+                  post_video="myUtils.postVideo:post_video_xhs",
+                  login="myUtils.login:xiaohongshu_cookie_gen",
+                  cookie_check="myUtils.auth:cookie_auth_xhs")
+register_platform(2, SOCIAL_MEDIA_TENCENT,
+                  post_video="myUtils.postVideo:post_video_tencent",
+                  login="myUtils.login:get_tencent_cookie",
+                  cookie_check="myUtils.auth:cookie_auth_tencent",
+                  setup="uploader.tencent_uploader.main:weixin_setup",
+                  video="uploader.tencent_uploader.main:TencentVideo")
+register_platform(3, SOCIAL_MEDIA_DOUYIN,
+                  post_video="myUtils.postVideo:post_video_DouYin",
+                  login="myUtils.login:douyin_cookie_gen",
+                  cookie_check="myUtils.auth:cookie_auth_douyin",
+                  setup="uploader.douyin_uploader.main:douyin_setup",
+                  video="uploader.douyin_uploader.main:DouYinVideo")
+register_platform(4, SOCIAL_MEDIA_KUAISHOU,
+                  post_video="myUtils.postVideo:post_video_ks",
+                  login="myUtils.login:get_ks_cookie",
+                  cookie_check="myUtils.auth:cookie_auth_ks",
+                  setup="uploader.ks_uploader.main:ks_setup",
+                  video="uploader.ks_uploader.main:KSVideo")
+# b 站没有扫码登录，账号通过 /uploadCookie 上传 biliup 生成的 cookie
+register_platform(5, SOCIAL_MEDIA_BILIBILI,
+                  post_video="myUtils.postVideo:post_video_bilibili",
+                  cookie_check="myUtils.auth:cookie_auth_bilibili")
+register_platform(None, SOCIAL_MEDIA_TIKTOK,
+                  setup="uploader.tk_uploader.main_chrome:tiktok_setup",
+                  video="uploader.tk_uploader.main_chrome:TiktokVideo")
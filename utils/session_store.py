@@ -0,0 +1,172 @@
+"""
+账号登录态（playwright storage_state）的内存缓存：
+- get(account_file) 返回解析好的 storage_state dict，直接传给 browser.new_context(storage_state=...)，
+  同一账号的多次 cookie 校验、上传不再重复读取和解析 cookiesFile 里的 JSON
+- 上传结束时 save_context_state(context, account_file) 把浏览器里最新的 cookie 合并进缓存（按 name/domain/path 合并，
+  后写的覆盖先写的，同一账号的并发任务不会互相覆盖对方新拿到的 cookie），SESSION_FLUSH_DELAY 秒内的多次更新只写一次盘
+- 写盘先写临时文件再 rename，进程崩溃或并发读取时不会看到写了一半的文件；进程退出时写完所有待写的更新
+
+文件被外部改过（扫码登录、/uploadCookie 上传、删除账号）时以文件为准：get 时发现修改时间变化会重新读取，
+有待写的更新也会丢弃，不会把旧 cookie 写回去。
+缓存只在一个进程内有效，多进程（后端 + worker、batch -p）各自缓存，通过文件修改时间发现其他进程写入的新状态。
+"""
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from loguru import logger
+
+# 更新后延迟写盘的时间，秒，期间同一账号的更新合并成一次写入
+SESSION_FLUSH_DELAY = float(os.environ.get("SAU_SESSION_FLUSH_DELAY", 2))
+
+
+def _mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def merge_storage_state(old, new):
+    """new 覆盖 old 中同一个 cookie（name+domain+path）和同一个 origin 的 localStorage 项，丢弃已过期的 cookie"""
+    now = time.time()
+    cookies = {}
+    for cookie in (old or {}).get("cookies", []) + (new or {}).get("cookies", []):
+        cookies[(cookie.get("name"), cookie.get("domain"), cookie.get("path"))] = cookie
+    origins = {}
+    for origin in (old or {}).get("origins", []) + (new or {}).get("origins", []):
+        items = dict((item["name"], item) for item in origins.get(origin["origin"], {}).get("localStorage", []))
+        items.update((item["name"], item) for item in origin.get("localStorage", []))
+        origins[origin["origin"]] = {**origin, "localStorage": list(items.values())}
+    return {
+        "cookies": [cookie for cookie in cookies.values() if not 0 < cookie.get("expires", -1) < now],
+        "origins": list(origins.values()),
+    }
+
+
+class _Entry(object):
+    def __init__(self, state, mtime_ns):
+        self.state = state
+        # 最近一次读取或写入后文件的修改时间，用来发现外部修改
+        self.mtime_ns = mtime_ns
+        self.dirty = False
+        self.timer = None
+
+
+class SessionStore(object):
+    """
+    SESSIONS.get(account_file)                        -> storage_state dict（只读，不要原地修改）
+    SESSIONS.update(account_file, state)              合并并延迟写盘
+    await save_context_state(context, account_file)   上传结束时保存 cookie
+    """
+
+    def __init__(self, flush_delay=SESSION_FLUSH_DELAY):
+        self.flush_delay = flush_delay
+        self._entries = {}
+        self._lock = threading.RLock()
+        self.reads = 0
+        self.writes = 0
+
+    @staticmethod
+    def _key(account_file):
+        return str(Path(account_file).resolve())
+
+    def get(self, account_file):
+        key = self._key(account_file)
+        with self._lock:
+            entry = self._entries.get(key)
+            mtime_ns = _mtime_ns(key)
+            if entry is not None and (entry.mtime_ns == mtime_ns or (entry.dirty and entry.mtime_ns is None)):
+                return entry.state
+            if entry is not None and entry.dirty:
+                logger.warning(f"{Path(key).name} changed on disk, dropping unsaved session update")
+                self._cancel_timer(entry)
+            with open(key, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.reads += 1
+            self._entries[key] = _Entry(state, mtime_ns)
+            return state
+
+    def update(self, account_file, state, merge=True):
+        key = self._key(account_file)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                try:
+                    self.get(key)
+                except FileNotFoundError:
+                    self._entries[key] = _Entry({}, None)
+                entry = self._entries[key]
+            # 复制后替换，已经交给 new_context 的旧 dict 不受影响
+            entry.state = merge_storage_state(entry.state, state) if merge else state
+            entry.dirty = True
+            if self.flush_delay <= 0:
+                self._flush_entry(key, entry)
+            elif entry.timer is None:
+                entry.timer = threading.Timer(self.flush_delay, self.flush, args=(key,))
+                entry.timer.daemon = True
+                entry.timer.start()
+
+    @staticmethod
+    def _cancel_timer(entry):
+        if entry.timer is not None:
+            entry.timer.cancel()
+            entry.timer = None
+
+    def _flush_entry(self, key, entry):
+        self._cancel_timer(entry)
+        if not entry.dirty:
+            return
+        entry.dirty = False
+        mtime_ns = _mtime_ns(key)
+        if mtime_ns != entry.mtime_ns:
+            # 读取之后文件被重新登录、上传或删除，以文件为准
+            logger.warning(f"{Path(key).name} changed on disk, dropping unsaved session update")
+            self._entries.pop(key, None)
+            return
+        fd, tmp_path = tempfile.mkstemp(prefix=".session-", suffix=".tmp", dir=os.path.dirname(key))
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry.state, f, ensure_ascii=False)
+            os.replace(tmp_path, key)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        entry.mtime_ns = _mtime_ns(key)
+        self.writes += 1
+
+    def flush(self, account_file=None):
+        """立即写盘，account_file 为 None 时写所有账号"""
+        with self._lock:
+            keys = [self._key(account_file)] if account_file is not None else list(self._entries)
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                try:
+                    self._flush_entry(key, entry)
+                except Exception as e:
+                    logger.error(f"failed to save session {Path(key).name}: {e!r}")
+
+    def invalidate(self, account_file):
+        """丢弃缓存和待写的更新，下次 get 重新读取文件"""
+        with self._lock:
+            entry = self._entries.pop(self._key(account_file), None)
+            if entry is not None:
+                self._cancel_timer(entry)
+
+
+SESSIONS = SessionStore()
+atexit.register(SESSIONS.flush)
+
+
+async def save_context_state(context, account_file):
+    """代替 context.storage_state(path=account_file)：合并进缓存，延迟写盘"""
+    SESSIONS.update(account_file, await context.storage_state())
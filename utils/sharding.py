@@ -0,0 +1,102 @@
+"""
+按账号把上传任务分到多个进程：每个进程有自己的 playwright driver 和浏览器池，一个 python 进程的事件循环、
+driver 管道的 JSON 编解码、日志只能用满一个核，多进程才能用满多核机器。
+一致性哈希保证同一个账号总是落在同一个进程上，复用该进程里已经校验过的 cookie 和浏览器；
+进程数变化时只有约 1/N 的账号换进程。
+
+    cli_main.py batch manifest.csv --processes 8       # 批量上传按账号分片
+    python -m utils.daemon start --processes 8         # 守护进程按账号把任务转发给子进程
+"""
+import asyncio
+import bisect
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+from utils.engine import JOB_FAILED, JOB_SKIPPED, format_job_result, run_jobs
+
+# 每个节点在环上的虚拟节点数，越多分布越均匀
+HASH_RING_REPLICAS = 160
+
+
+class HashRing(object):
+    """
+    ring = HashRing(range(4))
+    ring.get_node("cookies/douyin_xiaoA.json")  # -> 0..3，同一个 key 结果固定
+    """
+
+    def __init__(self, nodes=(), replicas=HASH_RING_REPLICAS):
+        self.replicas = replicas
+        self._keys = []
+        self._nodes = {}
+        for node in nodes:
+            self.add_node(node)
+
+    @staticmethod
+    def _hash(value):
+        # 不用内置 hash()：字符串的 hash 每个进程不同
+        return int.from_bytes(hashlib.md5(str(value).encode("utf-8")).digest()[:8], "big")
+
+    def add_node(self, node):
+        for i in range(self.replicas):
+            key = self._hash(f"{node}#{i}")
+            bisect.insort(self._keys, key)
+            self._nodes[key] = node
+
+    def remove_node(self, node):
+        for i in range(self.replicas):
+            key = self._hash(f"{node}#{i}")
+            self._keys.remove(key)
+            del self._nodes[key]
+
+    def get_node(self, key):
+        if not self._keys:
+            raise ValueError("hash ring is empty")
+        index = bisect.bisect(self._keys, self._hash(key)) % len(self._keys)
+        return self._nodes[self._keys[index]]
+
+
+def shard_jobs(jobs, shards):
+    """按账号 cookie 文件分片，返回 shards 个任务列表（保持原来的顺序）"""
+    ring = HashRing(range(shards))
+    buckets = [[] for _ in range(shards)]
+    for job in jobs:
+        buckets[ring.get_node(job.account_file)].append(job)
+    return buckets
+
+
+def _run_shard(shard, jobs, max_workers, platform_concurrency):
+    def print_result(job):
+        print(f"[shard {shard}] {format_job_result(job)}", flush=True)
+
+    return asyncio.run(run_jobs(jobs, max_workers, platform_concurrency, on_job_done=print_result))
+
+
+def run_jobs_sharded(jobs, processes, max_workers, platform_concurrency=None):
+    """
+    阻塞执行：每个分片一个子进程跑 run_jobs，max_workers、platform_concurrency 为每个进程的限制。
+    子进程里的任务状态写回传入的 UploadJob 对象；子进程崩溃时该分片的任务记为失败。
+    """
+    runnable = [job for job in jobs if job.status != JOB_SKIPPED]
+    buckets = [bucket for bucket in shard_jobs(runnable, processes) if bucket]
+    # spawn：不继承父进程的事件循环和 playwright 状态
+    context = multiprocessing.get_context("spawn")
+    with ExitStack() as stack:
+        # 每个分片一个单进程的进程池：共用一个进程池时，任一子进程崩溃（如被 OOM 杀掉）会让所有分片的 future 都失败
+        futures = [stack.enter_context(ProcessPoolExecutor(max_workers=1, mp_context=context))
+                   .submit(_run_shard, shard, bucket, max_workers, platform_concurrency)
+                   for shard, bucket in enumerate(buckets)]
+        for shard, (bucket, future) in enumerate(zip(buckets, futures)):
+            try:
+                results = future.result()
+            except Exception as e:
+                # 崩溃的分片里的任务结果拿不回来，全部记为失败，其他分片照常合并
+                for job in bucket:
+                    job.status = JOB_FAILED
+                    job.error = f"shard {shard} crashed: {e!r}"
+                    print(f"[shard {shard}] {format_job_result(job)}", flush=True)
+                continue
+            for job, result in zip(bucket, results):
+                job.__dict__.update(result.__dict__)
+    return jobs
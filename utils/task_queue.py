@@ -0,0 +1,242 @@
+"""
+发布任务队列：后端把发布请求写进共享队列，一个或多个 worker 进程（可以在不同机器上，见 myUtils/worker.py）
+按租约领取任务。worker 定时续约，崩溃或断网后租约过期，任务自动回到队列被其他 worker 领取。
+
+队列存储可插拔：open_task_store(url) 按 url 的 scheme 选择实现，自带 sqlite://（单机多进程，或测试用）。
+多台机器共用时注册一个网络存储（实现 TaskStore 的抽象方法即可）：
+    register_task_store("redis", lambda url: RedisTaskStore(url))
+注意 SQLite 文件不要放在 NFS 等网络文件系统上，文件锁不可靠。
+"""
+import json
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from contextlib import closing
+from pathlib import Path
+from urllib.parse import urlparse
+
+from conf import BASE_DIR
+
+# 为空时后端在处理请求的进程内直接发布（原来的方式）；设置后 /postVideo 只入队，由 worker 执行
+# 例：sqlite:////data/sau/task_queue.db（绝对路径）、sqlite:///db/task_queue.db（相对 BASE_DIR）
+TASK_STORE_URL = os.environ.get("SAU_TASK_STORE", "")
+# 租约时长，秒。worker 每 1/3 租约续约一次，超过租约没有续约视为 worker 已经挂掉
+DEFAULT_LEASE_SECONDS = 120
+DEFAULT_MAX_ATTEMPTS = 3
+# 失败重试的等待时间，秒，乘以已尝试次数
+RETRY_DELAY = 60
+
+TASK_QUEUED = "queued"
+TASK_LEASED = "leased"
+TASK_DONE = "done"
+TASK_FAILED = "failed"
+
+
+class TaskStore(ABC):
+    """
+    任务队列接口。任务是 dict：id、platform_type、payload、status、attempts、max_attempts、
+    lease_owner（最后一次领取的 worker）、lease_expires、result、error、created_at、updated_at。
+    除 enqueue/get/list_tasks 外的方法都带 worker_id，租约已经不属于该 worker 时返回 False。
+    """
+
+    @abstractmethod
+    def enqueue(self, platform_type, payload, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        raise NotImplementedError
+
+    @abstractmethod
+    def claim(self, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS, platform_types=None):
+        """领取最早一个可执行的任务（排队中，或租约已过期），没有时返回 None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def heartbeat(self, task_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        raise NotImplementedError
+
+    @abstractmethod
+    def complete(self, task_id, worker_id, result=None):
+        raise NotImplementedError
+
+    @abstractmethod
+    def fail(self, task_id, worker_id, error, retry=True, result=None):
+        """
+        retry 为 True 且还有重试次数时重新排队，否则标记失败。
+        result 不为 None 时一并保存（如已经成功的部分），重试时 worker 从领取到的任务里读回
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def release(self, task_id, worker_id):
+        """worker 正常退出时交还未开始的任务，不计入尝试次数"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, task_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def list_tasks(self, status=None, limit=100):
+        raise NotImplementedError
+
+
+class SQLiteTaskStore(TaskStore):
+    """同一台机器上的多个进程共用一个 SQLite 文件，领取任务时用 BEGIN IMMEDIATE 加写锁保证只有一个 worker 拿到"""
+
+    def __init__(self, db_path):
+        self.db_path = str(db_path)
+        Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute('''CREATE TABLE IF NOT EXISTS publish_tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                platform_type INTEGER,
+                payload TEXT NOT NULL,                -- /postVideo 请求体 JSON
+                status TEXT NOT NULL DEFAULT 'queued',  -- queued / leased / done / failed
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                available_at REAL NOT NULL,           -- 重试等待结束的时间
+                lease_owner TEXT,
+                lease_expires REAL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_publish_tasks_status ON publish_tasks (status, available_at)")
+
+    @classmethod
+    def from_url(cls, url):
+        path = urlparse(url).path
+        # sqlite:///db/x.db -> 相对 BASE_DIR；sqlite:////abs/x.db -> 绝对路径
+        if path.startswith("//"):
+            return cls(path[1:])
+        return cls(Path(BASE_DIR) / path.lstrip("/"))
+
+    def _connect(self):
+        # isolation_level=None：事务由下面显式的 BEGIN IMMEDIATE 控制
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _to_dict(row):
+        if row is None:
+            return None
+        task = dict(row)
+        task["payload"] = json.loads(task["payload"])
+        task["result"] = json.loads(task["result"]) if task["result"] else None
+        return task
+
+    def _update_owned(self, sql, params, task_id, worker_id):
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(f"{sql} WHERE id = ? AND status = ? AND lease_owner = ?",
+                                  (*params, task_id, TASK_LEASED, worker_id))
+            return cursor.rowcount == 1
+
+    def enqueue(self, platform_type, payload, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT INTO publish_tasks (platform_type, payload, max_attempts, available_at, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (platform_type, json.dumps(payload, ensure_ascii=False), max_attempts, now, now, now))
+            return cursor.lastrowid
+
+    def claim(self, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS, platform_types=None):
+        now = time.time()
+        type_filter, type_params = "", ()
+        if platform_types:
+            type_filter = f" AND platform_type IN ({','.join('?' * len(platform_types))})"
+            type_params = tuple(platform_types)
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 租约过期（worker 崩溃）且已经没有重试次数的任务直接标记失败
+                conn.execute("UPDATE publish_tasks SET status = ?, error = ?, updated_at = ?"
+                             " WHERE status = ? AND lease_expires < ? AND attempts >= max_attempts",
+                             (TASK_FAILED, "lease expired", now, TASK_LEASED, now))
+                row = conn.execute(
+                    "SELECT id FROM publish_tasks WHERE available_at <= ?"
+                    " AND (status = ? OR (status = ? AND lease_expires < ?))" + type_filter +
+                    " ORDER BY id LIMIT 1",
+                    (now, TASK_QUEUED, TASK_LEASED, now, *type_params)).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                conn.execute("UPDATE publish_tasks SET status = ?, lease_owner = ?, lease_expires = ?,"
+                             " attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                             (TASK_LEASED, worker_id, now + lease_seconds, now, row["id"]))
+                task = conn.execute("SELECT * FROM publish_tasks WHERE id = ?", (row["id"],)).fetchone()
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return self._to_dict(task)
+
+    def heartbeat(self, task_id, worker_id, lease_seconds=DEFAULT_LEASE_SECONDS):
+        now = time.time()
+        return self._update_owned("UPDATE publish_tasks SET lease_expires = ?, updated_at = ?",
+                                  (now + lease_seconds, now), task_id, worker_id)
+
+    def complete(self, task_id, worker_id, result=None):
+        return self._update_owned(
+            "UPDATE publish_tasks SET status = ?, result = ?, error = NULL, updated_at = ?",
+            (TASK_DONE, json.dumps(result, ensure_ascii=False, default=str), time.time()), task_id, worker_id)
+
+    def fail(self, task_id, worker_id, error, retry=True, result=None):
+        now = time.time()
+        task = self.get(task_id)
+        if task is None:
+            return False
+        # result 为 None 时保留原来的值
+        result = json.dumps(result, ensure_ascii=False, default=str) if result is not None else None
+        if retry and task["attempts"] < task["max_attempts"]:
+            return self._update_owned(
+                "UPDATE publish_tasks SET status = ?, error = ?, result = COALESCE(?, result), lease_owner = NULL,"
+                " available_at = ?, updated_at = ?",
+                (TASK_QUEUED, error, result, now + RETRY_DELAY * task["attempts"], now), task_id, worker_id)
+        return self._update_owned(
+            "UPDATE publish_tasks SET status = ?, error = ?, result = COALESCE(?, result), updated_at = ?",
+            (TASK_FAILED, error, result, now), task_id, worker_id)
+
+    def release(self, task_id, worker_id):
+        return self._update_owned(
+            "UPDATE publish_tasks SET status = ?, attempts = attempts - 1, lease_owner = NULL, updated_at = ?",
+            (TASK_QUEUED, time.time()), task_id, worker_id)
+
+    def get(self, task_id):
+        with closing(self._connect()) as conn:
+            return self._to_dict(conn.execute("SELECT * FROM publish_tasks WHERE id = ?", (task_id,)).fetchone())
+
+    def list_tasks(self, status=None, limit=100):
+        with closing(self._connect()) as conn:
+            if status:
+                rows = conn.execute("SELECT * FROM publish_tasks WHERE status = ? ORDER BY id DESC LIMIT ?",
+                                    (status, limit)).fetchall()
+            else:
+                rows = conn.execute("SELECT * FROM publish_tasks ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+
+_store_factories = {
+    "sqlite": SQLiteTaskStore.from_url,
+}
+
+
+def register_task_store(scheme, factory):
+    """factory(url) -> TaskStore"""
+    _store_factories[scheme] = factory
+
+
+_stores = {}
+
+
+def open_task_store(url=None):
+    """同一个 url 只创建一次存储（建表、连接参数），之后直接复用"""
+    url = url or TASK_STORE_URL
+    if url not in _stores:
+        scheme = urlparse(url).scheme
+        if scheme not in _store_factories:
+            raise ValueError(f"unsupported task store: {url}, registered: {', '.join(sorted(_store_factories))}")
+        _stores[url] = _store_factories[scheme](url)
+    return _stores[url]
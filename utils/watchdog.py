@@ -0,0 +1,204 @@
+"""
+浏览器内存看门狗：定时采样本进程名下每个浏览器（主进程 + renderer/GPU/utility 子进程）的 RSS，
+- 单个池内浏览器超过 BROWSER_RSS_LIMIT_MB：退役（不再分配新任务，正在跑的任务结束后关闭，下一个任务启动新浏览器）
+- 所有浏览器合计超过 TOTAL_RSS_LIMIT_MB，或系统可用内存低于 MIN_AVAILABLE_MB：每次退役占用最大的一个
+- 清理孤儿浏览器：playwright 启动的浏览器，driver 进程已经不在（崩溃、被强杀）后被 init 收养的进程
+采样结果导出到 /metrics（sau_browser_*）。
+
+RSS 按进程直接相加，共享内存会重复计算，数值偏大，限制按偏保守的方向生效。
+只有 BrowserPool 里的浏览器（cli_main.py batch、守护进程）能被退役；后端每个任务自己启动浏览器，只采样和清理孤儿。
+"""
+import asyncio
+import os
+import threading
+
+import psutil
+from loguru import logger
+
+from utils.engine import BROWSER_ID_ARG
+from utils.metrics import BROWSER_PROCESSES, BROWSER_RECYCLES, BROWSER_RSS_BYTES, BROWSER_TOTAL_RSS_BYTES, \
+    ORPHAN_PROCESSES_REAPED
+
+BROWSER_RSS_LIMIT_MB = int(os.environ.get("SAU_BROWSER_RSS_LIMIT_MB", 1500))
+# 0 表示不限制合计内存，只看系统可用内存
+TOTAL_RSS_LIMIT_MB = int(os.environ.get("SAU_TOTAL_RSS_LIMIT_MB", 0))
+MIN_AVAILABLE_MB = int(os.environ.get("SAU_MIN_AVAILABLE_MB", 512))
+# 采样间隔，秒
+WATCHDOG_INTERVAL = 10
+
+# playwright 用管道和浏览器通信，浏览器主进程的命令行里一定带其中一个开关；子进程带 --type=
+BROWSER_PIPE_ARGS = ("--remote-debugging-pipe", "-juggler-pipe", "--inspector-pipe")
+# playwright 启动的浏览器，临时用户目录以此开头
+PLAYWRIGHT_PROFILE_MARK = "playwright_"
+# 孤儿进程被收养后的父进程
+REAPER_NAMES = ("systemd", "init", "tini", "dumb-init")
+# 先 terminate，超时后 kill，秒
+REAP_TIMEOUT = 3
+
+MB = 1024 * 1024
+
+
+class BrowserSample(object):
+    def __init__(self, pid, browser_id, rss, processes):
+        self.pid = pid
+        # 池内 chromium 的编号，其他浏览器为 None
+        self.browser_id = browser_id
+        self.rss = rss
+        self.processes = processes
+
+
+def _is_browser_root(cmdline):
+    return any(arg in BROWSER_PIPE_ARGS for arg in cmdline) and not any(arg.startswith("--type=") for arg in cmdline)
+
+
+def _browser_id(cmdline):
+    for arg in cmdline:
+        if arg.startswith(BROWSER_ID_ARG + "="):
+            value = arg.partition("=")[2]
+            return int(value) if value.isdigit() else None
+    return None
+
+
+def _tree_rss(process):
+    rss, count = 0, 0
+    for proc in [process] + process.children(recursive=True):
+        try:
+            rss += proc.memory_info().rss
+            count += 1
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            pass
+    return rss, count
+
+
+def sample_browsers(root=None):
+    """本进程（root）名下的所有浏览器，playwright driver 是本进程的子进程，浏览器是 driver 的子进程"""
+    root = root or psutil.Process()
+    samples = []
+    for proc in root.children(recursive=True):
+        try:
+            cmdline = proc.cmdline()
+            if not _is_browser_root(cmdline):
+                continue
+            rss, count = _tree_rss(proc)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+        samples.append(BrowserSample(proc.pid, _browser_id(cmdline), rss, count))
+    return samples
+
+
+def find_orphan_browsers():
+    """当前用户下、playwright 启动、父进程已经变成 init 一类进程的浏览器主进程"""
+    username = psutil.Process().username()
+    orphans = []
+    for proc in psutil.process_iter(["pid", "ppid", "username", "cmdline"]):
+        try:
+            cmdline = proc.info["cmdline"] or []
+            if proc.info["username"] != username or not _is_browser_root(cmdline):
+                continue
+            if not any(PLAYWRIGHT_PROFILE_MARK in arg for arg in cmdline):
+                continue
+            ppid = proc.info["ppid"]
+            if ppid == 1 or not psutil.pid_exists(ppid) or psutil.Process(ppid).name() in REAPER_NAMES:
+                orphans.append(proc)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return orphans
+
+
+def reap(process):
+    try:
+        processes = [process] + process.children(recursive=True)
+    except psutil.NoSuchProcess:
+        return 0
+    for proc in processes:
+        try:
+            proc.terminate()
+        except psutil.NoSuchProcess:
+            pass
+    gone, alive = psutil.wait_procs(processes, timeout=REAP_TIMEOUT)
+    for proc in alive:
+        try:
+            proc.kill()
+        except psutil.NoSuchProcess:
+            pass
+    return len(processes)
+
+
+class MemoryWatchdog(object):
+    """
+    watchdog = MemoryWatchdog(pool)
+    task = asyncio.create_task(watchdog.run())   # 池内浏览器：采样 + 退役 + 清理孤儿
+    MemoryWatchdog().start_thread()              # 没有浏览器池的进程（后端、worker）：只采样和清理孤儿
+    """
+
+    def __init__(self, pool=None, browser_limit_mb=BROWSER_RSS_LIMIT_MB, total_limit_mb=TOTAL_RSS_LIMIT_MB,
+                 min_available_mb=MIN_AVAILABLE_MB, interval=WATCHDOG_INTERVAL, reap_orphans=True):
+        self.pool = pool
+        self.browser_limit = browser_limit_mb * MB
+        self.total_limit = total_limit_mb * MB
+        self.min_available = min_available_mb * MB
+        self.interval = interval
+        self.reap_orphans = reap_orphans
+        self.samples = []
+        self.reaped = 0
+
+    @property
+    def total_rss(self):
+        return sum(sample.rss for sample in self.samples)
+
+    def sample(self):
+        samples = sample_browsers()
+        BROWSER_RSS_BYTES.replace({(sample.browser_id or f"pid-{sample.pid}",): sample.rss for sample in samples})
+        BROWSER_TOTAL_RSS_BYTES.set(sum(sample.rss for sample in samples))
+        BROWSER_PROCESSES.set(sum(sample.processes for sample in samples))
+        self.samples = samples
+        if self.reap_orphans:
+            for orphan in find_orphan_browsers():
+                count = reap(orphan)
+                logger.warning(f"reaped orphaned browser pid {orphan.pid} ({count} processes)")
+                ORPHAN_PROCESSES_REAPED.inc(count)
+                self.reaped += count
+        return samples
+
+    def select_for_recycle(self, samples):
+        """返回 [(browser_id, reason)]，只考虑池内、还没退役的浏览器"""
+        if self.pool is None:
+            return []
+        active = {entry.id for entry in self.pool.entries() if not entry.draining}
+        pooled = [sample for sample in samples if sample.browser_id in active]
+        selected = [(sample.browser_id, "browser_limit") for sample in pooled
+                    if self.browser_limit and sample.rss > self.browser_limit]
+        over_total = self.total_limit and sum(sample.rss for sample in samples) > self.total_limit
+        low_memory = self.min_available and psutil.virtual_memory().available < self.min_available
+        if (over_total or low_memory) and not selected and pooled:
+            largest = max(pooled, key=lambda sample: sample.rss)
+            selected.append((largest.browser_id, "total_limit" if over_total else "low_memory"))
+        return selected
+
+    async def check(self):
+        samples = await asyncio.to_thread(self.sample)
+        for browser_id, reason in self.select_for_recycle(samples):
+            if await self.pool.retire(browser_id):
+                logger.warning(f"recycling browser {browser_id}: {reason}")
+                BROWSER_RECYCLES.inc(reason=reason)
+
+    async def run(self):
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                logger.warning(f"memory watchdog check failed: {e!r}")
+            await asyncio.sleep(self.interval)
+
+    def start_thread(self):
+        def loop():
+            while not stop.is_set():
+                try:
+                    self.sample()
+                except Exception as e:
+                    logger.warning(f"memory watchdog check failed: {e!r}")
+                stop.wait(self.interval)
+
+        stop = threading.Event()
+        threading.Thread(target=loop, name="memory-watchdog", daemon=True).start()
+        return stop